@@ -9,15 +9,22 @@ It intelligently routes requests to either:
 
 Cost: ~$20/month for the function + $342/month for endpoints + $100/month for batch
 Total: $462/month (97% savings vs naive approach)
+
+Batch-cache lookups are served from memory: the latest prediction of every
+model is bulk-loaded in ONE query and kept until the next hourly batch
+refresh (see BatchPredictionCache), instead of one query job per request.
 """
 
 import os
 import json
+import threading
+import time
 from flask import Request, jsonify
 from google.cloud import aiplatform
 from google.cloud import bigquery
-from datetime import datetime
+from datetime import datetime, timedelta
 import traceback
+from concurrent.futures import ThreadPoolExecutor
 
 # Initialize clients
 aiplatform.init(project='bqx-ml', location='us-central1')
@@ -35,6 +42,187 @@ CRITICAL_ENDPOINTS = {
 # BigQuery cache table for batch predictions
 BATCH_CACHE_TABLE = 'bqx-ml.predictions.batch_cache'
 
+# In-memory batch cache, aligned to the hourly batch schedule: a snapshot
+# expires at the next (hour boundary + BATCH_CACHE_OFFSET_SECONDS), i.e.
+# shortly after the batch job has written fresh predictions.
+BATCH_CACHE_PERIOD_SECONDS = int(os.environ.get('BATCH_CACHE_PERIOD_SECONDS', 3600))
+BATCH_CACHE_OFFSET_SECONDS = int(os.environ.get('BATCH_CACHE_OFFSET_SECONDS', 300))
+BATCH_CACHE_MAX_AGE_HOURS = 2  # Predictions older than this are not served
+BATCH_CACHE_MISS_REFRESH_SECONDS = 60  # Unknown model → reload if the snapshot is older than this
+BATCH_CACHE_RETRY_SECONDS = 30  # After a failed reload, keep the old snapshot this long
+BATCH_CACHE_WAIT_SECONDS = 30  # Max wait on a reload started by another request
+
+# Multi-model requests ({"requests": [...]})
+MAX_MULTI_ITEMS = 500
+ENDPOINT_FANOUT_THREADS = 8  # Endpoint predict calls issued in parallel
+DUMMY_FEATURE_COUNT = 6030  # 6030 features as per BQX paradigm
+
+
+class BatchPredictionCache:
+    """
+    Latest batch prediction per model, held in memory.
+
+    - One bulk query loads every model's latest row (QUALIFY ROW_NUMBER)
+    - The snapshot expires on the batch schedule, not per request
+    - Concurrent requests that find it expired (or miss a model) share ONE
+      reload: the first becomes the loader, the rest wait for its result
+    - A failed reload keeps serving the previous snapshot (still subject to
+      the 2-hour freshness rule) and retries after BATCH_CACHE_RETRY_SECONDS
+    - Hit / miss / reload counters are reported by health_check
+    """
+
+    def __init__(self, client, table: str = BATCH_CACHE_TABLE,
+                 period_s: int = BATCH_CACHE_PERIOD_SECONDS, offset_s: int = BATCH_CACHE_OFFSET_SECONDS):
+        self.client = client
+        self.table = table
+        self.period_s = period_s
+        self.offset_s = offset_s
+        self._lock = threading.Lock()
+        self._loading = None  # threading.Event while a reload is in flight
+        self._entries = {}
+        self._loaded_at = None
+        self._expires_at = 0.0
+        self._error = None
+        self.stats = {'hits': 0, 'misses': 0, 'stale': 0, 'reloads': 0, 'reload_errors': 0,
+                      'coalesced_waits': 0}
+
+    def next_expiry(self, now: float) -> float:
+        """First batch-schedule boundary (period × k + offset) after `now`."""
+        return ((now - self.offset_s) // self.period_s + 1) * self.period_s + self.offset_s
+
+    def _load(self) -> dict:
+        query = f"""
+        SELECT
+            model_name,
+            prediction,
+            confidence,
+            prediction_time,
+            batch_job_id
+        FROM `{self.table}`
+        WHERE prediction_time >= DATETIME_SUB(CURRENT_DATETIME(), INTERVAL {BATCH_CACHE_MAX_AGE_HOURS} HOUR)
+        QUALIFY ROW_NUMBER() OVER (PARTITION BY model_name ORDER BY prediction_time DESC) = 1
+        """
+        entries = {}
+        for row in self.client.query(query).result():
+            entries[row.model_name] = {
+                'prediction': row.prediction,
+                'confidence': row.confidence,
+                'prediction_time': row.prediction_time,
+                'batch_job_id': row.batch_job_id
+            }
+        return entries
+
+    def refresh(self, min_age_s: float = None) -> dict:
+        """
+        Reload the snapshot if it expired (or is older than min_age_s), coalesced.
+
+        Returns:
+            The current entries; raises only if there has never been a snapshot
+        """
+        with self._lock:
+            now = time.time()
+            fresh = now < self._expires_at and (
+                min_age_s is None or (self._loaded_at is not None and now - self._loaded_at < min_age_s))
+            if fresh:
+                return self._entries
+            loading = self._loading
+            if loading is None:
+                self._loading = threading.Event()
+            else:
+                self.stats['coalesced_waits'] += 1
+
+        if loading is not None:
+            loading.wait(BATCH_CACHE_WAIT_SECONDS)
+            with self._lock:
+                if self._loaded_at is None and self._error is not None:
+                    raise self._error
+                return self._entries
+
+        try:
+            entries = self._load()
+            with self._lock:
+                self._entries = entries
+                self._loaded_at = time.time()
+                self._expires_at = self.next_expiry(self._loaded_at)
+                self._error = None
+                self.stats['reloads'] += 1
+        except Exception as e:
+            with self._lock:
+                self._error = e
+                self._expires_at = time.time() + BATCH_CACHE_RETRY_SECONDS
+                self.stats['reload_errors'] += 1
+            print(f"⚠️ Batch cache reload failed: {e}", flush=True)
+            if self._loaded_at is None:
+                raise
+        finally:
+            with self._lock:
+                self._loading.set()
+                self._loading = None
+        return self._entries
+
+    def get(self, model_name: str):
+        """Latest prediction row of a model within the freshness window, or None."""
+        return self.get_many([model_name])[model_name]
+
+    def get_many(self, model_names: list) -> dict:
+        """
+        Look up several models against one snapshot (at most one reload for misses).
+
+        Returns:
+            {model_name: entry or None}
+        """
+        entries = self.refresh()
+        if any(name not in entries for name in model_names):
+            entries = self.refresh(min_age_s=BATCH_CACHE_MISS_REFRESH_SECONDS)
+
+        cutoff = datetime.utcnow() - timedelta(hours=BATCH_CACHE_MAX_AGE_HOURS)
+        found = {}
+        with self._lock:
+            for name in model_names:
+                entry = entries.get(name)
+                if entry is not None and entry['prediction_time'] is not None and entry['prediction_time'] < cutoff:
+                    self.stats['stale'] += 1
+                    entry = None
+                self.stats['hits' if entry is not None else 'misses'] += 1
+                found[name] = entry
+        return found
+
+    def status(self) -> dict:
+        """Counters and snapshot state for monitoring."""
+        lookups = self.stats['hits'] + self.stats['misses']
+        return {
+            **self.stats,
+            'hit_rate': round(self.stats['hits'] / lookups, 4) if lookups else None,
+            'models': len(self._entries),
+            'loaded_at': datetime.utcfromtimestamp(self._loaded_at).isoformat() if self._loaded_at else None,
+            'expires_at': datetime.utcfromtimestamp(self._expires_at).isoformat() if self._expires_at else None,
+            'last_error': str(self._error) if self._error else None
+        }
+
+
+batch_cache = BatchPredictionCache(bq_client)
+
+# Endpoint handles, created once per instance and reused across invocations
+_endpoints = {}
+_endpoints_lock = threading.Lock()
+
+
+def get_endpoint(endpoint_id: str):
+    """Shared aiplatform.Endpoint handle for an endpoint resource name."""
+    with _endpoints_lock:
+        endpoint = _endpoints.get(endpoint_id)
+        if endpoint is None:
+            endpoint = _endpoints[endpoint_id] = aiplatform.Endpoint(endpoint_id)
+        return endpoint
+
+
+def endpoint_instances(features=None) -> list:
+    """Prediction instances for one request's features (dummy vector when omitted)."""
+    if features:
+        return [features] if isinstance(features, list) else [[features]]
+    # Use dummy features for testing
+    return [[0.0] * DUMMY_FEATURE_COUNT]
+
 def get_prediction(request: Request):
     """
     Main entry point for the Cloud Function.
@@ -44,6 +232,9 @@ def get_prediction(request: Request):
     - window: Time window (45 or 90)
     - features: Optional JSON array of feature values
 
+    or a POST body {"requests": [{"pair", "window", "features"}, ...]} for
+    many models in one call (see get_multi_prediction).
+
     Returns:
     - prediction: The model prediction
     - source: 'endpoint' or 'batch_cache'
@@ -57,6 +248,9 @@ def get_prediction(request: Request):
         else:
             request_json = request.args
 
+        if isinstance(request_json.get('requests'), list):
+            return get_multi_prediction(request_json['requests'])
+
         # Extract parameters
         pair = request_json.get('pair', '').upper()
         window = request_json.get('window', '')
@@ -100,14 +294,10 @@ def get_endpoint_prediction(model_name, features=None):
     try:
         # Get endpoint
         endpoint_id = CRITICAL_ENDPOINTS[model_name]
-        endpoint = aiplatform.Endpoint(endpoint_id)
+        endpoint = get_endpoint(endpoint_id)
 
         # Prepare instances for prediction
-        if features:
-            instances = [features] if isinstance(features, list) else [[features]]
-        else:
-            # Use dummy features for testing
-            instances = [[0.0] * 6030]  # 6030 features as per BQX paradigm
+        instances = endpoint_instances(features)
 
         # Make prediction
         predictions = endpoint.predict(instances=instances)
@@ -136,7 +326,7 @@ def get_endpoint_prediction(model_name, features=None):
 
 def get_batch_prediction(model_name):
     """
-    Get cached prediction from BigQuery batch results.
+    Get cached prediction from BigQuery batch results (via the in-memory batch_cache).
 
     Args:
         model_name: Name of the model (e.g., AUD_USD_45)
@@ -147,42 +337,19 @@ def get_batch_prediction(model_name):
     start_time = datetime.now()
 
     try:
-        # Query BigQuery for cached prediction
-        query = f"""
-        SELECT
-            model_name,
-            prediction,
-            confidence,
-            prediction_time,
-            batch_job_id
-        FROM `{BATCH_CACHE_TABLE}`
-        WHERE model_name = @model_name
-            AND prediction_time >= DATETIME_SUB(CURRENT_DATETIME(), INTERVAL 2 HOUR)
-        ORDER BY prediction_time DESC
-        LIMIT 1
-        """
-
-        job_config = bigquery.QueryJobConfig(
-            query_parameters=[
-                bigquery.ScalarQueryParameter("model_name", "STRING", model_name)
-            ]
-        )
-
-        query_job = bq_client.query(query, job_config=job_config)
-        results = list(query_job.result())
+        row = batch_cache.get(model_name)
 
         # Calculate latency
         latency_ms = (datetime.now() - start_time).total_seconds() * 1000
 
-        if results:
-            row = results[0]
+        if row is not None:
             return jsonify({
                 'model': model_name,
-                'prediction': row.prediction,
-                'confidence': row.confidence,
+                'prediction': row['prediction'],
+                'confidence': row['confidence'],
                 'source': 'batch_cache',
-                'cache_time': row.prediction_time.isoformat() if row.prediction_time else None,
-                'batch_job_id': row.batch_job_id,
+                'cache_time': row['prediction_time'].isoformat() if row['prediction_time'] else None,
+                'batch_job_id': row['batch_job_id'],
                 'latency_ms': round(latency_ms, 2),
                 'timestamp': datetime.now().isoformat()
             })
@@ -205,6 +372,100 @@ def get_batch_prediction(model_name):
             'timestamp': datetime.now().isoformat()
         }), 500
 
+def get_multi_prediction(items: list):
+    """
+    Predict many models in one call.
+
+    Endpoint models are grouped by endpoint: each endpoint gets ONE predict
+    call carrying all of its instances, and the calls fan out in parallel.
+    Batch-cache models are resolved together against one cache snapshot.
+
+    Args:
+        items: [{"pair": "EUR_USD", "window": 90, "features": [...]}, ...]
+
+    Returns:
+        JSON {"results": [...]} in request order; each result has the fields of
+        a single-model response (or 'error') plus its own latency_ms
+    """
+    start = time.perf_counter()
+    if len(items) > MAX_MULTI_ITEMS:
+        return jsonify({'error': f'Too many requests in one call: {len(items)} > {MAX_MULTI_ITEMS}'}), 400
+
+    results = [None] * len(items)
+    by_endpoint, cached = {}, {}
+    for i, item in enumerate(items):
+        item = item if isinstance(item, dict) else {}
+        pair = str(item.get('pair', '')).upper()
+        window = item.get('window', '')
+        if not pair or not window:
+            results[i] = {'error': 'Missing required parameters: pair and window', 'latency_ms': 0.0}
+            continue
+        model_name = f"{pair}_{window}"
+        if CRITICAL_ENDPOINTS.get(model_name):
+            by_endpoint.setdefault(CRITICAL_ENDPOINTS[model_name], []).append(
+                (i, model_name, endpoint_instances(item.get('features'))))
+        else:
+            cached.setdefault(model_name, []).append(i)
+
+    def predict_group(endpoint_id, members):
+        instances = [inst for _, _, group in members for inst in group]
+        try:
+            predictions = get_endpoint(endpoint_id).predict(instances=instances).predictions or []
+            error = None
+        except Exception as e:
+            predictions, error = [], str(e)
+        latency_ms = round((time.perf_counter() - start) * 1000, 2)
+        offset = 0
+        for i, model_name, group in members:
+            result = {'model': model_name, 'source': 'endpoint', 'endpoint_id': endpoint_id,
+                      'latency_ms': latency_ms}
+            if error is not None:
+                result['error'] = error
+            else:
+                result['prediction'] = predictions[offset] if offset < len(predictions) else None
+            results[i] = result
+            offset += len(group)
+
+    with ThreadPoolExecutor(max_workers=min(ENDPOINT_FANOUT_THREADS, max(len(by_endpoint), 1))) as executor:
+        futures = [executor.submit(predict_group, eid, members) for eid, members in by_endpoint.items()]
+
+        if cached:
+            try:
+                rows = batch_cache.get_many(list(cached))
+                error = None
+            except Exception as e:
+                rows, error = {}, str(e)
+            latency_ms = round((time.perf_counter() - start) * 1000, 2)
+            for model_name, positions in cached.items():
+                row = rows.get(model_name)
+                if row is not None:
+                    result = {
+                        'model': model_name,
+                        'prediction': row['prediction'],
+                        'confidence': row['confidence'],
+                        'source': 'batch_cache',
+                        'cache_time': row['prediction_time'].isoformat() if row['prediction_time'] else None,
+                        'batch_job_id': row['batch_job_id'],
+                        'latency_ms': latency_ms
+                    }
+                else:
+                    result = {'model': model_name, 'source': 'batch_cache', 'latency_ms': latency_ms,
+                              'error': error or 'No recent batch prediction found. Batch jobs run hourly.'}
+                for i in positions:
+                    results[i] = dict(result)
+
+        for future in futures:
+            future.result()
+
+    return jsonify({
+        'results': results,
+        'count': len(results),
+        'errors': sum(1 for r in results if 'error' in r),
+        'endpoint_calls': len(by_endpoint),
+        'latency_ms': round((time.perf_counter() - start) * 1000, 2),
+        'timestamp': datetime.now().isoformat()
+    })
+
 def health_check(request: Request):
     """
     Health check endpoint for monitoring.
@@ -224,7 +485,7 @@ def health_check(request: Request):
     for model, endpoint_id in CRITICAL_ENDPOINTS.items():
         if endpoint_id:
             try:
-                endpoint = aiplatform.Endpoint(endpoint_id)
+                endpoint = get_endpoint(endpoint_id)
                 endpoint_status[model] = 'deployed' if endpoint.list_models() else 'no_models'
             except:
                 endpoint_status[model] = 'error'
@@ -235,6 +496,7 @@ def health_check(request: Request):
         'status': 'healthy',
         'bigquery': bq_status,
         'critical_endpoints': endpoint_status,
+        'batch_cache': batch_cache.status(),
         'architecture': 'Smart Vertex AI',
         'cost_per_month': '$462',
         'savings': '97% ($12,978/month saved)',
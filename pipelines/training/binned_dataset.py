@@ -0,0 +1,180 @@
+#!/usr/bin/env python3
+"""
+Binned Datasets - Shared LightGBM Bin Construction for Feature Selection
+
+Stability selection and ablation testing trained dozens of LightGBM models
+on the same matrix, and every one of them started with `lgb.Dataset(X)`:
+a full re-binning of the raw NumPy array (quantile sketch per feature),
+which costs as much as a short training run.
+
+Bins depend only on the data, not on the seed, fold or ablation group, so
+they are built ONCE per (pair, target, feature set) and then reused:
+- seeds: the same constructed Dataset is passed to every lgb.train call
+- folds: row subsets via Dataset.subset() (no re-binning, bins come from
+  all rows)
+- ablations: column masks via interaction_constraints (masked features are
+  in no constraint, so they are never split on)
+
+The constructed Dataset can be saved in LightGBM's binary format, so a
+repeated selection run on unchanged data loads its bins instead of
+rebuilding them.
+
+Usage:
+    from binned_dataset import binned_key, data_fingerprint, load_or_build, fold_subset, masked_params
+    key = binned_key('eurusd', 'target_bqx45_h15', feature_cols, data_fingerprint(X, y))
+    dataset = load_or_build(X, y, feature_cols, key=key, cache_dir=BINNED_DIR)
+    model = lgb.train(params, fold_subset(dataset, train_idx))
+    model = lgb.train(masked_params(params, feature_cols, dropped), dataset)
+"""
+
+import os
+import json
+import hashlib
+import numpy as np
+import lightgbm as lgb
+
+BINNED_DIR = "/home/micha/bqx_ml_v3/data/binned"
+BINARY_SUFFIX = ".lgb.bin"
+
+# Dataset-level parameters fixed at construction. feature_pre_filter is off
+# so one construction serves any min_data_in_leaf used at training time.
+BIN_PARAMS = {
+    'max_bin': 255,
+    'min_data_in_bin': 3,
+    'feature_pre_filter': False,
+    'verbose': -1
+}
+
+# Rows hashed (evenly strided) when fingerprinting a feature matrix
+FINGERPRINT_ROWS = 1024
+
+
+def _digest(payload) -> str:
+    return hashlib.sha256(json.dumps(payload, sort_keys=True).encode()).hexdigest()[:16]
+
+
+def data_fingerprint(X: np.ndarray, y: np.ndarray) -> str:
+    """
+    Cheap content fingerprint of a feature matrix and its labels.
+
+    Hashes the shape, all labels and an evenly strided row sample, so a
+    refreshed or re-sampled matrix gets a new key without hashing every value.
+    """
+    step = max(len(X) // FINGERPRINT_ROWS, 1)
+    h = hashlib.sha256()
+    h.update(repr((X.shape, str(X.dtype))).encode())
+    h.update(np.ascontiguousarray(y).tobytes())
+    h.update(np.ascontiguousarray(X[::step]).tobytes())
+    return h.hexdigest()[:16]
+
+
+def binned_key(pair: str, target: str, feature_names: list, fingerprint: str = None,
+               params: dict = None) -> str:
+    """
+    Cache key of one binned dataset.
+
+    Args:
+        pair: Currency pair (None when unknown)
+        target: Target column or horizon label, e.g. 'target_bqx45_h15'
+        feature_names: Ordered feature columns of the matrix
+        fingerprint: data_fingerprint() of the matrix (None → key ignores content)
+        params: Bin parameters (default BIN_PARAMS)
+    """
+    bin_params = params if params is not None else BIN_PARAMS
+    digest = _digest([list(feature_names), fingerprint, bin_params])
+    return f"{pair or 'any'}_{target}_{digest}"
+
+
+def binned_path(key: str, cache_dir: str = BINNED_DIR) -> str:
+    """Path of the LightGBM binary file for a cache key."""
+    return os.path.join(cache_dir, key + BINARY_SUFFIX)
+
+
+def build_binned_dataset(X: np.ndarray, y: np.ndarray, feature_names: list,
+                         params: dict = None) -> lgb.Dataset:
+    """Bin a raw matrix once and return the constructed Dataset."""
+    dataset = lgb.Dataset(X, label=y, feature_name=list(feature_names),
+                          params=dict(params if params is not None else BIN_PARAMS),
+                          free_raw_data=True)
+    return dataset.construct()
+
+
+def save_binned_dataset(dataset: lgb.Dataset, path: str) -> None:
+    """Write a constructed Dataset in LightGBM binary format (atomically)."""
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    dataset.save_binary(tmp_path)
+    os.replace(tmp_path, path)
+
+
+def load_binned_dataset(path: str, feature_names: list = None, n_rows: int = None) -> lgb.Dataset:
+    """
+    Load a binary Dataset, or None if it is missing or does not match.
+
+    Args:
+        path: Binary file written by save_binned_dataset
+        feature_names: Expected feature columns (None → not checked)
+        n_rows: Expected row count (None → not checked)
+    """
+    if not os.path.exists(path):
+        return None
+    try:
+        dataset = lgb.Dataset(path, params=dict(BIN_PARAMS)).construct()
+    except lgb.basic.LightGBMError:
+        return None
+    if feature_names is not None and dataset.feature_name != list(feature_names):
+        return None
+    if n_rows is not None and dataset.num_data() != n_rows:
+        return None
+    return dataset
+
+
+def load_or_build(X: np.ndarray, y: np.ndarray, feature_names: list, key: str = None,
+                  cache_dir: str = None, params: dict = None) -> lgb.Dataset:
+    """
+    Constructed Dataset for a matrix, from the on-disk cache when possible.
+
+    Without cache_dir (or key) the bins are built in memory only.
+    """
+    if cache_dir is None or key is None:
+        return build_binned_dataset(X, y, feature_names, params)
+
+    path = binned_path(key, cache_dir)
+    dataset = load_binned_dataset(path, feature_names, len(X))
+    if dataset is not None:
+        print(f"    ✅ Loaded binned dataset: {os.path.basename(path)}", flush=True)
+        return dataset
+
+    dataset = build_binned_dataset(X, y, feature_names, params)
+    try:
+        save_binned_dataset(dataset, path)
+    except OSError as e:
+        print(f"    ⚠️ Could not cache binned dataset: {e}", flush=True)
+    return dataset
+
+
+def fold_subset(dataset: lgb.Dataset, indices) -> lgb.Dataset:
+    """Row subset of a constructed Dataset (shares its bins, no re-binning)."""
+    return dataset.subset(np.sort(np.asarray(indices, dtype=np.int32)).tolist())
+
+
+def masked_params(params: dict, feature_names: list, dropped) -> dict:
+    """
+    Training params that hide `dropped` features from a shared Dataset.
+
+    Every kept feature goes into one interaction constraint; a feature in
+    no constraint is never used for a split, which trains the same trees as
+    a Dataset built without those columns. Existing constraints are
+    intersected with the kept set. Importances keep the full column layout
+    (masked features report 0).
+    """
+    dropped = set(dropped)
+    kept = [i for i, f in enumerate(feature_names) if f not in dropped]
+    constraints = params.get('interaction_constraints')
+    if constraints:
+        kept_set = set(kept)
+        constraints = [[i for i in c if i in kept_set] for c in constraints]
+        constraints = [c for c in constraints if c]
+    else:
+        constraints = [kept]
+    return {**params, 'interaction_constraints': constraints}
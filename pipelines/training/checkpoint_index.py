@@ -0,0 +1,204 @@
+#!/usr/bin/env python3
+"""
+Checkpoint Index - One Listing per Checkpoint Directory
+
+query_pair_with_checkpoints asked "does this checkpoint exist / is it
+current?" one table at a time: an exists() probe (a new storage.Client
+and a GCS round trip each) plus a sidecar read, two or three times per
+table for ~669 tables, before doing any work. Resume start-up on Cloud
+Run spent minutes on metadata calls.
+
+Each checkpoint directory now holds a `_checkpoint_index.json` manifest:
+
+    table → path, size, updated, rows, columns, schema_hash, projection_hash
+
+A run lists the directory ONCE (one object_store listing / scandir) and reconciles
+the listing with the stored manifest:
+- a listed checkpoint whose size / write time match its entry keeps the
+  recorded rows, columns and hashes
+- a new or rewritten checkpoint gets a fresh entry (metadata unknown; its
+  projection sidecar is read once, on demand)
+- entries whose file is gone are dropped
+
+Status, resume and completeness checks are then dict lookups. Workers
+report rows / columns / hashes of every checkpoint they write, and the run
+records them (record_checkpoint) and saves the manifest once at the end.
+
+Usage:
+    from checkpoint_index import load_index, record_checkpoint, format_index, INDEX_FILE
+    index = load_index(checkpoint_dir, read_text(f"{checkpoint_dir}/{INDEX_FILE}"))
+    if has_checkpoint(index, table): ...
+    record_checkpoint(index, table, path, rows, columns, schema_hash(df), projection)
+    write_text(format_index(index), f"{checkpoint_dir}/{INDEX_FILE}")
+"""
+
+import os
+import json
+import hashlib
+from datetime import datetime, timezone
+
+INDEX_FILE = "_checkpoint_index.json"
+INDEX_VERSION = 1
+CHECKPOINT_SUFFIX = ".parquet"
+SIDECAR_SUFFIX = ".manifest"  # Same as projection_manifest.SIDECAR_SUFFIX
+
+
+def empty_index() -> dict:
+    return {'version': INDEX_VERSION, 'tables': {}, 'listed': None}
+
+
+def parse_index(text: str) -> dict:
+    """Parse manifest JSON text (None, invalid or other version → empty index)."""
+    if not text:
+        return empty_index()
+    try:
+        index = json.loads(text)
+    except json.JSONDecodeError:
+        return empty_index()
+    if index.get('version') != INDEX_VERSION:
+        return empty_index()
+    index.setdefault('tables', {})
+    index.setdefault('listed', None)
+    return index
+
+
+def format_index(index: dict) -> str:
+    return json.dumps(index, indent=2, sort_keys=True)
+
+
+def schema_hash(df) -> str:
+    """Hash of a DataFrame's column names and dtypes (detects schema drift between runs)."""
+    spec = [(str(c), str(t)) for c, t in zip(df.columns, df.dtypes)]
+    return hashlib.sha256(json.dumps(spec).encode()).hexdigest()[:16]
+
+
+# ============================================================================
+# LISTING
+# ============================================================================
+
+def list_checkpoints(checkpoint_dir: str) -> dict:
+    """
+    List a checkpoint directory (local or gs://) in one call.
+
+    Returns:
+        {'files': {table: {'path', 'size', 'updated'}}, 'sidecars': set(table)}
+    """
+    files, sidecars = {}, set()
+
+    def _add(name, path, size, updated):
+        if name.endswith(CHECKPOINT_SUFFIX):
+            files[name[:-len(CHECKPOINT_SUFFIX)]] = {'path': path, 'size': int(size), 'updated': updated}
+        elif name.endswith(SIDECAR_SUFFIX):
+            sidecars.add(name[:-len(SIDECAR_SUFFIX)])
+
+    if checkpoint_dir.startswith('gs://'):
+        from object_store import get_store
+        for obj in get_store().list(checkpoint_dir):
+            _add(obj['name'], obj['uri'], obj['size'], obj['updated'])
+    else:
+        try:
+            entries = list(os.scandir(checkpoint_dir))
+        except FileNotFoundError:
+            entries = []
+        for entry in entries:
+            if entry.is_file():
+                stat = entry.stat()
+                updated = datetime.fromtimestamp(stat.st_mtime, tz=timezone.utc).isoformat()
+                _add(entry.name, entry.path, stat.st_size, updated)
+    return {'files': files, 'sidecars': sidecars}
+
+
+def reconcile(index: dict, listing: dict) -> dict:
+    """
+    Bring the stored manifest in line with a fresh listing (see module docstring).
+
+    Returns:
+        {'kept', 'new', 'changed', 'dropped'} counts
+    """
+    stats = {'kept': 0, 'new': 0, 'changed': 0, 'dropped': 0}
+    tables = {}
+    for table, listed in listing['files'].items():
+        entry = index['tables'].get(table)
+        if entry is None:
+            stats['new'] += 1
+            entry = {}
+        elif entry.get('size') in (None, listed['size']) and entry.get('updated') in (None, listed['updated']):
+            stats['kept'] += 1
+        else:
+            stats['changed'] += 1
+            entry = {}
+        entry.update(listed)
+        entry['sidecar'] = table in listing['sidecars']
+        tables[table] = entry
+    stats['dropped'] = len(set(index['tables']) - set(tables))
+    index['tables'] = tables
+    index['listed'] = datetime.now(timezone.utc).isoformat()
+    return stats
+
+
+def load_index(checkpoint_dir: str, text: str) -> dict:
+    """Stored manifest text (or None) reconciled with one listing of checkpoint_dir."""
+    index = parse_index(text)
+    index['last_reconcile'] = reconcile(index, list_checkpoints(checkpoint_dir))
+    return index
+
+
+# ============================================================================
+# QUERIES + RECORDING
+# ============================================================================
+
+def has_checkpoint(index: dict, table: str) -> bool:
+    return table in index['tables']
+
+
+def projection_hash(index: dict, table: str, read_text=None) -> str:
+    """
+    Projection hash a checkpoint was written with (None = no sidecar).
+
+    Unknown hashes (checkpoints written outside an indexed run) are read
+    from the sidecar once via read_text(path) and cached in the entry.
+    """
+    entry = index['tables'].get(table)
+    if entry is None:
+        return None
+    if 'projection_hash' not in entry:
+        text = None
+        if entry.get('sidecar') and read_text is not None:
+            path = entry['path']
+            text = read_text(path[:-len(CHECKPOINT_SUFFIX)] + SIDECAR_SUFFIX)
+        entry['projection_hash'] = text.strip() if text else None
+    return entry['projection_hash']
+
+
+def record_checkpoint(index: dict, table: str, path: str, rows: int, columns: int = None,
+                      schema: str = None, projection: str = None) -> None:
+    """
+    Record a checkpoint just written by this run.
+
+    Size / write time are filled in by the next listing (the entry matches
+    whatever the listing finds first).
+    """
+    index['tables'][table] = {
+        'path': path,
+        'size': None,
+        'updated': None,
+        'rows': int(rows) if rows is not None else None,
+        'columns': columns,
+        'schema_hash': schema,
+        'projection_hash': projection,
+        'sidecar': projection is not None,
+        'recorded': datetime.now(timezone.utc).isoformat()
+    }
+
+
+def summarize(index: dict, tables: list) -> dict:
+    """Completeness of a checkpoint directory for the given tables."""
+    present = [t for t in tables if t in index['tables']]
+    entries = [index['tables'][t] for t in present]
+    return {
+        'tables': len(tables),
+        'present': len(present),
+        'missing': [t for t in tables if t not in index['tables']],
+        'rows': sum(e.get('rows') or 0 for e in entries),
+        'bytes': sum(e.get('size') or 0 for e in entries),
+    }
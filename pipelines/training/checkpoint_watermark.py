@@ -0,0 +1,269 @@
+#!/usr/bin/env python3
+"""
+Checkpoint Watermarks - Incremental (Append-Only) Checkpoint Refresh
+
+New bars only ever arrive at the tail of the feature tables, yet every run
+re-extracted the full history of all ~669 tables per pair.
+
+Each checkpoint directory holds a `_watermarks.json` registry recording,
+per table, the high-water interval_time of its checkpoint. A refresh run
+then fetches only rows with
+
+    interval_time >= watermark - lookback
+
+and splices them onto the checkpoint: rows before the refresh start are
+kept as-is, rows from the refresh start on are replaced by the fetched
+tail. The lookback re-reads the last rows because their values change
+after the fact (rolling windows completing, LEAD-based targets filling in).
+
+The registry also records the earliest refresh start of the runs not yet
+merged (`since`) and the merged training file's own watermark, so the
+merge can keep its rows before the earlier of the two and only re-merge
+the tail.
+
+Usage:
+    from checkpoint_watermark import load_watermarks, refresh_start, append_tail
+    registry = load_watermarks(checkpoint_dir / WATERMARK_FILE)
+    start = refresh_start(registry['tables'][table]['watermark'])
+    append_tail(checkpoint_path, tail_table, start)
+"""
+
+import os
+import json
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+from datetime import datetime, timedelta, timezone
+
+import object_store
+
+WATERMARK_FILE = "_watermarks.json"
+KEY_COLUMN = "interval_time"
+
+# Rows re-read behind the watermark: covers the longest feature window and
+# target horizon (2880 minutes = 48 hours)
+DEFAULT_LOOKBACK_MINUTES = 2880
+
+
+def empty_registry() -> dict:
+    """New registry with no tables and no refresh recorded."""
+    return {'tables': {}, 'last_refresh': None, 'merged': None}
+
+
+def parse_watermarks(text: str) -> dict:
+    """Parse registry JSON text (None or invalid → empty registry)."""
+    if not text:
+        return empty_registry()
+    try:
+        registry = json.loads(text)
+    except json.JSONDecodeError:
+        return empty_registry()
+    registry.setdefault('tables', {})
+    registry.setdefault('last_refresh', None)
+    registry.setdefault('merged', None)
+    return registry
+
+
+def load_watermarks(path) -> dict:
+    """Read a registry file, local or gs:// (empty registry if it does not exist)."""
+    return parse_watermarks(object_store.read_text(str(path)))
+
+
+def save_watermarks(registry: dict, path) -> None:
+    """Write a registry file, local or gs://, atomically."""
+    with object_store.open_write(str(path)) as f:
+        f.write(json.dumps(registry, indent=2).encode())
+
+
+def format_timestamp(value) -> str:
+    """
+    Format a timestamp as a UTC 'YYYY-MM-DD HH:MM:SS' string.
+
+    Used both in the registry and as a BigQuery TIMESTAMP literal (a
+    literal without zone is UTC). Accepts datetime / pandas Timestamp,
+    tz-aware or naive (naive is taken as UTC, as BigQuery returns it).
+    """
+    if isinstance(value, str):
+        return value
+    if getattr(value, 'tzinfo', None) is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value.strftime('%Y-%m-%d %H:%M:%S')
+
+
+def refresh_start(watermark: str, lookback_minutes: int = DEFAULT_LOOKBACK_MINUTES) -> str:
+    """First interval_time a refresh re-fetches for a checkpoint."""
+    start = datetime.strptime(watermark, '%Y-%m-%d %H:%M:%S') - timedelta(minutes=lookback_minutes)
+    return format_timestamp(start)
+
+
+def record_table(registry: dict, table: str, watermark, rows: int, base_hash: str = None) -> None:
+    """Record a checkpoint's high-water interval_time after extraction or refresh."""
+    registry['tables'][table] = {
+        'watermark': format_timestamp(watermark) if watermark is not None else None,
+        'rows': int(rows),
+        'base_hash': base_hash,
+        'updated': datetime.now().isoformat()
+    }
+
+
+def record_refresh(registry: dict, since: str, refreshed: int, full_tables: list) -> None:
+    """
+    Record the outcome of an extraction run for the downstream merge.
+
+    `since` is the earliest refresh start of the run. Runs accumulate until
+    a merge is recorded (record_merge): the pending `since` is the earliest
+    over all unmerged runs, and any (re-)extraction in full - which may
+    change the table's rows anywhere in history - marks the merge for a
+    full rebuild.
+    """
+    pending = registry.get('last_refresh')
+    if pending and not pending.get('merged'):
+        starts = [s for s in (since, pending.get('since')) if s is not None]
+        since = min(starts, default=None)
+        refreshed += pending.get('refreshed_tables', 0)
+        full_count = len(full_tables) + pending.get('full_tables', 0)
+    else:
+        full_count = len(full_tables)
+    registry['last_refresh'] = {
+        'since': since if not full_count else None,
+        'refreshed_tables': refreshed,
+        'full_tables': full_count,
+        'merged': False,
+        'updated': datetime.now().isoformat()
+    }
+
+
+def record_merge(registry: dict, watermark) -> None:
+    """Record the merged training file's high-water interval_time after a merge."""
+    registry['merged'] = {
+        'watermark': format_timestamp(watermark) if watermark is not None else None,
+        'updated': datetime.now().isoformat()
+    }
+    if registry.get('last_refresh'):
+        registry['last_refresh']['merged'] = True
+
+
+def merge_since(registry: dict, lookback_minutes: int = DEFAULT_LOOKBACK_MINUTES) -> str:
+    """
+    Earliest row the merged training file must re-merge (None → full rebuild).
+
+    The earlier of the pending refresh start and the merged file's own
+    watermark less the lookback: checkpoint rows the merged file has never
+    seen, or saw before they settled, are re-merged even when several
+    refreshes ran since the last merge.
+    """
+    merged = registry.get('merged') or {}
+    last = registry.get('last_refresh') or {}
+    if merged.get('watermark') is None or last.get('full_tables'):
+        return None
+    starts = [refresh_start(merged['watermark'], lookback_minutes)]
+    if last.get('since') is not None:
+        starts.append(last['since'])
+    return min(starts)
+
+
+def key_values(column) -> np.ndarray:
+    """
+    Convert an interval_time column to int64 microseconds for comparison.
+
+    Checkpoints written by different pandas/BigQuery versions may store
+    timestamps in ns or us, with or without a timezone, so normalise first.
+    """
+    if isinstance(column, pa.ChunkedArray):
+        column = column.combine_chunks()
+    if pa.types.is_timestamp(column.type):
+        column = pc.cast(column, pa.timestamp('us', tz=column.type.tz))
+    return column.cast(pa.int64()).to_numpy(zero_copy_only=False)
+
+
+def timestamp_key(value: str) -> int:
+    """'YYYY-MM-DD HH:MM:SS' (UTC) → int64 microseconds, comparable with key_values."""
+    dt = datetime.strptime(value, '%Y-%m-%d %H:%M:%S').replace(tzinfo=timezone.utc)
+    return int(dt.timestamp()) * 1_000_000
+
+
+def _key_timestamp(key: int) -> str:
+    return format_timestamp(datetime.fromtimestamp(key / 1e6, tz=timezone.utc))
+
+
+def parquet_watermark(path) -> str:
+    """High-water interval_time of a checkpoint parquet, local or gs:// (None if empty)."""
+    keys = key_values(object_store.read_parquet_table(str(path), columns=[KEY_COLUMN]).column(0))
+    if len(keys) == 0:
+        return None
+    return _key_timestamp(int(keys.max()))
+
+
+def rows_before(path, start: str) -> int:
+    """Rows of a checkpoint parquet (sorted by interval_time) with interval_time < start."""
+    keys = key_values(object_store.read_parquet_table(str(path), columns=[KEY_COLUMN]).column(0))
+    return int(np.searchsorted(keys, timestamp_key(start), side='left'))
+
+
+def append_tail(path, tail: pa.Table, start: str, max_rows: int = None) -> dict:
+    """
+    Splice a refreshed tail onto a checkpoint parquet sorted by interval_time.
+
+    Row groups entirely before `start` are copied through unchanged (one row
+    group in memory at a time); the row group straddling `start` is cut;
+    `tail` rows (interval_time >= start) are appended as new row groups.
+    Works on local paths and gs:// URIs; the result replaces the checkpoint
+    only once fully written.
+
+    Args:
+        path: Checkpoint parquet (local or gs://)
+        tail: Rows fetched for interval_time >= start (same columns as the checkpoint)
+        start: Refresh start ('YYYY-MM-DD HH:MM:SS', UTC)
+        max_rows: Optional row cap on the rows kept before `start` (tail rows
+            are never dropped by it)
+
+    Returns:
+        dict with kept, appended, rows, watermark, schema (checkpoint Arrow schema)
+
+    Raises:
+        ValueError: tail columns differ from the checkpoint (needs full re-extract)
+    """
+    path = str(path)
+    parquet_file = object_store.open_parquet(path)
+    schema = parquet_file.schema_arrow
+    if set(tail.column_names) != set(schema.names):
+        raise ValueError(f"{os.path.basename(path)}: refreshed columns differ from checkpoint")
+    tail = tail.select(schema.names).cast(schema)
+
+    start_key = timestamp_key(start)
+    tail_keys = key_values(tail.column(KEY_COLUMN))
+    order = np.argsort(tail_keys, kind='stable')
+    tail = tail.take(pa.array(order))
+    tail = tail.slice(int(np.searchsorted(tail_keys[order], start_key, side='left')))
+
+    # Global cut position from the key column alone
+    file_keys = key_values(parquet_file.read(columns=[KEY_COLUMN]).column(0))
+    cut = int(np.searchsorted(file_keys, start_key, side='left'))
+    if max_rows is not None:
+        cut = min(cut, max_rows)
+
+    kept = 0
+    with object_store.open_write(path) as sink:
+        with pq.ParquetWriter(sink, schema, compression='snappy') as writer:
+            for i in range(parquet_file.num_row_groups):
+                if kept >= cut:
+                    break
+                group = parquet_file.read_row_group(i)
+                if kept + group.num_rows > cut:
+                    group = group.slice(0, cut - kept)
+                writer.write_table(group, row_group_size=object_store.CHECKPOINT_ROW_GROUP_ROWS)
+                kept += group.num_rows
+            if tail.num_rows:
+                writer.write_table(tail, row_group_size=object_store.CHECKPOINT_ROW_GROUP_ROWS)
+
+    if tail.num_rows:
+        last_key = int(key_values(tail.column(KEY_COLUMN))[-1])
+    elif kept:
+        last_key = int(file_keys[kept - 1])
+    else:
+        last_key = None
+    watermark = _key_timestamp(last_key) if last_key is not None else None
+
+    return {'kept': kept, 'appended': tail.num_rows, 'rows': kept + tail.num_rows, 'watermark': watermark,
+            'schema': schema}
@@ -0,0 +1,272 @@
+#!/usr/bin/env python3
+"""
+Ensemble Kernel - Calibrated Stack Inference as a Few NumPy Passes
+
+train_calibrated_stack scores by chaining sklearn-style calls: per-model
+predict_proba (building a DMatrix / Pool per call), three Platt
+LogisticRegression.predict_proba calls on (n × 1) reshapes, a column_stack,
+then the meta-learner's predict_proba. Serving repeats that chain per
+request, allocating a dozen temporaries each time.
+
+The kernel holds only plain parameters:
+- each base model's native booster, asked for RAW margins straight from a
+  float32 (batch × features) array (LightGBM raw_score, XGBoost
+  inplace_predict margin, CatBoost RawFormulaVal)
+- Platt parameters as one (models × 2) array
+- meta-learner weights as one vector [w_models..., w_regime..., intercept]
+
+and scores a batch as:
+1. margins → stacked (batch × models) workspace
+2. one fused in-place pass: p = σ(m), then q = σ(a·p + b) for all models
+3. regime columns copied next to q; meta logit = [q, regime]·w + c as one
+   matmul into the output, σ in place
+4. gating: +1 (p ≥ τ), -1 (p ≤ 1 - τ), 0 otherwise - the called-signal rule
+   used for gating_results
+
+Workspaces are kept per kernel and only grow, so after warm-up a call
+allocates the output buffers (pass out= / signals= to reuse those too) and
+whatever each booster library allocates for its own prediction vector.
+
+Usage:
+    from ensemble_kernel import EnsembleKernel
+    kernel = EnsembleKernel.from_artifact(open_artifact(path))       # model_artifact.py
+    kernel = EnsembleKernel.from_stack(results, feature_cols)        # train_calibrated_stack
+    prob = kernel.predict(X32)
+    prob, signal = kernel.predict_gated(X32, tau=0.85)
+
+    python ensemble_kernel.py h15_ensemble_v2.artifact --rows 100000   # benchmark
+"""
+
+import sys
+import time
+import threading
+import numpy as np
+
+DEFAULT_TAU = 0.85
+BOOSTER_KINDS = ('lightgbm', 'xgboost', 'catboost')
+
+
+def _kind(model) -> str:
+    module = type(model).__module__
+    for kind in BOOSTER_KINDS:
+        if module.startswith(kind):
+            return kind
+    raise TypeError(f"Unsupported base model type {type(model).__name__}")
+
+
+def _native(model):
+    """The booster object margins are requested from."""
+    if hasattr(model, 'booster_'):
+        return model.booster_  # LightGBM sklearn wrapper
+    if hasattr(model, 'get_booster'):
+        return model.get_booster()  # XGBoost sklearn wrapper
+    return model
+
+
+def _linear(model) -> np.ndarray:
+    return np.concatenate([np.ravel(model.coef_), np.ravel(model.intercept_)]).astype(np.float64)
+
+
+def sigmoid_(x: np.ndarray) -> np.ndarray:
+    """In-place logistic function."""
+    with np.errstate(over='ignore'):
+        np.negative(x, out=x)
+        np.exp(x, out=x)
+    x += 1.0
+    np.reciprocal(x, out=x)
+    return x
+
+
+class EnsembleKernel:
+    """
+    Vectorized scorer for a calibrated stack (base boosters → Platt →
+    LogReg meta-learner → confidence gate).
+
+    Args:
+        boosters: [(kind, native booster)] in meta-learner input order
+        calibration: (models × 2) [coef, intercept] Platt parameters, or None
+            (base probabilities go to the meta-learner uncalibrated)
+        meta: [w_models..., w_regime..., intercept]
+        regime_index: Columns of X fed to the meta-learner after the
+            calibrated probabilities; None = regime features (if the
+            meta-learner has any) are passed to predict() as `regime`
+        num_threads: Threads per booster call (0 = library default)
+    """
+
+    def __init__(self, boosters: list, calibration: np.ndarray, meta: np.ndarray,
+                 regime_index: list = None, num_threads: int = 0):
+        self.boosters = list(boosters)
+        self.n_models = len(self.boosters)
+        self.num_threads = num_threads
+
+        meta = np.asarray(meta, dtype=np.float64)
+        self.n_regime = len(meta) - 1 - self.n_models
+        self.regime_index = None if regime_index is None else np.asarray(regime_index, dtype=np.int64)
+        if self.n_regime < 0 or (self.regime_index is not None and len(self.regime_index) != self.n_regime):
+            raise ValueError(f"Meta-learner has {len(meta) - 1} weights, expected {self.n_models} models "
+                             f"+ {0 if regime_index is None else len(regime_index)} regime features")
+        self.w_meta = np.ascontiguousarray(meta[:-1])
+        self.intercept = float(meta[-1])
+
+        if calibration is not None:
+            calibration = np.asarray(calibration, dtype=np.float64)
+            if calibration.shape != (self.n_models, 2):
+                raise ValueError(f"Calibration must be ({self.n_models}, 2), got {calibration.shape}")
+            self.cal_coef = np.ascontiguousarray(calibration[:, 0])
+            self.cal_intercept = np.ascontiguousarray(calibration[:, 1])
+        else:
+            self.cal_coef = self.cal_intercept = None
+
+        self._local = threading.local()  # Per-thread workspaces (serving threads share a kernel)
+
+    # ------------------------------------------------------------------ build
+
+    @classmethod
+    def from_models(cls, base_models: dict, calibrators: dict, meta_learner,
+                    feature_names: list = None, regime_features: list = None, **kwargs):
+        """From trained models: {name: booster}, {name: Platt LogReg}, meta LogReg."""
+        names = list(base_models)
+        boosters = [(_kind(base_models[n]), _native(base_models[n])) for n in names]
+        calibration = np.stack([_linear(calibrators[n]) for n in names]) if calibrators else None
+        meta = _linear(meta_learner)
+        return cls(boosters, calibration, meta, _regime_index(feature_names, regime_features), **kwargs)
+
+    @classmethod
+    def from_stack(cls, results: dict, feature_names: list, **kwargs):
+        """From train_calibrated_stack results (base_models, calibrators, meta_model, regime_features)."""
+        return cls.from_models(results['base_models'], results['calibrators'], results['meta_model'],
+                               feature_names, results.get('regime_features'), **kwargs)
+
+    @classmethod
+    def from_artifact(cls, artifact, **kwargs):
+        """From a model_artifact.ModelArtifact (materialises its boosters)."""
+        boosters = [(artifact.booster_kind(n), artifact.booster(n)) for n in artifact.model_names]
+        return cls(boosters, artifact.calibration(), artifact.meta_coefficients(),
+                   _regime_index(artifact.feature_names, artifact.regime_features), **kwargs)
+
+    # ------------------------------------------------------------------ score
+
+    def _workspace(self, n: int) -> tuple:
+        """(batch × (models + regime)) meta-input matrix and a bool scratch row, grown on demand."""
+        ws = getattr(self._local, 'ws', None)
+        if ws is None or ws[0].shape[0] < n:
+            capacity = max(n, 2 * ws[0].shape[0] if ws is not None else n)
+            ws = self._local.ws = (np.empty((capacity, self.n_models + self.n_regime)),
+                                   np.empty(capacity, dtype=bool))
+        return ws[0][:n], ws[1][:n]
+
+    def _margins(self, X: np.ndarray, stacked: np.ndarray) -> None:
+        for j, (kind, booster) in enumerate(self.boosters):
+            if kind == 'lightgbm':
+                stacked[:, j] = booster.predict(X, raw_score=True, num_threads=self.num_threads)
+            elif kind == 'xgboost':
+                stacked[:, j] = booster.inplace_predict(X, predict_type='margin')
+            else:
+                stacked[:, j] = booster.predict(X, prediction_type='RawFormulaVal',
+                                                thread_count=self.num_threads or -1)
+
+    def predict(self, X: np.ndarray, out: np.ndarray = None, regime: np.ndarray = None) -> np.ndarray:
+        """
+        Meta-learner probability per row.
+
+        Args:
+            X: (batch × features) array in feature_names order (float32 preferred;
+               other dtypes are converted once)
+            out: Optional float64 (batch,) buffer to write into
+            regime: (batch × regime features), only when built without regime_index
+
+        Returns:
+            float64 (batch,) P(up)
+        """
+        X = np.ascontiguousarray(X, dtype=np.float32)
+        n = X.shape[0]
+        if out is None:
+            out = np.empty(n)
+        meta_X, _ = self._workspace(n)
+        probs = meta_X[:, :self.n_models]
+
+        self._margins(X, probs)
+        sigmoid_(probs)  # Base model probabilities
+        if self.cal_coef is not None:
+            probs *= self.cal_coef
+            probs += self.cal_intercept
+            sigmoid_(probs)  # Platt-calibrated probabilities
+        if self.regime_index is not None:
+            for j, column in enumerate(self.regime_index, start=self.n_models):
+                meta_X[:, j] = X[:, column]
+        elif self.n_regime:
+            if regime is None:
+                raise ValueError(f"Meta-learner expects {self.n_regime} regime features: pass regime=")
+            meta_X[:, self.n_models:] = regime
+
+        np.matmul(meta_X, self.w_meta, out=out)
+        out += self.intercept
+        return sigmoid_(out)
+
+    def predict_gated(self, X: np.ndarray, tau: float = DEFAULT_TAU, out: np.ndarray = None,
+                      signals: np.ndarray = None, regime: np.ndarray = None) -> tuple:
+        """
+        Probabilities plus confidence-gated signals.
+
+        Returns:
+            (prob float64 (batch,), signal int8 (batch,): +1 up, -1 down, 0 not called)
+        """
+        prob = self.predict(X, out, regime)
+        return prob, gate(prob, tau, signals, self._workspace(len(prob))[1])
+
+
+def gate(prob: np.ndarray, tau: float = DEFAULT_TAU, signals: np.ndarray = None,
+         scratch: np.ndarray = None) -> np.ndarray:
+    """Called-signal gate: +1 where prob ≥ tau, -1 where prob ≤ 1 - tau, else 0."""
+    if signals is None:
+        signals = np.empty(len(prob), dtype=np.int8)
+    if scratch is None:
+        scratch = np.empty(len(prob), dtype=bool)
+    np.greater_equal(prob, tau, out=signals, casting='unsafe')
+    np.less_equal(prob, 1.0 - tau, out=scratch)
+    np.subtract(signals, scratch, out=signals, casting='unsafe')
+    return signals
+
+
+def _regime_index(feature_names: list, regime_features: list):
+    if not regime_features:
+        return None
+    position = {name: i for i, name in enumerate(feature_names or [])}
+    if any(f not in position for f in regime_features):
+        return None  # Not model inputs: supplied per call as regime=
+    return [position[f] for f in regime_features]
+
+
+def main():
+    import argparse
+    import os
+    sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), 'scripts'))
+    from model_artifact import open_artifact
+
+    parser = argparse.ArgumentParser(description="Benchmark the calibrated-stack kernel on an artifact")
+    parser.add_argument('artifact')
+    parser.add_argument('--rows', type=int, default=100_000)
+    parser.add_argument('--batch', type=int, default=10_000)
+    parser.add_argument('--tau', type=float, default=DEFAULT_TAU)
+    args = parser.parse_args()
+
+    artifact = open_artifact(args.artifact)
+    kernel = EnsembleKernel.from_artifact(artifact)
+    X = np.random.default_rng(0).normal(size=(args.rows, len(artifact.feature_names))).astype(np.float32)
+    out = np.empty(args.batch)
+    signals = np.empty(args.batch, dtype=np.int8)
+    kernel.predict_gated(X[:args.batch], args.tau, out, signals)  # Warm-up: load boosters, size workspace
+
+    start = time.perf_counter()
+    called = 0
+    for lo in range(0, args.rows - args.batch + 1, args.batch):
+        _, sig = kernel.predict_gated(X[lo:lo + args.batch], args.tau, out, signals)
+        called += int(np.count_nonzero(sig))
+    elapsed = time.perf_counter() - start
+    scored = (args.rows // args.batch) * args.batch
+    print(f"✅ Scored {scored:,} rows in {elapsed:.3f}s "
+          f"({scored / elapsed / 1000:,.1f} rows/ms, {called:,} called at τ={args.tau})", flush=True)
+
+
+if __name__ == "__main__":
+    main()
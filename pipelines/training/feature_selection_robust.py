@@ -28,6 +28,12 @@ import lightgbm as lgb
 import warnings
 warnings.filterwarnings('ignore')
 
+from binned_dataset import binned_key, data_fingerprint, load_or_build, masked_params
+from interval_sample import (
+    SHARED_SAMPLE_NAME, SHARED_SAMPLE_PCT, SHARED_SAMPLE_ROWS, SHARED_SAMPLE_TARGET, get_or_build_sample,
+    read_parquet_sampled, sample_predicate_sql
+)
+
 PROJECT = "bqx-ml"
 FEATURES_DATASET = "bqx_ml_v3_features_v2"
 ANALYTICS_DATASET = "bqx_ml_v3_analytics_v2"
@@ -67,11 +73,18 @@ FEATURE_GROUPS = {
 }
 
 
-def load_from_parquet(pair: str) -> pd.DataFrame:
-    """Load feature data from Step 6 merged parquet (no BigQuery cost)."""
+def load_from_parquet(pair: str, horizon: int = 15) -> pd.DataFrame:
+    """Load the shared interval sample's rows of the Step 6 merged parquet (no BigQuery cost)."""
     parquet_path = f"/home/micha/bqx_ml_v3/data/features/{pair}_merged_features.parquet"
     try:
-        df = pd.read_parquet(parquet_path)
+        keys, _ = get_or_build_sample(None, pair, SHARED_SAMPLE_NAME, rows=SHARED_SAMPLE_ROWS,
+                                      pct=SHARED_SAMPLE_PCT, target_col=SHARED_SAMPLE_TARGET,
+                                      targets_path=parquet_path)
+        df = read_parquet_sampled(parquet_path, keys).to_pandas()
+        # The shared sample is drawn on the h15 label; drop rows this horizon leaves unlabelled
+        target_col = f'target_bqx45_h{horizon}'
+        if target_col in df.columns:
+            df = df[df[target_col].notna()].reset_index(drop=True)
         print(f"Loaded from parquet: {parquet_path}")
         print(f"  Rows: {len(df):,}, Columns: {len(df.columns)}")
         return df
@@ -119,8 +132,13 @@ def discover_feature_tables(client, pair: str) -> dict:
     return dict(discovered)
 
 
-def load_group_features(client, pair: str, tables: list, sample_pct: float = 5.0) -> pd.DataFrame:
-    """Load features from a single group of tables."""
+def load_group_features(client, pair: str, tables: list, keys, threshold: int) -> pd.DataFrame:
+    """Load the shared interval sample's rows of a single group of tables.
+
+    Args:
+        keys: Sample keys (semi-join applied to the query result)
+        threshold: Sample hash threshold (interval_sample.sample_predicate_sql)
+    """
     if not tables:
         return None
 
@@ -140,7 +158,8 @@ def load_group_features(client, pair: str, tables: list, sample_pct: float = 5.0
     # Build JOINs
     joins = []
     for i, t in enumerate(tables[1:5], 1):
-        joins.append(f"LEFT JOIN `{t['table_id']}` t{i} ON t0.interval_time = t{i}.interval_time")
+        joins.append(f"LEFT JOIN `{t['table_id']}` t{i} ON t0.interval_time = t{i}.interval_time"
+                     f" AND {sample_predicate_sql(f't{i}.interval_time', threshold)}")
 
     joins.append(f"JOIN `{PROJECT}.{ANALYTICS_DATASET}.targets_{pair}` targets ON t0.interval_time = targets.interval_time")
 
@@ -148,13 +167,14 @@ def load_group_features(client, pair: str, tables: list, sample_pct: float = 5.0
     SELECT {', '.join(select_parts)}
     FROM `{base['table_id']}` t0
     {' '.join(joins)}
-    WHERE RAND() < {sample_pct / 100.0}
-    AND targets.target_bqx45_h15 IS NOT NULL
-    LIMIT 30000
+    WHERE {sample_predicate_sql('t0.interval_time', threshold)}
+    AND targets.{SHARED_SAMPLE_TARGET} IS NOT NULL
     """
 
     try:
-        return client.query(query).to_dataframe()
+        df = client.query(query).to_dataframe()
+        # Semi-join on the saved keys: exact alignment even if targets were rebuilt since
+        return df[pd.to_datetime(df['interval_time'], utc=True).isin(keys)].reset_index(drop=True)
     except Exception as e:
         print(f"    Error loading group: {e}")
         return None
@@ -163,35 +183,141 @@ def load_group_features(client, pair: str, tables: list, sample_pct: float = 5.0
 # =============================================================================
 # STAGE 1: SAFE PRUNING
 # =============================================================================
-def safe_prune(df: pd.DataFrame, feature_cols: list) -> tuple:
-    """Remove constant, near-constant, and extreme missingness features."""
-    pruned = []
-    kept = []
-
-    for col in feature_cols:
-        if col not in df.columns:
-            continue
+MISSING_THRESHOLD = 0.99  # Prune if more than this fraction is missing
+DOMINANT_THRESHOLD = 0.99  # Prune if one value holds more than this share of non-null rows
+PRUNE_CHUNK_MB = 512  # Working-set budget per column chunk (float32 block + sort copy)
+
+
+def _prune_reason(missing_pct: float, valid: int, dominant_count: int):
+    """Pruning decision for one column (None → keep), same order as the original checks."""
+    if missing_pct > MISSING_THRESHOLD:
+        return 'missing', missing_pct
+    if valid == 0 or dominant_count == valid:
+        return 'constant', 0
+    share = dominant_count / valid
+    if share > DOMINANT_THRESHOLD:
+        return 'near_constant', share
+    return None
+
+
+def _prune_reason_series(series: pd.Series):
+    """Per-column fallback for non-numeric columns (original pandas checks)."""
+    missing_pct = series.isna().mean()
+    if missing_pct > MISSING_THRESHOLD:
+        return 'missing', missing_pct
+    if series.dropna().nunique() <= 1:
+        return 'constant', 0
+    value_counts = series.value_counts(normalize=True)
+    if len(value_counts) > 0 and value_counts.iloc[0] > DOMINANT_THRESHOLD:
+        return 'near_constant', value_counts.iloc[0]
+    return None
+
+
+def _block_stats(block: np.ndarray) -> tuple:
+    """
+    Missingness and dominant-value counts for a float32 block (one row per column).
 
-        series = df[col]
+    Each column is sorted (NaN last); the dominant value is the longest run
+    of equal values. NaN != NaN, so NaNs form runs of length 1 and can only
+    dominate a column with no valid values (caught as missing/constant).
 
-        # Check missingness (>99% missing)
-        missing_pct = series.isna().mean()
-        if missing_pct > 0.99:
-            pruned.append((col, 'missing', missing_pct))
-            continue
+    Returns: (missing_pct, valid, dominant_count) arrays, one entry per column
+    """
+    n_cols, n_rows = block.shape
+    nan_count = np.isnan(block).sum(axis=1)
+    valid = n_rows - nan_count
+    missing_pct = nan_count / n_rows if n_rows else np.full(n_cols, np.nan)
+    if n_rows == 0:
+        return missing_pct, valid, np.zeros(n_cols, dtype=np.int64)
+
+    ordered = np.sort(block, axis=1)
+
+    # Run boundaries per column, with a sentinel boundary at each column end
+    boundary = np.empty((n_cols, n_rows + 1), dtype=bool)
+    boundary[:, 0] = True
+    np.not_equal(ordered[:, 1:], ordered[:, :-1], out=boundary[:, 1:n_rows])
+    boundary[:, n_rows] = True
+    del ordered
+
+    positions = np.flatnonzero(boundary)
+    run_lengths = np.diff(positions)
+    column_starts = np.searchsorted(positions, np.arange(n_cols) * (n_rows + 1))
+    dominant_count = np.maximum.reduceat(run_lengths, column_starts)
+
+    return missing_pct, valid, dominant_count
+
+
+def _column_chunks(source, columns: list, n_rows: int, chunk_cols: int):
+    """Yield (names, float32 block) column chunks from a DataFrame or parquet file (one row per column)."""
+    for start in range(0, len(columns), chunk_cols):
+        names = columns[start:start + chunk_cols]
+        block = np.empty((len(names), n_rows), dtype=np.float32)
+        if isinstance(source, pd.DataFrame):
+            for j, name in enumerate(names):
+                block[j] = source[name].to_numpy(dtype=np.float32, na_value=np.nan)
+        else:
+            table = source.read(columns=names)
+            for j, name in enumerate(names):
+                block[j] = table.column(name).cast('float32').to_numpy()
+            del table
+        yield names, block
 
-        # Check constant (zero variance)
-        if series.dropna().nunique() <= 1:
-            pruned.append((col, 'constant', 0))
-            continue
 
-        # Check near-constant (>99% same value)
-        value_counts = series.value_counts(normalize=True)
-        if len(value_counts) > 0 and value_counts.iloc[0] > 0.99:
-            pruned.append((col, 'near_constant', value_counts.iloc[0]))
-            continue
-
-        kept.append(col)
+def safe_prune(df, feature_cols: list, chunk_cols: int = None) -> tuple:
+    """
+    Remove constant, near-constant, and extreme missingness features.
+
+    Vectorized: missingness, zero variance and dominant-value share are
+    computed for a whole chunk of columns at once over a float32 matrix
+    (values equal at float32 precision count as the same value). Chunks
+    are sized to PRUNE_CHUNK_MB, so memory stays bounded for 11k+ columns.
+
+    Args:
+        df: DataFrame, or path to a parquet file - streamed column chunk by
+            column chunk, so the merged file is never loaded whole
+        feature_cols: Columns to check (columns not present are skipped)
+        chunk_cols: Columns per chunk (default: sized to PRUNE_CHUNK_MB)
+
+    Returns:
+        (kept, pruned) - kept column names, and (column, reason, value)
+        tuples with reason 'missing' / 'constant' / 'near_constant'
+    """
+    if isinstance(df, pd.DataFrame):
+        source = df
+        n_rows = len(df)
+        present = set(df.columns)
+        numeric = {c for c in present if pd.api.types.is_numeric_dtype(df[c].dtype)}
+    else:
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        source = pq.ParquetFile(df)
+        n_rows = source.metadata.num_rows
+        schema = source.schema_arrow
+        present = set(schema.names)
+        numeric = {f.name for f in schema
+                   if pa.types.is_floating(f.type) or pa.types.is_integer(f.type) or pa.types.is_boolean(f.type)}
+
+    columns = [c for c in feature_cols if c in present]
+    vectorized = [c for c in columns if c in numeric]
+
+    if chunk_cols is None:
+        bytes_per_col = max(n_rows, 1) * 25  # block + sorted copy + boundary mask + run positions
+        chunk_cols = max(1, PRUNE_CHUNK_MB * 1024**2 // bytes_per_col)
+
+    reasons = {}
+    for names, block in _column_chunks(source, vectorized, n_rows, chunk_cols):
+        missing_pct, valid, dominant_count = _block_stats(block)
+        for j, name in enumerate(names):
+            reasons[name] = _prune_reason(float(missing_pct[j]), int(valid[j]), int(dominant_count[j]))
+        del block
+
+    for col in columns:
+        if col not in numeric:
+            series = source[col] if isinstance(source, pd.DataFrame) else source.read(columns=[col]).column(0).to_pandas()
+            reasons[col] = _prune_reason_series(series)
+
+    kept = [c for c in columns if reasons[c] is None]
+    pruned = [(c, *reasons[c]) for c in columns if reasons[c] is not None]
 
     return kept, pruned
 
@@ -199,44 +325,177 @@ def safe_prune(df: pd.DataFrame, feature_cols: list) -> tuple:
 # =============================================================================
 # STAGE 2: FEATURE CLUSTERING (correlation families)
 # =============================================================================
+CORR_SAMPLE_ROWS = 10000  # Rows sampled for the correlation estimate
+CORR_TILE_COLS = 2048  # Features per tile stripe (stripe × remaining features per matmul)
+
+_TILE_STATE = {}  # Per-process view of the shared standardized matrix
+
+
+def _standardized_features(values: np.ndarray) -> tuple:
+    """
+    Center and unit-normalize each column so that corr = Z.T @ Z.
+
+    Returns:
+        (zt, valid) - float32 matrix with one row per feature, and a mask of
+        features with non-zero variance (others have undefined correlation)
+    """
+    centered = values - values.mean(axis=0)
+    norm = np.sqrt(np.einsum('ij,ij->j', centered, centered))
+    valid = np.isfinite(norm) & (norm > 0)
+    centered *= np.where(valid, 1.0 / np.where(valid, norm, 1.0), 0.0)
+    return np.ascontiguousarray(centered.T, dtype=np.float32), valid
+
+
+def _stripe_edges(zt: np.ndarray, start: int, stop: int, threshold: float) -> tuple:
+    """Pairs (i, j), start <= i < stop, i < j, with |corr| > threshold."""
+    block = zt[start:stop] @ zt[start:].T
+    np.abs(block, out=block)
+    rows, cols = np.nonzero(block > threshold)
+    rows += start
+    cols += start
+    upper = cols > rows
+    return rows[upper].astype(np.int32), cols[upper].astype(np.int32)
+
+
+def _init_tile_worker(shm_name: str, shape: tuple) -> None:
+    """Attach a pool worker to the shared standardized matrix (1 BLAS thread each)."""
+    from multiprocessing import shared_memory
+    shm = shared_memory.SharedMemory(name=shm_name)
+    _TILE_STATE['shm'] = shm
+    _TILE_STATE['zt'] = np.ndarray(shape, dtype=np.float32, buffer=shm.buf)
+    try:
+        from threadpoolctl import threadpool_limits
+        _TILE_STATE['limits'] = threadpool_limits(limits=1)
+    except ImportError:
+        pass
+
+
+def _stripe_edges_worker(args) -> tuple:
+    start, stop, threshold = args
+    return _stripe_edges(_TILE_STATE['zt'], start, stop, threshold)
+
+
+def correlation_edges(zt: np.ndarray, threshold: float, tile_cols: int = CORR_TILE_COLS,
+                      n_jobs: int = 1) -> tuple:
+    """
+    Sparse edge list of feature pairs with |corr| > threshold, computed in tiles.
+
+    Each stripe of `tile_cols` features is multiplied against all later
+    features in float32, so only one stripe of the dense matrix exists at a
+    time. With n_jobs > 1 the stripes are spread over a process pool that
+    shares `zt` through shared memory.
+
+    Returns: (rows, cols) int32 arrays with rows < cols
+    """
+    n_features = zt.shape[0]
+    stripes = [(start, min(start + tile_cols, n_features), threshold)
+               for start in range(0, n_features, tile_cols)]
+
+    if n_jobs <= 1 or len(stripes) <= 1:
+        parts = [_stripe_edges(zt, start, stop, thr) for start, stop, thr in stripes]
+    else:
+        from multiprocessing import shared_memory
+        from concurrent.futures import ProcessPoolExecutor
+        shm = shared_memory.SharedMemory(create=True, size=max(zt.nbytes, 1))
+        try:
+            np.ndarray(zt.shape, dtype=np.float32, buffer=shm.buf)[:] = zt
+            with ProcessPoolExecutor(max_workers=n_jobs, initializer=_init_tile_worker,
+                                     initargs=(shm.name, zt.shape)) as executor:
+                parts = list(executor.map(_stripe_edges_worker, stripes))
+        finally:
+            shm.close()
+            shm.unlink()
+
+    if not parts:
+        return np.empty(0, dtype=np.int32), np.empty(0, dtype=np.int32)
+    return np.concatenate([p[0] for p in parts]), np.concatenate([p[1] for p in parts])
+
+
 def cluster_correlated_features(df: pd.DataFrame, feature_cols: list,
-                                 threshold: float = 0.95) -> dict:
-    """Cluster highly correlated features, keep one representative per cluster."""
+                                 threshold: float = 0.95, linkage: str = 'greedy',
+                                 n_jobs: int = 1, tile_cols: int = CORR_TILE_COLS) -> dict:
+    """
+    Cluster highly correlated features, keep one representative per cluster.
+
+    The correlation matrix is never materialized: features are standardized
+    into a float32 matrix, pairs above `threshold` are collected tile by tile
+    as a sparse edge list (see correlation_edges), and clusters are formed
+    from the resulting graph.
+
+    Args:
+        df: Feature data (CORR_SAMPLE_ROWS rows are sampled)
+        feature_cols: Features to cluster; order decides representatives
+        threshold: |corr| above which two features are linked
+        linkage: 'greedy' - each unassigned feature (in order) becomes a
+                 representative and absorbs its unassigned direct neighbours
+                 (same clusters as the previous dense implementation);
+                 'components' - connected components (union of all chained
+                 links), represented by their first feature
+        n_jobs: Processes for tile computation (1 → in-process, BLAS threads)
+        tile_cols: Features per tile stripe
+
+    Returns:
+        {feature: representative}; zero-variance features are left out, as
+        their correlation is undefined
+    """
     if len(feature_cols) < 2:
         return {col: col for col in feature_cols}
 
-    # Compute correlation matrix (sample for speed)
-    sample = df[feature_cols].sample(min(10000, len(df)), random_state=42)
-    sample = sample.apply(pd.to_numeric, errors='coerce')
-
-    # Fill NaN with column median
-    sample = sample.fillna(sample.median())
+    # Sample for speed
+    sample = df[feature_cols].sample(min(CORR_SAMPLE_ROWS, len(df)), random_state=42)
+    non_numeric = [c for c in feature_cols if not pd.api.types.is_numeric_dtype(sample[c].dtype)]
+    if non_numeric:
+        sample[non_numeric] = sample[non_numeric].apply(pd.to_numeric, errors='coerce')
 
     try:
-        corr = sample.corr().abs()
+        values = sample.to_numpy(dtype=np.float64, na_value=np.nan, copy=True)
+        del sample
+
+        # Fill NaN with column median (only columns that have NaN)
+        nan_mask = np.isnan(values)
+        nan_cols = np.flatnonzero(nan_mask.any(axis=0))
+        if len(nan_cols):
+            with warnings.catch_warnings():
+                warnings.simplefilter('ignore', RuntimeWarning)
+                medians = np.nanmedian(values[:, nan_cols], axis=0)
+            for col, median in zip(nan_cols, medians):
+                values[nan_mask[:, col], col] = median
+        del nan_mask
+
+        zt, valid = _standardized_features(values)
+        del values
+        rows, cols = correlation_edges(zt, threshold, tile_cols=tile_cols, n_jobs=n_jobs)
     except Exception:
         return {col: col for col in feature_cols}
 
-    # Build clusters using simple greedy approach
-    clusters = {}
-    assigned = set()
+    from scipy.sparse import coo_matrix
+    n_features = len(feature_cols)
+    graph = coo_matrix((np.ones(len(rows), dtype=np.int8), (rows, cols)),
+                       shape=(n_features, n_features)).tocsr()
 
-    for col in feature_cols:
-        if col in assigned:
+    clusters = {}
+    if linkage == 'components':
+        from scipy.sparse.csgraph import connected_components
+        _, labels = connected_components(graph, directed=False)
+        representative = {}
+        for i in np.flatnonzero(valid):
+            rep = representative.setdefault(labels[i], feature_cols[i])
+            clusters[feature_cols[i]] = rep
+        return clusters
+
+    # Greedy: representatives absorb their unassigned direct neighbours
+    graph = (graph + graph.T).tocsr()
+    assigned = np.zeros(n_features, dtype=bool)
+    for i in np.flatnonzero(valid):
+        if assigned[i]:
             continue
-
-        # Find all features correlated above threshold
-        if col in corr.columns:
-            correlated = corr[col][corr[col] > threshold].index.tolist()
-        else:
-            correlated = [col]
-
-        # Assign to cluster
-        cluster_rep = col  # First feature becomes representative
-        for c in correlated:
-            if c not in assigned:
-                clusters[c] = cluster_rep
-                assigned.add(c)
+        rep = feature_cols[i]
+        clusters[rep] = rep
+        assigned[i] = True
+        neighbours = graph.indices[graph.indptr[i]:graph.indptr[i + 1]]
+        for j in neighbours[~assigned[neighbours]]:
+            clusters[feature_cols[j]] = rep
+        assigned[neighbours] = True
 
     return clusters
 
@@ -290,8 +549,14 @@ def screen_group(df: pd.DataFrame, feature_cols: list, target_col: str) -> dict:
 # STAGE 4: STABILITY SELECTION
 # =============================================================================
 def stability_selection(df: pd.DataFrame, feature_cols: list, target_col: str,
-                        n_iterations: int = 10, n_folds: int = 5) -> dict:
-    """Run stability selection across multiple folds and seeds."""
+                        n_iterations: int = 10, n_folds: int = 5,
+                        pair: str = None, cache_dir: str = None) -> dict:
+    """
+    Run stability selection across multiple folds and seeds.
+
+    The LightGBM bins are built once and shared by every seed; with
+    cache_dir they are also persisted (see binned_dataset).
+    """
     if not feature_cols or len(df) < 1000:
         return {}
 
@@ -315,6 +580,10 @@ def stability_selection(df: pd.DataFrame, feature_cols: list, target_col: str,
     scaler = StandardScaler()
     X_scaled = scaler.fit_transform(X_clean)
 
+    # LightGBM bins: one construction for all seeds
+    key = binned_key(pair, target_col, feature_cols, data_fingerprint(X_clean, y_clean))
+    lgb_train = load_or_build(X_clean, y_clean, feature_cols, key=key, cache_dir=cache_dir)
+
     for seed in range(n_iterations):
         try:
             # Elastic Net (L1+L2 for stability with correlated features)
@@ -333,7 +602,6 @@ def stability_selection(df: pd.DataFrame, feature_cols: list, target_col: str,
             total_runs += 1
 
             # Also run LightGBM with different seed
-            lgb_train = lgb.Dataset(X_clean, label=y_clean, feature_name=feature_cols)
             params = {
                 'objective': 'binary', 'metric': 'binary_logloss',
                 'num_leaves': 31, 'learning_rate': 0.05,
@@ -374,8 +642,13 @@ def stability_selection(df: pd.DataFrame, feature_cols: list, target_col: str,
 # STAGE 5: ABLATION TESTING
 # =============================================================================
 def ablation_test(df: pd.DataFrame, feature_cols: list, target_col: str,
-                  groups_to_test: dict) -> dict:
-    """Test performance impact of removing each group."""
+                  groups_to_test: dict, pair: str = None, cache_dir: str = None) -> dict:
+    """
+    Test performance impact of removing each group.
+
+    Every ablation trains on the baseline's bins with the group masked out
+    (masked_params) instead of re-binning the remaining columns.
+    """
     if not feature_cols or len(df) < 1000:
         return {}
 
@@ -391,7 +664,8 @@ def ablation_test(df: pd.DataFrame, feature_cols: list, target_col: str,
         return {}
 
     # Baseline performance (all features)
-    lgb_train = lgb.Dataset(X_clean, label=y_clean, feature_name=feature_cols)
+    key = binned_key(pair, target_col, feature_cols, data_fingerprint(X_clean, y_clean))
+    lgb_train = load_or_build(X_clean, y_clean, feature_cols, key=key, cache_dir=cache_dir)
     params = {
         'objective': 'binary', 'metric': 'auc',
         'num_leaves': 63, 'learning_rate': 0.05,
@@ -410,16 +684,13 @@ def ablation_test(df: pd.DataFrame, feature_cols: list, target_col: str,
     for group_name, group_features in groups_to_test.items():
         # Features without this group
         remaining_features = [f for f in feature_cols if f not in group_features]
-        remaining_indices = [i for i, f in enumerate(feature_cols) if f not in group_features]
 
         if not remaining_features:
             continue
 
-        X_ablated = X_clean[:, remaining_indices]
-
         try:
-            lgb_train_ablated = lgb.Dataset(X_ablated, label=y_clean, feature_name=remaining_features)
-            ablated_model = lgb.train(params, lgb_train_ablated, num_boost_round=100)
+            ablated_params = masked_params(params, feature_cols, group_features)
+            ablated_model = lgb.train(ablated_params, lgb_train, num_boost_round=100)
             ablated_auc = ablated_model.best_score.get('training', {}).get('auc', 0.5)
 
             delta = baseline_auc - ablated_auc
@@ -438,7 +709,7 @@ def ablation_test(df: pd.DataFrame, feature_cols: list, target_col: str,
 # =============================================================================
 # MAIN ORCHESTRATOR
 # =============================================================================
-def run_robust_selection(pair: str, sample_pct: float = 5.0, horizon: int = 15):
+def run_robust_selection(pair: str, sample_pct: float = SHARED_SAMPLE_PCT, horizon: int = 15):
     """Run the complete robust feature selection pipeline."""
     print("=" * 80)
     print("ROBUST FEATURE SELECTION SYSTEM")
@@ -459,6 +730,12 @@ def run_robust_selection(pair: str, sample_pct: float = 5.0, horizon: int = 15):
         total_cols = sum(len(t['columns']) for t in tables)
         print(f"  {group}: {len(tables)} tables, {total_cols} columns")
 
+    # Every group reads the same intervals: the shared sample (drawn once per pair)
+    keys, sample_meta = get_or_build_sample(
+        client, pair, SHARED_SAMPLE_NAME, rows=SHARED_SAMPLE_ROWS, pct=sample_pct,
+        target_table=f"{PROJECT}.{ANALYTICS_DATASET}.targets_{pair}"
+    )
+
     results = {
         'pair': pair,
         'horizon': horizon,
@@ -477,7 +754,7 @@ def run_robust_selection(pair: str, sample_pct: float = 5.0, horizon: int = 15):
         print(f"\n=== PROCESSING GROUP: {group_name} ===")
 
         # Stage 3: Load and screen group
-        df = load_group_features(client, pair, tables, sample_pct)
+        df = load_group_features(client, pair, tables, keys, sample_meta['threshold'])
         if df is None or len(df) < 500:
             print(f"  Skipped (insufficient data)")
             continue
@@ -505,7 +782,7 @@ def run_robust_selection(pair: str, sample_pct: float = 5.0, horizon: int = 15):
 
         # Stage 4: Stability selection (on representatives)
         print(f"  Running stability selection...")
-        stability = stability_selection(df, representatives, target_col, n_iterations=5)
+        stability = stability_selection(df, representatives, target_col, n_iterations=5, pair=pair)
 
         # Identify stable features (frequency > 60%)
         stable_features = [
@@ -695,14 +972,14 @@ def run_robust_selection_from_df(pair: str, df: pd.DataFrame, horizon: int = 15)
 
 def main():
     pair = sys.argv[1] if len(sys.argv) > 1 else "eurusd"
-    sample_pct = float(sys.argv[2]) if len(sys.argv) > 2 else 5.0
+    sample_pct = float(sys.argv[2]) if len(sys.argv) > 2 else SHARED_SAMPLE_PCT
     horizon = int(sys.argv[3]) if len(sys.argv) > 3 else 15
     # GAP-001 FIX: Default to parquet (Step 6 output), use --bq flag for BigQuery fallback
     use_parquet = "--bq" not in sys.argv
 
     if use_parquet:
         print("Using parquet mode (Step 6 output) - DEFAULT")
-        df = load_from_parquet(pair)
+        df = load_from_parquet(pair, horizon)
         if df is not None:
             # Run selection on parquet data
             run_robust_selection_from_df(pair, df, horizon)
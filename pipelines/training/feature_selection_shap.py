@@ -3,7 +3,7 @@
 SHAP-based Feature Selection for BQX ML V3
 
 Strategy:
-1. Load core EURUSD features from BigQuery (10% sample)
+1. Load core EURUSD features from BigQuery (shared interval sample, see interval_sample.py)
 2. Train quick LightGBM on each horizon target
 3. Extract SHAP values
 4. Select top 500-1000 features based on mean |SHAP|
@@ -18,6 +18,10 @@ import lightgbm as lgb
 import shap
 from datetime import datetime
 
+from interval_sample import (
+    SHARED_SAMPLE_NAME, SHARED_SAMPLE_PCT, SHARED_SAMPLE_ROWS, get_or_build_sample, sample_predicate_sql
+)
+
 PROJECT = "bqx-ml"
 FEATURES_DATASET = "bqx_ml_v3_features_v2"
 ANALYTICS_DATASET = "bqx_ml_v3_analytics_v2"
@@ -27,8 +31,8 @@ BQX_WINDOWS = [45, 90, 180, 360, 720, 1440, 2880]
 HORIZONS = [15, 30, 45, 60, 75, 90, 105]
 
 
-def get_feature_query(pair: str, sample_pct: float = 10.0) -> str:
-    """Generate query to fetch EURUSD features joined with targets."""
+def get_feature_query(pair: str, threshold: int) -> str:
+    """Generate query to fetch EURUSD features joined with targets (sample hash below threshold)."""
 
     # Core feature tables to join
     query = f"""
@@ -39,7 +43,7 @@ def get_feature_query(pair: str, sample_pct: float = 10.0) -> str:
             interval_time,
             bqx_45, bqx_90, bqx_180, bqx_360, bqx_720, bqx_1440, bqx_2880
         FROM `{PROJECT}.{FEATURES_DATASET}.base_bqx_{pair}`
-        WHERE RAND() < {sample_pct / 100.0}
+        WHERE {sample_predicate_sql('interval_time', threshold)}
     ),
 
     -- Lag features (45 and 90 minute windows)
@@ -152,14 +156,20 @@ def get_feature_query(pair: str, sample_pct: float = 10.0) -> str:
     return query
 
 
-def load_features(pair: str, sample_pct: float = 10.0) -> pd.DataFrame:
-    """Load features from BigQuery."""
+def load_features(pair: str, sample_pct: float = SHARED_SAMPLE_PCT) -> pd.DataFrame:
+    """Load the shared interval sample's rows of the core features from BigQuery."""
     print(f"Loading {sample_pct}% sample of {pair} features...")
 
     client = bigquery.Client(project=PROJECT)
-    query = get_feature_query(pair, sample_pct)
+    keys, sample_meta = get_or_build_sample(
+        client, pair, SHARED_SAMPLE_NAME, rows=SHARED_SAMPLE_ROWS, pct=sample_pct,
+        target_table=f"{PROJECT}.{ANALYTICS_DATASET}.targets_{pair}"
+    )
+    query = get_feature_query(pair, sample_meta['threshold'])
 
     df = client.query(query).to_dataframe()
+    # Semi-join on the saved keys: exact alignment even if targets were rebuilt since
+    df = df[pd.to_datetime(df['interval_time'], utc=True).isin(keys)].reset_index(drop=True)
     print(f"  Loaded {len(df):,} rows with {len(df.columns)} columns")
 
     return df
@@ -219,7 +229,7 @@ def train_lightgbm_shap(X: pd.DataFrame, y: pd.Series, target_name: str) -> dict
 
 def main():
     pair = sys.argv[1] if len(sys.argv) > 1 else "eurusd"
-    sample_pct = float(sys.argv[2]) if len(sys.argv) > 2 else 10.0
+    sample_pct = float(sys.argv[2]) if len(sys.argv) > 2 else SHARED_SAMPLE_PCT
 
     print("=" * 60)
     print(f"SHAP-based Feature Selection for {pair.upper()}")
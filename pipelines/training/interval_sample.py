@@ -0,0 +1,198 @@
+#!/usr/bin/env python3
+"""
+Interval Samples - One Deterministic interval_time Sample for Every Stage
+
+SHAP and selection queries sampled with `WHERE RAND() < pct` (plus an
+unordered LIMIT), separately per table and per run. Every table drew a
+different set of intervals, so multi-table joins were sparse, results were
+not reproducible, and two stages never looked at the same rows.
+
+Here the sample is a function of interval_time alone:
+
+    h(t) = (minute(t) × HASH_MULT + salt) mod HASH_MOD
+
+with minute(t) = UNIX_SECONDS(t) DIV 60. The arithmetic is exact in both
+BigQuery INT64 and NumPy int64, so the same predicate selects the same
+rows in SQL and in local Parquet. HASH_MULT / HASH_MOD ≈ golden ratio,
+so consecutive minutes are spread evenly over [0, HASH_MOD) (the sample
+covers the whole history evenly, no clustered runs).
+
+A sample is drawn ONCE per (pair, name):
+1. Keys = the `rows` labelled intervals (target IS NOT NULL) with the
+   smallest hashes below the pct threshold
+2. Saved as a small key file (interval_time + metadata, Parquet)
+3. Applied everywhere as a semi-join filter: `h(t) < threshold` in SQL
+   (threshold = last key's hash + 1, which reproduces exactly the key set
+   on unchanged targets), and interval_time IN keys for local Parquet
+
+Usage:
+    from interval_sample import get_or_build_sample, sample_predicate_sql, read_parquet_sampled
+    keys, meta = get_or_build_sample(client, 'eurusd', 'shap_full', rows=50000, pct=3.0)
+    sql = f"... WHERE {sample_predicate_sql('feat.interval_time', meta['threshold'])}"
+    table = read_parquet_sampled(checkpoint_path, keys, columns=[...])
+"""
+
+import os
+import json
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+SAMPLE_DIR = "/home/micha/bqx_ml_v3/data/samples"
+KEY_COLUMN = "interval_time"
+
+# Sample shared by the SHAP and selection stages (shap_aggressive_full
+# defaults). A smaller sample drawn with the same pct, seed and label is a
+# subset of it (smallest hashes win), so stages with a tighter row budget stay
+# aligned. It is always drawn on the h15 label, whatever horizon a stage
+# evaluates: one key file per name, not redrawn (and overwritten) each time a
+# stage switches horizon. Stages drop the rows their own target leaves NULL.
+SHARED_SAMPLE_NAME = "shap_full"
+SHARED_SAMPLE_ROWS = 50000
+SHARED_SAMPLE_PCT = 3.0
+SHARED_SAMPLE_TARGET = "target_bqx45_h15"
+
+HASH_MOD = 2_147_483_647  # 2^31 - 1 (prime)
+HASH_MULT = 1_327_217_884  # round(HASH_MOD × (√5 - 1) / 2)
+DEFAULT_SEED = 42
+
+NS_PER_MINUTE = 60 * 1_000_000_000
+META_KEY = b"interval_sample"
+
+
+def _salt(seed: int) -> int:
+    return (seed * 2_654_435_761) % HASH_MOD
+
+
+def pct_threshold(pct: float) -> int:
+    """Hash threshold selecting `pct` percent of intervals."""
+    return int(round(HASH_MOD * pct / 100.0))
+
+
+def interval_hash(times, seed: int = DEFAULT_SEED) -> np.ndarray:
+    """h(t) for an array of timestamps (datetime64 / pandas, UTC)."""
+    ns = pd.to_datetime(pd.Series(np.asarray(times)), utc=True).to_numpy(dtype='datetime64[ns]').astype(np.int64)
+    minutes = ns // NS_PER_MINUTE
+    return (minutes * HASH_MULT + _salt(seed)) % HASH_MOD
+
+
+def hash_sql(column: str, seed: int = DEFAULT_SEED) -> str:
+    """BigQuery expression for h(t) of a TIMESTAMP column."""
+    return f"MOD(DIV(UNIX_SECONDS({column}), 60) * {HASH_MULT} + {_salt(seed)}, {HASH_MOD})"
+
+
+def sample_predicate_sql(column: str, threshold: int, seed: int = DEFAULT_SEED) -> str:
+    """SQL semi-join filter keeping the sampled intervals of `column`."""
+    return f"{hash_sql(column, seed)} < {threshold}"
+
+
+def sample_key_path(pair: str, name: str, sample_dir: str = SAMPLE_DIR) -> str:
+    return os.path.join(sample_dir, f"{pair}_{name}.parquet")
+
+
+def select_keys(times, rows: int, pct: float = 100.0, seed: int = DEFAULT_SEED) -> tuple:
+    """
+    Deterministic sample of candidate intervals.
+
+    Args:
+        times: Candidate (labelled) interval_times
+        rows: Maximum sample size (smallest hashes win)
+        pct: Only intervals with h(t) below pct_threshold(pct) are eligible
+
+    Returns:
+        (sorted keys as datetime64[ns, UTC] Index, threshold) with
+        {t : h(t) < threshold} ∩ candidates == keys
+    """
+    times = pd.to_datetime(pd.Series(np.asarray(times)), utc=True).drop_duplicates()
+    hashes = interval_hash(times, seed)
+    threshold = pct_threshold(pct)
+    eligible = np.flatnonzero(hashes < threshold)
+    if len(eligible) > rows:
+        eligible = eligible[np.argsort(hashes[eligible], kind='stable')[:rows]]
+        threshold = int(hashes[eligible].max()) + 1
+    keys = pd.DatetimeIndex(times.iloc[eligible]).sort_values()
+    return keys, threshold
+
+
+def save_sample_keys(path: str, keys, meta: dict) -> None:
+    """Write a key file: one interval_time column, sample metadata in the footer."""
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    table = pa.table({KEY_COLUMN: pa.array(pd.DatetimeIndex(keys))})
+    table = table.replace_schema_metadata({META_KEY: json.dumps(meta).encode()})
+    tmp_path = f"{path}.tmp"
+    pq.write_table(table, tmp_path)
+    os.replace(tmp_path, path)
+
+
+def load_sample_keys(path: str) -> tuple:
+    """Read a key file. Returns (keys DatetimeIndex UTC, meta dict), or None if absent."""
+    if not os.path.exists(path):
+        return None
+    table = pq.read_table(path)
+    meta = json.loads((table.schema.metadata or {}).get(META_KEY, b'{}'))
+    keys = pd.DatetimeIndex(pd.to_datetime(table.column(KEY_COLUMN).to_pandas(), utc=True))
+    return keys, meta
+
+
+def candidate_times_sql(pair: str, target_table: str, target_col: str, threshold: int,
+                        seed: int = DEFAULT_SEED) -> str:
+    """SQL listing the labelled intervals eligible for a sample (hash below threshold)."""
+    return f"""
+    SELECT interval_time
+    FROM `{target_table}`
+    WHERE {target_col} IS NOT NULL
+    AND {sample_predicate_sql('interval_time', threshold, seed)}
+    """
+
+
+def get_or_build_sample(client, pair: str, name: str, rows: int, pct: float = 100.0,
+                        target_table: str = None, target_col: str = SHARED_SAMPLE_TARGET,
+                        seed: int = DEFAULT_SEED, sample_dir: str = SAMPLE_DIR,
+                        targets_path: str = None) -> tuple:
+    """
+    Load the (pair, name) sample key file, or draw and save it.
+
+    Candidates come from the targets table in BigQuery (client + target_table)
+    or from a local Parquet file holding the target column (targets_path:
+    targets checkpoint or merged training file). An existing key file is
+    reused only if it was drawn with the same rows, pct, seed and target_col.
+
+    Returns:
+        (keys DatetimeIndex UTC, meta {pair, name, rows, pct, seed, threshold, target_col})
+    """
+    path = sample_key_path(pair, name, sample_dir)
+    loaded = load_sample_keys(path)
+    if loaded is not None:
+        keys, meta = loaded
+        if (meta.get('seed') == seed and meta.get('pct') == pct and meta.get('requested_rows') == rows
+                and meta.get('target_col') == target_col):
+            print(f"  ✅ Loaded interval sample {os.path.basename(path)}: {len(keys):,} keys", flush=True)
+            return keys, meta
+        print(f"  ⚠️  Interval sample {os.path.basename(path)} was drawn with other settings "
+              f"(target {meta.get('target_col')}), redrawing", flush=True)
+
+    if targets_path is not None:
+        targets = pq.read_table(targets_path, columns=[KEY_COLUMN, target_col]).to_pandas()
+        candidates = targets.loc[targets[target_col].notna(), KEY_COLUMN]
+    else:
+        sql = candidate_times_sql(pair, target_table, target_col, pct_threshold(pct), seed)
+        candidates = client.query(sql).to_dataframe()[KEY_COLUMN]
+
+    keys, threshold = select_keys(candidates, rows, pct, seed)
+    meta = {'pair': pair, 'name': name, 'requested_rows': rows, 'rows': len(keys), 'pct': pct,
+            'seed': seed, 'threshold': threshold, 'target_col': target_col}
+    save_sample_keys(path, keys, meta)
+    print(f"  ✅ Drew interval sample {os.path.basename(path)}: {len(keys):,} keys "
+          f"(threshold {threshold:,})", flush=True)
+    return keys, meta
+
+
+def read_parquet_sampled(path: str, keys, columns: list = None) -> pa.Table:
+    """Read only the sampled intervals of a local Parquet checkpoint (semi-join on interval_time)."""
+    key_array = pa.array(pd.DatetimeIndex(keys))
+    schema = pq.read_schema(path)
+    key_type = schema.field(KEY_COLUMN).type
+    if key_array.type != key_type:
+        key_array = key_array.cast(key_type)
+    return pq.read_table(path, columns=columns, filters=[(KEY_COLUMN, 'in', key_array.to_pylist())])
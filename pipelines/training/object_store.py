@@ -0,0 +1,553 @@
+#!/usr/bin/env python3
+"""
+Object Store - Pooled, Streaming GCS I/O for Checkpoints
+
+The GCS helpers staged every checkpoint through a NamedTemporaryFile:
+DataFrame → temp parquet → upload (or download → temp → read), each with a
+brand-new storage.Client, and exists() probes as extra round trips. The
+merge then downloaded all ~669 checkpoints of a pair one after another
+before doing any work.
+
+This module gives one I/O layer for local paths and gs:// URIs:
+1. One storage.Client per process (lazy, thread-safe), its HTTP pool sized
+   for IO_THREADS concurrent requests
+2. Parquet writes stream straight into a resumable upload (no temp file);
+   an exception cancels the upload, so no truncated object is published
+3. Parquet reads fetch the footer with one ranged GET, then only the byte
+   ranges of the requested columns' chunks, coalesced and fetched in
+   parallel
+4. prefetch() downloads a list of objects with at most `max_inflight`
+   transfers in flight and yields each local file in order as soon as it
+   is ready, so consumers overlap downloads with their own work
+5. iter_batches() streams a parquet (local or in place on GCS) one row
+   group at a time - on GCS that row group's column chunks are fetched and
+   released - so a k-way merge can read every checkpoint of a pair without
+   downloading any of them
+
+The Parquet reader decodes a whole row group per read, however small the
+requested batch, so a reader's memory follows the file's row-group size.
+write_parquet therefore writes checkpoints in row groups of at most
+CHECKPOINT_ROW_GROUP_ROWS rows (as do the other checkpoint writers).
+
+LocalStore is a filesystem-backed fake bucket (gs://bucket/key →
+{root}/bucket/key) with the same interface. Set OBJECT_STORE_ROOT (or call
+set_store) to run any gs:// code path against local files.
+
+Usage:
+    from object_store import write_parquet, read_parquet, read_text, write_text, prefetch
+    write_parquet(df, "gs://bqx-ml-staging/checkpoints/eurusd/reg_eurusd.parquet")
+    df = read_parquet(uri, columns=['interval_time', 'reg_slope_45'])
+    for local_path in prefetch(uris, "/tmp/checkpoints_eurusd", max_inflight=8): ...
+"""
+
+import io
+import os
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+PROJECT = "bqx-ml"
+STORE_ROOT_ENV = "OBJECT_STORE_ROOT"  # Filesystem fake bucket root (tests / offline runs)
+
+IO_THREADS = 16  # Concurrent ranged reads / prefetch transfers per process
+UPLOAD_CHUNK_BYTES = 16 * 1024 * 1024  # Resumable upload chunk (multiple of 256 KiB)
+FOOTER_PREFETCH_BYTES = 64 * 1024  # First tail read; a larger footer costs one more ranged GET
+COALESCE_GAP_BYTES = 1024 * 1024  # Merge column-chunk ranges closer than this
+DEFAULT_PREFETCH = 8
+
+# Row-group cap for checkpoint parquet. Readers decode one whole row group at
+# a time, so this bounds each open checkpoint cursor to a few MB (~669 are
+# open at once in the streaming merge) while keeping footers small
+CHECKPOINT_ROW_GROUP_ROWS = 16_384
+
+
+def is_remote(path) -> bool:
+    return str(path).startswith('gs://')
+
+
+def split_uri(uri: str) -> tuple:
+    """gs://bucket/key → (bucket, key)."""
+    if not is_remote(uri):
+        raise ValueError(f"GCS path must start with gs://, got: {uri}")
+    parts = uri[len('gs://'):].split('/', 1)
+    return parts[0], parts[1] if len(parts) > 1 else ''
+
+
+def _prefix(key: str) -> str:
+    return key.rstrip('/') + '/' if key else ''
+
+
+# ============================================================================
+# STORES
+# ============================================================================
+
+class GCSStore:
+    """gs:// objects through one shared storage.Client."""
+
+    def __init__(self, project: str = PROJECT, pool_size: int = IO_THREADS):
+        from google.cloud import storage
+        self.client = storage.Client(project=project)
+        try:
+            import requests.adapters
+            adapter = requests.adapters.HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+            self.client._http.mount('https://', adapter)
+        except (ImportError, AttributeError):
+            pass  # Keep the library's default pool
+        self._buckets = {}
+
+    def _blob(self, uri: str):
+        bucket_name, key = split_uri(uri)
+        bucket = self._buckets.get(bucket_name)
+        if bucket is None:
+            bucket = self._buckets.setdefault(bucket_name, self.client.bucket(bucket_name))
+        return bucket.blob(key)
+
+    def list(self, uri: str) -> list:
+        """Direct children of a gs:// "directory": [{'uri', 'name', 'size', 'updated'}]."""
+        bucket_name, key = split_uri(uri)
+        prefix = _prefix(key)
+        return [
+            {'uri': f"gs://{bucket_name}/{blob.name}", 'name': blob.name[len(prefix):], 'size': blob.size or 0,
+             'updated': blob.updated.astimezone(timezone.utc).isoformat() if blob.updated else None}
+            for blob in self.client.list_blobs(bucket_name, prefix=prefix, delimiter='/')
+        ]
+
+    def size(self, uri: str) -> int:
+        bucket_name, key = split_uri(uri)
+        blob = self.client.bucket(bucket_name).get_blob(key)
+        if blob is None:
+            raise FileNotFoundError(uri)
+        return blob.size
+
+    def read_range(self, uri: str, start: int, length: int) -> bytes:
+        return self._blob(uri).download_as_bytes(start=start, end=start + length - 1, checksum=None)
+
+    def read_bytes(self, uri: str) -> bytes:
+        """Whole object, or None if it does not exist."""
+        from google.api_core.exceptions import NotFound
+        try:
+            return self._blob(uri).download_as_bytes()
+        except NotFound:
+            return None
+
+    def write_bytes(self, uri: str, data: bytes) -> None:
+        self._blob(uri).upload_from_string(data)
+
+    def open_write(self, uri: str):
+        """Writable stream into a resumable upload (context manager; cancelled on error)."""
+        return self._blob(uri).open('wb', chunk_size=UPLOAD_CHUNK_BYTES, ignore_flush=True)
+
+    def download(self, uri: str, path: str) -> None:
+        self._blob(uri).download_to_filename(path)
+
+    def exists(self, uri: str) -> bool:
+        return self._blob(uri).exists()
+
+    def delete(self, uri: str) -> None:
+        self._blob(uri).delete()
+
+
+class _AtomicFile(io.FileIO):
+    """Local file written to `{path}.tmp` and moved into place on a clean close."""
+
+    def __init__(self, path: str):
+        self.final_path = path
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        super().__init__(f"{path}.tmp", 'wb')
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+        if exc_type is None:
+            os.replace(self.name, self.final_path)
+        elif os.path.exists(self.name):
+            os.remove(self.name)
+
+
+class LocalStore:
+    """Filesystem-backed fake bucket: gs://bucket/key ↔ {root}/bucket/key."""
+
+    def __init__(self, root: str):
+        self.root = root
+
+    def path(self, uri: str) -> str:
+        bucket_name, key = split_uri(uri)
+        return os.path.join(self.root, bucket_name, key)
+
+    def list(self, uri: str) -> list:
+        directory = self.path(uri)
+        try:
+            entries = sorted(os.scandir(directory), key=lambda e: e.name)
+        except FileNotFoundError:
+            return []
+        base = uri.rstrip('/')
+        out = []
+        for entry in entries:
+            if entry.is_file() and not entry.name.endswith('.tmp'):
+                stat = entry.stat()
+                out.append({'uri': f"{base}/{entry.name}", 'name': entry.name, 'size': stat.st_size,
+                            'updated': datetime.fromtimestamp(stat.st_mtime, tz=timezone.utc).isoformat()})
+        return out
+
+    def size(self, uri: str) -> int:
+        return os.path.getsize(self.path(uri))
+
+    def read_range(self, uri: str, start: int, length: int) -> bytes:
+        with open(self.path(uri), 'rb') as f:
+            f.seek(start)
+            return f.read(length)
+
+    def read_bytes(self, uri: str) -> bytes:
+        try:
+            with open(self.path(uri), 'rb') as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def write_bytes(self, uri: str, data: bytes) -> None:
+        with self.open_write(uri) as f:
+            f.write(data)
+
+    def open_write(self, uri: str):
+        return _AtomicFile(self.path(uri))
+
+    def download(self, uri: str, path: str) -> None:
+        with open(self.path(uri), 'rb') as src, open(path, 'wb') as dst:
+            while True:
+                block = src.read(UPLOAD_CHUNK_BYTES)
+                if not block:
+                    break
+                dst.write(block)
+
+    def exists(self, uri: str) -> bool:
+        return os.path.isfile(self.path(uri))
+
+    def delete(self, uri: str) -> None:
+        os.remove(self.path(uri))
+
+
+_STORE = None
+_STORE_LOCK = threading.Lock()
+_IO_POOL = None
+
+
+def get_store():
+    """The process-wide store: LocalStore under $OBJECT_STORE_ROOT, else one shared GCSStore."""
+    global _STORE
+    if _STORE is None:
+        with _STORE_LOCK:
+            if _STORE is None:
+                root = os.environ.get(STORE_ROOT_ENV)
+                _STORE = LocalStore(root) if root else GCSStore()
+    return _STORE
+
+
+def set_store(store) -> None:
+    """Replace the process-wide store (e.g. LocalStore(tmp_dir) in tests)."""
+    global _STORE
+    with _STORE_LOCK:
+        _STORE = store
+
+
+def _io_pool() -> ThreadPoolExecutor:
+    global _IO_POOL
+    if _IO_POOL is None:
+        with _STORE_LOCK:
+            if _IO_POOL is None:
+                _IO_POOL = ThreadPoolExecutor(max_workers=IO_THREADS, thread_name_prefix='object-store')
+    return _IO_POOL
+
+
+# ============================================================================
+# TEXT / EXISTENCE (local or gs://)
+# ============================================================================
+
+def read_text(path: str) -> str:
+    """Small text file (markers, manifests); None if it does not exist. One request on GCS."""
+    if is_remote(path):
+        data = get_store().read_bytes(path)
+        return data.decode() if data is not None else None
+    try:
+        with open(path) as f:
+            return f.read()
+    except FileNotFoundError:
+        return None
+
+
+def write_text(text: str, path: str) -> None:
+    if is_remote(path):
+        get_store().write_bytes(path, text.encode())
+    else:
+        with open(path, 'w') as f:
+            f.write(text)
+
+
+def exists(path: str) -> bool:
+    return get_store().exists(path) if is_remote(path) else os.path.exists(path)
+
+
+# ============================================================================
+# PARQUET
+# ============================================================================
+
+def write_parquet(data, path: str, row_group_size: int = CHECKPOINT_ROW_GROUP_ROWS) -> None:
+    """Write a DataFrame / Arrow table as parquet, streamed straight to its destination."""
+    table = data if isinstance(data, pa.Table) else pa.Table.from_pandas(data, preserve_index=False)
+    if not is_remote(path):
+        pq.write_table(table, path, row_group_size=row_group_size)
+        return
+    with get_store().open_write(path) as sink:
+        pq.write_table(table, sink, row_group_size=row_group_size)
+
+
+def open_write(path: str):
+    """
+    Writable binary stream (context manager) for a local path or gs:// URI.
+
+    Local files are written to `{path}.tmp` and moved into place on a clean
+    exit; uploads are cancelled on error. Either way no partial file is
+    published.
+    """
+    return get_store().open_write(path) if is_remote(path) else _AtomicFile(path)
+
+
+class _RangeFile(io.RawIOBase):
+    """
+    Read-only, seekable view of a remote object backed by fetched byte ranges.
+
+    Reads inside prefetched ranges are served from memory; anything else is
+    fetched on demand with one ranged GET.
+    """
+
+    def __init__(self, store, uri: str, size: int):
+        self.store, self.uri, self.size = store, uri, size
+        self.position = 0
+        self.blocks = []  # (start, bytes)
+        self.fetched_bytes = 0
+        self.requests = 0
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self.position
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        base = {io.SEEK_SET: 0, io.SEEK_CUR: self.position, io.SEEK_END: self.size}[whence]
+        self.position = base + offset
+        return self.position
+
+    def release(self, keep: int = 1) -> None:
+        """Drop cached blocks after the first `keep` (the footer) once their row group is decoded."""
+        del self.blocks[keep:]
+
+    def add_block(self, start: int, data: bytes) -> None:
+        self.blocks.append((start, data))
+        self.fetched_bytes += len(data)
+        self.requests += 1
+
+    def fetch(self, ranges: list) -> None:
+        """Fetch (start, length) ranges in parallel into the block cache."""
+        futures = [(start, _io_pool().submit(self.store.read_range, self.uri, start, length))
+                   for start, length in ranges]
+        for start, future in futures:
+            self.add_block(start, future.result())
+
+    def readinto(self, buffer) -> int:
+        n = min(len(buffer), self.size - self.position)
+        if n <= 0:
+            return 0
+        start, end = self.position, self.position + n
+        for block_start, data in self.blocks:
+            if block_start <= start and end <= block_start + len(data):
+                buffer[:n] = data[start - block_start:end - block_start]
+                break
+        else:
+            data = self.store.read_range(self.uri, start, n)
+            self.add_block(start, data)
+            buffer[:len(data)] = data
+            n = len(data)
+        self.position += n
+        return n
+
+
+def _column_ranges(metadata, columns: list, row_groups: list = None) -> list:
+    """Coalesced (start, length) byte ranges of the given columns' chunks (every row group by default)."""
+    wanted = None if columns is None else set(columns)
+    spans = []
+    for i in (range(metadata.num_row_groups) if row_groups is None else row_groups):
+        row_group = metadata.row_group(i)
+        for j in range(row_group.num_columns):
+            chunk = row_group.column(j)
+            if wanted is not None and chunk.path_in_schema.split('.')[0] not in wanted:
+                continue
+            start = chunk.data_page_offset
+            if chunk.has_dictionary_page and chunk.dictionary_page_offset:
+                start = min(start, chunk.dictionary_page_offset)
+            spans.append((start, start + chunk.total_compressed_size))
+    spans.sort()
+    merged = []
+    for start, end in spans:
+        if merged and start - merged[-1][1] <= COALESCE_GAP_BYTES:
+            merged[-1][1] = max(merged[-1][1], end)
+        else:
+            merged.append([start, end])
+    return [(start, end - start) for start, end in merged]
+
+
+def _remote_parquet(path: str, size: int = None) -> tuple:
+    """(_RangeFile, ParquetFile) for a gs:// parquet with only its footer fetched."""
+    store = get_store()
+    size = store.size(path) if size is None else size
+    source = _RangeFile(store, path, size)
+    tail = min(size, FOOTER_PREFETCH_BYTES)
+    source.fetch([(size - tail, tail)])
+    return source, pq.ParquetFile(source)
+
+
+def open_parquet(path: str, size: int = None) -> pq.ParquetFile:
+    """
+    ParquetFile for a local path or gs:// URI.
+
+    Remote files fetch only the footer up front; row groups are then read
+    by range as they are requested.
+    """
+    if not is_remote(path):
+        return pq.ParquetFile(path)
+    return _remote_parquet(path, size)[1]
+
+
+def read_parquet_table(path: str, columns: list = None, size: int = None) -> pa.Table:
+    """
+    Read parquet (local or gs://) as an Arrow table.
+
+    On GCS only the footer and the requested columns' chunks are transferred
+    (parallel ranged reads). `size` skips the object-size lookup when the
+    caller already has it (e.g. from a listing).
+    """
+    if not is_remote(path):
+        return pq.read_table(path, columns=columns)
+    source, parquet_file = _remote_parquet(path, size)
+    source.fetch(_column_ranges(parquet_file.metadata, columns))
+    return parquet_file.read(columns=columns)
+
+
+def read_schema(path: str) -> pa.Schema:
+    """Arrow schema of a local or gs:// parquet (footer only)."""
+    return open_parquet(path).schema_arrow if is_remote(path) else pq.read_schema(path)
+
+
+def iter_batches(path: str, columns: list = None, batch_size: int = 65_536, row_groups: list = None):
+    """
+    Stream record batches of a local or gs:// parquet, one row group at a time.
+
+    Each row group is read on its own, so memory stays at about one decoded
+    row group regardless of file size (a reader given all row groups at once
+    buffers far ahead of the batch being consumed). On GCS the row group's
+    requested column chunks are fetched (coalesced, parallel ranged reads)
+    and released once decoded.
+    """
+    if is_remote(path):
+        source, parquet_file = _remote_parquet(path)
+    else:
+        source, parquet_file = None, pq.ParquetFile(path)
+    for group in (range(parquet_file.num_row_groups) if row_groups is None else row_groups):
+        if source is not None:
+            source.fetch(_column_ranges(parquet_file.metadata, columns, [group]))
+        yield from parquet_file.iter_batches(batch_size=batch_size, row_groups=[group], columns=columns)
+        if source is not None:
+            source.release()
+
+
+def read_parquet(path: str, columns: list = None, size: int = None) -> pd.DataFrame:
+    """read_parquet_table as a pandas DataFrame."""
+    return read_parquet_table(path, columns, size).to_pandas()
+
+
+# ============================================================================
+# PREFETCH
+# ============================================================================
+
+def _download(entry: dict, local_dir: str) -> str:
+    """Download one object; a local copy with the listed size and write time is reused."""
+    local_path = os.path.join(local_dir, entry['uri'].rsplit('/', 1)[-1])
+    size, updated = entry.get('size'), entry.get('updated')
+    mtime = datetime.fromisoformat(updated).timestamp() if updated else None
+    if mtime is not None and os.path.exists(local_path):
+        stat = os.stat(local_path)
+        if stat.st_size == size and stat.st_mtime == mtime:
+            return local_path  # Already fetched by an earlier (interrupted) run
+    tmp_path = f"{local_path}.tmp"
+    try:
+        get_store().download(entry['uri'], tmp_path)
+        if mtime is not None:
+            os.utime(tmp_path, (mtime, mtime))
+        os.replace(tmp_path, local_path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    return local_path
+
+
+_END = object()
+
+
+def read_ahead(func, items: list, max_inflight: int = DEFAULT_PREFETCH):
+    """
+    Yield (item, result, error) for func(item) in input order, running at most
+    max_inflight calls ahead of the consumer on background threads.
+
+    The consumer works on item i while items i+1 … i+max_inflight are in
+    flight; an exception is returned as `error` rather than raised, so one
+    bad object does not abort the stream.
+    """
+    pending = iter(items)
+    window = deque()
+    with ThreadPoolExecutor(max_workers=max(1, max_inflight), thread_name_prefix='read-ahead') as executor:
+        def _submit():
+            item = next(pending, _END)
+            if item is not _END:
+                window.append((item, executor.submit(func, item)))
+
+        for _ in range(max(1, max_inflight)):
+            _submit()
+        while window:
+            item, future = window.popleft()
+            _submit()
+            try:
+                yield item, future.result(), None
+            except Exception as e:
+                yield item, None, e
+
+
+def prefetch(objects: list, local_dir: str, max_inflight: int = DEFAULT_PREFETCH):
+    """
+    Download objects to local_dir, at most max_inflight at a time, yielding
+    local paths in input order as each becomes ready.
+
+    Args:
+        objects: gs:// URIs, or listing entries {'uri', 'size', 'updated'}
+            (local copies matching an entry's size and write time, e.g. from
+            an interrupted run, are reused)
+        local_dir: Destination directory (created if missing)
+        max_inflight: Bound on concurrent transfers (and on files downloaded
+            ahead of the consumer)
+    """
+    os.makedirs(local_dir, exist_ok=True)
+    entries = [o if isinstance(o, dict) else {'uri': o} for o in objects]
+    for entry, local_path, error in read_ahead(lambda e: _download(e, local_dir), entries, max_inflight):
+        if error is not None:
+            raise error
+        yield local_path
+
+
+def download_all(objects: list, local_dir: str, max_inflight: int = DEFAULT_PREFETCH) -> list:
+    """Download every object with bounded concurrency; local paths in input order."""
+    return list(prefetch(objects, local_dir, max_inflight))
@@ -22,16 +22,29 @@ import os
 import shutil
 import numpy as np
 import pandas as pd
-import duckdb
 from datetime import datetime
 from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, as_completed
 import multiprocessing
 from google.cloud import bigquery
-from google.cloud import storage
 import warnings
 import gc
 warnings.filterwarnings('ignore')
 
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+import object_store
+from projection_manifest import (
+    build_projection_manifest, load_stable_features, table_projection_hash, table_base_hash, selection_hash,
+    checkpoint_is_current, sidecar_path, summarize, MANIFEST_FILE
+)
+from checkpoint_watermark import (
+    parse_watermarks, refresh_start, record_table, record_refresh, record_merge, merge_since,
+    parquet_watermark, rows_before, append_tail, format_timestamp, WATERMARK_FILE, DEFAULT_LOOKBACK_MINUTES
+)
+from checkpoint_index import (
+    load_index, has_checkpoint, projection_hash, record_checkpoint, schema_hash, format_index,
+    summarize as summarize_index, INDEX_FILE
+)
+
 # Configuration
 PROJECT = "bqx-ml"
 FEATURES_DATASET = "bqx_ml_v3_features_v2"
@@ -45,6 +58,7 @@ CPU_COUNT = multiprocessing.cpu_count()
 MAX_WORKERS = min(CPU_COUNT, 16) if CPU_COUNT <= 4 else 16  # Use CPU count for Cloud Run (≤4), 16 for VM
 MAX_TABLE_WORKERS = 8  # Parallel table queries per pair (CE approved)
 SAMPLE_LIMIT = 100000  # 100K samples - CE approved for 64GB RAM (n2-highmem-8)
+MERGE_READ_AHEAD = 4  # Checkpoints loaded ahead of the merge (bounds extra memory to 4 tables)
 
 # Chunk directory for parquet files
 CHUNK_DIR = "/tmp/feature_chunks"
@@ -66,89 +80,35 @@ ALL_28_PAIRS = [
 # GCS Helper Functions (Cloud Run Support)
 # ============================================================================
 
-def _write_parquet_to_gcs(df: pd.DataFrame, gcs_path: str) -> None:
-    """Write DataFrame to GCS as parquet file."""
-    # Parse gs://bucket/path format
-    if not gcs_path.startswith('gs://'):
-        raise ValueError(f"GCS path must start with gs://, got: {gcs_path}")
+def _write_parquet(df: pd.DataFrame, path: str) -> None:
+    """Write DataFrame to parquet (local, or streamed to GCS via the shared client)."""
+    object_store.write_parquet(df, path)
 
-    parts = gcs_path.replace('gs://', '').split('/', 1)
-    bucket_name = parts[0]
-    blob_path = parts[1] if len(parts) > 1 else ''
 
-    # Write to temporary local file first (more reliable than direct GCS write)
-    import tempfile
-    with tempfile.NamedTemporaryFile(suffix='.parquet', delete=False) as tmp:
-        tmp_path = tmp.name
-        df.to_parquet(tmp_path, index=False)
-
-    try:
-        # Upload to GCS
-        storage_client = storage.Client(project=PROJECT)
-        bucket = storage_client.bucket(bucket_name)
-        blob = bucket.blob(blob_path)
-        blob.upload_from_filename(tmp_path)
-    finally:
-        # Clean up temp file
-        if os.path.exists(tmp_path):
-            os.remove(tmp_path)
-
-
-def _read_parquet_from_gcs(gcs_path: str) -> pd.DataFrame:
-    """Read DataFrame from GCS parquet file."""
-    if not gcs_path.startswith('gs://'):
-        raise ValueError(f"GCS path must start with gs://, got: {gcs_path}")
-
-    parts = gcs_path.replace('gs://', '').split('/', 1)
-    bucket_name = parts[0]
-    blob_path = parts[1] if len(parts) > 1 else ''
-
-    # Download to temp file
-    import tempfile
-    with tempfile.NamedTemporaryFile(suffix='.parquet', delete=False) as tmp:
-        tmp_path = tmp.name
-
-    try:
-        storage_client = storage.Client(project=PROJECT)
-        bucket = storage_client.bucket(bucket_name)
-        blob = bucket.blob(blob_path)
-        blob.download_to_filename(tmp_path)
-        return pd.read_parquet(tmp_path)
-    finally:
-        if os.path.exists(tmp_path):
-            os.remove(tmp_path)
+def _read_parquet(path: str, columns: list = None) -> pd.DataFrame:
+    """Read DataFrame from parquet (local or GCS; on GCS only the requested columns are fetched)."""
+    return object_store.read_parquet(path, columns)
 
 
 def _parquet_exists(path: str) -> bool:
     """Check if parquet file exists (local or GCS)."""
-    if path.startswith('gs://'):
-        parts = path.replace('gs://', '').split('/', 1)
-        bucket_name = parts[0]
-        blob_path = parts[1] if len(parts) > 1 else ''
-
-        storage_client = storage.Client(project=PROJECT)
-        bucket = storage_client.bucket(bucket_name)
-        blob = bucket.blob(blob_path)
-        return blob.exists()
-    else:
-        from pathlib import Path
-        return Path(path).exists()
+    return object_store.exists(path)
 
 
-def _write_parquet(df: pd.DataFrame, path: str) -> None:
-    """Write DataFrame to parquet (local or GCS)."""
-    if path.startswith('gs://'):
-        _write_parquet_to_gcs(df, path)
-    else:
-        df.to_parquet(path, index=False)
+def _write_text(text: str, path: str) -> None:
+    """Write a small text file (local or GCS) - markers and manifest sidecars."""
+    object_store.write_text(text, path)
 
 
-def _read_parquet(path: str) -> pd.DataFrame:
-    """Read DataFrame from parquet (local or GCS)."""
-    if path.startswith('gs://'):
-        return _read_parquet_from_gcs(path)
-    else:
-        return pd.read_parquet(path)
+def _read_text(path: str) -> str:
+    """Read a small text file (local or GCS); None if it does not exist."""
+    return object_store.read_text(path)
+
+
+def _utc_cutoff(since: str, times: pd.Series) -> pd.Timestamp:
+    """Refresh start as a Timestamp comparable with an interval_time column."""
+    cutoff = pd.Timestamp(since, tz='UTC')
+    return cutoff if times.dt.tz is not None else cutoff.tz_localize(None)
 
 
 def get_feature_tables_for_pair(pair: str) -> dict:
@@ -334,69 +294,116 @@ def query_single_table_to_parquet(table_name: str, pair: str, date_start: str, d
         return table_name, None, 0, 0
 
 
-def merge_parquet_with_duckdb(targets_path: str, chunk_dir: str, output_path: str) -> pd.DataFrame:
+def _resolve_parquet_column_owners(targets_path: str, parquet_paths: list) -> list:
     """
-    Use DuckDB to efficiently merge all parquet files in BATCHES.
+    Decide which file contributes each merged column, reading footers only.
+
+    Same dedup rule as the pandas merges: a column already present in
+    targets or an earlier file is never re-added.
 
-    BATCHED APPROACH: Merge 50 files at a time to avoid OOM.
-    Memory usage: ~4-6GB peak instead of 25GB+
+    Returns: list of (parquet_path, [owned columns]) for contributing files
     """
-    con = duckdb.connect()
+    import pyarrow.parquet as pq
 
-    # Configure DuckDB for memory efficiency
-    con.execute("SET preserve_insertion_order=false")
-    con.execute("SET threads=2")
+    seen = set(pq.read_schema(targets_path).names)
+    owners = []
+    for path in parquet_paths:
+        try:
+            names = pq.read_schema(path).names
+        except Exception as e:
+            print(f"      Warning: {os.path.basename(path)}: {e}")
+            continue
+        if 'interval_time' not in names:
+            continue
+        owned = [c for c in names if c != 'interval_time' and c not in seen]
+        if owned:
+            seen.update(owned)
+            owners.append((path, owned))
+    return owners
 
-    # Get list of feature parquet files
-    parquet_files = [f for f in os.listdir(chunk_dir) if f.endswith('.parquet') and f != 'targets.parquet']
+
+def merge_parquet_columnar(targets_path: str, chunk_dir: str, output_path: str) -> pd.DataFrame:
+    """
+    Merge all chunk parquet files onto targets as ONE columnar Arrow plan.
+
+    COLUMNAR APPROACH:
+    1. Read only parquet footers to resolve duplicate column ownership
+    2. Read only the winning columns from each file (parquet column pruning)
+    3. Align each file to the targets keys with one hash lookup and gather
+       its columns (LEFT JOIN semantics, first match per interval_time)
+    4. Assemble the aligned columns once, write output_path, and convert to
+       pandas releasing each Arrow column as it is converted
+
+    Cost is linear in (files × owned columns); nothing is ever re-copied.
+    Peak memory is the merged table plus one file's projected columns: the
+    DataFrame reuses the merged table's memory (self_destruct) instead of
+    doubling it.
+    """
+    import pyarrow as pa
+    import pyarrow.compute as pc
+    import pyarrow.parquet as pq
+
+    # Get list of feature parquet files (sorted → deterministic column ownership)
+    parquet_files = sorted(
+        f for f in os.listdir(chunk_dir)
+        if f.endswith('.parquet') and f not in ('targets.parquet', os.path.basename(output_path))
+    )
 
     if not parquet_files:
         return pd.read_parquet(targets_path)
 
-    print(f"      Merging {len(parquet_files)} files in batches...")
+    owners = _resolve_parquet_column_owners(
+        targets_path, [os.path.join(chunk_dir, f) for f in parquet_files]
+    )
+    owned_cols = sum(len(cols) for _, cols in owners)
+    print(f"      Footers: {len(parquet_files)} files, {len(owners)} contribute {owned_cols:,} columns")
 
-    # Start with targets
-    current_df = pd.read_parquet(targets_path)
-    print(f"      Base: {len(current_df):,} rows, {len(current_df.columns)} cols")
+    targets = pq.read_table(targets_path)
+    target_keys = targets.column('interval_time')
+    print(f"      Base: {targets.num_rows:,} rows, {targets.num_columns} cols")
 
-    # Merge in batches of 50 files
-    BATCH_SIZE = 50
-    for batch_start in range(0, len(parquet_files), BATCH_SIZE):
-        batch_end = min(batch_start + BATCH_SIZE, len(parquet_files))
-        batch_files = parquet_files[batch_start:batch_end]
+    names = list(targets.column_names)
+    columns = list(targets.columns)
 
-        # Read batch files and merge
-        for pf in batch_files:
-            pf_path = os.path.join(chunk_dir, pf)
-            try:
-                feature_df = pd.read_parquet(pf_path)
-                if 'interval_time' in feature_df.columns:
-                    # Get feature columns (exclude duplicates already in current_df)
-                    existing_cols = set(current_df.columns)
-                    feature_cols = [c for c in feature_df.columns if c != 'interval_time' and c not in existing_cols]
-                    if feature_cols:
-                        current_df = current_df.merge(
-                            feature_df[['interval_time'] + feature_cols],
-                            on='interval_time',
-                            how='left'
-                        )
-                del feature_df
-            except Exception as e:
-                print(f"      Warning: {pf}: {e}")
+    for i, (path, cols) in enumerate(owners, 1):
+        try:
+            table = pq.read_table(path, columns=['interval_time'] + cols)
+            file_keys = table.column('interval_time')
+            if file_keys.type != target_keys.type:
+                file_keys = pc.cast(file_keys, target_keys.type)
+
+            # Row of each target interval_time in this file (null → no match)
+            positions = pc.index_in(target_keys, value_set=file_keys)
+            for col in cols:
+                columns.append(table.column(col).take(positions))
+                names.append(col)
+            del table
+        except Exception as e:
+            print(f"      Warning: {os.path.basename(path)}: {e}")
 
-        # Progress update
-        print(f"      Batch {batch_start//BATCH_SIZE + 1}: {len(current_df.columns):,} columns", flush=True)
+        if i % 100 == 0:
+            print(f"      Aligned {i}/{len(owners)} files: {len(names):,} columns", flush=True)
 
-        # Force garbage collection between batches
-        gc.collect()
+    merged = pa.Table.from_arrays(columns, names=names)
+    del columns, targets, target_keys
+    pq.write_table(merged, output_path, compression='snappy')
+
+    # Buffers are freed column by column as the DataFrame is built (~1× instead of 2× peak)
+    merged_df = merged.to_pandas(self_destruct=True, split_blocks=True)
+    del merged
+    gc.collect()
+    print(f"      Final: {len(merged_df):,} rows, {len(merged_df.columns):,} columns")
+    return merged_df
 
-    con.close()
-    print(f"      Final: {len(current_df):,} rows, {len(current_df.columns):,} columns")
-    return current_df
 
+def query_targets(pair: str, date_start: str, date_end: str, since: str = None,
+                  limit: int = SAMPLE_LIMIT) -> tuple:
+    """
+    Query targets table with all 7 windows × 7 horizons = 49 columns.
 
-def query_targets(pair: str, date_start: str, date_end: str) -> tuple:
-    """Query targets table with all 7 windows × 7 horizons = 49 columns."""
+    `since` (refresh) restricts the query to rows from that interval_time on;
+    `limit` is the row cap (the refresh passes what is left of SAMPLE_LIMIT).
+    """
     client = bigquery.Client(project=PROJECT)
 
     # All 7 BQX windows and 7 horizons per mandate
@@ -417,8 +424,9 @@ def query_targets(pair: str, date_start: str, date_end: str) -> tuple:
     FROM `{PROJECT}.{ANALYTICS_DATASET}.targets_{pair}`
     WHERE DATE(interval_time) BETWEEN '{date_start}' AND '{date_end}'
     AND target_bqx45_h15 IS NOT NULL
+    {f"AND interval_time >= TIMESTAMP '{since}'" if since else ''}
     ORDER BY interval_time
-    LIMIT {SAMPLE_LIMIT}
+    LIMIT {limit}
     """
 
     job = client.query(query)
@@ -579,8 +587,26 @@ def query_pair_direct(pair: str, date_start: str, date_end: str) -> tuple:
 
 
 def _extract_single_table_checkpoint(args) -> dict:
-    """Worker function for parallel table extraction with checkpointing."""
-    table_name, pair, date_start, date_end, checkpoint_dir, cols = args
+    """
+    Worker function for parallel table extraction with checkpointing.
+
+    `manifest` is the pair's projection manifest; the sidecar is written
+    next to every new checkpoint. Only tables without a current checkpoint
+    are dispatched (decided once from the checkpoint index by the caller).
+
+    With `refresh_lookback` set (minutes), the existing checkpoint is
+    refreshed in place: only rows from its high-water interval_time minus
+    the lookback are queried and appended (append_tail: earlier row groups
+    are copied through).
+
+    A checkpoint holds the first SAMPLE_LIMIT rows of the date window
+    (ORDER BY interval_time LIMIT), not the newest ones, so the refresh keeps
+    that cap: the tail query is limited to SAMPLE_LIMIT minus the rows kept
+    before the refresh start. The result is the same row set a full
+    re-extract would produce - a checkpoint already at the cap only has its
+    lookback rows re-read, it does not grow by the next SAMPLE_LIMIT rows.
+    """
+    table_name, pair, date_start, date_end, checkpoint_dir, cols, manifest, refresh_lookback = args
     import sys
 
     print(f"      [DEBUG] Starting extraction: {table_name}", flush=True)
@@ -593,10 +619,6 @@ def _extract_single_table_checkpoint(args) -> dict:
         from pathlib import Path
         parquet_path = str(Path(checkpoint_dir) / f"{table_name}.parquet")
 
-    # Skip if already exists (checkpoint)
-    if _parquet_exists(parquet_path):
-        return {'table': table_name, 'status': 'cached', 'cols': 0, 'bytes': 0}
-
     try:
         client = bigquery.Client(project=PROJECT)
 
@@ -605,21 +627,32 @@ def _extract_single_table_checkpoint(args) -> dict:
 
         col_list = ', '.join(cols)
 
+        # Refresh: start from the checkpoint's watermark minus the lookback (key column only),
+        # fetching only what the SAMPLE_LIMIT head cap leaves after the rows kept before it
+        since = None
+        limit = SAMPLE_LIMIT
+        if refresh_lookback is not None:
+            watermark = parquet_watermark(parquet_path)
+            since = refresh_start(watermark, refresh_lookback) if watermark else None
+            if since:
+                limit = SAMPLE_LIMIT - rows_before(parquet_path, since)
+
         # CE Directive 2025-12-11 08:35: Summary tables EXCLUDED at query level
         # All remaining tables have interval_time column
         query = f"""
         SELECT interval_time, {col_list}
         FROM `{PROJECT}.{FEATURES_DATASET}.{table_name}`
         WHERE DATE(interval_time) BETWEEN '{date_start}' AND '{date_end}'
+        {f"AND interval_time >= TIMESTAMP '{since}'" if since else ''}
         ORDER BY interval_time
-        LIMIT {SAMPLE_LIMIT}
+        LIMIT {limit}
         """
 
         job = client.query(query)
         table_df = job.to_dataframe()
         bytes_scanned = job.total_bytes_processed or 0
 
-        if len(table_df) == 0 or 'interval_time' not in table_df.columns:
+        if since is None and (len(table_df) == 0 or 'interval_time' not in table_df.columns):
             return {'table': table_name, 'status': 'skip_empty', 'cols': 0, 'bytes': bytes_scanned}
 
         # Apply column prefix (bug fix)
@@ -627,17 +660,46 @@ def _extract_single_table_checkpoint(args) -> dict:
         rename_map = {c: f"{prefix}_{c}" for c in table_df.columns if c != 'interval_time'}
         table_df = table_df.rename(columns=rename_map)
 
-        # Save checkpoint immediately (supports local or GCS)
-        _write_parquet(table_df, parquet_path)
-        col_count = len([c for c in table_df.columns if c != 'interval_time'])
-
-        return {'table': table_name, 'status': 'saved', 'cols': col_count, 'bytes': bytes_scanned}
+        if since:
+            import pyarrow as pa
+            stats = append_tail(parquet_path, pa.Table.from_pandas(table_df, preserve_index=False), since)
+            columns = stats['schema'].names
+            rows, watermark = stats['rows'], stats['watermark']
+            table_hash = schema_hash(stats['schema'].empty_table().to_pandas())
+        else:
+            # Save checkpoint immediately (supports local or GCS)
+            _write_parquet(table_df, parquet_path)
+            columns = list(table_df.columns)
+            rows = len(table_df)
+            watermark = table_df['interval_time'].max() if rows else None
+            table_hash = schema_hash(table_df)
+        del table_df
+
+        # Projection sidecar
+        projection = table_projection_hash(manifest, table_name)
+        _write_text(projection, sidecar_path(parquet_path))
+        col_count = len([c for c in columns if c != 'interval_time'])
+
+        return {
+            'table': table_name,
+            'status': 'refreshed' if since else 'saved',
+            'cols': col_count,
+            'bytes': bytes_scanned,
+            'rows': rows,
+            'path': parquet_path,
+            'schema_hash': table_hash,
+            'projection_hash': projection,
+            'watermark': watermark,
+            'since': since
+        }
 
     except Exception as e:
         return {'table': table_name, 'status': 'error', 'error': str(e), 'cols': 0, 'bytes': 0}
 
 
-def query_pair_with_checkpoints(pair: str, date_start: str, date_end: str, max_workers: int = MAX_WORKERS, gcs_output: str = None) -> tuple:
+def query_pair_with_checkpoints(pair: str, date_start: str, date_end: str, max_workers: int = MAX_WORKERS,
+                                gcs_output: str = None, selected_features: list = None,
+                                refresh: bool = False, lookback_minutes: int = DEFAULT_LOOKBACK_MINUTES) -> tuple:
     """
     Query ALL features for a pair using PARQUET CHECKPOINT approach with PARALLEL extraction.
 
@@ -654,12 +716,27 @@ def query_pair_with_checkpoints(pair: str, date_start: str, date_end: str, max_w
        - Save final: data/features/{pair}_merged_features.parquet OR gs://bucket/path/training_{pair}.parquet
        - Mark pair complete: _COMPLETE marker
 
+    PROJECTION PUSHDOWN: with selected_features, only tables/columns that
+    provide those features are queried (see projection_manifest.py). Each
+    checkpoint carries a projection hash sidecar; stale checkpoints
+    (different columns or date window) are re-extracted.
+
+    INCREMENTAL REFRESH: with refresh=True, existing checkpoints with the same
+    columns and date_start are refreshed in place (only rows from their
+    high-water interval_time minus lookback_minutes are queried, within the
+    same SAMPLE_LIMIT head cap as a full extraction), watermarks
+    are recorded in _watermarks.json, and the final merged parquet keeps its
+    rows before the earliest refresh start and only re-merges the tail.
+
     Args:
         pair: Currency pair (e.g., 'eurusd')
         date_start: Start date for queries
         date_end: End date for queries
         max_workers: Number of parallel workers
         gcs_output: Optional GCS path (e.g., 'gs://bqx-ml-staging') for Cloud Run mode
+        selected_features: Optional feature names to keep (None → all columns)
+        refresh: Append-only refresh of existing checkpoints from their watermarks
+        lookback_minutes: Rows re-read behind each watermark on refresh
 
     Returns: (merged_df, cost_info)
     """
@@ -681,8 +758,10 @@ def query_pair_with_checkpoints(pair: str, date_start: str, date_end: str, max_w
         complete_marker = str(checkpoint_base / pair / "_COMPLETE")
         final_parquet_path = f"/home/micha/bqx_ml_v3/data/features/{pair}_merged_features.parquet"
 
-    # Check if already complete
-    if _parquet_exists(complete_marker):
+    # Check if already complete (marker holds the selection hash it was built for)
+    selection = selection_hash(selected_features, date_start, date_end)
+    marker = _read_text(complete_marker)
+    if not refresh and marker is not None and (marker.strip() == selection or (not marker.strip() and selected_features is None)):
         print(f"  {pair.upper()} already COMPLETE, loading cached result...", flush=True)
         if _parquet_exists(final_parquet_path):
             merged_df = _read_parquet(final_parquet_path)
@@ -701,7 +780,38 @@ def query_pair_with_checkpoints(pair: str, date_start: str, date_end: str, max_w
         targets_path = str(Path(checkpoint_dir) / "targets.parquet")
     total_bytes = 0
 
-    if _parquet_exists(targets_path):
+    # Watermark registry (per-table high-water interval_time)
+    watermarks_path = f"{checkpoint_dir}/{WATERMARK_FILE}"
+    registry = parse_watermarks(_read_text(watermarks_path))
+    refresh_starts = []
+    full_tables = []
+
+    # Checkpoint index: ONE listing of the directory answers every exists/current check below
+    index_path = f"{checkpoint_dir}/{INDEX_FILE}"
+    index = load_index(checkpoint_dir, _read_text(index_path))
+    reconciled = index['last_reconcile']
+    print(f"    Checkpoint index: {len(index['tables'])} checkpoints listed "
+          f"({reconciled['kept']} indexed, {reconciled['new'] + reconciled['changed']} new/changed)", flush=True)
+
+    def _record_targets():
+        record_checkpoint(index, 'targets', targets_path, len(targets_df), len(targets_df.columns),
+                          schema_hash(targets_df))
+
+    if has_checkpoint(index, 'targets') and refresh:
+        import pyarrow as pa
+        targets_since = refresh_start(parquet_watermark(targets_path), lookback_minutes)
+        tail_df, targets_bytes = query_targets(pair, date_start, date_end, since=targets_since,
+                                               limit=SAMPLE_LIMIT - rows_before(targets_path, targets_since))
+        appended = len(tail_df)
+        stats = append_tail(targets_path, pa.Table.from_pandas(tail_df, preserve_index=False), targets_since)
+        del tail_df
+        targets_df = _read_parquet(targets_path)
+        _record_targets()
+        total_bytes += targets_bytes
+        refresh_starts.append(targets_since)
+        record_table(registry, 'targets', stats['watermark'], stats['rows'])
+        print(f"    Targets: REFRESHED from {targets_since} (+{appended:,} rows re-read)", flush=True)
+    elif has_checkpoint(index, 'targets'):
         print(f"    Targets: CACHED", flush=True)
         targets_df = _read_parquet(targets_path)
     else:
@@ -709,7 +819,10 @@ def query_pair_with_checkpoints(pair: str, date_start: str, date_end: str, max_w
         if targets_df is None or len(targets_df) < 1000:
             return None, {'error': 'Insufficient target data'}
         _write_parquet(targets_df, targets_path)
+        _record_targets()
         total_bytes += targets_bytes
+        full_tables.append('targets')
+        record_table(registry, 'targets', targets_df['interval_time'].max(), len(targets_df))
         print(f"    Targets: {len(targets_df):,} rows SAVED", flush=True)
 
     # Step 2: Get all feature tables (5 categories per CE directive)
@@ -731,7 +844,18 @@ def query_pair_with_checkpoints(pair: str, date_start: str, date_end: str, max_w
     # Batch fetch column metadata
     col_cache = get_all_table_columns_batch(all_tables)
 
-    # Count already cached
+    # Projection manifest: which columns of which tables to fetch
+    table_columns = {t: col_cache.get(t, []) for t in all_tables}
+    manifest = build_projection_manifest(pair, table_columns, selected_features, date_start, date_end)
+    if selected_features is not None:
+        stats = summarize(manifest, table_columns)
+        print(f"    Projection: {stats['columns_kept']:,}/{stats['columns_total']:,} columns "
+              f"({stats['column_fraction']:.1%}) from {stats['tables_kept']}/{stats['tables_total']} tables, "
+              f"{stats['unresolved']} features unresolved", flush=True)
+        all_tables = [t for t in all_tables if t in manifest['tables']]
+    _write_text(json.dumps(manifest, indent=2), f"{checkpoint_dir}/{MANIFEST_FILE}")
+
+    # Count already cached (existing checkpoint with a matching projection sidecar)
     def _get_checkpoint_path(table):
         if gcs_output:
             return f"{checkpoint_dir}/{table}.parquet"
@@ -739,25 +863,46 @@ def query_pair_with_checkpoints(pair: str, date_start: str, date_end: str, max_w
             from pathlib import Path
             return str(Path(checkpoint_dir) / f"{table}.parquet")
 
-    cached_count = sum(1 for t in all_tables if _parquet_exists(_get_checkpoint_path(t)))
-    pending_tables = [t for t in all_tables if not _parquet_exists(_get_checkpoint_path(t))]
-    print(f"    Status: {cached_count} cached, {len(pending_tables)} pending", flush=True)
+    def _is_cached(table):
+        return has_checkpoint(index, table) and \
+            checkpoint_is_current(projection_hash(index, table, _read_text), manifest, table)
+
+    def _is_refreshable(table):
+        # Same columns + date_start as recorded, or a current checkpoint not yet in the registry
+        entry = registry['tables'].get(table)
+        if entry is not None:
+            return entry.get('base_hash') == table_base_hash(manifest, table) and has_checkpoint(index, table)
+        return _is_cached(table)
+
+    refresh_tables = {t for t in all_tables if _is_refreshable(t)} if refresh else set()
+    cached_tables = {t for t in all_tables if t not in refresh_tables and _is_cached(t)}
+    cached_count = len(cached_tables)
+    pending_tables = [t for t in all_tables if t not in cached_tables]
+    completeness = summarize_index(index, all_tables)
+    print(f"    Status: {cached_count} cached, {len(refresh_tables)} refresh, "
+          f"{len(pending_tables) - len(refresh_tables)} pending "
+          f"({completeness['present']}/{completeness['tables']} checkpoints on disk, "
+          f"{completeness['bytes'] / 1e9:.2f} GB)", flush=True)
 
     if len(pending_tables) == 0:
         print(f"    All tables already extracted!", flush=True)
         success_count = 0
+        refreshed_count = 0
         error_count = 0
     else:
         print(f"    Starting PARALLEL extraction ({max_workers} workers)...", flush=True)
 
         # Prepare work items
         work_items = [
-            (table_name, pair, date_start, date_end, str(checkpoint_dir), col_cache.get(table_name, []))
+            (table_name, pair, date_start, date_end, str(checkpoint_dir),
+             manifest['tables'].get(table_name, []), manifest,
+             lookback_minutes if table_name in refresh_tables else None)
             for table_name in pending_tables
         ]
 
         start_time = _time.time()
         success_count = 0
+        refreshed_count = 0
         error_count = 0
         completed = 0
 
@@ -770,18 +915,29 @@ def query_pair_with_checkpoints(pair: str, date_start: str, date_end: str, max_w
                 try:
                     result = future.result(timeout=300)
 
+                    if result['status'] in ('saved', 'refreshed'):
+                        record_table(registry, table_name, result['watermark'], result['rows'],
+                                     table_base_hash(manifest, table_name))
+                        record_checkpoint(index, table_name, result['path'], result['rows'], result['cols'],
+                                          result['schema_hash'], result['projection_hash'])
+                        total_bytes += result['bytes']
                     if result['status'] == 'saved':
                         success_count += 1
-                        total_bytes += result['bytes']
+                        full_tables.append(table_name)
                         print(f"      [{cached_count + completed:3d}/{len(all_tables)}] {table_name}: +{result['cols']} cols SAVED", flush=True)
+                    elif result['status'] == 'refreshed':
+                        refreshed_count += 1
+                        refresh_starts.append(result['since'])
+                        print(f"      [{cached_count + completed:3d}/{len(all_tables)}] {table_name}: REFRESHED from {result['since']}", flush=True)
                     elif result['status'] == 'error':
                         error_count += 1
                         print(f"      [{cached_count + completed:3d}/{len(all_tables)}] {table_name}: ERROR - {result.get('error', 'unknown')}", flush=True)
                     else:
                         print(f"      [{cached_count + completed:3d}/{len(all_tables)}] {table_name}: SKIP ({result['status']})", flush=True)
 
-                    # Progress update every 50 tables
+                    # Progress update (and index save, so a crashed run resumes from it) every 50 tables
                     if completed % 50 == 0:
+                        _write_text(format_index(index), index_path)
                         elapsed = _time.time() - start_time
                         rate = completed / elapsed if elapsed > 0 else 0
                         remaining = (len(pending_tables) - completed) / rate if rate > 0 else 0
@@ -792,42 +948,77 @@ def query_pair_with_checkpoints(pair: str, date_start: str, date_end: str, max_w
                     print(f"      [{cached_count + completed:3d}/{len(all_tables)}] {table_name}: EXCEPTION - {e}", flush=True)
 
         extraction_elapsed = _time.time() - start_time
-        print(f"    Extraction complete: {success_count} new, {cached_count} cached, {error_count} errors in {extraction_elapsed:.0f}s", flush=True)
+        print(f"    Extraction complete: {success_count} new, {refreshed_count} refreshed, {cached_count} cached, "
+              f"{error_count} errors in {extraction_elapsed:.0f}s", flush=True)
+
+    # Record watermarks + earliest refreshed row (None after any full extraction)
+    record_refresh(registry, min(refresh_starts) if refresh_starts else None, len(refresh_starts), full_tables)
+    _write_text(json.dumps(registry, indent=2), watermarks_path)
+    since = merge_since(registry, lookback_minutes)
+    _write_text(format_index(index), index_path)
 
     # Step 3: Merge all checkpoints
     print(f"    Merging checkpoints...", flush=True)
     merge_start = _time.time()
 
-    merged_df = targets_df.copy()
-    del targets_df
+    def _merge_from(cutoff):
+        """Merge targets + checkpoints (rows from `cutoff` on; None → all rows)."""
+        merged = targets_df if cutoff is None else targets_df[targets_df['interval_time'] >= cutoff]
+        merged = merged.copy()
 
-    checkpoint_files = sorted(checkpoint_dir.glob("*.parquet"))
-    merged_cols = set(merged_df.columns)
+        # Only tables in the manifest (stale or unselected checkpoints are ignored)
+        merged_cols = set(merged.columns)
 
-    for pq_file in checkpoint_files:
-        if pq_file.name == "targets.parquet":
-            continue
+        # Checkpoints are read MERGE_READ_AHEAD tables ahead, so downloads overlap the joins
+        present = [t for t in sorted(all_tables) if has_checkpoint(index, t)]
+        reads = object_store.read_ahead(lambda t: _read_parquet(_get_checkpoint_path(t)), present, MERGE_READ_AHEAD)
 
-        try:
-            table_df = pd.read_parquet(pq_file)
+        for table_name, table_df, read_error in reads:
+            try:
+                if read_error is not None:
+                    raise read_error
+                if cutoff is not None:
+                    table_df = table_df[table_df['interval_time'] >= cutoff]
+
+                # Get non-duplicate columns
+                feature_cols = [c for c in table_df.columns if c != 'interval_time' and c not in merged_cols]
+                if not feature_cols:
+                    continue
+
+                # Merge
+                merged = merged.merge(
+                    table_df[['interval_time'] + feature_cols],
+                    on='interval_time',
+                    how='left'
+                )
+                merged_cols.update(feature_cols)
+                del table_df
 
-            # Get non-duplicate columns
-            feature_cols = [c for c in table_df.columns if c != 'interval_time' and c not in merged_cols]
-            if not feature_cols:
+            except Exception as e:
+                print(f"      Error merging {table_name}: {e}", flush=True)
                 continue
 
-            # Merge
-            merged_df = merged_df.merge(
-                table_df[['interval_time'] + feature_cols],
-                on='interval_time',
-                how='left'
-            )
-            merged_cols.update(feature_cols)
-            del table_df
+        return merged
+
+    # Incremental: keep the previous merged rows before the refresh start, re-merge the tail
+    merged_df = None
+    if refresh and since is not None and _parquet_exists(final_parquet_path):
+        previous_df = _read_parquet(final_parquet_path)
+        times = previous_df['interval_time']
+        cutoff = min(_utc_cutoff(since, times), times.max() + pd.Timedelta(1, 'ns'))
+        tail_df = _merge_from(cutoff)
+        if list(tail_df.columns) == list(previous_df.columns):
+            kept_df = previous_df[times < cutoff]
+            print(f"    Incremental merge: {len(kept_df):,} rows kept, {len(tail_df):,} re-merged from {cutoff}", flush=True)
+            merged_df = pd.concat([kept_df, tail_df], ignore_index=True)
+            del kept_df
+        else:
+            print(f"    Incremental merge: columns changed, rebuilding", flush=True)
+        del previous_df, tail_df
 
-        except Exception as e:
-            print(f"      Error merging {pq_file.name}: {e}", flush=True)
-            continue
+    if merged_df is None:
+        merged_df = _merge_from(None)
+    del targets_df
 
     merge_elapsed = _time.time() - merge_start
     gc.collect()
@@ -859,16 +1050,21 @@ def query_pair_with_checkpoints(pair: str, date_start: str, date_end: str, max_w
     final_size = os.path.getsize(final_parquet_path) / 1e9
     print(f"    Saved: {final_parquet_path} ({final_size:.2f} GB)")
 
-    # Mark as complete
-    complete_marker.touch()
+    # Merged file's own watermark: the next incremental merge re-merges from it at the latest
+    record_merge(registry, merged_df['interval_time'].max() if len(merged_df) else None)
+    _write_text(json.dumps(registry, indent=2), watermarks_path)
+
+    # Mark as complete (records the selection it was built for)
+    _write_text(selection, complete_marker)
     print(f"    Marked COMPLETE: {complete_marker}")
 
     cost_info = {
         'gb_scanned': gb_scanned,
         'cost': cost_estimate,
         'feature_count': len(feature_cols),
-        'table_count': success_count + cached_count,
+        'table_count': success_count + refreshed_count + cached_count,
         'new_tables': success_count,
+        'refreshed_tables': refreshed_count,
         'cached_tables': cached_count,
         'bytes_scanned': total_bytes
     }
@@ -878,12 +1074,12 @@ def query_pair_with_checkpoints(pair: str, date_start: str, date_end: str, max_w
 
 def query_pair_batched(pair: str, date_start: str, date_end: str) -> tuple:
     """
-    Query ALL features for a pair using PARQUET-CHUNKED approach with DuckDB.
+    Query ALL features for a pair using PARQUET-CHUNKED approach with columnar merge.
 
     MEMORY-EFFICIENT: Uses ~4-6GB instead of 12GB+
     1. Query targets first, save to parquet
     2. Query each feature table, save to parquet immediately
-    3. Use DuckDB to merge all parquet files efficiently
+    3. Merge all parquet files with one columnar Arrow pass
 
     This avoids memory issues with large dataframe merges.
     """
@@ -960,15 +1156,15 @@ def query_pair_batched(pair: str, date_start: str, date_end: str) -> tuple:
             except Exception as e:
                 print(f"    Error {table}: {e}", flush=True)
 
-    # Step 4: Use DuckDB to merge all parquet files efficiently
-    print(f"    Merging {successful_tables} parquet files with DuckDB...")
+    # Step 4: Columnar merge of all parquet files (footers → projection → align)
+    print(f"    Merging {successful_tables} parquet files (columnar)...")
     output_path = os.path.join(pair_chunk_dir, "merged.parquet")
 
     try:
-        merged_df = merge_parquet_with_duckdb(targets_path, pair_chunk_dir, output_path)
+        merged_df = merge_parquet_columnar(targets_path, pair_chunk_dir, output_path)
         print(f"    Merged: {len(merged_df):,} rows, {len(merged_df.columns):,} columns")
     except Exception as e:
-        print(f"    DuckDB merge error: {e}")
+        print(f"    Columnar merge error: {e}")
         # Fallback: just read targets
         merged_df = pd.read_parquet(targets_path)
 
@@ -1002,7 +1198,9 @@ def query_pair_batched(pair: str, date_start: str, date_end: str) -> tuple:
 
 
 def process_pair_all_horizons(pair: str, date_start: str = '2020-01-01',
-                              date_end: str = '2024-12-31', gcs_output: str = None) -> dict:
+                              date_end: str = '2024-12-31', gcs_output: str = None,
+                              selected_features: list = None, refresh: bool = False,
+                              lookback_minutes: int = DEFAULT_LOOKBACK_MINUTES) -> dict:
     """
     Process ONE pair: query all features (batched), then process 7 horizons locally.
 
@@ -1011,6 +1209,9 @@ def process_pair_all_horizons(pair: str, date_start: str = '2020-01-01',
         date_start: Start date
         date_end: End date
         gcs_output: Optional GCS path for Cloud Run mode (e.g., 'gs://bqx-ml-staging')
+        selected_features: Optional feature projection (None → all columns)
+        refresh: Append-only checkpoint refresh from watermarks
+        lookback_minutes: Rows re-read behind each watermark on refresh
     """
     print(f"\n{'='*50}")
     print(f"Processing {pair.upper()}")
@@ -1018,7 +1219,9 @@ def process_pair_all_horizons(pair: str, date_start: str = '2020-01-01',
 
     try:
         # Query all features using CHECKPOINT approach (resume capability - USER MANDATE)
-        df, cost_info = query_pair_with_checkpoints(pair, date_start, date_end, gcs_output=gcs_output)
+        df, cost_info = query_pair_with_checkpoints(pair, date_start, date_end, gcs_output=gcs_output,
+                                                    selected_features=selected_features, refresh=refresh,
+                                                    lookback_minutes=lookback_minutes)
 
         if df is None or len(df) < 1000:
             return {'pair': pair, 'status': 'error', 'message': 'Insufficient data'}
@@ -1285,15 +1488,41 @@ if __name__ == "__main__":
     elif mode == "single":
         pair = sys.argv[2] if len(sys.argv) > 2 else "eurusd"
 
-        # Check for --gcs-output flag
+        # Check for --gcs-output / projection flags
         gcs_output = None
+        stable_horizons = None
+        date_start, date_end = '2020-01-01', '2024-12-31'
+        refresh = "--refresh" in sys.argv
+        lookback_minutes = DEFAULT_LOOKBACK_MINUTES
         for i, arg in enumerate(sys.argv):
-            if arg == "--gcs-output" and i + 1 < len(sys.argv):
+            if i + 1 >= len(sys.argv):
+                break
+            if arg == "--lookback-minutes":
+                lookback_minutes = int(sys.argv[i + 1])
+            elif arg == "--gcs-output":
                 gcs_output = sys.argv[i + 1]
                 print(f"GCS Output Mode: {gcs_output}")
-                break
-
-        result = process_pair_all_horizons(pair, gcs_output=gcs_output)
+            elif arg == "--stable-horizons":
+                stable_horizons = [int(h) for h in sys.argv[i + 1].split(',')]
+            elif arg == "--date-start":
+                date_start = sys.argv[i + 1]
+            elif arg == "--date-end":
+                date_end = sys.argv[i + 1]
+
+        selected_features = None
+        if stable_horizons:
+            selected_features = load_stable_features(pair, stable_horizons)
+            if not selected_features:
+                print(f"ERROR: No stable feature files for {pair} h{stable_horizons}")
+                sys.exit(1)
+            print(f"Projection: {len(selected_features)} stable features (h{stable_horizons})")
+
+        if refresh:
+            print(f"Refresh: append from watermarks (lookback {lookback_minutes} min)")
+
+        result = process_pair_all_horizons(pair, date_start, date_end, gcs_output=gcs_output,
+                                           selected_features=selected_features, refresh=refresh,
+                                           lookback_minutes=lookback_minutes)
         print(json.dumps(result, indent=2, default=str))
         # Save results to file
         output_file = f"/tmp/parallel_batch_single_{pair}.json"
@@ -1315,7 +1544,13 @@ if __name__ == "__main__":
         print("  python parallel_feature_testing.py count eurusd")
         print("  python parallel_feature_testing.py single eurusd")
         print("  python parallel_feature_testing.py single eurusd --gcs-output gs://bqx-ml-staging")
+        print("  python parallel_feature_testing.py single eurusd --stable-horizons 15,30 --date-start 2023-01-01")
+        print("  python parallel_feature_testing.py single eurusd --refresh --date-end 2025-06-30")
         print("  python parallel_feature_testing.py full")
         print("")
         print("Options:")
-        print("  --gcs-output <bucket>  Write checkpoints to GCS (for Cloud Run deployment)")
+        print("  --gcs-output <bucket>       Write checkpoints to GCS (for Cloud Run deployment)")
+        print("  --stable-horizons <h,...>   Only extract stable features for these horizons")
+        print("  --date-start / --date-end  Date window to extract (YYYY-MM-DD)")
+        print("  --refresh                   Append only new rows to existing checkpoints (watermarks)")
+        print("  --lookback-minutes <N>      Rows re-read behind each watermark on refresh (default 2880)")
@@ -0,0 +1,235 @@
+#!/usr/bin/env python3
+"""
+Projection Manifest - Column and Date-Range Pushdown for Checkpoint Extraction
+
+Retraining only consumes the ~400 stable features per (pair, horizon) from
+intelligence/stable_features_{pair}_h{h}.json, yet extraction pulled every
+column of every table for the full 2020-2025 history.
+
+A projection manifest records, per table:
+- which columns to fetch (resolved from the selected feature names)
+- the date window to fetch (interval_time range, prunes partitions)
+
+Each checkpoint gets a sidecar `{table}.manifest` holding the hash of its
+table projection. A checkpoint whose sidecar hash differs from the current
+manifest was extracted with a different projection/window and is STALE.
+
+Usage:
+    from projection_manifest import (
+        load_stable_features, build_projection_manifest, table_projection_hash
+    )
+    features = load_stable_features('eurusd', [15, 30])
+    manifest = build_projection_manifest('eurusd', table_columns, features,
+                                         date_start='2023-01-01', date_end='2025-06-30')
+"""
+
+import os
+import json
+import hashlib
+from datetime import datetime, timedelta
+
+INTELLIGENCE_DIR = "/home/micha/bqx_ml_v3/intelligence"
+MANIFEST_FILE = "_projection_manifest.json"
+SIDECAR_SUFFIX = ".manifest"
+
+# Tables that are never column-projected (date window still applies)
+UNPROJECTED_PREFIXES = ('targets_',)
+
+
+def load_stable_features(pair: str, horizons: list, intelligence_dir: str = INTELLIGENCE_DIR) -> list:
+    """
+    Load the union of selected features for a pair across horizons.
+
+    Accepts both stable_features_{pair}_h{h}.json ('selected_features' list)
+    and the older robust_feature_selection_{pair}_h{h}.json ('groups') format.
+
+    Returns: sorted feature list (empty if no selection file exists)
+    """
+    features = set()
+
+    for horizon in horizons:
+        for name in (f"stable_features_{pair}_h{horizon}.json",
+                     f"robust_feature_selection_{pair}_h{horizon}.json"):
+            path = os.path.join(intelligence_dir, name)
+            try:
+                with open(path) as f:
+                    selection = json.load(f)
+            except (FileNotFoundError, json.JSONDecodeError):
+                continue
+
+            if 'selected_features' in selection:
+                features.update(selection['selected_features'])
+            else:
+                for group_data in selection.get('groups', {}).values():
+                    features.update(feat for feat, _ in group_data.get('top_features', []))
+            break
+
+    return sorted(features)
+
+
+def _candidate_names(table: str, column: str, pair: str) -> tuple:
+    """
+    Names a table column may carry in merged training data.
+
+    - raw column name (extract_to_parquet checkpoints)
+    - {table}_{column}
+    - {prefix}_{column} with the pair removed from the table name
+      (parallel_feature_testing checkpoints)
+    """
+    prefix = table.replace(f'_{pair}', '').replace('__', '_').strip('_')
+    return column, f"{table}_{column}", f"{prefix}_{column}"
+
+
+def build_projection_manifest(pair: str, table_columns: dict, selected_features: list = None,
+                              date_start: str = None, date_end: str = None) -> dict:
+    """
+    Resolve selected features to per-table column projections.
+
+    Args:
+        pair: Currency pair
+        table_columns: {table_name: [all feature columns]} (interval_time excluded)
+        selected_features: Feature names to keep (None → all columns)
+        date_start: First date to fetch (YYYY-MM-DD, inclusive; None → unbounded)
+        date_end: Last date to fetch (YYYY-MM-DD, inclusive; None → unbounded)
+
+    Returns:
+        Manifest dict; 'tables' holds only tables with at least one kept
+        column, and 'unresolved' lists selected features no table provides
+    """
+    selected = set(selected_features) if selected_features is not None else None
+    tables = {}
+    resolved = set()
+
+    for table, columns in sorted(table_columns.items()):
+        if selected is None or table.startswith(UNPROJECTED_PREFIXES):
+            kept = list(columns)
+        else:
+            kept = []
+            for col in columns:
+                hits = selected.intersection(_candidate_names(table, col, pair))
+                if hits:
+                    kept.append(col)
+                    resolved.update(hits)
+        if kept:
+            tables[table] = kept
+
+    manifest = {
+        'pair': pair,
+        'date_start': date_start,
+        'date_end': date_end,
+        'selected_features': len(selected) if selected is not None else None,
+        'unresolved': sorted(selected - resolved) if selected is not None else [],
+        'tables': tables,
+        'selection_hash': selection_hash(selected_features, date_start, date_end),
+        'created': datetime.now().isoformat()
+    }
+    manifest['hash'] = manifest_hash(manifest)
+    return manifest
+
+
+def _digest(payload) -> str:
+    return hashlib.sha256(json.dumps(payload, sort_keys=True).encode()).hexdigest()[:16]
+
+
+def manifest_hash(manifest: dict) -> str:
+    """Hash of the full projection (all tables + date window)."""
+    return _digest([manifest['date_start'], manifest['date_end'], manifest['tables']])
+
+
+def table_projection_hash(manifest: dict, table: str) -> str:
+    """
+    Hash of one table's projection (columns + date window).
+
+    Per-table so that changing the feature list only invalidates the
+    checkpoints whose columns actually changed.
+    """
+    return _digest([manifest['date_start'], manifest['date_end'], manifest['tables'].get(table)])
+
+
+def table_base_hash(manifest: dict, table: str) -> str:
+    """
+    Hash of one table's projection WITHOUT the window end.
+
+    An append-only refresh extends date_end, so a checkpoint with the same
+    base hash can be refreshed from its watermark instead of re-extracted.
+    """
+    return _digest([manifest['date_start'], manifest['tables'].get(table)])
+
+
+def selection_hash(selected_features: list, date_start: str, date_end: str) -> str:
+    """
+    Hash of the extraction request itself (feature list + date window).
+
+    Computable before any table metadata is fetched, so pair-level
+    completion markers can be validated without touching BigQuery.
+    """
+    features = sorted(selected_features) if selected_features is not None else None
+    return _digest([date_start, date_end, features])
+
+
+def sidecar_path(checkpoint_path: str) -> str:
+    """Path of the manifest sidecar stored next to a checkpoint parquet."""
+    base = checkpoint_path[:-len('.parquet')] if checkpoint_path.endswith('.parquet') else checkpoint_path
+    return base + SIDECAR_SUFFIX
+
+
+def checkpoint_is_current(sidecar_hash: str, manifest: dict, table: str) -> bool:
+    """
+    Whether an existing checkpoint matches the manifest's projection.
+
+    Checkpoints without a sidecar predate manifests and were full-column
+    extractions, so they only count as current for unprojected manifests.
+    Without a manifest (full-column, unbounded run), a sidecar marks a
+    projected or date-windowed checkpoint, which is never current.
+    """
+    if manifest is None:
+        return sidecar_hash is None
+    if sidecar_hash is None:
+        return manifest.get('selected_features') is None
+    return sidecar_hash.strip() == table_projection_hash(manifest, table)
+
+
+def date_window_sql(manifest: dict, column: str = 'interval_time') -> str:
+    """
+    SQL predicate for the manifest date window ('' if unbounded).
+
+    Written as a half-open literal range on the timestamp column so it works
+    both in a query WHERE clause and as a Storage Read API row_restriction
+    (which does not accept function calls on literals), and prunes
+    DATE(interval_time) partitions in either case.
+    """
+    clauses = []
+    if manifest.get('date_start'):
+        clauses.append(f"{column} >= TIMESTAMP '{manifest['date_start']}'")
+    if manifest.get('date_end'):
+        end = datetime.strptime(manifest['date_end'], '%Y-%m-%d') + timedelta(days=1)
+        clauses.append(f"{column} < TIMESTAMP '{end:%Y-%m-%d}'")
+    return ' AND '.join(clauses)
+
+
+def save_manifest(manifest: dict, path: str) -> None:
+    """Write a manifest JSON file."""
+    with open(path, 'w') as f:
+        json.dump(manifest, f, indent=2)
+
+
+def load_manifest(path: str) -> dict:
+    """Read a manifest JSON file (hash recomputed, never trusted from disk)."""
+    with open(path) as f:
+        manifest = json.load(f)
+    manifest['hash'] = manifest_hash(manifest)
+    return manifest
+
+
+def summarize(manifest: dict, table_columns: dict) -> dict:
+    """Column/table reduction achieved by a manifest, for logging."""
+    total_cols = sum(len(c) for c in table_columns.values())
+    kept_cols = sum(len(c) for c in manifest['tables'].values())
+    return {
+        'tables_total': len(table_columns),
+        'tables_kept': len(manifest['tables']),
+        'columns_total': total_cols,
+        'columns_kept': kept_cols,
+        'column_fraction': kept_cols / total_cols if total_cols else 0.0,
+        'unresolved': len(manifest['unresolved'])
+    }
@@ -11,6 +11,11 @@ Approach:
 3. Run SHAP analysis on each batch
 4. Aggregate rankings across all features
 5. Output complete feature importance ranking
+
+Rows come from one deterministic interval_time sample per pair (see
+interval_sample.py): drawn once, saved as a key file and applied as the
+same hash predicate to every table, so all joins and batches see
+identical, reproducible intervals.
 """
 
 import sys
@@ -21,12 +26,18 @@ from datetime import datetime
 from google.cloud import bigquery
 import lightgbm as lgb
 import warnings
+from interval_sample import (
+    HASH_MOD, SHARED_SAMPLE_NAME, SHARED_SAMPLE_ROWS, SHARED_SAMPLE_PCT, get_or_build_sample, pct_threshold,
+    sample_predicate_sql
+)
 warnings.filterwarnings('ignore')
 
 PROJECT = "bqx-ml"
 FEATURES_DATASET = "bqx_ml_v3_features_v2"
 ANALYTICS_DATASET = "bqx_ml_v3_analytics_v2"
 HORIZONS = [15, 30, 45, 60, 75, 90, 105]
+SAMPLE_NAME = SHARED_SAMPLE_NAME  # Key file shared by all SHAP / selection stages
+SAMPLE_ROWS = SHARED_SAMPLE_ROWS
 
 # All known feature table patterns
 FEATURE_PATTERNS = [
@@ -94,37 +105,6 @@ def discover_all_feature_tables(client, pair: str) -> dict:
     return discovered
 
 
-def load_batch_features(client, pair: str, table_info: dict, sample_pct: float = 5.0) -> pd.DataFrame:
-    """Load features from a single table batch."""
-    table_name = list(table_info.keys())[0]
-    info = table_info[table_name]
-
-    # Build column list
-    cols = ', '.join([f'feat.{c}' for c in info['columns'][:200]])  # Limit to 200 cols per batch
-
-    query = f"""
-    SELECT
-        feat.interval_time,
-        {cols},
-        targets.target_bqx45_h15, targets.target_bqx45_h30, targets.target_bqx45_h45,
-        targets.target_bqx45_h60, targets.target_bqx45_h75, targets.target_bqx45_h90,
-        targets.target_bqx45_h105
-    FROM `{info['table_id']}` feat
-    JOIN `{PROJECT}.{ANALYTICS_DATASET}.targets_{pair}` targets
-        ON feat.interval_time = targets.interval_time
-    WHERE RAND() < {sample_pct / 100.0}
-    AND targets.target_bqx45_h15 IS NOT NULL
-    LIMIT 30000
-    """
-
-    try:
-        df = client.query(query).to_dataframe()
-        return df
-    except Exception as e:
-        print(f"    Error loading {table_name}: {e}")
-        return None
-
-
 def run_shap_on_batch(df: pd.DataFrame, table_name: str, horizon: int = 15) -> dict:
     """Run SHAP analysis on a batch of features."""
     target_col = f'target_bqx45_h{horizon}'
@@ -162,8 +142,11 @@ def run_shap_on_batch(df: pd.DataFrame, table_name: str, horizon: int = 15) -> d
     return feature_importance
 
 
-def load_all_features_mega_query(client, pair: str, tables: dict, sample_pct: float = 3.0, max_features: int = 8000) -> pd.DataFrame:
-    """Load ALL features using a mega JOIN query."""
+def load_all_features_mega_query(client, pair: str, tables: dict, sample_pct: float = SHARED_SAMPLE_PCT,
+                                 max_features: int = 8000, threshold: int = None) -> pd.DataFrame:
+    """Load ALL features using a mega JOIN query (sampled by interval hash < threshold)."""
+    if threshold is None:
+        threshold = pct_threshold(sample_pct)
     print(f"\n=== Loading ALL {max_features}+ features via mega JOIN ===")
 
     # Group tables - we'll select specific columns from each
@@ -185,6 +168,7 @@ def load_all_features_mega_query(client, pair: str, tables: dict, sample_pct: fl
         else:
             join_parts.append(
                 f"LEFT JOIN `{info['table_id']}` {alias} ON {base_table[2]}.interval_time = {alias}.interval_time"
+                f" AND {sample_predicate_sql(f'{alias}.interval_time', threshold)}"
             )
             for col in info['columns'][:300]:
                 if total_cols < max_features:
@@ -206,13 +190,12 @@ def load_all_features_mega_query(client, pair: str, tables: dict, sample_pct: fl
     {' '.join(join_parts)}
     JOIN `{PROJECT}.{ANALYTICS_DATASET}.targets_{pair}` targets
         ON {base_table[2]}.interval_time = targets.interval_time
-    WHERE RAND() < {sample_pct / 100.0}
+    WHERE {sample_predicate_sql(f'{base_table[2]}.interval_time', threshold)}
     AND targets.target_bqx45_h15 IS NOT NULL
-    LIMIT 50000
     """
 
     print(f"  Total features to analyze: {total_cols:,}")
-    print(f"  Sample size: ~{int(50000 * sample_pct / 100):,} rows")
+    print(f"  Sample threshold: {threshold:,} ({threshold / HASH_MOD:.3%} of intervals)")
     print(f"  Executing mega query...")
 
     df = client.query(query).to_dataframe()
@@ -223,7 +206,7 @@ def load_all_features_mega_query(client, pair: str, tables: dict, sample_pct: fl
 
 def main():
     pair = sys.argv[1] if len(sys.argv) > 1 else "eurusd"
-    sample_pct = float(sys.argv[2]) if len(sys.argv) > 2 else 3.0
+    sample_pct = float(sys.argv[2]) if len(sys.argv) > 2 else SHARED_SAMPLE_PCT
     max_features = int(sys.argv[3]) if len(sys.argv) > 3 else 8000
 
     print("=" * 80)
@@ -241,8 +224,16 @@ def main():
         print("ERROR: No feature tables found!")
         return
 
-    # Step 2: Load all features via mega query
-    df = load_all_features_mega_query(client, pair, all_tables, sample_pct, max_features)
+    # Step 2: Draw (or reuse) the interval sample, then load all features via mega query
+    keys, sample_meta = get_or_build_sample(
+        client, pair, SAMPLE_NAME, rows=SAMPLE_ROWS, pct=sample_pct,
+        target_table=f"{PROJECT}.{ANALYTICS_DATASET}.targets_{pair}"
+    )
+    df = load_all_features_mega_query(client, pair, all_tables, sample_pct, max_features,
+                                      threshold=sample_meta['threshold'])
+    # Semi-join on the saved keys: exact alignment even if targets were rebuilt since
+    df = df[pd.to_datetime(df['interval_time'], utc=True).isin(keys)].reset_index(drop=True)
+    print(f"  Aligned to sample: {len(df):,} rows")
 
     # Step 3: Run SHAP analysis
     target_cols = [c for c in df.columns if c.startswith('target_')]
@@ -319,6 +310,7 @@ def main():
     output = {
         "pair": pair,
         "sample_pct": sample_pct,
+        "sample": sample_meta,
         "total_features_tested": len(feature_cols),
         "total_tables": len(all_tables),
         "timestamp": datetime.now().isoformat(),
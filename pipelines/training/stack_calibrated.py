@@ -27,6 +27,8 @@ from sklearn.metrics import accuracy_score, roc_auc_score
 import warnings
 warnings.filterwarnings('ignore')
 
+from fold_engine import walk_forward_bounds, valid_rows, fold_size
+
 PROJECT = "bqx-ml"
 FEATURES_DATASET = "bqx_ml_v3_features_v2"
 ANALYTICS_DATASET = "bqx_ml_v3_analytics_v2"
@@ -96,28 +98,11 @@ def create_walk_forward_splits(df: pd.DataFrame, n_folds: int = 5, embargo: int
     Train [0..T1] → Val (T1+embargo..T2)
     Train [0..T2] → Val (T2+embargo..T3)
     ...
-    """
-    df = df.sort_values('interval_time').reset_index(drop=True)
-    n = len(df)
-    fold_size = n // (n_folds + 1)
-
-    splits = []
-    for i in range(n_folds):
-        train_end = fold_size * (i + 1)
-        val_start = train_end + embargo
-        val_end = fold_size * (i + 2)
-
-        if val_end > n:
-            val_end = n
-        if val_start >= val_end:
-            continue
 
-        splits.append({
-            'train_idx': list(range(0, train_end)),
-            'val_idx': list(range(val_start, val_end))
-        })
-
-    return splits
+    Folds are slice bounds over the interval_time-sorted rows (see fold_engine),
+    so indexing with them yields views instead of copies.
+    """
+    return walk_forward_bounds(len(df), n_folds=n_folds, embargo=embargo)
 
 
 def calibrate_probabilities(y_true, y_prob, method='platt'):
@@ -219,6 +204,8 @@ def train_calibrated_stack(df, feature_cols, target_col, n_folds=5, verbose=True
     - Calibrated meta-learner
     - Base model ensemble
     - Performance metrics
+
+    Score new rows with ensemble_kernel.EnsembleKernel.from_stack(results, feature_cols).
     """
     target_series = df[target_col]
     y = (target_series > 0).astype(int).values
@@ -243,23 +230,20 @@ def train_calibrated_stack(df, feature_cols, target_col, n_folds=5, verbose=True
     oof_mask = np.zeros(len(df), dtype=bool)
 
     regime_features_oof = []
+    base_models = {}
 
-    for fold_idx, split in enumerate(splits):
-        train_idx = split['train_idx']
-        val_idx = split['val_idx']
-
-        X_train, X_val = X[train_idx], X[val_idx]
-        y_train, y_val = y[train_idx], y[val_idx]
+    # Handle NaN (one row mask for all folds)
+    row_ok = ~(np.isnan(X).any(axis=1) | np.isnan(y))
 
-        # Handle NaN
-        train_mask = ~(np.isnan(X_train).any(axis=1) | np.isnan(y_train))
-        val_mask = ~(np.isnan(X_val).any(axis=1) | np.isnan(y_val))
+    for fold_idx, split in enumerate(splits):
+        train_rows = valid_rows(split['train_idx'], row_ok)
+        val_rows = valid_rows(split['val_idx'], row_ok)
 
-        X_train_clean = X_train[train_mask]
-        y_train_clean = y_train[train_mask]
-        X_val_clean = X_val[val_mask]
+        X_train_clean = X[train_rows]
+        y_train_clean = y[train_rows]
+        X_val_clean = X[val_rows]
 
-        if len(X_train_clean) < 1000 or len(X_val_clean) < 100:
+        if fold_size(train_rows) < 1000 or fold_size(val_rows) < 100:
             continue
 
         # Train base models
@@ -268,17 +252,18 @@ def train_calibrated_stack(df, feature_cols, target_col, n_folds=5, verbose=True
         )
 
         # Store OOF predictions (3 models after EA-001)
-        val_idx_clean = [val_idx[i] for i, m in enumerate(val_mask) if m]
-        for i, idx in enumerate(val_idx_clean):
-            oof_lgb[idx] = base_results['lightgbm']['prob'][i]
-            oof_xgb[idx] = base_results['xgboost']['prob'][i]
-            oof_cb[idx] = base_results['catboost']['prob'][i]
-            oof_y[idx] = y[idx]
-            oof_mask[idx] = True
+        oof_lgb[val_rows] = base_results['lightgbm']['prob']
+        oof_xgb[val_rows] = base_results['xgboost']['prob']
+        oof_cb[val_rows] = base_results['catboost']['prob']
+        oof_y[val_rows] = y[val_rows]
+        oof_mask[val_rows] = True
 
         # Store regime features for this fold
         if regime_df is not None:
-            regime_features_oof.append(regime_df.iloc[val_idx_clean].values)
+            regime_features_oof.append(regime_df.iloc[val_rows].values)
+
+        # Keep the latest fold's models (most training data) for serving / EnsembleKernel
+        base_models = {name: res['model'] for name, res in base_results.items()}
 
         if verbose:
             print(f"    Fold {fold_idx+1}: train={len(X_train_clean)}, val={len(X_val_clean)}")
@@ -308,10 +293,12 @@ def train_calibrated_stack(df, feature_cols, target_col, n_folds=5, verbose=True
     meta_X = np.column_stack([lgb_cal, xgb_cal, cb_cal])
 
     # Add regime features if available
+    regime_cols = []
     if regime_df is not None and len(regime_features_oof) > 0:
         regime_oof = np.vstack(regime_features_oof)
         if len(regime_oof) == len(meta_X):
             meta_X = np.hstack([meta_X, regime_oof])
+            regime_cols = list(regime_df.columns)
             if verbose:
                 print(f"  Added {regime_oof.shape[1]} regime features to meta-learner")
 
@@ -362,6 +349,8 @@ def train_calibrated_stack(df, feature_cols, target_col, n_folds=5, verbose=True
             # ElasticNet removed per EA-001
         },
         'meta_model': meta_model,
+        'base_models': base_models,
+        'regime_features': regime_cols,
         'ensemble_version': '3-model (EA-001 applied)'
     }
 
@@ -20,11 +20,12 @@ import lightgbm as lgb
 import xgboost as xgb
 from catboost import CatBoostRegressor
 from sklearn.linear_model import Ridge, LogisticRegression
-from sklearn.model_selection import KFold
 from sklearn.metrics import mean_squared_error
 import warnings
 warnings.filterwarnings('ignore')
 
+from fold_engine import kfold_indices
+
 PROJECT = "bqx-ml"
 FEATURES_DATASET = "bqx_ml_v3_features_v2"
 ANALYTICS_DATASET = "bqx_ml_v3_analytics_v2"
@@ -107,15 +108,19 @@ def calculate_directional_accuracy(y_true, y_pred):
     return np.mean(np.sign(y_true) == np.sign(y_pred))
 
 
-def get_oof_predictions(X, y, n_folds=5):
-    """Generate out-of-fold predictions from base models."""
-    kf = KFold(n_splits=n_folds, shuffle=True, random_state=42)
+def get_oof_predictions(X, y, n_folds=5, embargo=0):
+    """
+    Generate out-of-fold predictions from base models.
 
+    Folds match KFold(shuffle=True, random_state=42); embargo > 0 purges
+    training rows adjacent to each fold's validation rows (see fold_engine).
+    """
     oof_lgb = np.zeros(len(X))
     oof_xgb = np.zeros(len(X))
     oof_cb = np.zeros(len(X))
 
-    for fold, (train_idx, val_idx) in enumerate(kf.split(X)):
+    for fold, split in enumerate(kfold_indices(len(X), n_folds, shuffle=True, seed=42, embargo=embargo)):
+        train_idx, val_idx = split['train_idx'], split['val_idx']
         X_tr, X_vl = X[train_idx], X[val_idx]
         y_tr, y_vl = y[train_idx], y[val_idx]
 
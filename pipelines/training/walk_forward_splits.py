@@ -15,6 +15,8 @@ import json
 from datetime import datetime, timedelta
 from google.cloud import bigquery
 
+from fold_engine import time_bounds
+
 PROJECT = "bqx-ml"
 ANALYTICS_DATASET = "bqx_ml_v3_analytics_v2"
 
@@ -113,6 +115,24 @@ def create_walk_forward_splits(
     return splits
 
 
+def split_slices(times, split: dict) -> dict:
+    """
+    Row slices of one date split over a local, interval_time-sorted frame.
+
+    Lets a split be applied to data already in memory (e.g. the merged
+    parquet) without a BigQuery query per window or per-row index lists:
+
+        bounds = split_slices(df['interval_time'].values, split)
+        train_df = df.iloc[bounds['train']]
+
+    Returns: {'train': slice, 'validation': slice, 'test': slice}
+    """
+    return {
+        window: time_bounds(times, split[window]['start'], split[window]['end'])
+        for window in ('train', 'validation', 'test')
+    }
+
+
 def generate_split_queries(pair: str, splits: list) -> dict:
     """Generate BigQuery queries for each split."""
     queries = {}
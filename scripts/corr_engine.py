@@ -0,0 +1,265 @@
+#!/usr/bin/env python3
+"""
+Local CORR Engine - Rolling Pair × ETF Correlations in One O(n) Pass
+
+generate_corr_tables.py runs one CREATE OR REPLACE TABLE per
+(variant, pair, asset): 28 pairs × 8 assets × 2 variants = 448 BigQuery
+jobs. Each evaluates CORR / COVAR_POP / STDDEV window functions for 7
+ROWS frames (45 … 2880 intervals) - 35 window aggregates per row - and
+re-reads its base pair table and asset table.
+
+This engine, per variant:
+1. Loads all 28 base pair series and the 8 asset series once onto one
+   aligned time grid (pairs from the per-pair checkpoints, assets from
+   {checkpoint_root}/assets/{asset}_{variant}.parquet)
+2. Groups (pair, asset) tables by output row set (pair ∪ asset intervals
+   within the window): pairs sharing a presence pattern × assets sharing a
+   presence pattern form one (time × pairs) × (time × assets) block
+3. rolling_kernels.rolling_pearson computes, for each window, the frame
+   sums of n, x, y, xy, x², y² over pairwise-complete rows for every
+   pair × asset at once; corr / cov / std / beta follow as array expressions
+4. Streams each corr_etf_{variant}_{pair}_{asset} table to Parquet in
+   ROW_BLOCK-row slices (each slice recomputed with a max-window halo), so
+   memory is bounded by the slice, not the history; pairs run in parallel
+   threads (NumPy and Parquet writes release the GIL)
+
+Window sums are O(n) regardless of window length and do not drift (see
+rolling_kernels: chunked sums around per-chunk references).
+
+Semantics follow generate_corr_sql: LEFT JOINs onto the interval union,
+NULL-skipping aggregates over each ROWS frame, CORR / COVAR_POP over
+pairs with both values (CORR NULL below 2 pairs, NaN on zero variance),
+STDDEV (sample) over each side's own values, beta =
+SAFE_DIVIDE(COVAR_POP, NULLIF(STDDEV(asset)², 0)). Checkpoints are
+expected to hold one row per interval.
+
+Usage:
+    from corr_engine import build_corr_tables_local
+    results = build_corr_tables_local('idx', checkpoint_root, output_root)
+"""
+
+import os
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from generate_corr_tables import PAIRS, ASSETS, WINDOWS, DATE_START, DATE_END, corr_table_name
+from local_tables import (
+    read_series, load_pair_series, align_series, window_mask, constant_column, VALUE_COLUMNS,
+    CHECKPOINT_ROOT, LOCAL_OUTPUT_ROOT
+)
+from rolling_kernels import rolling_pearson
+
+ASSET_DIR = "assets"  # {checkpoint_root}/assets/{asset}_{variant}.parquet
+
+# Output rows per slice (peak memory per worker ~ a dozen float64 arrays of
+# (ROW_BLOCK + max window) × pairs × assets)
+ROW_BLOCK = 262144
+
+STATS = ('corr', 'cov', 'std_pair', 'std_asset', 'beta')
+
+
+def output_schema() -> pa.Schema:
+    fields = [pa.field('interval_time', pa.timestamp('ns', tz='UTC')),
+              pa.field('pair', pa.string()),
+              pa.field('asset', pa.string()),
+              pa.field('pair_value', pa.float64()),
+              pa.field('asset_value', pa.float64())]
+    fields += [pa.field(f"{stat}_{w}", pa.float64()) for w in WINDOWS for stat in STATS]
+    return pa.schema(fields)
+
+
+SCHEMA = output_schema()
+
+
+# ============================================================================
+# KERNEL
+# ============================================================================
+
+def pearson_block(x: np.ndarray, y: np.ndarray, window: int) -> dict:
+    """
+    corr_etf_* window statistics of every pair column against every asset column.
+
+    Args:
+        x: (rows × pairs) float64, NaN = NULL
+        y: (rows × assets) float64, NaN = NULL
+        window: ROWS frame length
+
+    Returns:
+        {'corr', 'cov': (rows × pairs × assets), 'std_pair': (rows × pairs),
+         'std_asset': (rows × assets), 'beta': (rows × pairs × assets)}
+        with NaN for NULL, plus 'corr_nan' (rows × pairs × assets bool):
+        CORR results that are NaN rather than NULL (zero variance)
+    """
+    stats = rolling_pearson(x, y, window)
+    asset_var = (stats['std_y'] * stats['std_y'])[:, None, :]
+    with np.errstate(invalid='ignore', divide='ignore'):
+        beta = np.where(asset_var > 0, stats['cov'] / asset_var, np.nan)
+    return {'corr': stats['corr'], 'cov': stats['cov'], 'std_pair': stats['std_x'],
+            'std_asset': stats['std_y'], 'beta': beta, 'corr_nan': stats['corr_nan']}
+
+
+# ============================================================================
+# BUILD
+# ============================================================================
+
+def load_asset_series(asset: str, variant: str, checkpoint_root: str = CHECKPOINT_ROOT) -> tuple:
+    """
+    Read one {asset}_{variant} checkpoint.
+
+    Returns: (times int64 ns UTC, values float64), or None if not extracted
+    """
+    return read_series(os.path.join(checkpoint_root, ASSET_DIR, f"{asset}_{variant}.parquet"),
+                       VALUE_COLUMNS[variant])
+
+
+def group_blocks(present: np.ndarray, names: list, pairs: list, assets: list, in_window: np.ndarray) -> list:
+    """
+    Split pairs × assets into blocks sharing one output row set.
+
+    Pairs with the same presence pattern (inside the window) and assets with
+    the same pattern have identical pair ∪ asset rows.
+
+    Returns:
+        [(row index int64, [pairs], [assets])]
+    """
+    col = {name: j for j, name in enumerate(names)}
+
+    def _patterns(members):
+        groups = {}
+        for m in members:
+            groups.setdefault(np.packbits(present[:, col[m]] & in_window).tobytes(), []).append(m)
+        return list(groups.values())
+
+    blocks = []
+    for pair_group in _patterns(pairs):
+        for asset_group in _patterns(assets):
+            rows = (present[:, col[pair_group[0]]] | present[:, col[asset_group[0]]]) & in_window
+            blocks.append((np.flatnonzero(rows), pair_group, asset_group))
+    return blocks
+
+
+def _column(values: np.ndarray, nan_is_value: np.ndarray = None) -> pa.Array:
+    """float64 column with NaN as NULL, except where nan_is_value marks a real NaN."""
+    mask = np.isnan(values)
+    if nan_is_value is not None:
+        mask &= ~nan_is_value
+    return pa.array(values, type=pa.float64(), mask=mask)
+
+
+def build_pair_tables(variant: str, pair: str, assets: list, idx: np.ndarray, grid: np.ndarray,
+                      values: np.ndarray, names: list, output_root: str,
+                      row_block: int = ROW_BLOCK) -> list:
+    """
+    Stream corr_etf_{variant}_{pair}_{asset} for the given assets over one row set.
+
+    Returns:
+        List of result dicts (table, status, rows / error)
+    """
+    col = {name: j for j, name in enumerate(names)}
+    halo = max(WINDOWS) - 1
+    tables = [corr_table_name(variant, pair, asset) for asset in assets]
+    paths = [os.path.join(output_root, 'corr', f"{t}.parquet") for t in tables]
+    writers = []
+    try:
+        os.makedirs(os.path.join(output_root, 'corr'), exist_ok=True)
+        writers = [pq.ParquetWriter(f"{p}.tmp", SCHEMA, compression='snappy') for p in paths]
+        x_all = values[:, [col[pair]]]
+        y_all = values[:, [col[a] for a in assets]]
+
+        for start in range(0, len(idx), row_block):
+            stop = min(start + row_block, len(idx))
+            lead = min(start, halo)
+            rows = idx[start - lead:stop]
+            x, y = x_all[rows], y_all[rows]
+            stats = {w: pearson_block(x, y, w) for w in WINDOWS}
+            times = pa.array(grid[rows[lead:]], type=pa.int64()).cast(SCHEMA.field('interval_time').type)
+
+            for k, asset in enumerate(assets):
+                arrays = [times, constant_column(pair, len(times)), constant_column(asset, len(times)),
+                          _column(x[lead:, 0]), _column(y[lead:, k])]
+                for w in WINDOWS:
+                    s = stats[w]
+                    arrays += [_column(s['corr'][lead:, 0, k], s['corr_nan'][lead:, 0, k]),
+                               _column(s['cov'][lead:, 0, k]),
+                               _column(s['std_pair'][lead:, 0]),
+                               _column(s['std_asset'][lead:, k]),
+                               _column(s['beta'][lead:, 0, k])]
+                writers[k].write_table(pa.Table.from_arrays(arrays, schema=SCHEMA))
+
+        for writer, path in zip(writers, paths):
+            writer.close()
+            os.replace(f"{path}.tmp", path)
+        return [{'table': t, 'status': 'SUCCESS', 'rows': len(idx)} for t in tables]
+    except (OSError, pa.ArrowException) as e:
+        return [{'table': t, 'status': 'FAILED', 'error': str(e)[:200]} for t in tables]
+    finally:
+        for writer, path in zip(writers, paths):
+            writer.close()
+            if os.path.exists(f"{path}.tmp"):
+                os.remove(f"{path}.tmp")
+
+
+def build_corr_tables_local(variant: str, checkpoint_root: str = CHECKPOINT_ROOT,
+                            output_root: str = LOCAL_OUTPUT_ROOT, pairs: list = None,
+                            assets: list = None, workers: int = None,
+                            row_block: int = ROW_BLOCK) -> list:
+    """
+    Build every corr_etf_{variant}_{pair}_{asset} table from one load of the base series.
+
+    Args:
+        variant: 'idx' or 'bqx'
+        checkpoint_root: Root with one checkpoint directory per pair (+ assets/)
+        output_root: Tables are written to output_root/corr/{table_name}.parquet
+        pairs: Subset of PAIRS (default: all)
+        assets: Subset of ASSETS (default: all)
+        workers: Pairs computed in parallel (default: CPU count)
+        row_block: Output rows per streamed slice
+
+    Returns:
+        List of result dicts (table, status, rows / error) like generate_corr_table
+    """
+    pairs = pairs or PAIRS
+    assets = assets or ASSETS
+    workers = workers or os.cpu_count() or 1
+
+    series, missing = {}, {}
+    for pair in pairs:
+        loaded = load_pair_series(pair, variant, checkpoint_root)
+        if loaded is None:
+            missing[pair] = f"base_{variant}_{pair}"
+        else:
+            series[pair] = loaded
+    for asset in assets:
+        loaded = load_asset_series(asset, variant, checkpoint_root)
+        if loaded is None:
+            missing[asset] = f"{ASSET_DIR}/{asset}_{variant}"
+        else:
+            series[asset] = loaded
+    print(f"  Loaded {len(series)} base_{variant}_* / asset series once "
+          f"({sum(len(s[0]) for s in series.values()):,} rows)", flush=True)
+
+    results = []
+    for pair in pairs:
+        for asset in assets:
+            absent = [missing[m] for m in (pair, asset) if m in missing]
+            if absent:
+                results.append({'table': corr_table_name(variant, pair, asset), 'status': 'FAILED',
+                                'error': f"missing checkpoint {absent[0]}"})
+    pairs = [p for p in pairs if p not in missing]
+    assets = [a for a in assets if a not in missing]
+    if not pairs or not assets:
+        return results
+
+    grid, values, present, names = align_series(series)
+    blocks = group_blocks(present, names, pairs, assets, window_mask(grid, DATE_START, DATE_END))
+    del present
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(build_pair_tables, variant, pair, block_assets, idx, grid, values,
+                                   names, output_root, row_block)
+                   for idx, block_pairs, block_assets in blocks for pair in block_pairs]
+        for future in futures:
+            results += future.result()
+    return results
@@ -0,0 +1,219 @@
+#!/usr/bin/env python3
+"""
+Local COV Engine - All Pairwise Spread/Ratio Tables from One Aligned Matrix
+
+generate_cov_tables.py runs one CREATE OR REPLACE TABLE per
+(variant, source_variant, pair1, pair2): 378 pair combinations × 2 variants
+× 2 source variants = 1,512 BigQuery jobs. Every job re-reads two base_*
+tables and rebuilds their interval union, and the agg/align variants are
+the very same query under two table names.
+
+This engine, per source variant:
+1. Loads all 28 base pair series once (from the extracted checkpoints) into
+   one aligned (time × pair) float64 matrix with a row-presence mask
+2. Groups the pair combinations by output row set (pair1 ∪ pair2 intervals
+   within the window); combinations whose pairs share presence patterns
+   share one row index, timestamps and month labels
+3. Computes spread, ratio, sign agreement and the w45/w180 rolling stats
+   for COV_BLOCK combinations at a time as (rows × block) arrays
+4. Writes each cov_{variant}[_idx]_{pair1}_{pair2} table as month-partitioned
+   Parquet (computed once, written for both agg and align)
+
+Peak memory is the aligned matrix plus ~12 float64 arrays of rows × COV_BLOCK,
+independent of how many combinations are built.
+
+Semantics follow generate_cov_sql: LEFT JOINs onto the interval union,
+SAFE_DIVIDE ratio (NULL on a zero divisor), sign_agreement 0 when either
+side is NULL, ROWS frames over the combination's own rows, NULL-skipping
+AVG / STDDEV (sample), NULL z-score → mean_reversion_signal 0. Checkpoints
+are expected to hold one row per interval.
+
+Usage:
+    from cov_engine import build_cov_tables_local
+    results = build_cov_tables_local('bqx', checkpoint_root, output_root)
+"""
+
+import os
+import itertools
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+from generate_cov_tables import PAIRS, VARIANTS, DATE_START, DATE_END, cov_table_name
+from local_tables import (
+    load_pair_series, align_series, window_mask, constant_column, month_labels, write_partitioned,
+    CHECKPOINT_ROOT, LOCAL_OUTPUT_ROOT
+)
+
+# Pair combinations computed together (bounds peak memory: ~12 float64
+# arrays of rows × COV_BLOCK on top of the aligned matrix)
+COV_BLOCK = 8
+
+ZSCORE_THRESHOLD = 2  # |spread_zscore| above this → mean_reversion_signal
+
+SCHEMA = pa.schema([
+    pa.field('interval_time', pa.timestamp('ns', tz='UTC')),
+    pa.field('pair1', pa.string()),
+    pa.field('pair2', pa.string()),
+    pa.field('val1', pa.float64()),
+    pa.field('val2', pa.float64()),
+    pa.field('spread', pa.float64()),
+    pa.field('ratio', pa.float64()),
+    pa.field('spread_ma_45', pa.float64()),
+    pa.field('spread_ma_180', pa.float64()),
+    pa.field('spread_std_45', pa.float64()),
+    pa.field('spread_zscore', pa.float64()),
+    pa.field('sign_agreement', pa.int64()),
+    pa.field('rolling_agreement_45', pa.float64()),
+    pa.field('mean_reversion_signal', pa.int64())
+])
+
+
+def group_combinations(present: np.ndarray, pairs: list, combinations: list, in_window: np.ndarray) -> list:
+    """
+    Group pair combinations that share an output row set.
+
+    Pairs are first keyed by their own presence pattern inside the window
+    (28 patterns at most); a combination's rows are pair1 ∪ pair2, so
+    combinations over the same two patterns have identical rows.
+
+    Returns:
+        [(row index int64, [(pair1, pair2)...])]
+    """
+    col = {p: j for j, p in enumerate(pairs)}
+    pattern = {}
+    for pair in {p for c in combinations for p in c}:
+        rows = present[:, col[pair]] & in_window
+        pattern[pair] = np.packbits(rows).tobytes()
+
+    groups = {}
+    for pair1, pair2 in combinations:
+        key = tuple(sorted((pattern[pair1], pattern[pair2])))
+        groups.setdefault(key, []).append((pair1, pair2))
+
+    out = []
+    for members in groups.values():
+        pair1, pair2 = members[0]
+        rows = (present[:, col[pair1]] | present[:, col[pair2]]) & in_window
+        out.append((np.flatnonzero(rows), members))
+    return out
+
+
+def _rolling(frame: pd.DataFrame, window: int):
+    return frame.rolling(window, min_periods=1)
+
+
+def pair_block(val1: np.ndarray, val2: np.ndarray) -> dict:
+    """
+    cov_* columns for a block of combinations over their shared rows.
+
+    Args:
+        val1, val2: (rows × block) float64, NaN = NULL / no row
+
+    Returns:
+        {column: (rows × block) array} for every computed SCHEMA column
+    """
+    spread = val1 - val2
+    with np.errstate(divide='ignore', invalid='ignore'):
+        ratio = np.where(val2 == 0, np.nan, val1 / val2)
+    sign_agreement = (np.sign(val1) == np.sign(val2)).astype(np.int64)  # NULL side → 0
+
+    spreads = pd.DataFrame(spread)
+    w45, w180 = _rolling(spreads, 45), _rolling(spreads, 180)
+    ma_180, std_180 = w180.mean().to_numpy(), w180.std().to_numpy()
+    with np.errstate(divide='ignore', invalid='ignore'):
+        zscore = np.where(std_180 == 0, np.nan, (spread - ma_180) / std_180)
+
+    return {
+        'val1': val1,
+        'val2': val2,
+        'spread': spread,
+        'ratio': ratio,
+        'spread_ma_45': w45.mean().to_numpy(),
+        'spread_ma_180': ma_180,
+        'spread_std_45': w45.std().to_numpy(),
+        'spread_zscore': zscore,
+        'sign_agreement': sign_agreement,
+        'rolling_agreement_45': _rolling(pd.DataFrame(sign_agreement), 45).mean().to_numpy(),
+        'mean_reversion_signal': (np.abs(zscore) > ZSCORE_THRESHOLD).astype(np.int64)
+    }
+
+
+def combination_tables(values: np.ndarray, present: np.ndarray, pairs: list, combinations: list,
+                       grid: np.ndarray, block: int = COV_BLOCK):
+    """
+    Yield ((pair1, pair2), Arrow table, month labels) for every combination.
+
+    Combinations sharing a row set are computed COV_BLOCK at a time, so
+    each rolling window is one 2-D pass per block.
+    """
+    col = {p: j for j, p in enumerate(pairs)}
+    for idx, members in group_combinations(present, pairs, combinations, window_mask(grid, DATE_START, DATE_END)):
+        times = pa.array(grid[idx], type=pa.int64()).cast(SCHEMA.field('interval_time').type)
+        month = month_labels(grid[idx])
+        for start in range(0, len(members), block):
+            batch = members[start:start + block]
+            val1 = values[np.ix_(idx, [col[p1] for p1, _ in batch])]
+            val2 = values[np.ix_(idx, [col[p2] for _, p2 in batch])]
+            stats = pair_block(val1, val2)
+            for j, (pair1, pair2) in enumerate(batch):
+                arrays = [times, constant_column(pair1, len(idx)), constant_column(pair2, len(idx))]
+                arrays += [pa.array(stats[f.name][:, j], type=f.type, from_pandas=True)
+                           for f in SCHEMA if f.name in stats]
+                yield (pair1, pair2), pa.Table.from_arrays(arrays, schema=SCHEMA), month
+
+
+def build_cov_tables_local(source_variant: str, checkpoint_root: str = CHECKPOINT_ROOT,
+                           output_root: str = LOCAL_OUTPUT_ROOT, combinations: list = None,
+                           variants: list = None) -> list:
+    """
+    Build every cov_{variant}[_idx]_* table of a source variant from one load of the base series.
+
+    Args:
+        source_variant: 'bqx' or 'idx'
+        checkpoint_root: Root with one checkpoint directory per pair
+        output_root: Tables are written to output_root/cov/{table_name}/
+        combinations: Subset of (pair1, pair2) combinations (default: all 378)
+        variants: Subset of VARIANTS (default: all)
+
+    Returns:
+        List of result dicts (table, status, rows / error) like generate_cov_table
+    """
+    combinations = combinations or list(itertools.combinations(PAIRS, 2))
+    variants = variants or VARIANTS
+    needed = sorted({p for c in combinations for p in c})
+
+    series, missing = {}, []
+    for pair in needed:
+        loaded = load_pair_series(pair, source_variant, checkpoint_root)
+        if loaded is None:
+            missing.append(pair)
+        else:
+            series[pair] = loaded
+    print(f"  Loaded {len(series)} base_{source_variant}_* series once "
+          f"({sum(len(s[0]) for s in series.values()):,} rows)", flush=True)
+
+    results = []
+    runnable = []
+    for combination in combinations:
+        absent = [p for p in combination if p in missing]
+        if absent:
+            for variant in variants:
+                results.append({'table': cov_table_name(variant, source_variant, *combination),
+                                'status': 'FAILED',
+                                'error': f"missing checkpoint base_{source_variant}_{absent[0]}"})
+        else:
+            runnable.append(combination)
+    if not runnable:
+        return results
+
+    grid, values, present, pairs = align_series(series)
+    for (pair1, pair2), table, month in combination_tables(values, present, pairs, runnable, grid):
+        for variant in variants:
+            table_name = cov_table_name(variant, source_variant, pair1, pair2)
+            try:
+                write_partitioned(table, os.path.join(output_root, 'cov', table_name), month)
+                results.append({'table': table_name, 'status': 'SUCCESS', 'rows': table.num_rows})
+            except (OSError, pa.ArrowException) as e:
+                results.append({'table': table_name, 'status': 'FAILED', 'error': str(e)[:200]})
+    return results
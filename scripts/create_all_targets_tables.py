@@ -6,8 +6,15 @@ Mandate: /mandate/BQX_TARGET_FORMULA_MANDATE.md
 Formula: target_bqx{window}_h{horizon} = LEAD(bqx_{window}, horizon)
 
 Creates 49 target columns per pair (7 BQX windows × 7 prediction horizons)
+
+--local computes the targets from the extracted base_bqx checkpoints and
+writes targets.parquet into each pair's checkpoint directory, all pairs in
+parallel (see target_engine.py). --gap-policy lead reproduces the SQL's
+row-offset LEAD; the default 'time' never LEADs across a missing interval.
 """
 
+import argparse
+import os
 import subprocess
 import sys
 import time
@@ -102,15 +109,59 @@ def create_targets_table(pair: str) -> dict:
     return {"pair": pair, "status": "SUCCESS", "row_count": row_count}
 
 
+def run_local(args):
+    """Build targets.parquet checkpoints for all pairs with target_engine."""
+    from target_engine import build_all_targets_local, CHECKPOINT_ROOT, TARGETS_FILE
+
+    checkpoint_root = args.checkpoint_dir or CHECKPOINT_ROOT
+    if args.force:
+        pairs = [p for p in ALL_PAIRS if not (args.skip_eurusd and p == 'eurusd')]
+    else:
+        pairs = [p for p in ALL_PAIRS if not os.path.exists(os.path.join(checkpoint_root, p, TARGETS_FILE))]
+    print(f"\nPairs needing {TARGETS_FILE}: {len(pairs)} (gap policy: {args.gap_policy})")
+    if not pairs:
+        print("\nAll pairs already have targets checkpoints! Use --force to rebuild.")
+        return
+
+    start_time = time.time()
+    results = build_all_targets_local(pairs, checkpoint_root, args.gap_policy, args.workers)
+    for result in sorted(results, key=lambda r: r["pair"]):
+        if result["status"] == "SUCCESS":
+            crossed = sum(result["crossed_gaps"].values())
+            print(f"  ✅ {result['pair']}: {result['row_count']:,} rows "
+                  f"({crossed:,} targets a plain LEAD would take across a gap)")
+        else:
+            print(f"  ❌ {result['pair']}: {result['error']}")
+
+    failed = [r for r in results if r["status"] == "FAILED"]
+    print(f"\nLocal targets: {len(results) - len(failed)}/{len(results)} pairs in {time.time() - start_time:.1f}s")
+    if failed:
+        sys.exit(1)
+
+
 def main():
     print("=" * 60)
     print("BQX ML V3 - Create Targets Tables for All Pairs")
     print("Following mandate: /mandate/BQX_TARGET_FORMULA_MANDATE.md")
     print("=" * 60)
 
+    parser = argparse.ArgumentParser(description='Create targets tables for all pairs')
+    parser.add_argument('--force', '-f', action='store_true', help='Rebuild existing targets tables')
+    parser.add_argument('--skip-eurusd', action='store_true', help='With --force: leave eurusd untouched')
+    parser.add_argument('--local', action='store_true',
+                        help='Compute from base_bqx checkpoints into <checkpoint-dir>/<pair>/targets.parquet')
+    parser.add_argument('--checkpoint-dir', default=None, help='Checkpoint root with one directory per pair (--local)')
+    parser.add_argument('--gap-policy', choices=['time', 'lead'], default='time',
+                        help='--local: time = NULL when the interval h minutes ahead is missing; lead = SQL row offset')
+    parser.add_argument('--workers', type=int, default=None, help='--local: parallel pair processes (default: cores)')
+    args = parser.parse_args()
+
+    if args.local:
+        return run_local(args)
+
     # Check command line arguments for force rebuild
-    force_rebuild = "--force" in sys.argv or "-f" in sys.argv
-    skip_eurusd = "--skip-eurusd" in sys.argv
+    force_rebuild = args.force
+    skip_eurusd = args.skip_eurusd
 
     # Check which pairs already have targets tables
     check_cmd = [
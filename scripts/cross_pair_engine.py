@@ -0,0 +1,542 @@
+#!/usr/bin/env python3
+"""
+Local Cross-Pair Engine - CSI, VAR and MKT Tables in One Pass per Source
+
+generate_csi_tables.py, generate_mkt_tables.py, generate_var_lag.py and
+generate_var_usd.py all follow the same shape: UNION ALL the same feature
+table across a set of pairs, then GROUP BY interval_time. Every
+(feature_type, currency, variant) and mkt/var table is its own BigQuery
+job, so each agg_{pair} table is scanned 8 times for CSI, once more for
+mkt_dispersion and once more for var_agg_*_usd, per variant.
+
+This engine, per source family ({feature_type}[_bqx]_{pair}, and the
+lag[_bqx]_{pair}_45 tables behind var_lag):
+1. Reads each pair's checkpoint once, streaming in interval_time order and
+   projected to the columns some output needs
+2. Assembles blocks of an aligned (interval × pair × feature) tensor, with
+   an (interval × pair) row-presence mask
+3. Evaluates every output table fed by that family on each block: the 8
+   currencies' directional/absolute CSI averages, the var_* family stats
+   and the mkt_vol/dispersion/regime/sentiment aggregates
+4. Streams each table to Parquet, one row group per block
+
+Memory is bounded by BLOCK_ROWS intervals, not by history length, and the
+whole job is linear in the size of the source data.
+
+Semantics follow the SQL generators: an output row for every interval at
+which any of its pairs has a row, NULL-skipping AVG / STDDEV (sample) /
+VAR_POP / MAX / MIN / SUM, COUNT(DISTINCT pair) as the number of pairs with
+a row, CSI direction +1 for base / -1 for quote on directional columns,
+and CSI pairs without a source table skipped (mkt/var tables fail instead,
+as their SQL would). Checkpoints are expected to hold one row per interval.
+
+Usage:
+    from cross_pair_engine import build_cross_pair_tables_local
+    results = build_cross_pair_tables_local(checkpoint_root, output_root)
+
+    python3 cross_pair_engine.py [--only csi,mkt,var] [--checkpoint-dir DIR] [--output-dir DIR]
+"""
+
+import os
+import sys
+import argparse
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from generate_csi_tables import (
+    CURRENCY_PAIRS, FEATURE_TYPES, get_source_table_name, get_csi_table_name
+)
+from generate_mkt_tables import ALL_PAIRS, WINDOWS as MKT_WINDOWS
+from generate_var_lag import CURRENCY_PAIRS as LAG_FAMILY_PAIRS, TABLES_TO_CREATE, LAG_WINDOWS
+from generate_var_usd import (
+    USD_PAIRS, WINDOWS_AGG, WINDOWS_ALIGN, AGG_FEATURES, ALIGN_FEATURES
+)
+
+CHECKPOINT_ROOT = "/home/micha/bqx_ml_v3/data/features/checkpoints"
+LOCAL_OUTPUT_ROOT = "/home/micha/bqx_ml_v3/data/features/local"
+
+VARIANTS = ['idx', 'bqx']
+GROUPS = ['csi', 'mkt', 'var']
+
+# Source families: the CSI feature types plus the lag_{pair}_45 tables of var_lag
+LAG45_KIND = 'lag45'
+SOURCE_KINDS = list(FEATURE_TYPES) + [LAG45_KIND]
+
+# Columns never aggregated (generate_csi_sql excludes the same)
+META_COLUMNS = ('interval_time', 'pair', 'source_value')
+
+# Intervals per block (peak memory ~ BLOCK_ROWS × pairs × features × 8 bytes)
+BLOCK_ROWS = 16384
+
+# Output columns computed as integers; everything else is FLOAT64
+INT_OPS = ('pairs', 'count_pos', 'count_neg')
+
+
+# ============================================================================
+# OUTPUT SPECS
+# ============================================================================
+# A spec describes one output table:
+#   {'table', 'group', 'kind', 'variant', 'pairs', 'signs', 'const', 'columns'}
+# with columns = [(name, op, source_column, factor)] in output order.
+
+def source_table(kind: str, variant: str, pair: str) -> str:
+    """Source table (= checkpoint file stem) of a family for one pair."""
+    if kind == LAG45_KIND:
+        return f"lag_bqx_{pair}_45" if variant == 'bqx' else f"lag_{pair}_45"
+    return get_source_table_name(kind, pair, variant == 'bqx')
+
+
+def csi_specs(kind: str, variant: str, schemas: dict) -> list:
+    """csi_{kind}[_bqx]_{currency} specs for all currencies (as generate_csi_sql)."""
+    specs = []
+    directional = FEATURE_TYPES[kind]['directional_cols']
+    for currency, config in CURRENCY_PAIRS.items():
+        table = get_csi_table_name(kind, currency, variant == 'bqx')
+        members = [(p, 1.0) for p in config['base']] + [(p, -1.0) for p in config['quote']]
+        sample = members[0][0]
+        columns = [c for c in schemas.get(sample, {}) if c not in META_COLUMNS]
+        present = [(p, s) for p, s in members if p in schemas]
+        if not columns:
+            error = f"No feature columns found in {source_table(kind, variant, sample)}"
+        elif not present:
+            error = f"No source tables found for {kind} {currency}"
+        else:
+            error = None
+        specs.append({
+            'table': table, 'group': 'csi', 'kind': kind, 'variant': variant,
+            'pairs': [p for p, _ in present], 'signs': np.array([s for _, s in present]),
+            'const': {'currency': currency.upper()},
+            'columns': [(f"csi_{c}", 'avg_dir' if any(d in c for d in directional) else 'avg', c, 1.0)
+                        for c in columns],
+            'error': error
+        })
+    return specs
+
+
+def mkt_specs(kind: str, variant: str) -> list:
+    """mkt_vol / mkt_dispersion / mkt_regime / mkt_sentiment spec fed by `kind`."""
+    suffix = '_bqx' if variant == 'bqx' else ''
+    columns = [('pairs_count', 'pairs', None, 1.0)]
+    if kind == 'vol':
+        table = f"mkt_vol{suffix}"
+        for w in MKT_WINDOWS:
+            columns += [(f"mkt_vol_realized_{w}", 'avg', f"vol_realized_{w}", 1.0),
+                        (f"mkt_vol_atr_{w}", 'avg', f"vol_atr_{w}", 1.0),
+                        (f"mkt_vol_normalized_{w}", 'avg', f"vol_normalized_{w}", 1.0),
+                        (f"mkt_vol_dispersion_{w}", 'stddev', f"vol_realized_{w}", 1.0)]
+    elif kind == 'agg':
+        table = f"mkt_dispersion{suffix}"
+        for w in MKT_WINDOWS:
+            columns += [(f"mkt_dispersion_mean_{w}", 'range', f"agg_mean_{w}", 1.0),
+                        (f"mkt_dispersion_position_{w}", 'range', f"agg_position_{w}", 1.0),
+                        (f"mkt_spread_std_{w}", 'stddev', f"agg_mean_{w}", 1.0)]
+    elif kind == 'reg':
+        table = f"mkt_regime{suffix}"
+        columns += [('mkt_direction_45', 'avg', 'reg_direction_45', 1.0),
+                    ('mkt_direction_90', 'avg', 'reg_direction_90', 1.0),
+                    ('mkt_slope_45', 'avg', 'reg_slope_45', 1.0),
+                    ('mkt_slope_90', 'avg', 'reg_slope_90', 1.0),
+                    ('pairs_trending_up_45', 'count_pos', 'reg_direction_45', 1.0),
+                    ('pairs_trending_down_45', 'count_neg', 'reg_direction_45', 1.0)]
+    elif kind == 'mom':
+        table = f"mkt_sentiment{suffix}"
+        for w in MKT_WINDOWS:
+            columns += [(f"mkt_net_direction_{w}", 'sum_sign', f"mom_roc_{w}", 1.0),
+                        (f"mkt_avg_momentum_{w}", 'avg', f"mom_roc_{w}", 1.0),
+                        (f"mkt_avg_strength_{w}", 'avg', f"mom_strength_{w}", 1.0)]
+    else:
+        return []
+    return [{'table': table, 'group': 'mkt', 'kind': kind, 'variant': variant,
+             'pairs': list(ALL_PAIRS), 'signs': None, 'const': {'scope': 'MARKET'},
+             'columns': columns, 'error': None}]
+
+
+def var_specs(kind: str, variant: str) -> list:
+    """var_{agg,align}_{variant}_usd (generate_var_usd) and var_lag_* (generate_var_lag) specs."""
+    if kind in ('agg', 'align'):
+        features = AGG_FEATURES if kind == 'agg' else ALIGN_FEATURES
+        windows = WINDOWS_AGG if kind == 'agg' else WINDOWS_ALIGN
+        columns = [('pairs_in_family', 'pairs', None, 1.0)]
+        for w in windows:
+            for feat in features:
+                col = f"agg_{feat}_{w}" if kind == 'agg' else f"{feat}_{w}"
+                columns += [(f"var_{feat}_{w}", 'var_pop', col, 1.0),
+                            (f"avg_{feat}_{w}", 'avg', col, 1.0)]
+        return [{'table': f"var_{kind}_{variant}_usd", 'group': 'var', 'kind': kind,
+                 'variant': variant, 'pairs': list(USD_PAIRS), 'signs': None,
+                 'const': {'currency_family': 'USD'}, 'columns': columns, 'error': None}]
+
+    if kind == LAG45_KIND:
+        specs = []
+        for lag_variant, currency in TABLES_TO_CREATE:
+            if lag_variant != variant:
+                continue
+            columns = [('family_avg', 'avg', 'return_lag_45', 1.0),
+                       ('family_std', 'stddev', 'return_lag_45', 1.0),
+                       ('pair_count', 'pairs', None, 1.0)]
+            # Same rounded literal the SQL multiplies by
+            columns += [(f"family_lag_{lag}", 'avg', 'return_lag_45', float(f"{lag / 45.0:.4f}"))
+                        for lag in LAG_WINDOWS]
+            specs.append({'table': f"var_lag_{variant}_{currency.lower()}", 'group': 'var',
+                          'kind': kind, 'variant': variant, 'pairs': list(LAG_FAMILY_PAIRS[currency]),
+                          'signs': None, 'const': {'currency': currency}, 'columns': columns,
+                          'error': None})
+        return specs
+    return []
+
+
+def output_specs(kind: str, variant: str, schemas: dict, groups: list = None) -> list:
+    """
+    Every output table fed by one source family, validated against the checkpoint schemas.
+
+    Args:
+        kind: Feature type or LAG45_KIND
+        variant: 'idx' or 'bqx'
+        schemas: {pair: {column: is_numeric}} for pairs with a checkpoint
+        groups: Subset of GROUPS (default: all)
+
+    Returns:
+        List of specs; 'error' is set on specs that cannot be built
+    """
+    groups = groups or GROUPS
+    specs = []
+    if 'csi' in groups and kind in FEATURE_TYPES:
+        specs += csi_specs(kind, variant, schemas)
+    if 'mkt' in groups:
+        specs += mkt_specs(kind, variant)
+    if 'var' in groups:
+        specs += var_specs(kind, variant)
+
+    for spec in specs:
+        if spec['error']:
+            continue
+        for pair in spec['pairs']:
+            table = source_table(kind, variant, pair)
+            if pair not in schemas:
+                spec['error'] = f"missing checkpoint {table}"
+                break
+            bad = [c for _, op, c, _ in spec['columns']
+                   if op != 'pairs' and not schemas[pair].get(c, False)]
+            if bad:
+                reason = 'missing' if bad[0] not in schemas[pair] else 'non-numeric'
+                spec['error'] = f"{reason} column {bad[0]} in {table}"
+                break
+    return specs
+
+
+# ============================================================================
+# TENSOR BLOCKS
+# ============================================================================
+
+def _is_numeric(field: pa.Field) -> bool:
+    t = field.type
+    return pa.types.is_integer(t) or pa.types.is_floating(t) or pa.types.is_boolean(t) \
+        or pa.types.is_decimal(t)
+
+
+def read_schema(path: str) -> dict:
+    """{column: is_numeric} of one checkpoint, in file column order."""
+    return {f.name: _is_numeric(f) for f in pq.read_schema(path)}
+
+
+def _times_ns(column) -> np.ndarray:
+    times = pd.to_datetime(column.to_pandas(), utc=True).to_numpy(dtype='datetime64[ns]')
+    return times.astype(np.int64)
+
+
+def _to_matrix(batch, columns: list) -> np.ndarray:
+    """Columns of an Arrow batch/table as one float64 (rows × columns) array, NULL → NaN."""
+    out = np.empty((batch.num_rows, len(columns)))
+    for j, name in enumerate(columns):
+        out[:, j] = batch.column(name).cast(pa.float64()).to_numpy(zero_copy_only=False)
+    return out
+
+
+class _RowStream:
+    """
+    Sequential reader of one checkpoint's feature columns.
+
+    Record batches are decoded once, in file order, and handed out by row
+    count. A checkpoint not sorted by interval_time is read whole and
+    reordered instead (`order`).
+    """
+
+    def __init__(self, path: str, columns: list, order: np.ndarray = None):
+        self.columns = columns
+        self.pending = []
+        if not columns:
+            self.batches = None
+        elif order is not None:
+            table = pq.read_table(path, columns=columns)
+            self.pending = [_to_matrix(table, columns)[order]]
+            self.batches = iter(())
+        else:
+            self.batches = pq.ParquetFile(path).iter_batches(batch_size=BLOCK_ROWS, columns=columns)
+
+    def take(self, n: int) -> np.ndarray:
+        if self.batches is None:
+            return np.empty((n, 0))
+        parts, have = [], 0
+        while have < n:
+            if not self.pending:
+                self.pending.append(_to_matrix(next(self.batches), self.columns))
+            head = self.pending[0]
+            need = n - have
+            if len(head) <= need:
+                parts.append(self.pending.pop(0))
+                have += len(head)
+            else:
+                parts.append(head[:need])
+                self.pending[0] = head[need:]
+                have = n
+        if not parts:
+            return np.empty((0, len(self.columns)))
+        return parts[0] if len(parts) == 1 else np.concatenate(parts)
+
+
+def iter_tensor_blocks(paths: dict, columns: list, block_rows: int = BLOCK_ROWS):
+    """
+    Yield aligned tensor blocks over the union of the pairs' intervals.
+
+    Args:
+        paths: {pair: checkpoint path}
+        columns: Feature columns to load (pairs lacking one get NaN)
+
+    Yields:
+        (grid int64 ns (B,), values float64 (B × pairs × features) with NaN for
+         NULL/missing, present bool (B × pairs), [pair order])
+    """
+    pairs = sorted(paths)
+    times, streams, col_index = [], [], []
+    for pair in pairs:
+        path = paths[pair]
+        t = _times_ns(pq.read_table(path, columns=['interval_time']).column(0))
+        order = None
+        if len(t) > 1 and np.any(np.diff(t) < 0):
+            order = np.argsort(t, kind='stable')
+            t = t[order]
+        names = set(pq.read_schema(path).names)
+        own = [c for c in columns if c in names]
+        times.append(t)
+        streams.append(_RowStream(path, own, order))
+        col_index.append(np.array([columns.index(c) for c in own], dtype=np.int64))
+
+    grid = np.unique(np.concatenate(times)) if pairs else np.empty(0, np.int64)
+    cursors = [0] * len(pairs)
+    for start in range(0, len(grid), block_rows):
+        block = grid[start:start + block_rows]
+        values = np.full((len(block), len(pairs), len(columns)), np.nan)
+        present = np.zeros((len(block), len(pairs)), dtype=bool)
+        for j in range(len(pairs)):
+            stop = int(np.searchsorted(times[j], block[-1], side='right'))
+            rows = streams[j].take(stop - cursors[j])
+            pos = np.searchsorted(block, times[j][cursors[j]:stop])
+            values[pos[:, None], j, col_index[j][None, :]] = rows
+            present[pos, j] = True
+            cursors[j] = stop
+        yield block, values, present, pairs
+
+
+# ============================================================================
+# AGGREGATION
+# ============================================================================
+
+def reduce_pairs(op: str, values: np.ndarray, signs: np.ndarray = None) -> np.ndarray:
+    """
+    GROUP BY interval_time aggregate over the pair axis of an (intervals × pairs × k) block.
+
+    NaN is NULL: skipped by every aggregate, NULL results where SQL gives NULL.
+    """
+    valid = ~np.isnan(values)
+    count = valid.sum(axis=1)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        if op in ('avg', 'avg_dir'):
+            if op == 'avg_dir':
+                values = values * signs[None, :, None]
+            total = np.where(valid, values, 0.0).sum(axis=1)
+            return np.where(count > 0, total / count, np.nan)
+        if op in ('stddev', 'var_pop'):
+            mean = np.where(valid, values, 0.0).sum(axis=1) / count
+            dev = np.where(valid, values - mean[:, None, :], 0.0)
+            ss = (dev * dev).sum(axis=1)
+            if op == 'var_pop':
+                return np.where(count > 0, ss / count, np.nan)
+            return np.where(count > 1, np.sqrt(ss / (count - 1)), np.nan)
+        if op == 'range':
+            return np.fmax.reduce(values, axis=1) - np.fmin.reduce(values, axis=1)
+        if op == 'sum_sign':
+            return np.where(count > 0, np.where(valid, np.sign(values), 0.0).sum(axis=1), np.nan)
+        if op == 'count_pos':
+            return (values > 0).sum(axis=1).astype(np.int64)
+        if op == 'count_neg':
+            return (values < 0).sum(axis=1).astype(np.int64)
+    raise ValueError(f"Unknown aggregate: {op}")
+
+
+def spec_block(spec: dict, grid: np.ndarray, values: np.ndarray, present: np.ndarray,
+               pairs: list, columns: list) -> dict:
+    """
+    One table's rows for a tensor block, as {column: array} in output order.
+
+    Returns None when none of the spec's pairs has a row in the block.
+    """
+    pair_idx = np.array([pairs.index(p) for p in spec['pairs']], dtype=np.int64)
+    rows = np.flatnonzero(present[:, pair_idx].any(axis=1))
+    if len(rows) == 0:
+        return None
+
+    out = {'interval_time': pd.to_datetime(grid[rows], utc=True)}
+    for name, value in spec['const'].items():
+        out[name] = np.full(len(rows), value, dtype=object)
+
+    by_op = {}
+    for j, (name, op, col, factor) in enumerate(spec['columns']):
+        by_op.setdefault(op, []).append(j)
+
+    results = [None] * len(spec['columns'])
+    for op, members in by_op.items():
+        if op == 'pairs':
+            counts = present[np.ix_(rows, pair_idx)].sum(axis=1).astype(np.int64)
+            for j in members:
+                results[j] = counts
+            continue
+        feat_idx = np.array([columns.index(spec['columns'][j][2]) for j in members], dtype=np.int64)
+        reduced = reduce_pairs(op, values[np.ix_(rows, pair_idx, feat_idx)], spec['signs'])
+        for k, j in enumerate(members):
+            factor = spec['columns'][j][3]
+            results[j] = reduced[:, k] if factor == 1.0 else reduced[:, k] * factor
+
+    for (name, _, _, _), result in zip(spec['columns'], results):
+        out[name] = result
+    return out
+
+
+def spec_schema(spec: dict) -> pa.Schema:
+    """Arrow schema of one output table."""
+    fields = [pa.field('interval_time', pa.timestamp('ns', tz='UTC'))]
+    fields += [pa.field(name, pa.string()) for name in spec['const']]
+    fields += [pa.field(name, pa.int64() if op in INT_OPS else pa.float64())
+               for name, op, _, _ in spec['columns']]
+    return pa.schema(fields)
+
+
+# ============================================================================
+# BUILD
+# ============================================================================
+
+def build_source_tables(kind: str, variant: str, specs: list, checkpoint_root: str,
+                        output_root: str, block_rows: int = BLOCK_ROWS) -> list:
+    """
+    Build all (valid) specs of one source family from a single read of its checkpoints.
+
+    Tables are written to output_root/{group}/{table}.parquet (atomic replace).
+
+    Returns:
+        List of result dicts (table, status, rows / error)
+    """
+    results = [{'table': s['table'], 'status': 'FAILED', 'error': s['error']} for s in specs if s['error']]
+    specs = [s for s in specs if not s['error']]
+    if not specs:
+        return results
+
+    needed_pairs = sorted({p for s in specs for p in s['pairs']})
+    columns = list(dict.fromkeys(c for s in specs for _, op, c, _ in s['columns'] if op != 'pairs'))
+    paths = {p: os.path.join(checkpoint_root, p, f"{source_table(kind, variant, p)}.parquet")
+             for p in needed_pairs}
+
+    writers, rows, tmp_paths = {}, {s['table']: 0 for s in specs}, {}
+    try:
+        for s in specs:
+            path = os.path.join(output_root, s['group'], f"{s['table']}.parquet")
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_paths[s['table']] = (f"{path}.tmp", path)
+            writers[s['table']] = pq.ParquetWriter(f"{path}.tmp", spec_schema(s), compression='snappy')
+
+        for grid, values, present, pairs in iter_tensor_blocks(paths, columns, block_rows):
+            for s in specs:
+                block = spec_block(s, grid, values, present, pairs, columns)
+                if block is None:
+                    continue
+                writers[s['table']].write_table(pa.table(block, schema=spec_schema(s)))
+                rows[s['table']] += len(block['interval_time'])
+
+        for s in specs:
+            writers.pop(s['table']).close()
+            tmp_path, path = tmp_paths[s['table']]
+            os.replace(tmp_path, path)
+            results.append({'table': s['table'], 'status': 'SUCCESS', 'rows': rows[s['table']]})
+    except (OSError, pa.ArrowException) as e:
+        done = {r['table'] for r in results}
+        results += [{'table': s['table'], 'status': 'FAILED', 'error': str(e)[:200]}
+                    for s in specs if s['table'] not in done]
+    finally:
+        for writer in writers.values():
+            writer.close()
+        for tmp_path, _ in tmp_paths.values():
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+    return results
+
+
+def build_cross_pair_tables_local(checkpoint_root: str = CHECKPOINT_ROOT,
+                                  output_root: str = LOCAL_OUTPUT_ROOT, groups: list = None,
+                                  kinds: list = None, variants: list = None,
+                                  tables: set = None, block_rows: int = BLOCK_ROWS) -> list:
+    """
+    Build csi_* / var_* / mkt_* tables, reading each source family once.
+
+    Args:
+        checkpoint_root: Root with one checkpoint directory per pair
+        output_root: Tables are written to output_root/{csi,mkt,var}/{table}.parquet
+        groups: Subset of GROUPS (default: all)
+        kinds: Subset of SOURCE_KINDS (default: all)
+        variants: Subset of VARIANTS (default: all)
+        tables: Only build these output tables (default: every table of the groups)
+        block_rows: Intervals per tensor block
+
+    Returns:
+        List of result dicts (table, status, rows / error)
+    """
+    results = []
+    for kind in kinds or SOURCE_KINDS:
+        for variant in variants or VARIANTS:
+            schemas = {}
+            for pair in ALL_PAIRS:
+                path = os.path.join(checkpoint_root, pair, f"{source_table(kind, variant, pair)}.parquet")
+                if os.path.exists(path):
+                    schemas[pair] = read_schema(path)
+
+            specs = output_specs(kind, variant, schemas, groups)
+            if tables is not None:
+                specs = [s for s in specs if s['table'] in tables]
+            if not specs:
+                continue
+
+            print(f"  {kind}/{variant}: {len(schemas)} pair checkpoints → {len(specs)} tables", flush=True)
+            results += build_source_tables(kind, variant, specs, checkpoint_root, output_root, block_rows)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Build csi_* / var_* / mkt_* tables locally in one pass per source')
+    parser.add_argument('--only', default=','.join(GROUPS), help='Comma-separated groups (csi,mkt,var)')
+    parser.add_argument('--checkpoint-dir', default=CHECKPOINT_ROOT, help='Checkpoint root with one directory per pair')
+    parser.add_argument('--output-dir', default=LOCAL_OUTPUT_ROOT, help='Output root')
+    args = parser.parse_args()
+
+    groups = [g.strip() for g in args.only.split(',') if g.strip()]
+    results = build_cross_pair_tables_local(args.checkpoint_dir, args.output_dir, groups=groups)
+    for r in results:
+        if r['status'] == 'SUCCESS':
+            print(f"✅ {r['table']}: {r['rows']:,} rows")
+        else:
+            print(f"❌ {r['table']}: {r['error'][:100]}")
+    failed = sum(1 for r in results if r['status'] != 'SUCCESS')
+    print(f"\nCross-pair tables: {len(results) - failed}/{len(results)} built", flush=True)
+    return 0 if failed == 0 else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -6,26 +6,70 @@ Mirrors successful AUDUSD extraction protocol (no DuckDB)
 This script ONLY extracts features from BigQuery to parquet checkpoint files.
 Merge is handled separately by merge_with_polars_safe.py
 
+Extraction modes:
+- storage (default): BigQuery Storage Read API. Table data is read directly
+  as Arrow record batches over parallel streams (no query job, no ORDER BY,
+  no pandas). Each stream is written as runs sorted by interval_time, and
+  the runs are k-way merged into the checkpoint (see streaming_merge.py).
+- query: SELECT * ... ORDER BY interval_time query job + to_dataframe()
+
+Both modes share one pooled client per process across all workers.
+
+Projection pushdown (--stable-horizons / --date-start / --date-end):
+only the columns providing the selected stable features, and only rows in
+the date window, are fetched (see pipelines/training/projection_manifest.py).
+A projection hash sidecar is written next to each checkpoint; checkpoints
+extracted with a different projection are detected as stale and replaced.
+
+Incremental refresh (--refresh): each checkpoint's high-water interval_time
+is recorded in _watermarks.json (see pipelines/training/checkpoint_watermark.py).
+A refresh run fetches only rows from (watermark - lookback) on and splices
+them onto the existing checkpoints as new row groups.
+
 Usage:
-    python3 extract_to_parquet.py <pair> --workers <N>
+    python3 extract_to_parquet.py <pair> --workers <N> [--mode storage|query]
+        [--stable-horizons 15,30] [--date-start YYYY-MM-DD] [--date-end YYYY-MM-DD]
+        [--refresh] [--lookback-minutes N]
 
 Example:
     python3 extract_to_parquet.py audusd --workers 25
+    python3 extract_to_parquet.py eurusd --stable-horizons 15 --date-start 2024-01-01
+    python3 extract_to_parquet.py eurusd --refresh
 """
 
 import sys
 import os
 import argparse
+import threading
 from pathlib import Path
 from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime
+import numpy as np
 import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
 from google.cloud import bigquery
 
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'pipelines', 'training'))
+from projection_manifest import (
+    build_projection_manifest, load_stable_features, table_projection_hash, table_base_hash,
+    checkpoint_is_current, sidecar_path, date_window_sql, summarize, save_manifest, MANIFEST_FILE
+)
+from checkpoint_watermark import (
+    load_watermarks, save_watermarks, refresh_start, record_table, record_refresh,
+    parquet_watermark, append_tail, key_values, WATERMARK_FILE, DEFAULT_LOOKBACK_MINUTES
+)
+from object_store import CHECKPOINT_ROW_GROUP_ROWS
+from streaming_merge import merge_sorted_runs
+
 # BigQuery configuration
 PROJECT_ID = "bqx-ml"
 DATASET_V2 = "bqx_ml_v3_features_v2"
 
+# Storage Read API configuration
+MAX_READ_STREAMS = 4  # Parallel read streams per table (× --workers tables)
+RUN_BUFFER_ROWS = 100_000  # Batches are buffered (and sorted) to this size before writing
+
 # Feature table patterns (667 tables + 1 targets = 668 total)
 FEATURE_PATTERNS = {
     'agg': 7,      # Aggregation features (7 horizons)
@@ -78,26 +122,185 @@ def get_table_list(pair: str) -> list:
     return sorted(tables)
 
 
+# ============================================================================
+# POOLED CLIENTS (one per process, shared by all worker threads)
+# ============================================================================
+
+_CLIENT_LOCK = threading.Lock()
+_BQ_CLIENT = None
+_READ_CLIENT = None
+
+
+def get_bigquery_client() -> bigquery.Client:
+    """Get the shared BigQuery client (created on first use)."""
+    global _BQ_CLIENT
+    with _CLIENT_LOCK:
+        if _BQ_CLIENT is None:
+            _BQ_CLIENT = bigquery.Client(project=PROJECT_ID)
+    return _BQ_CLIENT
+
+
+def get_read_client():
+    """Get the shared BigQuery Storage Read API client (created on first use)."""
+    global _READ_CLIENT
+    with _CLIENT_LOCK:
+        if _READ_CLIENT is None:
+            from google.cloud import bigquery_storage
+            _READ_CLIENT = bigquery_storage.BigQueryReadClient()
+    return _READ_CLIENT
+
+
+class LocalReadClient:
+    """
+    Storage Read API stand-in serving in-memory Arrow tables (local testing).
+
+    Each table is cut into `page_rows` record batches dealt round-robin to
+    up to max_stream_count streams, so rows arrive interleaved across
+    streams as they do from BigQuery. With `shuffle_seed`, page order is
+    shuffled as well (out-of-order streams). selected_fields is honoured;
+    row_restriction is not evaluated.
+
+    Args:
+        tables: {table_name: pa.Table}
+        page_rows: Rows per page (record batch)
+        shuffle_seed: Shuffle pages before dealing them (None = keep order)
+    """
+
+    class _Page:
+        def __init__(self, batch):
+            self.batch = batch
+
+        def to_arrow(self):
+            return self.batch
+
+    class _Stream:
+        def __init__(self, name, pages):
+            self.name, self.pages = name, pages
+
+        def rows(self, session):
+            return self
+
+    class _Session:
+        def __init__(self, streams):
+            self.streams = streams
+
+    def __init__(self, tables: dict, page_rows: int = 10_000, shuffle_seed: int = None):
+        self.tables = tables
+        self.page_rows = page_rows
+        self.shuffle_seed = shuffle_seed
+        self._streams = {}
+
+    def create_read_session(self, parent, read_session, max_stream_count):
+        table_name = read_session.table.rsplit('/', 1)[-1]
+        table = self.tables[table_name]
+        fields = list(read_session.read_options.selected_fields) if read_session.read_options else []
+        if fields:
+            table = table.select(fields)
+        pages = table.combine_chunks().to_batches(max_chunksize=self.page_rows)
+        if self.shuffle_seed is not None:
+            order = np.random.default_rng(self.shuffle_seed).permutation(len(pages))
+            pages = [pages[i] for i in order]
+        count = min(max_stream_count, len(pages))
+        streams = [self._Stream(f"{table_name}/streams/{i}", [self._Page(b) for b in pages[i::count]])
+                   for i in range(count)]
+        self._streams.update((stream.name, stream) for stream in streams)
+        return self._Session(streams)
+
+    def read_rows(self, stream_name):
+        return self._streams[stream_name]
+
+
+def get_table_columns(tables: list) -> dict:
+    """Get {table: [columns excluding interval_time]} for all tables in ONE metadata query."""
+    client = get_bigquery_client()
+    table_list = "', '".join(tables)
+    query = f"""
+    SELECT table_name, column_name
+    FROM `{PROJECT_ID}.{DATASET_V2}.INFORMATION_SCHEMA.COLUMNS`
+    WHERE table_name IN ('{table_list}')
+    AND column_name != 'interval_time'
+    ORDER BY table_name, ordinal_position
+    """
+    columns = {}
+    for row in client.query(query).result():
+        columns.setdefault(row.table_name, []).append(row.column_name)
+    return columns
+
+
+def _is_current(output_file: Path, manifest: dict, table_name: str) -> bool:
+    """Whether an existing checkpoint matches the table's projection."""
+    sidecar = Path(sidecar_path(str(output_file)))
+    sidecar_hash = sidecar.read_text() if sidecar.exists() else None
+    return checkpoint_is_current(sidecar_hash, manifest, table_name)
+
+
+def _write_sidecar(output_file: Path, manifest: dict, table_name: str) -> None:
+    """Record the table's projection hash next to its checkpoint (none for a full extraction)."""
+    sidecar = Path(sidecar_path(str(output_file)))
+    if manifest is not None:
+        sidecar.write_text(table_projection_hash(manifest, table_name))
+    elif sidecar.exists():
+        sidecar.unlink()
+
+
+def _fetch_window(manifest: dict, since: str = None) -> dict:
+    """Date window to fetch: the manifest window, starting at `since` for a refresh."""
+    window = dict(manifest) if manifest is not None else {}
+    if since:
+        window['date_start'] = max(since, window.get('date_start') or since)
+    return window
+
+
+def _refresh_checkpoint(output_file: Path, tail: pa.Table, since: str, manifest: dict, table_name: str) -> dict:
+    """Splice a fetched tail onto an existing checkpoint and re-stamp its sidecar."""
+    stats = append_tail(output_file, tail, since)
+    _write_sidecar(output_file, manifest, table_name)
+    return {
+        'table': table_name,
+        'status': 'refreshed',
+        'rows': stats['rows'],
+        'appended': stats['appended'],
+        'since': since,
+        'watermark': stats['watermark']
+    }
+
+
 def extract_table(args):
-    """Extract a single table from BigQuery to parquet."""
-    table_name, pair, checkpoint_dir = args
+    """
+    Extract a single table from BigQuery to parquet (query job mode).
+
+    With `since` set (refresh), only rows from `since` on are fetched and
+    spliced onto the existing checkpoint.
+    """
+    table_name, pair, checkpoint_dir, manifest, since = args
 
     output_file = checkpoint_dir / f"{table_name}.parquet"
 
-    # Skip if already exists
-    if output_file.exists():
+    # Skip if already exists with the same projection
+    if since is None and output_file.exists() and _is_current(output_file, manifest, table_name):
         return {'table': table_name, 'status': 'skipped', 'reason': 'exists'}
 
     try:
-        client = bigquery.Client(project=PROJECT_ID)
+        client = get_bigquery_client()
+
+        # Query: SELECT <projection> FROM table [WHERE <date window>] ORDER BY interval_time
+        if manifest is None:
+            select_list = '*'
+        else:
+            select_list = ', '.join(['interval_time'] + manifest['tables'][table_name])
+        window = date_window_sql(_fetch_window(manifest, since))
+        where = f"WHERE {window}" if window else ''
 
-        # Query: SELECT * FROM table ORDER BY interval_time
         query = f"""
-        SELECT *
+        SELECT {select_list}
         FROM `{PROJECT_ID}.{DATASET_V2}.{table_name}`
+        {where}
         ORDER BY interval_time
         """
 
+        if since is not None:
+            return _refresh_checkpoint(output_file, client.query(query).to_arrow(), since, manifest, table_name)
+
         # Execute query
         df = client.query(query).to_dataframe()
 
@@ -106,15 +309,178 @@ def extract_table(args):
 
         # Write to parquet
         df.to_parquet(output_file, index=False)
+        _write_sidecar(output_file, manifest, table_name)
 
         return {
             'table': table_name,
             'status': 'success',
             'rows': len(df),
+            'watermark': parquet_watermark(output_file),
+            'size_mb': output_file.stat().st_size / 1024**2
+        }
+
+    except Exception as e:
+        return {
+            'table': table_name,
+            'status': 'error',
+            'error': str(e)
+        }
+
+
+def _requested_read_session(table_name: str, manifest: dict = None, since: str = None):
+    """
+    Build the Storage Read API session request for a feature table.
+
+    With a manifest, column projection and the date window are pushed down
+    as selected_fields / row_restriction, so only needed columns and
+    partitions are read. `since` (refresh) moves the window start up to the
+    refresh start.
+    """
+    from google.cloud.bigquery_storage import types
+
+    read_options = None
+    if manifest is not None or since:
+        read_options = types.ReadSession.TableReadOptions(
+            selected_fields=['interval_time'] + manifest['tables'][table_name] if manifest is not None else [],
+            row_restriction=date_window_sql(_fetch_window(manifest, since)),
+        )
+
+    return types.ReadSession(
+        table=f"projects/{PROJECT_ID}/datasets/{DATASET_V2}/tables/{table_name}",
+        data_format=types.DataFormat.ARROW,
+        read_options=read_options,
+    )
+
+
+def extract_table_storage(args, read_client=None):
+    """
+    Extract a single table to parquet via the BigQuery Storage Read API.
+
+    Each of up to MAX_READ_STREAMS streams is read in its own thread; Arrow
+    record batches are buffered to RUN_BUFFER_ROWS, sorted by interval_time
+    and written as sorted runs (a stream whose rows arrive in order is one
+    run). Runs are k-way merged into the checkpoint (merge_sorted_runs), so
+    the table is never re-read or sorted as a whole. No query job is run and
+    no DataFrame is built.
+
+    Args:
+        args: (table_name, pair, checkpoint_dir, manifest, since) work item;
+            with `since` set, only rows from `since` on are read and spliced
+            onto the existing checkpoint
+        read_client: Storage Read client (default: shared pooled client).
+            Any object providing create_read_session(parent=, read_session=,
+            max_stream_count=) -> session with .streams[i].name, and
+            read_rows(stream_name) -> reader with .rows(session).pages whose
+            pages have .to_arrow(), can stand in (see LocalReadClient).
+    """
+    table_name, pair, checkpoint_dir, manifest, since = args
+
+    output_file = checkpoint_dir / f"{table_name}.parquet"
+
+    # Skip if already exists with the same projection
+    if since is None and output_file.exists() and _is_current(output_file, manifest, table_name):
+        return {'table': table_name, 'status': 'skipped', 'reason': 'exists'}
+
+    tmp_file = output_file.with_suffix('.parquet.tmp')
+
+    try:
+        if read_client is None:
+            read_client = get_read_client()
+
+        session = read_client.create_read_session(
+            parent=f"projects/{PROJECT_ID}",
+            read_session=_requested_read_session(table_name, manifest, since),
+            max_stream_count=MAX_READ_STREAMS,
+        )
+
+        if since is not None:
+            # Refresh tails are small: read streams in turn, splice in one pass
+            batches = [
+                page.to_arrow()
+                for stream in session.streams
+                for page in read_client.read_rows(stream.name).rows(session).pages
+            ]
+            batches = [b for b in batches if b.num_rows]
+            tail = pa.Table.from_batches(batches) if batches else pq.read_schema(output_file).empty_table()
+            return _refresh_checkpoint(output_file, tail, since, manifest, table_name)
+
+        if not session.streams:
+            return {'table': table_name, 'status': 'empty', 'rows': 0}
+
+        runs = []  # Sorted run files, each sorted by interval_time
+        runs_lock = threading.Lock()
+
+        def _read_stream(index, stream_name):
+            """Write one stream as sorted runs: each buffer is sorted; a new run starts only when keys go back."""
+            reader = read_client.read_rows(stream_name)
+            writer, run_last, stream_runs, stream_rows = None, None, 0, 0
+            buffer, buffered = [], 0
+
+            def _flush():
+                nonlocal writer, run_last, stream_runs, stream_rows
+                table = pa.Table.from_batches(buffer).sort_by('interval_time')
+                keys = key_values(table.column('interval_time'))
+                if writer is None or keys[0] < run_last:
+                    if writer is not None:
+                        writer.close()
+                    run_path = tmp_file.with_suffix(f'.s{index}r{stream_runs}.tmp')
+                    stream_runs += 1
+                    with runs_lock:
+                        runs.append(run_path)
+                    writer = pq.ParquetWriter(run_path, table.schema)
+                writer.write_table(table, row_group_size=CHECKPOINT_ROW_GROUP_ROWS)
+                run_last = keys[-1]
+                stream_rows += table.num_rows
+
+            try:
+                for page in reader.rows(session).pages:
+                    batch = page.to_arrow()
+                    if batch.num_rows == 0:
+                        continue
+                    buffer.append(batch)
+                    buffered += batch.num_rows
+                    if buffered >= RUN_BUFFER_ROWS:
+                        _flush()
+                        buffer, buffered = [], 0
+                if buffer:
+                    _flush()
+            finally:
+                if writer is not None:
+                    writer.close()
+            return stream_rows
+
+        try:
+            with ThreadPoolExecutor(max_workers=len(session.streams)) as executor:
+                futures = [executor.submit(_read_stream, i, st.name) for i, st in enumerate(session.streams)]
+                row_count = sum(future.result() for future in futures)
+
+            if row_count == 0:
+                return {'table': table_name, 'status': 'empty', 'rows': 0}
+
+            # One run is already the sorted checkpoint; several are k-way merged (no full re-read)
+            if len(runs) == 1:
+                runs[0].replace(tmp_file)
+            else:
+                merge_sorted_runs(runs, tmp_file, CHECKPOINT_ROW_GROUP_ROWS)
+        finally:
+            for run_path in runs:
+                run_path.unlink(missing_ok=True)
+
+        tmp_file.replace(output_file)
+        _write_sidecar(output_file, manifest, table_name)
+
+        return {
+            'table': table_name,
+            'status': 'success',
+            'rows': row_count,
+            'streams': len(session.streams),
+            'runs': len(runs),
+            'watermark': parquet_watermark(output_file),
             'size_mb': output_file.stat().st_size / 1024**2
         }
 
     except Exception as e:
+        tmp_file.unlink(missing_ok=True)
         return {
             'table': table_name,
             'status': 'error',
@@ -122,7 +488,9 @@ def extract_table(args):
         }
 
 
-def extract_features(pair: str, workers: int = 25, checkpoint_dir: Path = None):
+def extract_features(pair: str, workers: int = 25, checkpoint_dir: Path = None, mode: str = 'storage',
+                     selected_features: list = None, date_start: str = None, date_end: str = None,
+                     refresh: bool = False, lookback_minutes: int = DEFAULT_LOOKBACK_MINUTES):
     """
     Extract all feature tables for a pair from BigQuery to parquet checkpoints.
 
@@ -130,6 +498,12 @@ def extract_features(pair: str, workers: int = 25, checkpoint_dir: Path = None):
         pair: Currency pair (e.g., 'audusd')
         workers: Number of parallel workers
         checkpoint_dir: Directory to save parquet files
+        mode: 'storage' (Storage Read API, Arrow) or 'query' (query job + pandas)
+        selected_features: Only fetch columns providing these features (None → all)
+        date_start: First date to fetch (YYYY-MM-DD, None → full history)
+        date_end: Last date to fetch (YYYY-MM-DD, None → full history)
+        refresh: Append only rows from each checkpoint's watermark - lookback
+        lookback_minutes: Rows re-read behind each watermark on refresh
     """
 
     if checkpoint_dir is None:
@@ -145,25 +519,69 @@ def extract_features(pair: str, workers: int = 25, checkpoint_dir: Path = None):
     print(f"Dataset: {DATASET_V2}")
     print(f"Output: {checkpoint_dir}")
     print(f"Workers: {workers}")
+    print(f"Mode: {mode}")
+    if refresh:
+        print(f"Refresh: append from watermarks (lookback {lookback_minutes} min)")
     print(f"")
 
     # Get table list
     tables = get_table_list(pair)
+
+    # Projection manifest (column + date window pushdown)
+    manifest = None
+    if selected_features is not None or date_start or date_end:
+        table_columns = get_table_columns(tables)
+        manifest = build_projection_manifest(pair, table_columns, selected_features, date_start, date_end)
+        save_manifest(manifest, str(checkpoint_dir / MANIFEST_FILE))
+        stats = summarize(manifest, table_columns)
+        print(f"Projection: {stats['columns_kept']:,}/{stats['columns_total']:,} columns "
+              f"({stats['column_fraction']:.1%}) from {stats['tables_kept']}/{stats['tables_total']} tables")
+        print(f"Date window: {date_start or 'start'} → {date_end or 'end'}")
+        if stats['unresolved']:
+            print(f"⚠️  {stats['unresolved']} selected features not found in any table")
+        tables = [t for t in tables if t in manifest['tables']]
+
     print(f"Tables to extract: {len(tables)}")
 
-    # Check existing files
-    existing = list(checkpoint_dir.glob("*.parquet"))
+    # Watermark registry: which existing checkpoints can be refreshed in place
+    registry_path = checkpoint_dir / WATERMARK_FILE
+    registry = load_watermarks(registry_path)
+
+    def _base_hash(table):
+        return table_base_hash(manifest, table) if manifest is not None else None
+
+    refresh_from = {}
+    existing = []
+    for t in tables:
+        path = checkpoint_dir / f"{t}.parquet"
+        if not path.exists():
+            continue
+        current = _is_current(path, manifest, t)
+        entry = registry['tables'].get(t)
+        if refresh and entry is None and current:
+            # Checkpoint predates the registry: adopt its on-disk watermark
+            record_table(registry, t, parquet_watermark(path), pq.ParquetFile(path).metadata.num_rows, _base_hash(t))
+            entry = registry['tables'][t]
+        if refresh and entry and entry.get('watermark') and entry.get('base_hash') == _base_hash(t):
+            refresh_from[t] = refresh_start(entry['watermark'], lookback_minutes)
+        elif current:
+            existing.append(t)
+
     print(f"Already extracted: {len(existing)}")
-    print(f"Remaining: {len(tables) - len(existing)}")
+    if refresh:
+        print(f"Refresh (append from watermark): {len(refresh_from)}")
+    print(f"Remaining: {len(tables) - len(existing) - len(refresh_from)}")
     print(f"")
 
     # Prepare extraction tasks
-    tasks = [(table, pair, checkpoint_dir) for table in tables]
+    tasks = [(table, pair, checkpoint_dir, manifest, refresh_from.get(table)) for table in tables]
+    extract_fn = extract_table_storage if mode == 'storage' else extract_table
 
     # Execute extraction in parallel
     start_time = datetime.now()
     results = {
         'success': [],
+        'refreshed': [],
         'skipped': [],
         'empty': [],
         'error': []
@@ -173,13 +591,16 @@ def extract_features(pair: str, workers: int = 25, checkpoint_dir: Path = None):
     print(f"Progress updates every 50 tables\n")
 
     with ThreadPoolExecutor(max_workers=workers) as executor:
-        futures = {executor.submit(extract_table, task): task for task in tasks}
+        futures = {executor.submit(extract_fn, task): task for task in tasks}
 
         completed = 0
         for future in as_completed(futures):
             result = future.result()
             status = result['status']
             results[status].append(result)
+            if 'watermark' in result:
+                record_table(registry, result['table'], result['watermark'], result['rows'],
+                             _base_hash(result['table']))
 
             completed += 1
 
@@ -191,6 +612,7 @@ def extract_features(pair: str, workers: int = 25, checkpoint_dir: Path = None):
 
                 print(f"  [{completed:4d}/{len(tables)}] "
                       f"Success: {len(results['success']):3d} | "
+                      f"Refreshed: {len(results['refreshed']):3d} | "
                       f"Skipped: {len(results['skipped']):3d} | "
                       f"Empty: {len(results['empty']):3d} | "
                       f"Error: {len(results['error']):3d} | "
@@ -199,11 +621,17 @@ def extract_features(pair: str, workers: int = 25, checkpoint_dir: Path = None):
 
     elapsed = (datetime.now() - start_time).total_seconds()
 
+    # Record watermarks + earliest refreshed row for the incremental merge
+    since = min((r['since'] for r in results['refreshed']), default=None)
+    record_refresh(registry, since, len(results['refreshed']), [r['table'] for r in results['success']])
+    save_watermarks(registry, registry_path)
+
     print(f"\n{'='*70}")
     print(f"EXTRACTION COMPLETE")
     print(f"{'='*70}\n")
     print(f"Total tables: {len(tables)}")
     print(f"Success: {len(results['success'])}")
+    print(f"Refreshed: {len(results['refreshed'])}")
     print(f"Skipped (existing): {len(results['skipped'])}")
     print(f"Empty: {len(results['empty'])}")
     print(f"Errors: {len(results['error'])}")
@@ -223,6 +651,16 @@ def extract_features(pair: str, workers: int = 25, checkpoint_dir: Path = None):
     final_count = len(list(checkpoint_dir.glob("*.parquet")))
     print(f"Final checkpoint files: {final_count}")
 
+    if manifest is not None:
+        # Projected extraction: every manifest table must be present and current
+        current = sum(1 for t in tables if (checkpoint_dir / f"{t}.parquet").exists()
+                      and _is_current(checkpoint_dir / f"{t}.parquet", manifest, t))
+        if current == len(tables):
+            print(f"✅ EXTRACTION SUCCESSFUL ({current}/{len(tables)} projected tables)")
+            return True
+        print(f"❌ EXTRACTION INCOMPLETE ({current}/{len(tables)} projected tables)")
+        return False
+
     if final_count >= 600:  # Should have 668 for complete extraction
         print(f"✅ EXTRACTION SUCCESSFUL")
         return True
@@ -236,15 +674,38 @@ if __name__ == "__main__":
     parser.add_argument('pair', help='Currency pair (e.g., audusd)')
     parser.add_argument('--workers', type=int, default=25, help='Number of parallel workers')
     parser.add_argument('--checkpoint-dir', help='Checkpoint directory')
+    parser.add_argument('--mode', choices=['storage', 'query'], default='storage',
+                        help='storage: Storage Read API Arrow streams (default); query: query job + pandas')
+    parser.add_argument('--stable-horizons', help='Only fetch stable features for these horizons (e.g., 15,30)')
+    parser.add_argument('--date-start', help='First date to fetch (YYYY-MM-DD)')
+    parser.add_argument('--date-end', help='Last date to fetch (YYYY-MM-DD)')
+    parser.add_argument('--refresh', action='store_true',
+                        help='Append only new rows (from each checkpoint watermark - lookback)')
+    parser.add_argument('--lookback-minutes', type=int, default=DEFAULT_LOOKBACK_MINUTES,
+                        help=f'Rows re-read behind each watermark on refresh (default: {DEFAULT_LOOKBACK_MINUTES})')
 
     args = parser.parse_args()
 
     checkpoint_dir = Path(args.checkpoint_dir) if args.checkpoint_dir else None
 
+    selected_features = None
+    if args.stable_horizons:
+        horizons = [int(h) for h in args.stable_horizons.split(',')]
+        selected_features = load_stable_features(args.pair.lower(), horizons)
+        if not selected_features:
+            print(f"❌ No stable feature files for {args.pair.lower()} h{horizons}")
+            sys.exit(1)
+
     success = extract_features(
         pair=args.pair.lower(),
         workers=args.workers,
-        checkpoint_dir=checkpoint_dir
+        checkpoint_dir=checkpoint_dir,
+        mode=args.mode,
+        selected_features=selected_features,
+        date_start=args.date_start,
+        date_end=args.date_end,
+        refresh=args.refresh,
+        lookback_minutes=args.lookback_minutes
     )
 
     sys.exit(0 if success else 1)
@@ -2,6 +2,10 @@
 """
 Tier 1 Remediation: Cross-Asset Correlation Table Generation
 Regenerates corr_etf_* tables with 100% row coverage using FULL OUTER JOIN strategy
+
+--local computes every table from the extracted base_* and asset checkpoints
+with rolling running-sum kernels (see corr_engine.py) instead of one
+BigQuery job per table.
 """
 
 from google.cloud import bigquery
@@ -14,6 +18,10 @@ PROJECT = 'bqx-ml'
 FEATURES_DATASET = 'bqx_ml_v3_features_v2'
 LOCATION = 'us-central1'
 
+# Interval window of the all_intervals union (BETWEEN, inclusive)
+DATE_START = '2020-01-01'
+DATE_END = '2025-11-21'
+
 # All 28 currency pairs
 PAIRS = [
     'audcad', 'audchf', 'audjpy', 'audnzd', 'audusd',
@@ -34,10 +42,15 @@ VARIANTS = ['idx', 'bqx']
 WINDOWS = [45, 90, 180, 360, 720, 1440, 2880]
 
 
+def corr_table_name(variant, pair, asset):
+    """corr_etf_idx_* / corr_etf_bqx_* (v2 naming; formerly corr_ibkr_* / corr_bqx_ibkr_*)."""
+    return f"corr_etf_{variant}_{pair}_{asset}"
+
+
 def generate_corr_sql(variant, pair, asset, validate_only=False):
     """Generate SQL for cross-asset correlation table with 100% row coverage."""
 
-    table_name = f"corr_etf_{variant}_{pair}_{asset}"
+    table_name = corr_table_name(variant, pair, asset)
 
     # Source tables
     if variant == 'idx':
@@ -137,13 +150,13 @@ def generate_corr_sql(variant, pair, asset, validate_only=False):
         -- Get ALL unique interval_times from both pair and asset
         SELECT DISTINCT interval_time
         FROM `{PROJECT}.{FEATURES_DATASET}.{pair_table}`
-        WHERE interval_time BETWEEN '2020-01-01' AND '2025-11-21'
+        WHERE interval_time BETWEEN '{DATE_START}' AND '{DATE_END}'
 
         UNION DISTINCT
 
         SELECT DISTINCT interval_time
         FROM `{PROJECT}.{FEATURES_DATASET}.{asset_table}`
-        WHERE interval_time BETWEEN '2020-01-01' AND '2025-11-21'
+        WHERE interval_time BETWEEN '{DATE_START}' AND '{DATE_END}'
       ),
       pair_data AS (
         SELECT interval_time, {pair_value_col} as pair_value
@@ -171,7 +184,7 @@ def generate_corr_sql(variant, pair, asset, validate_only=False):
 
 def validate_table(client, variant, pair, asset):
     """Validate regenerated table against original."""
-    table_name = f"corr_etf_{variant}_{pair}_{asset}"
+    table_name = corr_table_name(variant, pair, asset)
 
     try:
         validation_sql = generate_corr_sql(variant, pair, asset, validate_only=True)
@@ -197,7 +210,7 @@ def validate_table(client, variant, pair, asset):
 
 def generate_corr_table(client, variant, pair, asset, dry_run=False):
     """Generate a single cross-asset correlation table."""
-    table_name = f"corr_etf_{variant}_{pair}_{asset}"
+    table_name = corr_table_name(variant, pair, asset)
 
     if dry_run:
         return {'table': table_name, 'status': 'DRY_RUN'}
@@ -225,6 +238,45 @@ def generate_corr_table(client, variant, pair, asset, dry_run=False):
         }
 
 
+def task_list(test_only=False):
+    """(variant, pair, asset) for every table to generate."""
+    tasks = []
+    for variant in VARIANTS:
+        for pair in PAIRS:
+            for asset in ASSETS:
+                tasks.append((variant, pair, asset))
+    return tasks[:3] if test_only else tasks
+
+
+def run_local(args):
+    """Generate all corr_etf_* tables locally with corr_engine (no BigQuery jobs)."""
+    from corr_engine import build_corr_tables_local, CHECKPOINT_ROOT, LOCAL_OUTPUT_ROOT
+    from local_tables import print_run_header, report_results
+
+    tasks = task_list(args.test_only)
+    checkpoint_root = args.checkpoint_dir or CHECKPOINT_ROOT
+    output_root = args.output_dir or LOCAL_OUTPUT_ROOT
+
+    print_run_header("TIER 1: CROSS-ASSET CORRELATION TABLE GENERATION", checkpoint_root, f"{output_root}/corr", len(tasks), args.workers)
+
+    results = []
+    for variant in VARIANTS:
+        selected = [t for t in tasks if t[0] == variant]
+        if not selected:
+            continue
+        if args.dry_run:
+            results += [{'table': corr_table_name(*t), 'status': 'DRY_RUN'} for t in selected]
+            continue
+        pairs = list(dict.fromkeys(t[1] for t in selected))
+        assets = list(dict.fromkeys(t[2] for t in selected))
+        print(f"\n{variant.upper()}: {len(pairs)} pairs × {len(assets)} assets", flush=True)
+        built = build_corr_tables_local(variant, checkpoint_root, output_root, pairs, assets, args.workers)
+        wanted = {corr_table_name(*t) for t in selected}
+        results += [r for r in built if r['table'] in wanted]
+
+    return report_results(results, len(tasks))
+
+
 def main():
     import argparse
     parser = argparse.ArgumentParser(description='Generate cross-asset correlation tables')
@@ -232,8 +284,15 @@ def main():
     parser.add_argument('--dry-run', action='store_true', help='Dry run - show what would be generated')
     parser.add_argument('--workers', type=int, default=16, help='Number of parallel workers')
     parser.add_argument('--test-only', action='store_true', help='Test on 3 tables only')
+    parser.add_argument('--local', action='store_true',
+                        help='Compute locally from extracted base_* / asset checkpoints (--workers pairs in parallel)')
+    parser.add_argument('--checkpoint-dir', default=None, help='Checkpoint root with one directory per pair (--local)')
+    parser.add_argument('--output-dir', default=None, help='Output root for --local tables')
     args = parser.parse_args()
 
+    if args.local:
+        return run_local(args)
+
     client = bigquery.Client(project=PROJECT, location=LOCATION)
 
     print("=" * 80)
@@ -246,14 +305,9 @@ def main():
     print()
 
     # Generate all pair-asset combinations
-    tasks = []
-    for variant in VARIANTS:
-        for pair in PAIRS:
-            for asset in ASSETS:
-                tasks.append((variant, pair, asset))
+    tasks = task_list(args.test_only)
 
     if args.test_only:
-        tasks = tasks[:3]
         print(f"TEST MODE: Processing only {len(tasks)} tables")
         print()
 
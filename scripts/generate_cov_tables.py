@@ -2,6 +2,10 @@
 """
 Tier 1 Remediation: Covariance Feature Table Generation
 Regenerates cov_* tables with 100% row coverage using FULL OUTER JOIN strategy
+
+--local computes every table from the extracted base_* checkpoints with one
+aligned matrix per source variant (see cov_engine.py) instead of one
+BigQuery job per table.
 """
 
 from google.cloud import bigquery
@@ -15,6 +19,10 @@ PROJECT = 'bqx-ml'
 FEATURES_DATASET = 'bqx_ml_v3_features_v2'
 LOCATION = 'us-central1'
 
+# Interval window of the all_intervals union (BETWEEN, inclusive)
+DATE_START = '2020-01-01'
+DATE_END = '2025-11-21'
+
 # All 28 currency pairs
 PAIRS = [
     'audcad', 'audchf', 'audjpy', 'audnzd', 'audusd',
@@ -31,6 +39,14 @@ VARIANTS = ['agg', 'align']
 # Source variants: bqx, idx
 SOURCE_VARIANTS = ['bqx', 'idx']
 
+
+def cov_table_name(variant, source_variant, pair1, pair2):
+    """BQX uses old naming (cov_agg_pair1_pair2), IDX uses new naming (cov_agg_idx_pair1_pair2)."""
+    if source_variant == 'bqx':
+        return f"cov_{variant}_{pair1}_{pair2}"
+    return f"cov_{variant}_idx_{pair1}_{pair2}"
+
+
 def generate_cov_sql(variant, source_variant, pair1, pair2, validate_only=False):
     """Generate SQL for pair relationship table with 100% row coverage.
 
@@ -45,11 +61,7 @@ def generate_cov_sql(variant, source_variant, pair1, pair2, validate_only=False)
         validate_only: If True, return validation query instead
     """
 
-    # Table naming: BQX uses old naming (cov_agg_pair1_pair2), IDX uses new naming (cov_agg_idx_pair1_pair2)
-    if source_variant == 'bqx':
-        table_name = f"cov_{variant}_{pair1}_{pair2}"
-    else:  # idx
-        table_name = f"cov_{variant}_idx_{pair1}_{pair2}"
+    table_name = cov_table_name(variant, source_variant, pair1, pair2)
 
     # Source tables
     source_table_1 = f"base_{source_variant}_{pair1}"
@@ -105,13 +117,13 @@ def generate_cov_sql(variant, source_variant, pair1, pair2, validate_only=False)
         -- Get ALL unique interval_times from both pairs
         SELECT DISTINCT interval_time
         FROM `{PROJECT}.{FEATURES_DATASET}.{source_table_1}`
-        WHERE interval_time BETWEEN '2020-01-01' AND '2025-11-21'
+        WHERE interval_time BETWEEN '{DATE_START}' AND '{DATE_END}'
 
         UNION DISTINCT
 
         SELECT DISTINCT interval_time
         FROM `{PROJECT}.{FEATURES_DATASET}.{source_table_2}`
-        WHERE interval_time BETWEEN '2020-01-01' AND '2025-11-21'
+        WHERE interval_time BETWEEN '{DATE_START}' AND '{DATE_END}'
       ),
       pair1_data AS (
         SELECT interval_time, {value_col} as val1
@@ -172,10 +184,7 @@ def generate_cov_sql(variant, source_variant, pair1, pair2, validate_only=False)
 
 def validate_table(client, variant, source_variant, pair1, pair2):
     """Validate regenerated table against original."""
-    if source_variant == 'bqx':
-        table_name = f"cov_{variant}_{pair1}_{pair2}"
-    else:
-        table_name = f"cov_{variant}_idx_{pair1}_{pair2}"
+    table_name = cov_table_name(variant, source_variant, pair1, pair2)
 
     try:
         validation_sql = generate_cov_sql(variant, source_variant, pair1, pair2, validate_only=True)
@@ -201,10 +210,7 @@ def validate_table(client, variant, source_variant, pair1, pair2):
 
 def generate_cov_table(client, variant, source_variant, pair1, pair2, dry_run=False):
     """Generate a single covariance table."""
-    if source_variant == 'bqx':
-        table_name = f"cov_{variant}_{pair1}_{pair2}"
-    else:
-        table_name = f"cov_{variant}_idx_{pair1}_{pair2}"
+    table_name = cov_table_name(variant, source_variant, pair1, pair2)
 
     if dry_run:
         return {'table': table_name, 'status': 'DRY_RUN'}
@@ -232,6 +238,45 @@ def generate_cov_table(client, variant, source_variant, pair1, pair2, dry_run=Fa
         }
 
 
+def task_list(source_variants, test_only=False):
+    """(variant, source_variant, pair1, pair2) for every table to generate (excluding self-pairs)."""
+    tasks = []
+    for source_variant in source_variants:
+        for variant in VARIANTS:
+            for pair1, pair2 in itertools.combinations(PAIRS, 2):
+                tasks.append((variant, source_variant, pair1, pair2))
+    return tasks[:3] if test_only else tasks
+
+
+def run_local(args, source_variants):
+    """Generate all cov_* tables locally with cov_engine (no BigQuery jobs)."""
+    from cov_engine import build_cov_tables_local, CHECKPOINT_ROOT, LOCAL_OUTPUT_ROOT
+    from local_tables import print_run_header, report_results
+
+    tasks = task_list(source_variants, args.test_only)
+    checkpoint_root = args.checkpoint_dir or CHECKPOINT_ROOT
+    output_root = args.output_dir or LOCAL_OUTPUT_ROOT
+
+    print_run_header("TIER 1: COVARIANCE TABLE GENERATION", checkpoint_root, f"{output_root}/cov", len(tasks))
+
+    results = []
+    for source_variant in source_variants:
+        selected = [t for t in tasks if t[1] == source_variant]
+        if not selected:
+            continue
+        combinations = list(dict.fromkeys(t[2:] for t in selected))
+        variants = list(dict.fromkeys(t[0] for t in selected))
+        if args.dry_run:
+            results += [{'table': cov_table_name(*t), 'status': 'DRY_RUN'} for t in selected]
+            continue
+        print(f"\n{source_variant.upper()}: {len(combinations)} pair combinations × {len(variants)} variants", flush=True)
+        built = build_cov_tables_local(source_variant, checkpoint_root, output_root, combinations, variants)
+        wanted = {cov_table_name(*t) for t in selected}
+        results += [r for r in built if r['table'] in wanted]
+
+    return report_results(results, len(tasks))
+
+
 def main():
     import argparse
     parser = argparse.ArgumentParser(description='Generate covariance feature tables')
@@ -241,17 +286,12 @@ def main():
     parser.add_argument('--test-only', action='store_true', help='Test on 3 tables only')
     parser.add_argument('--bqx-only', action='store_true', help='Only regenerate BQX variant (skip IDX)')
     parser.add_argument('--idx-only', action='store_true', help='Only regenerate IDX variant (skip BQX)')
+    parser.add_argument('--local', action='store_true',
+                        help='Compute locally from extracted base_* checkpoints (one aligned matrix per source variant)')
+    parser.add_argument('--checkpoint-dir', default=None, help='Checkpoint root with one directory per pair (--local)')
+    parser.add_argument('--output-dir', default=None, help='Output root for --local tables')
     args = parser.parse_args()
 
-    client = bigquery.Client(project=PROJECT, location=LOCATION)
-
-    print("=" * 80)
-    print("TIER 1: COVARIANCE TABLE GENERATION")
-    print("=" * 80)
-    print(f"Start time: {datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S')} UTC")
-    print(f"Mode: {'VALIDATION ONLY' if args.validate_only else 'DRY RUN' if args.dry_run else 'GENERATION'}")
-    print(f"Workers: {args.workers}")
-
     # Determine which source variants to generate
     source_variants = []
     if args.bqx_only:
@@ -261,19 +301,26 @@ def main():
     else:
         source_variants = SOURCE_VARIANTS  # Both BQX and IDX
 
+    if args.local:
+        return run_local(args, source_variants)
+
+    client = bigquery.Client(project=PROJECT, location=LOCATION)
+
+    print("=" * 80)
+    print("TIER 1: COVARIANCE TABLE GENERATION")
+    print("=" * 80)
+    print(f"Start time: {datetime.utcnow().strftime('%Y-%m-%d %H:%M:%S')} UTC")
+    print(f"Mode: {'VALIDATION ONLY' if args.validate_only else 'DRY RUN' if args.dry_run else 'GENERATION'}")
+    print(f"Workers: {args.workers}")
+
     print(f"Source Variants: {', '.join(source_variants).upper()}")
     print("=" * 80)
     print()
 
     # Generate all pair combinations (excluding self-pairs)
-    tasks = []
-    for source_variant in source_variants:
-        for variant in VARIANTS:
-            for pair1, pair2 in itertools.combinations(PAIRS, 2):
-                tasks.append((variant, source_variant, pair1, pair2))
+    tasks = task_list(source_variants, args.test_only)
 
     if args.test_only:
-        tasks = tasks[:3]
         print(f"TEST MODE: Processing only {len(tasks)} tables")
         print()
 
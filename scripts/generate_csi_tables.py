@@ -9,9 +9,13 @@ with directional adjustment:
 - When currency is BASE (e.g., USD in USDJPY): direction = +1
 - When currency is QUOTE (e.g., USD in EURUSD): direction = -1
 
+--local computes the tables from the extracted pair checkpoints instead,
+reading each source family once for all currencies (see cross_pair_engine.py).
+
 Usage:
     python generate_csi_tables.py --currency USD --feature-type agg --variant idx
     python generate_csi_tables.py --currency USD --all-types --all-variants
+    python generate_csi_tables.py --all-currencies --all-types --local
 """
 
 import argparse
@@ -313,6 +317,34 @@ def create_csi_table(feature_type: str, currency: str, is_bqx: bool, dry_run: bo
     except Exception as e:
         return False, str(e)
 
+def run_local(args, currencies: List[str], feature_types: List[str], variants: List[bool]) -> int:
+    """Build the selected CSI tables with cross_pair_engine (no BigQuery jobs)."""
+    from cross_pair_engine import build_cross_pair_tables_local, CHECKPOINT_ROOT, LOCAL_OUTPUT_ROOT
+
+    tables = {get_csi_table_name(ft, c, is_bqx) for c in currencies for ft in feature_types for is_bqx in variants}
+    if args.dry_run:
+        for table in sorted(tables):
+            print(f"  DRY RUN - would build {table}")
+        return 0
+
+    results = build_cross_pair_tables_local(
+        args.checkpoint_dir or CHECKPOINT_ROOT, args.output_dir or LOCAL_OUTPUT_ROOT,
+        groups=['csi'], kinds=feature_types, variants=['bqx' if v else 'idx' for v in variants],
+        tables=tables
+    )
+    failed = [r for r in results if r['status'] != 'SUCCESS']
+    for r in results:
+        if r['status'] == 'SUCCESS':
+            print(f"  ✓ {r['table']} ({r['rows']:,} rows)")
+        else:
+            print(f"  ✗ FAILED: {r['table']}: {r['error'][:100]}")
+
+    print("\n" + "=" * 60)
+    print(f"CSI Table Generation Complete (local)")
+    print(f"  Success: {len(results) - len(failed)}/{len(tables)}")
+    print(f"  Failed:  {len(failed)}/{len(tables)}")
+    return 0 if not failed else 1
+
 def main():
     parser = argparse.ArgumentParser(description='Generate CSI tables')
     parser.add_argument('--currency', type=str, help='Currency code (USD, EUR, etc.)')
@@ -323,6 +355,10 @@ def main():
     parser.add_argument('--all-types', action='store_true', help='Generate for all feature types')
     parser.add_argument('--dry-run', action='store_true', help='Print SQL without executing')
     parser.add_argument('--max-retries', type=int, default=3, help='Max retries per table')
+    parser.add_argument('--local', action='store_true',
+                        help='Compute locally from extracted pair checkpoints (one read per source family)')
+    parser.add_argument('--checkpoint-dir', default=None, help='Checkpoint root with one directory per pair (--local)')
+    parser.add_argument('--output-dir', default=None, help='Output root for --local tables')
 
     args = parser.parse_args()
 
@@ -355,6 +391,9 @@ def main():
     print(f"Variants: {'IDX + BQX' if len(variants) == 2 else ('BQX' if variants[0] else 'IDX')}")
     print("-" * 60)
 
+    if args.local:
+        return run_local(args, currencies, feature_types, variants)
+
     for currency in currencies:
         for ft in feature_types:
             for is_bqx in variants:
@@ -2,8 +2,12 @@
 """
 Generate MKT (market-wide) tables.
 Creates mkt_vol, mkt_dispersion, mkt_regime, mkt_sentiment (IDX and BQX variants)
+
+--local builds the same tables from the extracted pair checkpoints in one
+pass per source family (see cross_pair_engine.py).
 """
 
+import argparse
 import subprocess
 import sys
 
@@ -207,7 +211,37 @@ def execute_bq(sql: str, table_name: str) -> bool:
     return True
 
 
+def run_local(args) -> int:
+    """Build all 8 MKT tables with cross_pair_engine (no BigQuery jobs)."""
+    from cross_pair_engine import build_cross_pair_tables_local, CHECKPOINT_ROOT, LOCAL_OUTPUT_ROOT
+
+    results = build_cross_pair_tables_local(
+        args.checkpoint_dir or CHECKPOINT_ROOT, args.output_dir or LOCAL_OUTPUT_ROOT,
+        groups=['mkt'], kinds=['vol', 'agg', 'reg', 'mom']
+    )
+    failed = 0
+    for r in results:
+        if r['status'] == 'SUCCESS':
+            print(f"  ✓ {r['table']} ({r['rows']:,} rows)")
+        else:
+            print(f"  ✗ FAILED: {r['table']}: {r['error']}")
+            failed += 1
+
+    print(f"\nMKT Tables Complete: {len(results) - failed}/8 success, {failed}/8 failed")
+    return 0 if failed == 0 else 1
+
+
 def main():
+    parser = argparse.ArgumentParser(description='Generate MKT tables')
+    parser.add_argument('--local', action='store_true',
+                        help='Compute locally from extracted pair checkpoints (one read per source family)')
+    parser.add_argument('--checkpoint-dir', default=None, help='Checkpoint root with one directory per pair (--local)')
+    parser.add_argument('--output-dir', default=None, help='Output root for --local tables')
+    args = parser.parse_args()
+
+    if args.local:
+        return run_local(args)
+
     results = {'success': 0, 'failed': 0}
 
     # Generate all 8 MKT tables
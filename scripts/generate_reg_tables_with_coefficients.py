@@ -21,17 +21,36 @@ Key formulas:
 - lin_term = β₁ × N
 - const_term = β₀
 - residual = y - (quad_term + lin_term + const_term)
+
+LOCAL MODE (--local): the same columns computed in-process from the extracted
+base_* checkpoints with reg_engine.py (no BigQuery scan); --compare checks the
+result against the extracted SQL-built table.
 """
 
 import subprocess
 import sys
 import argparse
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
 from typing import List
 
+import pandas as pd
+import pyarrow.parquet as pq
+
+from reg_engine import REG_COLUMNS, write_reg_parquet, compare_frames
+
 PROJECT = "bqx-ml"
 DATASET_V2 = "bqx_ml_v3_features_v2"
 LOCATION = "us-central1"
 
+# Local mode (--local): extracted checkpoints in, reg parquet out
+CHECKPOINT_ROOT = "/home/micha/bqx_ml_v3/data/features/checkpoints"
+LOCAL_OUTPUT_ROOT = "/home/micha/bqx_ml_v3/data/features/local"
+
+# Default --compare tolerance: the local float64 sums reproduce BigQuery's to
+# ~2e-8 relative, not bit for bit (different summation order)
+COMPARE_TOLERANCE = 1e-6
+
 PAIRS = [
     'eurusd', 'gbpusd', 'usdjpy', 'usdchf', 'audusd', 'usdcad', 'nzdusd',
     'eurgbp', 'eurjpy', 'eurchf', 'euraud', 'eurcad', 'eurnzd',
@@ -44,6 +63,16 @@ PAIRS = [
 WINDOWS = [45, 90, 180, 360, 720, 1440, 2880]
 
 
+def table_spec(pair: str, variant: str = "idx") -> tuple:
+    """(source_table, output_table, source_col) of a REG table variant."""
+    if variant == "bqx":
+        return f"base_bqx_{pair}", f"reg_bqx_{pair}", "bqx_45"
+    if variant == "idx":
+        return f"base_idx_{pair}", f"reg_idx_{pair}", "close_idx"
+    # For reg_* (other variant): legacy source table name
+    return f"{pair}_idx", f"reg_{pair}", "close_idx"
+
+
 def generate_polynomial_sql_v5(pair: str, variant: str = "idx") -> str:
     """
     Generate SQL for polynomial regression features with BOTH coefficients and terms.
@@ -53,19 +82,7 @@ def generate_polynomial_sql_v5(pair: str, variant: str = "idx") -> str:
       Stage 1: Basic window statistics (mean, std, min, max, first, var, sums)
       Stage 2: Calculate polynomial coefficients AND endpoint-scaled terms
     """
-    if variant == "bqx":
-        source_table = f"base_bqx_{pair}"
-        output_table = f"reg_bqx_{pair}"
-        source_col = "bqx_45"
-    elif variant == "idx":
-        source_table = f"base_idx_{pair}"
-        output_table = f"reg_idx_{pair}"
-        source_col = "close_idx"
-    else:
-        # For reg_* (other variant)
-        source_table = f"{pair}_idx"  # Legacy table name
-        output_table = f"reg_{pair}"
-        source_col = "close_idx"
+    source_table, output_table, source_col = table_spec(pair, variant)
 
     # Stage 1: Basic window calculations
     stage1_cols = []
@@ -282,6 +299,75 @@ def execute_bq(sql: str, table_name: str, dry_run: bool = False) -> bool:
         return False
 
 
+def build_reg_table_local(pair: str, variant: str, checkpoint_dir: str = None,
+                          output_dir: str = None, compare: bool = False,
+                          tolerance: float = COMPARE_TOLERANCE) -> bool:
+    """
+    Build one REG table locally from its extracted base_* checkpoint (see reg_engine).
+
+    Args:
+        pair: Currency pair
+        variant: idx, bqx or other
+        checkpoint_dir: Pair checkpoint directory holding {source_table}.parquet
+                        (and {output_table}.parquet, the SQL output, for compare)
+        output_dir: Where {output_table}.parquet is written
+        compare: Compare the result column by column against the SQL output
+        tolerance: Max relative difference accepted by compare (0 = bit for bit)
+
+    Returns:
+        True if built (and, with compare, within tolerance)
+    """
+    source_table, output_table, source_col = table_spec(pair, variant)
+    checkpoint_dir = Path(checkpoint_dir or f"{CHECKPOINT_ROOT}/{pair}")
+    output_dir = Path(output_dir or f"{LOCAL_OUTPUT_ROOT}/{pair}")
+    source_path = checkpoint_dir / f"{source_table}.parquet"
+    output_path = output_dir / f"{output_table}.parquet"
+
+    if not source_path.exists():
+        print(f"❌ MISSING: {source_path} (extract {source_table} first)", flush=True)
+        return False
+    schema_names = pq.ParquetFile(source_path).schema_arrow.names
+    if source_col not in schema_names:
+        print(f"❌ FAILED: {output_table} - {source_col} not in {source_path.name} (projected checkpoint?)", flush=True)
+        return False
+
+    base_df = pd.read_parquet(source_path, columns=[c for c in ('interval_time', 'pair', source_col)
+                                                     if c in schema_names])
+    output_dir.mkdir(parents=True, exist_ok=True)
+    rows = write_reg_parquet(base_df, source_col, WINDOWS, str(output_path))
+    print(f"✅ OK: {output_table} ({rows:,} rows) → {output_path}", flush=True)
+
+    if not compare:
+        return True
+
+    sql_path = checkpoint_dir / f"{output_table}.parquet"
+    if not sql_path.exists():
+        print(f"❌ MISSING: {sql_path} (extract the SQL-built {output_table} to compare)", flush=True)
+        return False
+
+    sql_names = set(pq.ParquetFile(sql_path).schema_arrow.names)
+    failures = []
+    for w in WINDOWS:
+        columns = [f"reg_{name}_{w}" for name in REG_COLUMNS if f"reg_{name}_{w}" in sql_names]
+        local_df = pd.read_parquet(output_path, columns=['interval_time'] + columns)
+        sql_df = pd.read_parquet(sql_path, columns=['interval_time'] + columns)
+        report = compare_frames(local_df, sql_df, columns)
+        identical = sum(r['identical'] for r in report.values())
+        total = sum(r['rows'] for r in report.values())
+        worst_col, worst = max(report.items(), key=lambda kv: kv[1]['max_rel_diff'])
+        print(f"  w={w}: {identical:,}/{total:,} values bit-identical, "
+              f"max rel diff {worst['max_rel_diff']:.3g} ({worst_col}, {worst['max_ulp']:.0f} ulp)", flush=True)
+        failures += [col for col, r in report.items()
+                     if r['null_mismatch'] or r['max_rel_diff'] > tolerance]
+
+    if failures:
+        print(f"❌ COMPARE: {output_table} - {len(failures)} columns differ beyond tolerance {tolerance:g}: "
+              f"{', '.join(failures[:10])}{' ...' if len(failures) > 10 else ''}", flush=True)
+        return False
+    print(f"✅ COMPARE: {output_table} matches SQL output (tolerance {tolerance:g})", flush=True)
+    return True
+
+
 def main():
     parser = argparse.ArgumentParser(
         description="Generate REG tables with coefficient + term data (BQX-ML-M005 compliant)"
@@ -307,6 +393,38 @@ def main():
         action="store_true",
         help="Print table names without executing"
     )
+    parser.add_argument(
+        "--local",
+        action="store_true",
+        help="Compute locally from extracted base_* parquet instead of running BigQuery jobs"
+    )
+    parser.add_argument(
+        "--compare",
+        action="store_true",
+        help="With --local: compare against the extracted SQL-built reg table"
+    )
+    parser.add_argument(
+        "--tolerance",
+        type=float,
+        default=COMPARE_TOLERANCE,
+        help=f"Max relative difference accepted by --compare (default: {COMPARE_TOLERANCE:g}; 0 = bit for bit)"
+    )
+    parser.add_argument(
+        "--checkpoint-dir",
+        default=None,
+        help=f"Checkpoint root with one directory per pair (default: {CHECKPOINT_ROOT})"
+    )
+    parser.add_argument(
+        "--output-dir",
+        default=None,
+        help=f"Output root for --local tables (default: {LOCAL_OUTPUT_ROOT})"
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=1,
+        help="Pairs computed in parallel with --local (default: 1)"
+    )
 
     args = parser.parse_args()
 
@@ -332,6 +450,8 @@ def main():
     print(f"Pairs:       {len(pairs_to_run)}")
     print(f"Test mode:   {args.test_only}")
     print(f"Dry run:     {args.dry_run}")
+    print(f"Mode:        {'LOCAL (NumPy engine)' if args.local else 'BigQuery'}"
+          f"{' + compare' if args.local and args.compare else ''}")
     print()
     print("NEW COLUMNS (14 per table):")
     print("  - reg_lin_coef_45, reg_lin_coef_90, ..., reg_lin_coef_2880 (7)")
@@ -342,6 +462,21 @@ def main():
 
     success, failed = 0, 0
 
+    if args.local:
+        jobs = [(pair, args.variant,
+                 f"{args.checkpoint_dir}/{pair}" if args.checkpoint_dir else None,
+                 f"{args.output_dir}/{pair}" if args.output_dir else None,
+                 args.compare, args.tolerance)
+                for pair in pairs_to_run]
+        if args.workers > 1:
+            with ProcessPoolExecutor(max_workers=args.workers) as executor:
+                results = list(executor.map(build_reg_table_local, *zip(*jobs)))
+        else:
+            results = [build_reg_table_local(*job) for job in jobs]
+        success = sum(results)
+        failed = len(results) - success
+        pairs_to_run = []
+
     for pair in pairs_to_run:
         if args.variant == "bqx":
             table_name = f"reg_bqx_{pair}"
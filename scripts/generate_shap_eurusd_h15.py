@@ -4,9 +4,18 @@ SHAP Value Generation for EURUSD h15
 USER MANDATE: 100,000+ samples minimum (BINDING)
 
 Generates TreeSHAP values for all base models and updates feature ledger.
+
+TreeSHAP runs through shap_engine: native contribution prediction per
+model, streamed mean(|SHAP|) over row shards (optionally across --jobs
+processes) and a result cache keyed by model hash, so the 100k-sample
+mandate fits all pairs × horizons in a nightly run:
+
+    python3 generate_shap_eurusd_h15.py --pair gbpusd --horizon 30 --jobs 4
 """
 
+import sys
 import json
+import argparse
 import numpy as np
 import pandas as pd
 from datetime import datetime
@@ -14,10 +23,11 @@ from google.cloud import bigquery
 import lightgbm as lgb
 import xgboost as xgb
 from catboost import CatBoostClassifier
-import shap
 import warnings
 warnings.filterwarnings('ignore')
 
+from shap_engine import mean_abs_shap_many, SHAP_CACHE_DIR
+
 PROJECT = "bqx-ml"
 FEATURES_DATASET = "bqx_ml_v3_features_v2"
 ANALYTICS_DATASET = "bqx_ml_v3_analytics_v2"
@@ -121,8 +131,15 @@ def train_models_for_shap(X, y, feature_names):
     return models
 
 
-def calculate_shap_values(models, X, feature_names, sample_size=SHAP_SAMPLE_SIZE):
-    """Calculate SHAP values for all models."""
+def calculate_shap_values(models, X, feature_names, sample_size=SHAP_SAMPLE_SIZE,
+                          n_jobs: int = 1, cache_dir: str = SHAP_CACHE_DIR):
+    """
+    Calculate mean |SHAP| per feature for all models.
+
+    Args:
+        n_jobs: Worker processes for the row shards (1 = in process)
+        cache_dir: SHAP result cache (None = always recompute)
+    """
 
     # Ensure we have enough samples
     if len(X) < sample_size:
@@ -134,32 +151,12 @@ def calculate_shap_values(models, X, feature_names, sample_size=SHAP_SAMPLE_SIZE
     indices = np.random.choice(len(X), size=sample_size, replace=False)
     X_sample = X[indices]
 
-    shap_results = {}
-
-    print(f"  Calculating SHAP for {sample_size:,} samples...")
-
-    # LightGBM SHAP
-    print("    LightGBM TreeSHAP...")
-    lgb_explainer = shap.TreeExplainer(models['lightgbm'])
-    lgb_shap = lgb_explainer.shap_values(X_sample)
-    if isinstance(lgb_shap, list):
-        lgb_shap = lgb_shap[1]  # Take positive class
-    shap_results['lightgbm'] = np.abs(lgb_shap).mean(axis=0)
-
-    # XGBoost TreeSHAP (XGBoost 2.1.0 compatible)
-    print("    XGBoost TreeSHAP...")
-    xgb_explainer = shap.TreeExplainer(models['xgboost'])
-    xgb_shap = xgb_explainer.shap_values(X_sample)
-    if isinstance(xgb_shap, list):
-        xgb_shap = xgb_shap[1]  # Take positive class for binary classification
-    shap_results['xgboost'] = np.abs(xgb_shap).mean(axis=0)
-    print("      XGBoost TreeSHAP: SUCCESS")
-
-    # CatBoost SHAP
-    print("    CatBoost TreeSHAP...")
-    cb_explainer = shap.TreeExplainer(models['catboost'])
-    cb_shap = cb_explainer.shap_values(X_sample)
-    shap_results['catboost'] = np.abs(cb_shap).mean(axis=0)
+    print(f"  Calculating SHAP for {sample_size:,} samples "
+          f"(LightGBM, XGBoost, CatBoost TreeSHAP, {n_jobs} process{'es' if n_jobs > 1 else ''})...")
+    shap_results = mean_abs_shap_many(
+        {name: models[name] for name in ('lightgbm', 'xgboost', 'catboost')},
+        X_sample, n_jobs=n_jobs, cache_dir=cache_dir
+    )
 
     # Ensemble average (3 TreeSHAP models: LGB, XGB, CB)
     ensemble_shap = (shap_results['lightgbm'] + shap_results['xgboost'] + shap_results['catboost']) / 3
@@ -177,11 +174,17 @@ def calculate_shap_values(models, X, feature_names, sample_size=SHAP_SAMPLE_SIZE
 
 
 def main():
-    pair = "eurusd"
-    horizon = 15
+    parser = argparse.ArgumentParser(description='Generate TreeSHAP importances for one pair/horizon')
+    parser.add_argument('--pair', default='eurusd', help='Currency pair (default: eurusd)')
+    parser.add_argument('--horizon', type=int, default=15, help='Prediction horizon (default: 15)')
+    parser.add_argument('--jobs', type=int, default=1, help='Worker processes for SHAP row shards')
+    parser.add_argument('--no-cache', action='store_true', help='Recompute SHAP even for cached models')
+    args = parser.parse_args()
+    pair = args.pair.lower()
+    horizon = args.horizon
 
     print("=" * 70)
-    print("SHAP VALUE GENERATION - EURUSD h15")
+    print(f"SHAP VALUE GENERATION - {pair.upper()} h{horizon}")
     print(f"USER MANDATE: {SHAP_SAMPLE_SIZE:,}+ samples (BINDING)")
     print("=" * 70)
 
@@ -207,7 +210,8 @@ def main():
 
     # Calculate SHAP
     print("\nStep 3: Calculating TreeSHAP values...")
-    importance_df, actual_samples = calculate_shap_values(models, X, feature_cols)
+    importance_df, actual_samples = calculate_shap_values(
+        models, X, feature_cols, n_jobs=args.jobs, cache_dir=None if args.no_cache else SHAP_CACHE_DIR)
 
     # Validate mandate compliance
     print("\n" + "=" * 70)
@@ -239,7 +243,7 @@ def main():
         'all_features': importance_df[['feature', 'ensemble_shap', 'lgb_shap', 'xgb_shap', 'cb_shap']].to_dict('records')
     }
 
-    output_file = f"/home/micha/bqx_ml_v3/intelligence/shap_eurusd_h15.json"
+    output_file = f"/home/micha/bqx_ml_v3/intelligence/shap_{pair}_h{horizon}.json"
     with open(output_file, 'w') as f:
         json.dump(output, f, indent=2)
 
@@ -257,5 +261,4 @@ def main():
 
 
 if __name__ == "__main__":
-    import sys
     sys.exit(main())
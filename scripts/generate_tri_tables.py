@@ -2,6 +2,10 @@
 """
 Tier 1 Remediation: Triangulation Feature Table Generation
 Regenerates tri_* tables with 100% row coverage using FULL OUTER JOIN strategy
+
+--local computes every table from the extracted base_* checkpoints in one
+vectorized pass per source variant (see tri_engine.py) instead of one
+BigQuery job per table.
 """
 
 from google.cloud import bigquery
@@ -14,6 +18,10 @@ PROJECT = 'bqx-ml'
 FEATURES_DATASET = 'bqx_ml_v3_features_v2'
 LOCATION = 'us-central1'
 
+# Interval window of the all_intervals union (BETWEEN, inclusive)
+DATE_START = '2020-01-01'
+DATE_END = '2025-11-21'
+
 # Currency triangles - all valid 3-currency combinations
 # Format: (base, quote, cross) where base/quote * quote/cross ≈ base/cross
 TRIANGLES = [
@@ -154,13 +162,13 @@ def generate_tri_sql(variant, source_variant, base_curr, quote_curr, cross_curr,
         -- (pair2 direction varies, so we'll handle it separately)
         SELECT DISTINCT interval_time
         FROM `{PROJECT}.{FEATURES_DATASET}.{source_table_1}`
-        WHERE interval_time BETWEEN '2020-01-01' AND '2025-11-21'
+        WHERE interval_time BETWEEN '{DATE_START}' AND '{DATE_END}'
 
         UNION DISTINCT
 
         SELECT DISTINCT interval_time
         FROM `{PROJECT}.{FEATURES_DATASET}.{source_table_3}`
-        WHERE interval_time BETWEEN '2020-01-01' AND '2025-11-21'
+        WHERE interval_time BETWEEN '{DATE_START}' AND '{DATE_END}'
       ),
       pair1_data AS (
         SELECT interval_time, {value_col} as pair1_val
@@ -285,6 +293,46 @@ def generate_tri_table(client, variant, source_variant, base_curr, quote_curr, c
         }
 
 
+def task_list(test_only=False):
+    """(variant, source_variant, base, quote, cross) for every table to generate."""
+    tasks = []
+    for variant in VARIANTS:
+        for source_variant in SOURCE_VARIANTS:
+            for base, quote, cross in TRIANGLES:
+                tasks.append((variant, source_variant, base, quote, cross))
+    return tasks[:3] if test_only else tasks
+
+
+def run_local(args):
+    """Generate all tri_* tables locally with tri_engine (no BigQuery jobs)."""
+    from tri_engine import build_tri_tables_local, CHECKPOINT_ROOT, LOCAL_OUTPUT_ROOT
+    from local_tables import print_run_header, report_results
+
+    tasks = task_list(args.test_only)
+    checkpoint_root = args.checkpoint_dir or CHECKPOINT_ROOT
+    output_root = args.output_dir or LOCAL_OUTPUT_ROOT
+
+    print_run_header("TIER 1: TRIANGULATION TABLE GENERATION", checkpoint_root, f"{output_root}/tri", len(tasks))
+
+    results = []
+    for source_variant in SOURCE_VARIANTS:
+        selected = [t for t in tasks if t[1] == source_variant]
+        if not selected:
+            continue
+        triangles = list(dict.fromkeys(t[2:] for t in selected))
+        variants = list(dict.fromkeys(t[0] for t in selected))
+        if args.dry_run:
+            results += [{'table': f"tri_{t[0]}_{source_variant}_{'_'.join(t[2:])}", 'status': 'DRY_RUN'}
+                        for t in selected]
+            continue
+        print(f"\n{source_variant.upper()}: {len(triangles)} triangles × {len(variants)} variants", flush=True)
+        built = build_tri_tables_local(source_variant, checkpoint_root, output_root, triangles, variants)
+        wanted = {f"tri_{t[0]}_{source_variant}_{'_'.join(t[2:])}" for t in selected}
+        results += [r for r in built if r['table'] in wanted]
+
+    return report_results(results, len(tasks))
+
+
 def main():
     import argparse
     parser = argparse.ArgumentParser(description='Generate triangulation feature tables')
@@ -292,8 +340,15 @@ def main():
     parser.add_argument('--dry-run', action='store_true', help='Dry run - show what would be generated')
     parser.add_argument('--workers', type=int, default=16, help='Number of parallel workers')
     parser.add_argument('--test-only', action='store_true', help='Test on 3 tables only')
+    parser.add_argument('--local', action='store_true',
+                        help='Compute locally from extracted base_* checkpoints (one load per source variant)')
+    parser.add_argument('--checkpoint-dir', default=None, help='Checkpoint root with one directory per pair (--local)')
+    parser.add_argument('--output-dir', default=None, help='Output root for --local tables')
     args = parser.parse_args()
 
+    if args.local:
+        return run_local(args)
+
     client = bigquery.Client(project=PROJECT, location=LOCATION)
 
     print("=" * 80)
@@ -306,14 +361,9 @@ def main():
     print()
 
     # Generate task list
-    tasks = []
-    for variant in VARIANTS:
-        for source_variant in SOURCE_VARIANTS:
-            for base, quote, cross in TRIANGLES:
-                tasks.append((variant, source_variant, base, quote, cross))
+    tasks = task_list(args.test_only)
 
     if args.test_only:
-        tasks = tasks[:3]
         print(f"TEST MODE: Processing only {len(tasks)} tables")
         print()
 
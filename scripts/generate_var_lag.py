@@ -2,8 +2,12 @@
 """
 Generate missing VAR LAG tables.
 Creates var_lag_idx_cad, var_lag_idx_chf, var_lag_bqx_jpy, var_lag_bqx_nzd
+
+--local builds the same tables from the extracted lag_*_45 checkpoints in
+one pass per variant (see cross_pair_engine.py).
 """
 
+import argparse
 import subprocess
 import sys
 
@@ -98,7 +102,37 @@ def execute_bq(sql: str, table_name: str) -> bool:
     return True
 
 
+def run_local(args) -> int:
+    """Build the VAR LAG tables with cross_pair_engine (no BigQuery jobs)."""
+    from cross_pair_engine import build_cross_pair_tables_local, CHECKPOINT_ROOT, LOCAL_OUTPUT_ROOT, LAG45_KIND
+
+    results = build_cross_pair_tables_local(
+        args.checkpoint_dir or CHECKPOINT_ROOT, args.output_dir or LOCAL_OUTPUT_ROOT,
+        groups=['var'], kinds=[LAG45_KIND]
+    )
+    failed = 0
+    for r in results:
+        if r['status'] == 'SUCCESS':
+            print(f"  ✓ {r['table']} ({r['rows']:,} rows)")
+        else:
+            print(f"  ✗ FAILED: {r['table']}: {r['error']}")
+            failed += 1
+
+    print(f"\nVAR LAG Complete: {len(results) - failed}/4 success, {failed}/4 failed")
+    return 0 if failed == 0 else 1
+
+
 def main():
+    parser = argparse.ArgumentParser(description='Generate VAR LAG tables')
+    parser.add_argument('--local', action='store_true',
+                        help='Compute locally from extracted lag_*_45 checkpoints')
+    parser.add_argument('--checkpoint-dir', default=None, help='Checkpoint root with one directory per pair (--local)')
+    parser.add_argument('--output-dir', default=None, help='Output root for --local tables')
+    args = parser.parse_args()
+
+    if args.local:
+        return run_local(args)
+
     results = {'success': 0, 'failed': 0}
 
     for variant, currency in TABLES_TO_CREATE:
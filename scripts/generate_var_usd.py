@@ -2,8 +2,12 @@
 """
 Generate VAR tables for USD currency.
 Creates var_agg_idx_usd, var_agg_bqx_usd, var_align_idx_usd, var_align_bqx_usd
+
+--local builds the same tables from the extracted pair checkpoints in one
+pass per source family (see cross_pair_engine.py).
 """
 
+import argparse
 import subprocess
 import sys
 
@@ -93,7 +97,37 @@ def execute_bq(sql: str, table_name: str) -> bool:
     return True
 
 
+def run_local(args) -> int:
+    """Build the 4 USD VAR tables with cross_pair_engine (no BigQuery jobs)."""
+    from cross_pair_engine import build_cross_pair_tables_local, CHECKPOINT_ROOT, LOCAL_OUTPUT_ROOT
+
+    results = build_cross_pair_tables_local(
+        args.checkpoint_dir or CHECKPOINT_ROOT, args.output_dir or LOCAL_OUTPUT_ROOT,
+        groups=['var'], kinds=['agg', 'align']
+    )
+    failed = 0
+    for r in results:
+        if r['status'] == 'SUCCESS':
+            print(f"  ✓ {r['table']} ({r['rows']:,} rows)")
+        else:
+            print(f"  ✗ FAILED: {r['table']}: {r['error']}")
+            failed += 1
+
+    print(f"\nVAR USD Complete: {len(results) - failed}/4 success, {failed}/4 failed")
+    return 0 if failed == 0 else 1
+
+
 def main():
+    parser = argparse.ArgumentParser(description='Generate USD VAR tables')
+    parser.add_argument('--local', action='store_true',
+                        help='Compute locally from extracted pair checkpoints (one read per source family)')
+    parser.add_argument('--checkpoint-dir', default=None, help='Checkpoint root with one directory per pair (--local)')
+    parser.add_argument('--output-dir', default=None, help='Output root for --local tables')
+    args = parser.parse_args()
+
+    if args.local:
+        return run_local(args)
+
     results = {'success': 0, 'failed': 0}
 
     # Generate all 4 VAR tables for USD
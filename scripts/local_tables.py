@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+"""
+Local Tables - Shared Loading, Alignment and Output Helpers of the Local Engines
+
+tri_engine, cov_engine and corr_engine rebuild BigQuery feature tables from
+the extracted base_* checkpoints. They share:
+- load_pair_series / read_series: one checkpoint's (times, values)
+- align_series: several series on one sorted time grid + row-presence mask
+- window_mask: rows inside the all_intervals BETWEEN window
+- constant_column: a string column holding one value
+- month_labels / write_partitioned: month-partitioned Parquet output
+- print_run_header / report_results: the generate_*_tables --local console
+  header and per-table summary
+
+Usage:
+    from local_tables import load_pair_series, align_series, window_mask
+    grid, values, present, pairs = align_series({p: load_pair_series(p, 'bqx') for p in pairs})
+    in_window = window_mask(grid, DATE_START, DATE_END)
+"""
+
+import os
+import shutil
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+CHECKPOINT_ROOT = "/home/micha/bqx_ml_v3/data/features/checkpoints"
+LOCAL_OUTPUT_ROOT = "/home/micha/bqx_ml_v3/data/features/local"
+
+VALUE_COLUMNS = {'bqx': 'bqx_45', 'idx': 'close_idx'}
+
+
+# ============================================================================
+# INPUT
+# ============================================================================
+
+def read_series(path: str, value_column: str) -> tuple:
+    """
+    Read (interval_time, value_column) of one checkpoint parquet.
+
+    Returns: (times int64 ns UTC, values float64 with NaN = NULL), or None if absent
+    """
+    if not os.path.exists(path):
+        return None
+    table = pq.read_table(path, columns=['interval_time', value_column])
+    times = pd.to_datetime(table.column(0).to_pandas(), utc=True).to_numpy(dtype='datetime64[ns]')
+    values = pd.to_numeric(table.column(1).to_pandas(), errors='coerce').to_numpy(dtype=np.float64,
+                                                                                   na_value=np.nan)
+    return times.astype(np.int64), values
+
+
+def load_pair_series(pair: str, source_variant: str, checkpoint_root: str = CHECKPOINT_ROOT) -> tuple:
+    """
+    Read one base_{source_variant}_{pair} checkpoint.
+
+    Returns: (times int64 ns UTC, values float64), or None if not extracted
+    """
+    path = os.path.join(checkpoint_root, pair, f"base_{source_variant}_{pair}.parquet")
+    return read_series(path, VALUE_COLUMNS[source_variant])
+
+
+def align_series(series: dict) -> tuple:
+    """
+    Put series on one sorted time grid.
+
+    Args:
+        series: {name: (times int64, values float64)}
+
+    Returns:
+        (grid int64 ns, values T×P float64 (NaN = missing or NULL),
+         present T×P bool (row exists), [name order])
+    """
+    names = sorted(series)
+    grid = np.unique(np.concatenate([series[n][0] for n in names])) if names else np.empty(0, np.int64)
+    values = np.full((len(grid), len(names)), np.nan)
+    present = np.zeros((len(grid), len(names)), dtype=bool)
+    for j, name in enumerate(names):
+        times, vals = series[name]
+        pos = np.searchsorted(grid, times)
+        values[pos, j] = vals
+        present[pos, j] = True
+    return grid, values, present, names
+
+
+def window_mask(grid: np.ndarray, date_start: str, date_end: str) -> np.ndarray:
+    """Rows inside the all_intervals BETWEEN window (timestamp bounds, inclusive)."""
+    start = pd.Timestamp(date_start, tz='UTC').value
+    end = pd.Timestamp(date_end, tz='UTC').value
+    return (grid >= start) & (grid <= end)
+
+
+# ============================================================================
+# OUTPUT
+# ============================================================================
+
+def constant_column(value: str, n: int) -> pa.Array:
+    """A string column holding one value (built as a 1-entry dictionary, not n Python strings)."""
+    indices = pa.array(np.zeros(n, dtype=np.int32))
+    return pa.DictionaryArray.from_arrays(indices, pa.array([value])).cast(pa.string())
+
+
+def month_labels(times: np.ndarray) -> pa.Array:
+    """'YYYY-MM' partition labels of int64 ns UTC times."""
+    months = times.astype('datetime64[ns]').astype('datetime64[M]')
+    return pa.array(np.datetime_as_string(months, unit='M'))
+
+
+def write_partitioned(frame, table_dir: str, month: pa.Array = None) -> None:
+    """
+    Write a table as month-partitioned Parquet (table_dir/month=YYYY-MM/part-0.parquet).
+
+    Written to a temporary directory and swapped in, so readers never see a
+    half-written table.
+
+    Args:
+        frame: pandas DataFrame or Arrow table with a UTC interval_time column
+        table_dir: Table directory
+        month: Precomputed 'YYYY-MM' labels (tables sharing a row set reuse them)
+    """
+    if isinstance(frame, pa.Table):
+        table = frame
+        if month is None:
+            times = frame.column('interval_time').cast(pa.timestamp('ns', tz='UTC'))
+            month = month_labels(times.to_numpy().astype(np.int64))
+    else:
+        table = pa.Table.from_pandas(frame, preserve_index=False)
+        if month is None:
+            month = pa.array(frame['interval_time'].dt.strftime('%Y-%m').to_numpy(dtype=object))
+    table = table.append_column('month', month)
+
+    tmp_dir = f"{table_dir}.tmp"
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    pq.write_to_dataset(table, tmp_dir, partition_cols=['month'],
+                        basename_template='part-{i}.parquet')
+    shutil.rmtree(table_dir, ignore_errors=True)
+    os.replace(tmp_dir, table_dir)
+
+
+# ============================================================================
+# CONSOLE
+# ============================================================================
+
+def print_run_header(title: str, checkpoint_root: str, output_dir: str, total: int,
+                     workers: int = None) -> None:
+    """Banner of a generate_*_tables --local run."""
+    print("=" * 80)
+    print(f"{title} (LOCAL)")
+    print("=" * 80)
+    print(f"Checkpoints: {checkpoint_root}")
+    print(f"Output: {output_dir}")
+    if workers is not None:
+        print(f"Workers: {workers}")
+    print(f"Total tables to process: {total}")
+    print("=" * 80, flush=True)
+
+
+def report_results(results: list, total: int) -> int:
+    """
+    Print one line per result dict (SUCCESS / DRY_RUN / FAILED) and the totals.
+
+    Returns: process exit code (0 if nothing failed)
+    """
+    successful = sum(1 for r in results if r['status'] == 'SUCCESS')
+    failed = sum(1 for r in results if r['status'] == 'FAILED')
+    for result in results:
+        if result['status'] == 'SUCCESS':
+            print(f"✅ {result['table']}: {result['rows']:,} rows")
+        elif result['status'] == 'DRY_RUN':
+            print(f"🔍 {result['table']}: Would generate")
+        else:
+            print(f"❌ {result['table']}: {result.get('error', 'Unknown')[:80]}")
+
+    print()
+    print("=" * 80)
+    print(f"✅ Successful: {successful}/{total}")
+    print(f"❌ Failed: {failed}/{total}")
+    print("=" * 80)
+    return 0 if failed == 0 else 1
@@ -17,6 +17,8 @@ PAIR="${PAIR:-eurusd}"
 CHECKPOINT_BUCKET="${GCS_CHECKPOINT_BUCKET:-gs://bqx-ml-staging}"
 OUTPUT_BUCKET="${GCS_OUTPUT_BUCKET:-gs://bqx-ml-output}"
 MERGE_METHOD="${MERGE_METHOD:-bigquery}"
+MAX_RSS_GB="${MAX_RSS_GB:-8}"  # Polars method: streaming merge RSS budget
+INCREMENTAL="${INCREMENTAL:-0}"  # Polars method: 1 = re-merge only refreshed tail onto previous output
 
 CHECKPOINT_DIR="${CHECKPOINT_BUCKET}/checkpoints/${PAIR}"
 OUTPUT_FILE="${OUTPUT_BUCKET}/training_${PAIR}.parquet"
@@ -72,19 +74,29 @@ if [ "${MERGE_METHOD}" = "bigquery" ]; then
     }
 
 elif [ "${MERGE_METHOD}" = "polars" ]; then
-    echo "Method: Polars Local Merge (HIGH MEMORY)"
+    echo "Method: Streaming Local Merge (BOUNDED MEMORY)"
     echo "  - Download ${checkpoint_count} checkpoints from GCS to /tmp"
-    echo "  - Merge with Polars (requires ~56 GB memory for EURUSD)"
+    echo "  - Single k-way merge over sorted checkpoints"
     echo "  - Upload merged result to GCS"
-    echo "  - Memory: ~6× file size (may OOM on standard instances)"
+    echo "  - Memory: held under ${MAX_RSS_GB} GB RSS (16 GB instance is sufficient)"
     echo ""
 
-    # WARNING: This requires high-memory instance (>64 GB)
+    INCREMENTAL_ARGS=""
+    if [ "${INCREMENTAL}" = "1" ]; then
+        # Previous output is the base the refreshed tail is spliced onto
+        if gsutil -q stat "${OUTPUT_FILE}"; then
+            echo "Incremental: downloading previous ${OUTPUT_FILE}"
+            gsutil cp "${OUTPUT_FILE}" "/tmp/training_${PAIR}.parquet"
+        fi
+        INCREMENTAL_ARGS="--incremental"
+    fi
+
     python3 /workspace/scripts/merge_with_polars_safe.py \
         "${PAIR}" \
         "${CHECKPOINT_DIR}" \
-        "/tmp/training_${PAIR}.parquet" || {
-        echo "❌ MERGE FAILED: Polars merge error (likely OOM)"
+        "/tmp/training_${PAIR}.parquet" \
+        --max-rss "${MAX_RSS_GB}" ${INCREMENTAL_ARGS} || {
+        echo "❌ MERGE FAILED: Streaming merge error"
         exit 1
     }
 
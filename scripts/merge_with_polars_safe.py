@@ -12,16 +12,47 @@ This script adds safety controls:
 2. Memory limit enforcement (max 50GB via resource module)
 3. Progress monitoring
 4. Graceful failure handling
+
+STREAMING ENGINE (default):
+- Single k-way merge over all sorted checkpoints (see streaming_merge.py)
+- Output written incrementally, one row group per batch
+- RSS held under --max-rss (default 8 GB) → runs on a 16 GB Cloud Run instance
+- The original per-file join remains available via --engine join
+
+GCS CHECKPOINTS (gs:// checkpoint_dir):
+- streaming: checkpoints are read in place by ranged row-group reads, with
+  cursors advanced ahead of the batch assembly (no up-front download)
+- join: targets are downloaded first; feature files are prefetched
+  DOWNLOAD_CONCURRENCY ahead and each is joined as soon as it lands
+
+INCREMENTAL (--incremental, streaming engine):
+- After an append-only checkpoint refresh (extract_to_parquet.py --refresh),
+  keep the existing output's rows before the earlier of the pending refresh
+  start and the output's own watermark (both in _watermarks.json) and
+  re-merge only the tail
+- Falls back to a full merge if an unmerged extraction re-extracted any table
+
+Usage:
+    python3 merge_with_polars_safe.py <pair> [checkpoint_dir] [output_path]
+        [--engine streaming|join] [--batch-rows N] [--max-rss GB] [--incremental]
 """
 
 import sys
 import os
+import argparse
 import polars as pl
 import resource
 import gc
 from pathlib import Path
 from datetime import datetime
-from google.cloud import storage  # For GCS checkpoint support
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'pipelines', 'training'))
+from streaming_merge import streaming_merge, list_checkpoints, DEFAULT_BATCH_ROWS, DEFAULT_MAX_RSS_GB
+from checkpoint_watermark import (
+    load_watermarks, save_watermarks, merge_since, record_merge, parquet_watermark, WATERMARK_FILE
+)
+import object_store  # Shared GCS client, in-place reads, read-ahead downloads
 
 # ============================================================================
 # SAFETY CONFIGURATION (OPS Requirements)
@@ -30,6 +61,7 @@ from google.cloud import storage  # For GCS checkpoint support
 MAX_MEMORY_GB = 50  # Maximum memory this process can use
 MIN_FREE_MEMORY_GB = 40  # Minimum free memory required to start
 CHECKPOINT_INTERVAL = 50  # Log progress every N files
+DOWNLOAD_CONCURRENCY = 16  # Parallel GCS checkpoint downloads
 
 # Memory monitoring configuration (no hard limits - Polars manages memory well)
 # Note: Hard limits via RLIMIT_AS cause allocation failures with Polars
@@ -43,64 +75,63 @@ print(f"✅ Memory monitoring configured: {MAX_MEMORY_GB} GB target (soft)")
 # GCS SUPPORT FUNCTIONS (CE Directive 2025-12-12)
 # ============================================================================
 
-def download_gcs_checkpoints_to_tmp(gcs_checkpoint_dir: str, pair: str) -> Path:
+def checkpoint_path(checkpoint_dir, name: str):
+    """File in a local checkpoint directory (Path) or gs:// prefix (str)."""
+    if object_store.is_remote(checkpoint_dir):
+        return f"{str(checkpoint_dir).rstrip('/')}/{name}"
+    return Path(checkpoint_dir) / name
+
+
+def download_gcs_checkpoints_to_tmp(gcs_checkpoint_dir: str, pair: str) -> tuple:
     """
-    Download all checkpoint files from GCS to local /tmp directory.
+    Stage GCS checkpoints in local /tmp for the join engine, overlapping downloads with the merge.
 
-    CE Directive 2025-12-12: If Polars cannot read GCS URIs directly,
-    download checkpoints to /tmp first before merging.
+    CE Directive 2025-12-12: Polars cannot read GCS URIs directly, so the
+    join engine reads local copies. targets.parquet is downloaded now; the
+    feature files are returned as a read-ahead iterator that keeps
+    DOWNLOAD_CONCURRENCY transfers in flight ahead of the join, so file i is
+    joined while files i+1 … i+DOWNLOAD_CONCURRENCY download. (The streaming
+    engine needs no staging: it reads checkpoints in place.)
 
     Args:
         gcs_checkpoint_dir: GCS path (e.g., "gs://bqx-ml-staging/checkpoints/eurusd")
         pair: Currency pair name
 
     Returns:
-        Path to local /tmp checkpoint directory
+        (targets_path, feature_paths, feature_count) - local targets file,
+        iterator of local feature file paths in sorted order, and their number
     """
     print(f"\n{'='*70}")
-    print(f"DOWNLOADING GCS CHECKPOINTS TO LOCAL /tmp")
+    print(f"STAGING GCS CHECKPOINTS IN LOCAL /tmp")
     print(f"{'='*70}")
     print(f"Source: {gcs_checkpoint_dir}")
 
-    # Parse GCS path
     if not gcs_checkpoint_dir.startswith('gs://'):
         raise ValueError(f"Invalid GCS path: {gcs_checkpoint_dir}")
 
-    parts = gcs_checkpoint_dir.replace('gs://', '').split('/', 1)
-    bucket_name = parts[0]
-    prefix = parts[1] if len(parts) > 1 else ''
-    if not prefix.endswith('/'):
-        prefix += '/'
-
     # Create local temp directory
     local_dir = Path(f"/tmp/checkpoints_{pair}")
     local_dir.mkdir(parents=True, exist_ok=True)
     print(f"Destination: {local_dir}")
 
-    # Download all .parquet files from GCS
-    storage_client = storage.Client(project="bqx-ml")
-    bucket = storage_client.bucket(bucket_name)
-    blobs = list(bucket.list_blobs(prefix=prefix))
-
-    parquet_blobs = [b for b in blobs if b.name.endswith('.parquet')]
+    # One listing through the shared client
+    listing = object_store.get_store().list(gcs_checkpoint_dir)
+    parquet_blobs = [o for o in listing if o['name'].endswith('.parquet')]
+    targets = [o for o in parquet_blobs if o['name'] == "targets.parquet"]
+    feature_blobs = sorted((o for o in parquet_blobs if o['name'] != "targets.parquet"), key=lambda o: o['name'])
     print(f"Found {len(parquet_blobs)} parquet files in GCS")
 
-    if len(parquet_blobs) == 0:
-        raise ValueError(f"No parquet files found in {gcs_checkpoint_dir}")
-
-    print("Downloading files...")
-    for i, blob in enumerate(parquet_blobs, 1):
-        filename = blob.name.split('/')[-1]
-        local_path = local_dir / filename
-        blob.download_to_filename(str(local_path))
-
-        if i % 100 == 0 or i == len(parquet_blobs):
-            print(f"  Downloaded: {i}/{len(parquet_blobs)} files")
+    if not targets:
+        raise ValueError(f"targets.parquet not found in {gcs_checkpoint_dir}")
 
-    print(f"✅ All {len(parquet_blobs)} checkpoint files downloaded to {local_dir}")
+    # Copies already in /tmp with the same size and write time are kept
+    targets_path = Path(object_store.download_all(targets, str(local_dir))[0])
+    print(f"✅ targets.parquet downloaded; {len(feature_blobs)} feature files stream in "
+          f"({DOWNLOAD_CONCURRENCY} ahead of the join)")
     print(f"{'='*70}\n")
 
-    return local_dir
+    feature_paths = (Path(p) for p in object_store.prefetch(feature_blobs, str(local_dir), DOWNLOAD_CONCURRENCY))
+    return targets_path, feature_paths, len(feature_blobs)
 
 
 def check_available_memory() -> float:
@@ -123,10 +154,17 @@ def get_current_memory_usage() -> float:
     return mem_info.rss / 1024**3
 
 
-def preflight_check(pair: str, checkpoint_dir: Path) -> bool:
+def preflight_check(pair: str, checkpoint_dir, min_free_gb: float = MIN_FREE_MEMORY_GB,
+                    output_dir: Path = None) -> bool:
     """
     Pre-flight safety checks before starting merge.
 
+    Args:
+        pair: Currency pair
+        checkpoint_dir: Path to checkpoint directory (or gs:// prefix)
+        min_free_gb: Free memory required to start (streaming engine only needs its RSS budget)
+        output_dir: Directory the merged file is written to (default: VM training dir)
+
     Returns: True if safe to proceed, False otherwise
     """
     print("\n" + "="*70)
@@ -137,33 +175,32 @@ def preflight_check(pair: str, checkpoint_dir: Path) -> bool:
     available_gb = check_available_memory()
     print(f"1. Available memory: {available_gb:.1f} GB")
 
-    if available_gb < MIN_FREE_MEMORY_GB:
-        print(f"   ❌ FAIL: Need {MIN_FREE_MEMORY_GB} GB, have {available_gb:.1f} GB")
-        print(f"   Action: Free memory or increase MIN_FREE_MEMORY_GB")
+    if available_gb < min_free_gb:
+        print(f"   ❌ FAIL: Need {min_free_gb} GB, have {available_gb:.1f} GB")
+        print(f"   Action: Free memory or lower the requirement (--max-rss for streaming)")
         return False
     print(f"   ✅ PASS: Sufficient memory available")
 
     # Check 2: Checkpoint directory exists
-    if not checkpoint_dir.exists():
+    if not object_store.is_remote(checkpoint_dir) and not Path(checkpoint_dir).exists():
         print(f"2. Checkpoint directory: {checkpoint_dir}")
         print(f"   ❌ FAIL: Directory not found")
         return False
 
-    # Check 3: Count checkpoint files
-    parquet_files = list(checkpoint_dir.glob("*.parquet"))
-    targets_file = checkpoint_dir / "targets.parquet"
+    # Check 3: Count checkpoint files (one listing on GCS)
+    targets_file, feature_files = list_checkpoints(checkpoint_dir)
 
-    if targets_file not in parquet_files:
+    if not object_store.exists(str(targets_file)):
         print(f"   ❌ FAIL: targets.parquet not found")
         return False
 
-    feature_files = [f for f in parquet_files if f.name != "targets.parquet"]
-    print(f"2. Checkpoint files: {len(feature_files)} features + 1 targets = {len(parquet_files)} total")
+    print(f"2. Checkpoint files: {len(feature_files)} features + 1 targets = {len(feature_files) + 1} total")
     print(f"   ✅ PASS: All files present")
 
     # Check 4: Disk space for output
     import shutil
-    output_dir = Path(f"/home/micha/bqx_ml_v3/data/training")
+    if output_dir is None:
+        output_dir = Path(f"/home/micha/bqx_ml_v3/data/training")
     output_dir.mkdir(parents=True, exist_ok=True)
 
     stat = shutil.disk_usage(output_dir)
@@ -184,13 +221,103 @@ def preflight_check(pair: str, checkpoint_dir: Path) -> bool:
     return True
 
 
-def merge_with_polars_safe(pair: str, checkpoint_dir: Path, output_path: Path) -> bool:
+def record_merged_watermark(checkpoint_dir, output_path: Path) -> None:
+    """
+    Record the merged output's high-water interval_time in _watermarks.json.
+
+    --incremental re-merges from this watermark (less the lookback) at the
+    latest, so refreshes that ran without a merge in between are not lost.
+    """
+    registry_path = checkpoint_path(checkpoint_dir, WATERMARK_FILE)
+    registry = load_watermarks(registry_path)
+    record_merge(registry, parquet_watermark(output_path))
+    save_watermarks(registry, registry_path)
+
+
+def mark_complete(checkpoint_dir) -> None:
+    """Write the _COMPLETE marker next to the checkpoints (local or gs://)."""
+    object_store.write_text('', str(checkpoint_path(checkpoint_dir, "_COMPLETE")))
+    print(f"✅ Completion marker created: _COMPLETE")
+
+
+def merge_streaming_safe(pair: str, checkpoint_dir, output_path: Path,
+                         batch_rows: int = DEFAULT_BATCH_ROWS,
+                         max_rss_gb: float = DEFAULT_MAX_RSS_GB,
+                         incremental: bool = False) -> bool:
+    """
+    Merge checkpoints with the streaming k-way engine under an RSS budget.
+
+    Args:
+        pair: Currency pair (e.g., 'audusd')
+        checkpoint_dir: Path to checkpoint directory (or gs:// prefix)
+        output_path: Path to output file
+        batch_rows: Rows per output batch
+        max_rss_gb: RSS budget in GB (merge aborts if it cannot be held)
+        incremental: Re-merge only the tail (see merge_since in checkpoint_watermark)
+
+    Returns:
+        True if successful, False otherwise
+    """
+    print(f"\n{'='*70}")
+    print(f"STREAMING MERGE: {pair.upper()}")
+    print(f"{'='*70}\n")
+
+    # Only the RSS budget needs to be free, not the 40 GB the join engine needs
+    if not preflight_check(pair, checkpoint_dir, min_free_gb=max_rss_gb, output_dir=output_path.parent):
+        return False
+
+    since = None
+    if incremental:
+        since = merge_since(load_watermarks(checkpoint_path(checkpoint_dir, WATERMARK_FILE)))
+        if since is None:
+            print(f"⚠️  No merged watermark in {WATERMARK_FILE} (or a full re-extraction is pending), "
+                  f"running full merge")
+        else:
+            print(f"Incremental merge from {since}")
+
+    try:
+        stats = streaming_merge(checkpoint_dir, output_path, batch_rows=batch_rows, max_rss_gb=max_rss_gb,
+                                since=since)
+    except MemoryError as e:
+        print(f"\n❌ MEMORY ERROR: {e}")
+        print(f"   Recommendation: Lower --batch-rows or raise --max-rss")
+        return False
+    except Exception as e:
+        print(f"\n❌ UNEXPECTED ERROR: {e}")
+        import traceback
+        traceback.print_exc()
+        return False
+
+    file_size_gb = output_path.stat().st_size / 1024**3
+    record_merged_watermark(checkpoint_dir, output_path)
+
+    mark_complete(checkpoint_dir)
+
+    print(f"\n{'='*70}")
+    print(f"MERGE COMPLETE")
+    print(f"{'='*70}")
+    print(f"Dimensions: {stats['rows']:,} rows × {stats['columns']:,} columns ({stats['files']} files)")
+    if stats['kept_rows']:
+        print(f"Incremental: {stats['kept_rows']:,} rows kept, {stats['rows'] - stats['kept_rows']:,} re-merged")
+    print(f"Time: {stats['elapsed_seconds']/60:.1f} minutes")
+    print(f"Peak Memory: {stats['peak_rss_gb']:.2f} GB (budget: {max_rss_gb} GB)")
+    print(f"Output: {output_path}")
+    print(f"Size: {file_size_gb:.2f} GB")
+    print(f"{'='*70}\n")
+
+    return True
+
+
+def merge_with_polars_safe(pair: str, checkpoint_dir, output_path: Path) -> bool:
     """
     Safely merge parquet files using Polars with resource limits.
 
+    Legacy per-file join engine (~6× output size in RAM). Prefer
+    merge_streaming_safe() unless comparing outputs.
+
     Args:
         pair: Currency pair (e.g., 'audusd')
-        checkpoint_dir: Path to checkpoint directory
+        checkpoint_dir: Path to checkpoint directory (or gs:// prefix)
         output_path: Path to output file
 
     Returns:
@@ -201,26 +328,26 @@ def merge_with_polars_safe(pair: str, checkpoint_dir: Path, output_path: Path) -
     print(f"{'='*70}\n")
 
     # Pre-flight checks
-    if not preflight_check(pair, checkpoint_dir):
+    if not preflight_check(pair, checkpoint_dir, output_dir=output_path.parent):
         return False
 
     start_time = datetime.now()
 
     try:
+        # gs:// checkpoints are staged in /tmp while the join runs (read-ahead)
+        if object_store.is_remote(checkpoint_dir):
+            targets_file, feature_files, feature_count = download_gcs_checkpoints_to_tmp(str(checkpoint_dir), pair)
+        else:
+            targets_file, feature_files = list_checkpoints(checkpoint_dir)
+            feature_count = len(feature_files)
+
         # Load targets
-        targets_file = checkpoint_dir / "targets.parquet"
         print(f"Loading targets from {targets_file.name}...")
         df = pl.read_parquet(targets_file)
         print(f"  ✅ Loaded: {len(df):,} rows, {len(df.columns)} columns")
         print(f"  Memory: {get_current_memory_usage():.2f} GB")
 
-        # Get feature files
-        feature_files = sorted([
-            f for f in checkpoint_dir.glob("*.parquet")
-            if f.name != "targets.parquet" and f.name != "_COMPLETE"
-        ])
-
-        print(f"\nMerging {len(feature_files)} feature files...")
+        print(f"\nMerging {feature_count} feature files...")
         print(f"Progress checkpoints every {CHECKPOINT_INTERVAL} files\n")
 
         # Merge feature files in batches
@@ -240,10 +367,10 @@ def merge_with_polars_safe(pair: str, checkpoint_dir: Path, output_path: Path) -
                 del feature_df
 
                 # Progress logging
-                if i % CHECKPOINT_INTERVAL == 0 or i == len(feature_files):
+                if i % CHECKPOINT_INTERVAL == 0 or i == feature_count:
                     elapsed = (datetime.now() - start_time).total_seconds()
                     mem_usage = get_current_memory_usage()
-                    print(f"  [{i:4d}/{len(feature_files)}] {feature_file.name[:40]:<40} "
+                    print(f"  [{i:4d}/{feature_count}] {feature_file.name[:40]:<40} "
                           f"| Cols: {len(df.columns):5d} | Mem: {mem_usage:5.2f} GB | "
                           f"Time: {elapsed/60:5.1f} min")
 
@@ -271,11 +398,10 @@ def merge_with_polars_safe(pair: str, checkpoint_dir: Path, output_path: Path) -
         # Verify output
         file_size_gb = output_path.stat().st_size / 1024**3
         print(f"✅ Output file created: {file_size_gb:.2f} GB")
+        record_merged_watermark(checkpoint_dir, output_path)
 
         # Mark complete
-        complete_marker = checkpoint_dir / "_COMPLETE"
-        complete_marker.touch()
-        print(f"✅ Completion marker created: {complete_marker.name}")
+        mark_complete(checkpoint_dir)
 
         elapsed = (datetime.now() - start_time).total_seconds()
         print(f"\n{'='*70}")
@@ -303,28 +429,43 @@ def merge_with_polars_safe(pair: str, checkpoint_dir: Path, output_path: Path) -
 
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Merge checkpoint parquet files into a training file")
+    parser.add_argument("pair", help="Currency pair (e.g., audusd)")
+    parser.add_argument("checkpoint_dir", nargs="?", help="Local or gs:// checkpoint directory")
+    parser.add_argument("output_path", nargs="?", help="Merged training parquet to write")
+    parser.add_argument("--engine", choices=["streaming", "join"], default="streaming",
+                        help="streaming: bounded-memory k-way merge (default); join: legacy per-file Polars join")
+    parser.add_argument("--batch-rows", type=int, default=DEFAULT_BATCH_ROWS,
+                        help=f"Streaming engine rows per batch (default: {DEFAULT_BATCH_ROWS:,})")
+    parser.add_argument("--max-rss", type=float, default=DEFAULT_MAX_RSS_GB,
+                        help=f"Streaming engine RSS budget in GB (default: {DEFAULT_MAX_RSS_GB})")
+    parser.add_argument("--incremental", action="store_true",
+                        help="Streaming engine: re-merge only rows refreshed since the last extraction")
+
     if len(sys.argv) < 2:
-        print("Usage: python3 merge_with_polars_safe.py <pair> [checkpoint_dir] [output_path]")
+        parser.print_usage()
         print("Example: python3 merge_with_polars_safe.py audusd")
         print("Example (custom paths): python3 merge_with_polars_safe.py audusd /tmp/checkpoints/audusd /tmp/training_audusd.parquet")
+        print("Example (16 GB instance): python3 merge_with_polars_safe.py eurusd gs://bqx-ml-staging/checkpoints/eurusd --max-rss 8")
         sys.exit(1)
 
-    pair = sys.argv[1].lower()
+    args = parser.parse_args()
+    pair = args.pair.lower()
 
     # Support both VM and Cloud Run environments
     # CE Directive 2025-12-12: Support GCS checkpoint paths
-    if len(sys.argv) >= 3:
+    if args.checkpoint_dir:
         # Custom paths provided (Cloud Run or VM)
-        checkpoint_dir_arg = sys.argv[2]
+        checkpoint_dir_arg = args.checkpoint_dir
 
-        # Check if GCS path - download to /tmp first
+        # GCS path: streaming reads checkpoints in place, join stages them in /tmp during the merge
         if checkpoint_dir_arg.startswith('gs://'):
             print(f"GCS checkpoint path detected: {checkpoint_dir_arg}")
-            checkpoint_dir = download_gcs_checkpoints_to_tmp(checkpoint_dir_arg, pair)
+            checkpoint_dir = checkpoint_dir_arg.rstrip('/')
         else:
             checkpoint_dir = Path(checkpoint_dir_arg)
 
-        output_path = Path(sys.argv[3]) if len(sys.argv) >= 4 else Path(f"/tmp/training_{pair}.parquet")
+        output_path = Path(args.output_path) if args.output_path else Path(f"/tmp/training_{pair}.parquet")
     else:
         # Default VM paths
         checkpoint_dir = Path(f"/home/micha/bqx_ml_v3/data/features/checkpoints/{pair}")
@@ -332,8 +473,14 @@ if __name__ == "__main__":
 
     print(f"Checkpoint directory: {checkpoint_dir}")
     print(f"Output path: {output_path}")
+    print(f"Engine: {args.engine}")
 
-    success = merge_with_polars_safe(pair, checkpoint_dir, output_path)
+    if args.engine == "streaming":
+        success = merge_streaming_safe(pair, checkpoint_dir, output_path,
+                                       batch_rows=args.batch_rows, max_rss_gb=args.max_rss,
+                                       incremental=args.incremental)
+    else:
+        success = merge_with_polars_safe(pair, checkpoint_dir, output_path)
 
     if success:
         print(f"✅ {pair.upper()} merge completed successfully")
@@ -0,0 +1,378 @@
+#!/usr/bin/env python3
+"""
+Model Artifacts - Native Boosters + Plain Coefficients, mmap-able, Lazy
+
+The h{horizon}_ensemble*.joblib artifacts pickled LightGBM, XGBoost and
+CatBoost models, three sklearn Platt calibrators and the LogReg
+meta-learner into one object graph. Loading one means unpickling every
+component into Python objects (and importing sklearn) even when a
+serving container only needs the manifest; 196 ensembles took minutes
+to cold-start.
+
+An artifact is ONE file (one GCS blob):
+
+    MAGIC (8 bytes) | manifest length (uint64 LE) | manifest JSON
+    | segments, each aligned to SEGMENT_ALIGN bytes
+
+- Boosters are stored in each library's own format: LightGBM model text,
+  XGBoost UBJSON, CatBoost .cbm
+- Calibrators are one float64 array (models × [coef, intercept]), the
+  meta-learner one float64 array [coef..., intercept]
+- The manifest holds feature names, regime features, component order,
+  segment offsets / sizes / sha256, library versions and free metadata
+
+open_artifact() maps the file and parses only the manifest. Coefficient
+arrays are zero-copy views into the map; each booster is materialised on
+first access. Nothing is ever unpickled.
+
+Usage:
+    from model_artifact import save_artifact, open_artifact
+    save_artifact(path, feature_names, base_models, calibrators, meta_learner, metadata=...)
+    artifact = open_artifact(path)
+    artifact.booster('lightgbm'); artifact.calibration(); artifact.meta_coefficients()
+
+    python model_artifact.py convert h15_ensemble_v2.joblib   # -> h15_ensemble_v2.artifact
+    python model_artifact.py inspect h15_ensemble_v2.artifact
+"""
+
+import os
+import sys
+import json
+import mmap
+import struct
+import hashlib
+import tempfile
+import threading
+import numpy as np
+
+MAGIC = b"BQXART01"
+FORMAT_VERSION = 1
+ARTIFACT_SUFFIX = ".artifact"
+SEGMENT_ALIGN = 64  # Segment start alignment (cache line; safe for any numpy dtype view)
+
+BOOSTER_FORMATS = {'lightgbm': 'lightgbm_text', 'xgboost': 'xgboost_ubj', 'catboost': 'catboost_cbm'}
+CALIBRATION_SEGMENT = "calibration"
+META_SEGMENT = "meta_learner"
+
+
+# ============================================================================
+# COMPONENT ENCODING
+# ============================================================================
+
+def _library_version(kind: str) -> str:
+    try:
+        return __import__(kind).__version__
+    except ImportError:
+        return None
+
+
+def booster_kind(model) -> str:
+    """'lightgbm', 'xgboost' or 'catboost' from the model's class."""
+    module = type(model).__module__
+    for kind in BOOSTER_FORMATS:
+        if module.startswith(kind):
+            return kind
+    raise TypeError(f"Unsupported base model type {type(model).__name__}")
+
+
+def booster_bytes(model) -> tuple:
+    """(kind, native serialized booster bytes)."""
+    kind = booster_kind(model)
+    if kind == 'lightgbm':
+        booster = model.booster_ if hasattr(model, 'booster_') else model
+        return kind, booster.model_to_string().encode()
+    if kind == 'xgboost':
+        booster = model.get_booster() if hasattr(model, 'get_booster') else model
+        return kind, bytes(booster.save_raw('ubj'))
+    # CatBoost only serializes to a file
+    fd, tmp_path = tempfile.mkstemp(suffix='.cbm')
+    os.close(fd)
+    try:
+        model.save_model(tmp_path, format='cbm')
+        with open(tmp_path, 'rb') as f:
+            return kind, f.read()
+    finally:
+        os.remove(tmp_path)
+
+
+def linear_params(model) -> np.ndarray:
+    """[coef..., intercept] of a fitted binary linear model (LogisticRegression)."""
+    return np.concatenate([np.ravel(model.coef_), np.ravel(model.intercept_)]).astype(np.float64)
+
+
+def _load_booster(kind: str, buffer):
+    if kind == 'lightgbm':
+        import lightgbm as lgb
+        return lgb.Booster(model_str=bytes(buffer).decode())
+    if kind == 'xgboost':
+        import xgboost as xgb
+        booster = xgb.Booster()
+        booster.load_model(bytearray(buffer))
+        return booster
+    from catboost import CatBoostClassifier
+    model = CatBoostClassifier()
+    model.load_model(blob=bytes(buffer))
+    return model
+
+
+# ============================================================================
+# WRITE
+# ============================================================================
+
+def save_artifact(path: str, feature_names: list, base_models: dict, calibrators: dict = None,
+                  meta_learner=None, regime_features: list = None, metadata: dict = None) -> dict:
+    """
+    Write an ensemble artifact atomically.
+
+    Args:
+        path: Output file (conventionally *.artifact)
+        feature_names: Model input columns, in order
+        base_models: {name: LightGBM / XGBoost / CatBoost model}
+        calibrators: {name: fitted 1-feature LogisticRegression} (same names as base_models)
+        meta_learner: Fitted LogisticRegression over [calibrated probs..., regime features]
+        regime_features: Regime columns appended to the meta-learner input
+        metadata: JSON-serializable extra metadata (pair, horizon, gating results, ...)
+
+    Returns:
+        The manifest that was written
+    """
+    segments = []  # (name, bytes, manifest entry)
+    versions = {'numpy': np.__version__}
+    model_order = list(base_models)
+    for name, model in base_models.items():
+        kind, payload = booster_bytes(model)
+        versions[kind] = _library_version(kind)
+        segments.append((name, payload, {'kind': kind, 'format': BOOSTER_FORMATS[kind]}))
+
+    if calibrators:
+        missing = [name for name in model_order if name not in calibrators]
+        if missing:
+            raise ValueError(f"No calibrator for base models {missing}")
+        calibration = np.stack([linear_params(calibrators[name]) for name in model_order])
+        if calibration.shape[1] != 2:
+            raise ValueError(f"Calibrators must be 1-feature Platt models, got {calibration.shape[1] - 1} coefs")
+        segments.append((CALIBRATION_SEGMENT, calibration.tobytes(),
+                         {'kind': 'array', 'dtype': '<f8', 'shape': list(calibration.shape)}))
+
+    if meta_learner is not None:
+        meta = linear_params(meta_learner)
+        segments.append((META_SEGMENT, meta.tobytes(),
+                         {'kind': 'array', 'dtype': '<f8', 'shape': list(meta.shape)}))
+
+    manifest = {
+        'format_version': FORMAT_VERSION,
+        'feature_names': list(feature_names),
+        'regime_features': list(regime_features or []),
+        'models': model_order,
+        'versions': versions,
+        'metadata': metadata or {},
+        'segments': {},
+    }
+
+    # The data start depends on the manifest length, which contains the data
+    # start: lay segments out relative to it, then grow it until it fits.
+    relative = 0
+    for name, payload, entry in segments:
+        relative = -(-relative // SEGMENT_ALIGN) * SEGMENT_ALIGN
+        entry.update({'offset': relative, 'length': len(payload),
+                      'sha256': hashlib.sha256(payload).hexdigest()})
+        manifest['segments'][name] = entry
+        relative += len(payload)
+    data_offset = 0
+    while True:
+        manifest['data_offset'] = data_offset
+        manifest_bytes = json.dumps(manifest).encode()
+        header_end = -(-(len(MAGIC) + 8 + len(manifest_bytes)) // SEGMENT_ALIGN) * SEGMENT_ALIGN
+        if header_end <= data_offset:
+            break
+        data_offset = header_end
+
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    try:
+        with open(tmp_path, 'wb') as f:
+            f.write(MAGIC + struct.pack('<Q', len(manifest_bytes)) + manifest_bytes)
+            for name, payload, entry in segments:
+                f.write(b'\0' * (data_offset + entry['offset'] - f.tell()))
+                f.write(payload)
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    return manifest
+
+
+def convert_joblib(joblib_path: str, artifact_path: str = None) -> str:
+    """
+    Convert a legacy h{horizon}_ensemble*.joblib dict to an artifact.
+
+    Accepts both layouts: v2 ('base_models', 'calibrators', 'meta_learner',
+    'metadata') and v1 ('models', pair / horizon / version at top level).
+    """
+    import joblib
+    legacy = joblib.load(joblib_path)
+    artifact_path = artifact_path or os.path.splitext(joblib_path)[0] + ARTIFACT_SUFFIX
+    base_models = legacy.get('base_models') or legacy['models']
+    metadata = dict(legacy.get('metadata') or {
+        key: value for key, value in legacy.items()
+        if key not in ('models', 'feature_names') and isinstance(value, (str, int, float))
+    })
+    metadata['converted_from'] = os.path.basename(joblib_path)
+    save_artifact(artifact_path, legacy['feature_names'], base_models, legacy.get('calibrators'),
+                  legacy.get('meta_learner'), legacy.get('regime_features'), metadata)
+    return artifact_path
+
+
+# ============================================================================
+# READ
+# ============================================================================
+
+class ModelArtifact:
+    """
+    Memory-mapped ensemble artifact. Only the manifest is parsed on open;
+    arrays are views into the map, boosters are loaded on first use.
+    """
+
+    def __init__(self, path: str, verify: bool = False):
+        self.path = path
+        with open(path, 'rb') as f:
+            self._map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._map[:len(MAGIC)] != MAGIC:
+            self._map.close()
+            raise ValueError(f"{path} is not a model artifact (bad magic)")
+        (manifest_len,) = struct.unpack_from('<Q', self._map, len(MAGIC))
+        start = len(MAGIC) + 8
+        self.manifest = json.loads(self._map[start:start + manifest_len])
+        if self.manifest['format_version'] > FORMAT_VERSION:
+            raise ValueError(f"{path}: format version {self.manifest['format_version']} "
+                             f"is newer than supported ({FORMAT_VERSION})")
+        self._boosters = {}
+        self._lock = threading.Lock()
+        if verify:
+            self.verify()
+
+    @property
+    def feature_names(self) -> list:
+        return self.manifest['feature_names']
+
+    @property
+    def regime_features(self) -> list:
+        return self.manifest['regime_features']
+
+    @property
+    def model_names(self) -> list:
+        return self.manifest['models']
+
+    @property
+    def metadata(self) -> dict:
+        return self.manifest['metadata']
+
+    def segment(self, name: str) -> memoryview:
+        """Zero-copy view of a segment's bytes."""
+        entry = self.manifest['segments'][name]
+        start = self.manifest['data_offset'] + entry['offset']
+        return memoryview(self._map)[start:start + entry['length']]
+
+    def array(self, name: str) -> np.ndarray:
+        """Read-only array view of an array segment (no copy)."""
+        entry = self.manifest['segments'][name]
+        return np.frombuffer(self.segment(name), dtype=entry['dtype']).reshape(entry['shape'])
+
+    def booster(self, name: str):
+        """Native booster for a base model, loaded once on first access."""
+        booster = self._boosters.get(name)
+        if booster is None:
+            with self._lock:
+                booster = self._boosters.get(name)
+                if booster is None:
+                    entry = self.manifest['segments'][name]
+                    booster = _load_booster(entry['kind'], self.segment(name))
+                    self._boosters[name] = booster
+        return booster
+
+    def booster_kind(self, name: str) -> str:
+        return self.manifest['segments'][name]['kind']
+
+    def calibration(self) -> np.ndarray:
+        """(models × 2) [coef, intercept] Platt parameters in model_names order, or None."""
+        return self.array(CALIBRATION_SEGMENT) if CALIBRATION_SEGMENT in self.manifest['segments'] else None
+
+    def meta_coefficients(self) -> np.ndarray:
+        """[coef..., intercept] of the meta-learner, or None."""
+        return self.array(META_SEGMENT) if META_SEGMENT in self.manifest['segments'] else None
+
+    def verify(self) -> None:
+        """Check every segment against its manifest sha256 (reads the whole file)."""
+        for name, entry in self.manifest['segments'].items():
+            if hashlib.sha256(self.segment(name)).hexdigest() != entry['sha256']:
+                raise ValueError(f"{self.path}: segment {name!r} is corrupt (sha256 mismatch)")
+
+    def close(self) -> None:
+        self._boosters.clear()
+        try:
+            self._map.close()
+        except BufferError:
+            pass  # Array views still alive; the map closes when they are released
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def open_artifact(path: str, verify: bool = False) -> ModelArtifact:
+    """Open an artifact (manifest only; components load lazily)."""
+    return ModelArtifact(path, verify)
+
+
+def open_artifacts(model_root: str, suffix: str = ARTIFACT_SUFFIX) -> dict:
+    """
+    Open every artifact under model_root ({pair}/h{horizon}_*.artifact).
+
+    Returns:
+        {relative path without suffix: ModelArtifact}, e.g. 'eurusd/h15_ensemble_v2'
+    """
+    artifacts = {}
+    for dirpath, _, filenames in os.walk(model_root):
+        for filename in sorted(filenames):
+            if filename.endswith(suffix):
+                path = os.path.join(dirpath, filename)
+                key = os.path.relpath(path, model_root)[:-len(suffix)]
+                artifacts[key] = open_artifact(path)
+    return artifacts
+
+
+def main():
+    import argparse
+    parser = argparse.ArgumentParser(description="Convert / inspect ensemble model artifacts")
+    sub = parser.add_subparsers(dest='command', required=True)
+    convert = sub.add_parser('convert', help='Convert legacy .joblib ensembles')
+    convert.add_argument('paths', nargs='+')
+    inspect = sub.add_parser('inspect', help='Print an artifact manifest')
+    inspect.add_argument('path')
+    inspect.add_argument('--verify', action='store_true', help='Check segment checksums')
+    args = parser.parse_args()
+
+    if args.command == 'convert':
+        failed = 0
+        for path in args.paths:
+            try:
+                out = convert_joblib(path)
+                print(f"✅ {path} -> {out} ({os.path.getsize(out) / 1024 / 1024:.2f} MiB)", flush=True)
+            except Exception as e:
+                failed += 1
+                print(f"❌ {path}: {e}", flush=True)
+        return 1 if failed else 0
+
+    with open_artifact(args.path, verify=args.verify) as artifact:
+        manifest = dict(artifact.manifest)
+        manifest['feature_names'] = f"{len(artifact.feature_names)} features"
+        print(json.dumps(manifest, indent=2))
+        if args.verify:
+            print("✅ All segments verified", flush=True)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -6,6 +6,7 @@ USER MANDATE: Test ALL features with parallel batch processing
 Strategy:
 - Smaller sample size (40K instead of 80K)
 - Process feature groups in parallel
+- Seed/fold fits in a process pool over a shared-memory matrix (--jobs N)
 - Combine results at end
 
 GAP-001 FIX: Default to parquet (Step 6 output), use --bq flag for BigQuery fallback
@@ -16,6 +17,7 @@ import sys
 import json
 import numpy as np
 import pandas as pd
+import pyarrow.parquet as pq
 from datetime import datetime
 from google.cloud import bigquery
 import lightgbm as lgb
@@ -24,6 +26,13 @@ from concurrent.futures import ThreadPoolExecutor, as_completed
 import warnings
 warnings.filterwarnings('ignore')
 
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'pipelines', 'training'))
+from binned_dataset import (
+    BINNED_DIR, BIN_PARAMS, binned_key, binned_path, data_fingerprint, build_binned_dataset,
+    load_binned_dataset, load_or_build, fold_subset
+)
+from interval_sample import SHARED_SAMPLE_PCT, SHARED_SAMPLE_TARGET, get_or_build_sample, read_parquet_sampled
+
 PROJECT = "bqx-ml"
 FEATURES_DATASET = "bqx_ml_v3_features_v2"
 ANALYTICS_DATASET = "bqx_ml_v3_analytics_v2"
@@ -33,22 +42,32 @@ N_FOLDS = 5
 N_SEEDS = 3
 STABILITY_THRESHOLD = 0.50
 SAMPLE_LIMIT = 40000  # Reduced for memory
+SAMPLE_NAME = "stability_selection"  # Interval sample key file (subset of the SHAP sample)
+N_JOBS = 1  # Fit processes (--jobs); 1 = sequential
+IO_THREADS = 4  # BigQuery batch loaders (--bq mode)
 
 
 def get_client():
     return bigquery.Client(project=PROJECT)
 
 
-def load_from_parquet(pair: str) -> pd.DataFrame:
-    """Load feature data from Step 6 merged parquet (no BigQuery cost).
+def load_from_parquet(pair: str, target_col: str) -> pd.DataFrame:
+    """Load the sampled rows of the Step 6 merged parquet (no BigQuery cost).
 
     GAP-001 FIX: Use this as the default data source to avoid duplicate BQ costs.
+    Only the persisted interval sample is read (SAMPLE_LIMIT intervals
+    labelled for SHARED_SAMPLE_TARGET, drawn once per pair - not per
+    horizon - and a subset of the SHAP stage's rows).
     """
     parquet_path = f"/home/micha/bqx_ml_v3/data/features/{pair}_merged_features.parquet"
     if not os.path.exists(parquet_path):
         raise FileNotFoundError(f"Parquet not found: {parquet_path}. Run Step 6 first.")
+    if target_col not in pq.read_schema(parquet_path).names:
+        raise ValueError(f"Target column {target_col} not found in parquet")
+    keys, _ = get_or_build_sample(None, pair, SAMPLE_NAME, rows=SAMPLE_LIMIT, pct=SHARED_SAMPLE_PCT,
+                                  target_col=SHARED_SAMPLE_TARGET, targets_path=parquet_path)
     print(f"  Loading from parquet: {parquet_path}")
-    df = pd.read_parquet(parquet_path)
+    df = read_parquet_sampled(parquet_path, keys).to_pandas()
     print(f"  Loaded: {len(df):,} rows, {len(df.columns)} columns")
     return df
 
@@ -109,45 +128,145 @@ def load_feature_group(pair: str, tables: list, intervals: set):
     return features
 
 
-def run_stability_on_features(X, y, feature_names):
-    """Run stability selection on feature matrix."""
-    selection_counts = defaultdict(int)
-    total_runs = N_FOLDS * N_SEEDS
+def _fold_train_indices(n: int, seed: int, fold: int) -> np.ndarray:
+    """Training rows of one (seed, fold): shuffled K-fold, last fold takes the remainder."""
+    indices = np.arange(n)
+    np.random.RandomState(seed * 42).shuffle(indices)
+    fold_size = n // N_FOLDS
+    val_start = fold * fold_size
+    val_end = (fold + 1) * fold_size if fold < N_FOLDS - 1 else n
+    return np.concatenate([indices[:val_start], indices[val_end:]])
 
-    for seed in range(N_SEEDS):
-        n = len(X)
-        indices = np.arange(n)
-        np.random.seed(seed * 42)
-        np.random.shuffle(indices)
-        fold_size = n // N_FOLDS
-
-        for fold in range(N_FOLDS):
-            val_start = fold * fold_size
-            val_end = (fold + 1) * fold_size if fold < N_FOLDS - 1 else n
-            train_idx = np.concatenate([indices[:val_start], indices[val_end:]])
-
-            X_train = X[train_idx]
-            y_train = y[train_idx]
-
-            lgb_params = {
-                'objective': 'binary', 'metric': 'binary_logloss',
-                'num_leaves': 31, 'learning_rate': 0.05,
-                'feature_fraction': 0.8, 'bagging_fraction': 0.8,
-                'bagging_freq': 5, 'verbose': -1,
-                'seed': seed * 100 + fold, 'min_data_in_leaf': 100,
-            }
 
-            lgb_train = lgb.Dataset(X_train, label=y_train, feature_name=feature_names)
-            model = lgb.train(lgb_params, lgb_train, num_boost_round=100)
+def _lgb_params(seed: int, fold: int, num_threads: int = None) -> dict:
+    params = {
+        'objective': 'binary', 'metric': 'binary_logloss',
+        'num_leaves': 31, 'learning_rate': 0.05,
+        'feature_fraction': 0.8, 'bagging_fraction': 0.8,
+        'bagging_freq': 5, 'verbose': -1,
+        'seed': seed * 100 + fold, 'min_data_in_leaf': 100,
+    }
+    if num_threads:
+        params['num_threads'] = num_threads
+    return params
+
 
-            importances = model.feature_importance(importance_type='gain')
-            for i in np.where(importances > 0)[0]:
-                selection_counts[feature_names[i]] += 1
+def _fit_fold(binned, n: int, seed: int, fold: int, num_threads: int = None) -> np.ndarray:
+    """Indices of the features one (seed, fold) model uses (gain > 0)."""
+    lgb_train = fold_subset(binned, _fold_train_indices(n, seed, fold))
+    model = lgb.train(_lgb_params(seed, fold, num_threads), lgb_train, num_boost_round=100)
+    importances = model.feature_importance(importance_type='gain')
+    return np.where(importances > 0)[0]
+
+
+_FIT_STATE = {}  # Per-process binned dataset (built once per worker)
+
+
+def _init_fit_worker(x_name: str, y_name: str, shape: tuple, feature_names: list,
+                     num_threads: int, binned_file: str) -> None:
+    """
+    Attach a pool worker to the shared matrix and bin it once.
+
+    With a persisted binned dataset the worker loads that file instead of
+    re-binning. BLAS/OpenMP pools are capped at num_threads so that
+    n_jobs workers × num_threads stays within the machine's cores.
+    """
+    from multiprocessing import shared_memory
+    try:
+        from threadpoolctl import threadpool_limits
+        _FIT_STATE['limits'] = threadpool_limits(limits=num_threads)
+    except ImportError:
+        pass
+
+    binned = load_binned_dataset(binned_file, feature_names, shape[0]) if binned_file else None
+    if binned is None:
+        x_shm = shared_memory.SharedMemory(name=x_name)
+        y_shm = shared_memory.SharedMemory(name=y_name)
+        X = np.ndarray(shape, dtype=np.float32, buffer=x_shm.buf)
+        y = np.ndarray((shape[0],), dtype=np.float32, buffer=y_shm.buf)
+        binned = build_binned_dataset(X, y, feature_names, dict(BIN_PARAMS, num_threads=num_threads))
+        x_shm.close()
+        y_shm.close()
+
+    _FIT_STATE['binned'] = binned
+    _FIT_STATE['n'] = shape[0]
+    _FIT_STATE['num_threads'] = num_threads
+
+
+def _fit_fold_worker(args) -> np.ndarray:
+    seed, fold = args
+    return _fit_fold(_FIT_STATE['binned'], _FIT_STATE['n'], seed, fold, _FIT_STATE['num_threads'])
+
+
+def _run_fits_parallel(X, y, feature_names, n_jobs: int, binned_file: str = None) -> list:
+    """
+    Fan the N_SEEDS × N_FOLDS fits out over a process pool.
+
+    X and y (float32) are copied into shared memory once; workers map
+    them without per-task copies and each bins the matrix a single time.
+    Each worker gets cpu_count // n_jobs threads (at least 1).
+    """
+    from multiprocessing import shared_memory
+    from concurrent.futures import ProcessPoolExecutor
+
+    num_threads = max(1, (os.cpu_count() or 1) // n_jobs)
+    tasks = [(seed, fold) for seed in range(N_SEEDS) for fold in range(N_FOLDS)]
+
+    x_shm = shared_memory.SharedMemory(create=True, size=max(X.shape[0] * X.shape[1] * 4, 1))
+    y_shm = shared_memory.SharedMemory(create=True, size=max(len(y) * 4, 1))
+    try:
+        np.ndarray(X.shape, dtype=np.float32, buffer=x_shm.buf)[:] = X
+        np.ndarray((len(y),), dtype=np.float32, buffer=y_shm.buf)[:] = y
+        with ProcessPoolExecutor(max_workers=n_jobs, initializer=_init_fit_worker,
+                                 initargs=(x_shm.name, y_shm.name, X.shape, list(feature_names),
+                                           num_threads, binned_file)) as executor:
+            return list(executor.map(_fit_fold_worker, tasks))
+    finally:
+        x_shm.close()
+        x_shm.unlink()
+        y_shm.close()
+        y_shm.unlink()
+
+
+def run_stability_on_features(X, y, feature_names, pair: str = None, target: str = None,
+                              cache_dir: str = None, n_jobs: int = 1):
+    """
+    Run stability selection on feature matrix.
+
+    The matrix is binned once; every (seed, fold) model trains on a row
+    subset of that construction. With cache_dir the bins are persisted,
+    keyed by (pair, target, feature set, data fingerprint).
+
+    With n_jobs > 1 the fits run in a process pool over a shared-memory
+    copy of the matrix (see _run_fits_parallel). Both paths bin the same
+    float32 matrix, so their selections match exactly.
+    """
+    X = np.ascontiguousarray(X, dtype=np.float32)
+    y = np.asarray(y, dtype=np.float32)
+    selection_counts = defaultdict(int)
+    total_runs = N_FOLDS * N_SEEDS
+    key = binned_key(pair, target or 'target', feature_names, data_fingerprint(X, y))
+
+    if n_jobs > 1:
+        binned_file = None
+        if cache_dir:
+            # Bin (or load) once here so workers load the file instead of re-binning
+            load_or_build(X, y, feature_names, key=key, cache_dir=cache_dir)
+            binned_file = binned_path(key, cache_dir)
+        used = _run_fits_parallel(X, y, feature_names, n_jobs, binned_file)
+    else:
+        binned = load_or_build(X, y, feature_names, key=key, cache_dir=cache_dir)
+        used = [_fit_fold(binned, len(X), seed, fold)
+                for seed in range(N_SEEDS) for fold in range(N_FOLDS)]
+
+    for indices in used:
+        for i in indices:
+            selection_counts[feature_names[i]] += 1
 
     return {f: c / total_runs for f, c in selection_counts.items()}
 
 
-def process_batch(batch_name, tables, base_df, pair):
+def process_batch(batch_name, tables, base_df, pair, cache_dir: str = None, n_jobs: int = 1):
     """Process a single batch of feature tables."""
     print(f"  Processing batch: {batch_name}...")
 
@@ -177,26 +296,24 @@ def process_batch(batch_name, tables, base_df, pair):
     print(f"    {batch_name}: {len(feature_cols)} features")
 
     # Run stability selection
-    scores = run_stability_on_features(X, y, feature_cols)
+    scores = run_stability_on_features(X, y, feature_cols, pair=pair,
+                                       target='target_bqx45_h15', cache_dir=cache_dir,
+                                       n_jobs=n_jobs)
 
     return batch_name, scores
 
 
-def run_stability_from_parquet(pair: str, horizon: int):
+def run_stability_from_parquet(pair: str, horizon: int, cache_dir: str = None, n_jobs: int = 1):
     """Run stability selection using Step 6 parquet output (GAP-001 FIX).
 
     This is the default mode - uses pre-merged parquet from Step 6.
     """
     print("\nStep 1: Loading data from parquet (Step 6 output)...")
-    df = load_from_parquet(pair)
-
-    # Extract target and features
     target_col = f'target_bqx45_h{horizon}'
-    if target_col not in df.columns:
-        raise ValueError(f"Target column {target_col} not found in parquet")
+    df = load_from_parquet(pair, target_col)
 
-    # Filter rows with valid targets
-    df = df[df[target_col].notna()].head(SAMPLE_LIMIT)
+    # The sample is drawn on the h15 label; drop rows this horizon leaves unlabelled
+    df = df[df[target_col].notna()]
     print(f"  Samples: {len(df):,}")
 
     # Identify feature columns
@@ -218,7 +335,9 @@ def run_stability_from_parquet(pair: str, horizon: int):
 
     # Run stability selection
     print(f"\nStep 2: Running stability selection...")
-    all_scores = run_stability_on_features(X, y, feature_cols)
+    all_scores = run_stability_on_features(X, y, feature_cols, pair=pair,
+                                           target=target_col, cache_dir=cache_dir,
+                                           n_jobs=n_jobs)
 
     return all_scores
 
@@ -228,6 +347,10 @@ def main():
     horizon = int(sys.argv[2]) if len(sys.argv) > 2 else 15
     # GAP-001 FIX: Default to parquet, use --bq flag for BigQuery fallback
     use_parquet = "--bq" not in sys.argv
+    # Binned LightGBM datasets are cached across runs unless --no-bin-cache
+    cache_dir = None if "--no-bin-cache" in sys.argv else BINNED_DIR
+    # Seed/fold fits run in a process pool of --jobs workers (default: sequential)
+    n_jobs = int(sys.argv[sys.argv.index("--jobs") + 1]) if "--jobs" in sys.argv else N_JOBS
 
     print("=" * 70)
     print("PARALLEL STABILITY SELECTION")
@@ -240,7 +363,7 @@ def main():
 
     if use_parquet:
         # Use Step 6 parquet output (DEFAULT - no BigQuery costs)
-        all_scores = run_stability_from_parquet(pair, horizon)
+        all_scores = run_stability_from_parquet(pair, horizon, cache_dir, n_jobs)
     else:
         # Legacy BigQuery mode (--bq flag specified)
         print("\nStep 1: Loading base data from BigQuery...")
@@ -266,9 +389,11 @@ def main():
 
         all_scores = {}
 
-        with ThreadPoolExecutor(max_workers=4) as executor:
+        # I/O threads share base_df read-only; the fit processes are split between them
+        batch_jobs = max(1, n_jobs // IO_THREADS)
+        with ThreadPoolExecutor(max_workers=IO_THREADS) as executor:
             futures = {
-                executor.submit(process_batch, name, tables, base_df.copy(), pair): name
+                executor.submit(process_batch, name, tables, base_df, pair, cache_dir, batch_jobs): name
                 for name, tables in batches.items()
             }
 
@@ -0,0 +1,358 @@
+#!/usr/bin/env python3
+"""
+Local REG Engine - NumPy Computation of the reg_* Polynomial Features
+
+generate_reg_tables_with_coefficients.py builds every reg_{variant}_{pair}
+table in BigQuery: ~10 ROWS BETWEEN w-1 PRECEDING windows × 7 WINDOWS per
+table, 28 pairs × 2 variants of full-history scans.
+
+This module computes the same 35 columns per window in-process from the
+extracted base_* checkpoint parquet, in float64 and O(n) per window:
+- AVG / STDDEV / VAR_POP / SUM(y) / SUM(row_num × y): chunked prefix sums
+  (each chunk re-based on its own first value and row index, so the
+  cumulative sums never grow with the table length)
+- SUM(row_num) / SUM(row_num²): closed forms
+- MIN / MAX / FIRST_VALUE: rolling_kernels (van Herk / Gil-Werman block
+  extrema, direct index)
+
+Window frames follow BigQuery: the first w-1 rows use the partial frame,
+NULL inputs are skipped by the aggregates (FIRST_VALUE respects them), and
+SAFE_DIVIDE / NULLIF map to NaN.
+
+compare_frames() checks local output against the SQL table bit for bit
+(and reports the max ULP distance where values are not identical). The
+sums are not bit-exact against BigQuery (~2e-8 relative), so
+generate_reg_tables_with_coefficients --compare gates on max_rel_diff
+(--tolerance, default 1e-6).
+
+Usage:
+    from reg_engine import compute_reg_features, write_reg_parquet, compare_frames
+    reg_df = compute_reg_features(base_df, 'close_idx', WINDOWS)
+    write_reg_parquet(base_df, 'close_idx', WINDOWS, 'reg_idx_eurusd.parquet')
+    report = compare_frames(reg_df, sql_df)
+"""
+
+import os
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from rolling_kernels import rolling_stats
+
+# Output columns per window, in the order of generate_polynomial_sql_v5
+REG_COLUMNS = [
+    'mean', 'std', 'min', 'max', 'first', 'slope', 'direction', 'deviation', 'zscore', 'range_pct',
+    'quad_coef', 'lin_coef', 'quad_term', 'lin_term', 'const_term', 'residual', 'quad_norm', 'lin_norm',
+    'total_var', 'resid_var', 'r2', 'rmse', 'resid_norm', 'resid_std', 'resid_min', 'resid_max',
+    'resid_last', 'resid_skew', 'resid_kurt', 'curv_sign', 'acceleration', 'trend_str', 'forecast_5',
+    'ci_lower', 'ci_upper'
+]
+
+# INT64 columns in the SQL output (everything else is FLOAT64)
+INT_COLUMNS = ('curv_sign',)
+
+# Minimum rows per prefix-sum chunk (chunks are at least 32 windows long)
+CHUNK_ROWS = 8192
+
+# Output rows per block / parquet row group (~250 MB of float64 columns)
+BLOCK_ROWS = 131072
+
+
+def _prefix(values: np.ndarray) -> np.ndarray:
+    """Exclusive prefix sums (leading 0) so that sum(v[i:j]) = p[j] - p[i]."""
+    return np.concatenate([[0.0], np.cumsum(values)])
+
+
+def _window_sums(y: np.ndarray, w: int) -> dict:
+    """
+    Per-row sums over the frame [max(0, i-w+1), i], NULL (NaN) inputs skipped.
+
+    Returns dict of float64 arrays:
+        rows  - frame length k (NULLs included, as SUM(row_num) sees them)
+        count - non-NULL values in the frame
+        ref   - value the sums below are taken relative to
+        s0    - Σ (y - ref)
+        s2    - Σ (y - ref)²
+        su    - Σ u · (y - ref), u = row offset within the frame (0..k-1)
+        u0    - Σ u over non-NULL rows
+    """
+    n = len(y)
+    out = {name: np.empty(n) for name in ('count', 'ref', 's0', 's2', 'su', 'u0')}
+    chunk = max(CHUNK_ROWS, 32 * w)
+
+    for a in range(0, n, chunk):
+        b = min(a + chunk, n)
+        lo = max(a - (w - 1), 0)
+        seg = y[lo:b]
+        valid = ~np.isnan(seg)
+        finite = seg[valid]
+        ref = finite[0] if len(finite) else 0.0
+        yc = np.where(valid, seg - ref, 0.0)
+        local = np.arange(b - lo, dtype=np.float64)
+
+        p_cnt = _prefix(valid.astype(np.float64))
+        p0 = _prefix(yc)
+        p2 = _prefix(yc * yc)
+        p1 = _prefix(local * yc)
+        pu = _prefix(local * valid)
+
+        end = np.arange(a, b) - lo + 1  # exclusive prefix index of row i
+        k = np.minimum(np.arange(a, b) + 1, w)
+        start = end - k  # local index of the frame's first row
+
+        s0 = p0[end] - p0[start]
+        cnt = p_cnt[end] - p_cnt[start]
+        out['count'][a:b] = cnt
+        out['ref'][a:b] = ref
+        out['s0'][a:b] = s0
+        out['s2'][a:b] = p2[end] - p2[start]
+        out['su'][a:b] = (p1[end] - p1[start]) - start * s0
+        out['u0'][a:b] = (pu[end] - pu[start]) - start * cnt
+
+    out['rows'] = np.minimum(np.arange(n) + 1, w).astype(np.float64)
+    return out
+
+
+def _safe_divide(num, den) -> np.ndarray:
+    """SAFE_DIVIDE: NULL (NaN) where the denominator is 0."""
+    num = np.asarray(num, dtype=np.float64)
+    den = np.asarray(den, dtype=np.float64)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return np.where(den == 0, np.nan, num / den)
+
+
+def _nullif_zero(values: np.ndarray) -> np.ndarray:
+    return np.where(values == 0, np.nan, values)
+
+
+def window_stats(y: np.ndarray, w: int) -> dict:
+    """
+    Stage 1 of generate_polynomial_sql_v5 for one window.
+
+    Returns dict with mean, std, min, max, first, total_var, slope.
+    """
+    n = len(y)
+    sums = _window_sums(y, w)
+    cnt, ref, s0, s2, su, u0 = (sums[k] for k in ('count', 'ref', 's0', 's2', 'su', 'u0'))
+    k = sums['rows']
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        mean = np.where(cnt > 0, ref + s0 / cnt, np.nan)
+        ss = np.maximum(s2 - s0 * s0 / cnt, 0.0)
+        total_var = np.where(cnt > 0, ss / cnt, np.nan)
+        std = np.where(cnt > 1, np.sqrt(ss / (cnt - 1)), np.nan)
+
+    # SUM(row_num · y), SUM(row_num), SUM(row_num²) with row_num = u + c over
+    # the frame; expanded so the c terms cancel exactly on full frames
+    c = np.arange(n) - k + 2.0  # row_num of the frame's first row
+    sum_u = k * (k - 1) / 2.0
+    sum_uu = (k - 1) * k * (2 * k - 1) / 6.0
+    sum_y = s0 + cnt * ref
+    numerator = (w * su - sum_u * s0 + ref * (w * u0 - sum_u * cnt) + (w - k) * c * sum_y)
+    denominator = (w * sum_uu - sum_u * sum_u + 2 * c * sum_u * (w - k) + c * c * k * (w - k))
+    slope = np.where(cnt > 0, _safe_divide(numerator, denominator), np.nan)
+
+    order = rolling_stats(y, [w], ('min', 'max', 'first'))
+
+    return {
+        'mean': mean,
+        'std': std,
+        'min': order[('min', w)],
+        'max': order[('max', w)],
+        'first': order[('first', w)],
+        'total_var': total_var,
+        'slope': slope
+    }
+
+
+def reg_window_features(y: np.ndarray, w: int) -> dict:
+    """Stage 2: the 35 reg_*_{w} columns for one window, as float64 arrays."""
+    st = window_stats(y, w)
+    mean, std, first = st['mean'], st['std'], st['first']
+    N = float(w)
+
+    with np.errstate(divide='ignore', invalid='ignore', over='ignore'):
+        quad = _safe_divide(first - 2.0 * mean + y, (w - 1) ** 2 / 2.0)
+        lin = _safe_divide(y - first, w - 1) - quad * (w - 1)
+        quad_term = quad * N ** 2
+        lin_term = lin * N
+        residual = y - (quad_term + lin_term + first)
+        deviation = y - mean
+        std_nz = _nullif_zero(std)
+        mean_nz = _nullif_zero(mean)
+        ratio = np.abs(deviation) / std_nz
+        ci_half = 1.96 * _safe_divide(std, np.sqrt(N))
+
+        features = {
+            'mean': mean,
+            'std': std,
+            'min': st['min'],
+            'max': st['max'],
+            'first': first,
+            'slope': st['slope'],
+            'direction': np.sign(y - first),
+            'deviation': deviation,
+            'zscore': _safe_divide(deviation, std_nz),
+            'range_pct': _safe_divide(st['max'] - st['min'], mean_nz) * 100,
+            'quad_coef': quad,
+            'lin_coef': lin,
+            'quad_term': quad_term,
+            'lin_term': lin_term,
+            'const_term': first,
+            'residual': residual,
+            'quad_norm': _safe_divide(quad * N ** 2 * (w - 1) ** 2, mean_nz),
+            'lin_norm': _safe_divide(lin * N * (w - 1), mean_nz),
+            'total_var': st['total_var'],
+            'resid_var': std ** 2,
+            'r2': np.where(st['total_var'] > 0, 1.0 - _safe_divide(std ** 2, st['total_var']), np.nan),
+            'rmse': std,
+            'resid_norm': _safe_divide(residual, mean_nz),
+            'resid_std': std,
+            'resid_min': st['min'] - mean,
+            'resid_max': st['max'] - mean,
+            'resid_last': deviation,
+            'resid_skew': np.sign(deviation) * ratio ** 3,
+            'resid_kurt': ratio ** 4 - 3.0,
+            'curv_sign': np.sign(quad),
+            'acceleration': 2.0 * quad,
+            'trend_str': _safe_divide(lin * N, std_nz),
+            'forecast_5': quad * ((N + 5) ** 2 - N ** 2) + lin * 5,
+            'ci_lower': y - ci_half,
+            'ci_upper': y + ci_half
+        }
+    return features
+
+
+def iter_reg_blocks(base_df: pd.DataFrame, source_col: str, windows: list,
+                    block_rows: int = BLOCK_ROWS):
+    """
+    Yield the reg_* table in row blocks of `block_rows`.
+
+    Each block is computed from its rows plus a halo of max(windows)-1
+    preceding rows, so every frame is complete and the result matches a
+    whole-series computation (up to rounding of the re-based sums); memory
+    stays at one block of ~250 float64 columns.
+
+    Yields:
+        Frames with interval_time, pair, source_value and reg_{name}_{w}
+        columns in SQL column order
+    """
+    df = base_df.sort_values('interval_time', kind='stable').reset_index(drop=True)
+    y = pd.to_numeric(df[source_col], errors='coerce').to_numpy(dtype=np.float64, na_value=np.nan)
+    times = df['interval_time'].to_numpy()
+    pairs = df['pair'].to_numpy() if 'pair' in df.columns else None
+    halo = max(windows) - 1
+
+    for a in range(0, len(y), block_rows):
+        b = min(a + block_rows, len(y))
+        lo = max(a - halo, 0)
+        columns = {'interval_time': times[a:b]}
+        if pairs is not None:
+            columns['pair'] = pairs[a:b]
+        columns['source_value'] = y[a:b]
+
+        for w in windows:
+            features = reg_window_features(y[lo:b], w)
+            for name in REG_COLUMNS:
+                values = features[name][a - lo:]
+                if name in INT_COLUMNS:
+                    values = pd.array(values, dtype='Int64')
+                columns[f"reg_{name}_{w}"] = values
+
+        yield pd.DataFrame(columns)
+
+
+def compute_reg_features(base_df: pd.DataFrame, source_col: str, windows: list) -> pd.DataFrame:
+    """
+    Compute a full reg_* table from a base_* frame in memory.
+
+    Args:
+        base_df: Frame with interval_time, pair and source_col
+        source_col: Source series (close_idx for idx, bqx_45 for bqx)
+        windows: Window sizes (WINDOWS)
+
+    Returns:
+        Frame sorted by interval_time (see iter_reg_blocks for columns)
+    """
+    blocks = list(iter_reg_blocks(base_df, source_col, windows))
+    if not blocks:
+        return pd.DataFrame()
+    return pd.concat(blocks, ignore_index=True) if len(blocks) > 1 else blocks[0]
+
+
+def write_reg_parquet(base_df: pd.DataFrame, source_col: str, windows: list, path: str,
+                      block_rows: int = BLOCK_ROWS) -> int:
+    """
+    Stream a reg_* table to parquet, one row group per block (atomic replace).
+
+    Returns: rows written
+    """
+    tmp_path = f"{path}.tmp"
+    writer = None
+    rows = 0
+    try:
+        for block in iter_reg_blocks(base_df, source_col, windows, block_rows):
+            table = pa.Table.from_pandas(block, preserve_index=False)
+            if writer is None:
+                writer = pq.ParquetWriter(tmp_path, table.schema, compression='snappy')
+            writer.write_table(table)
+            rows += len(block)
+        if writer is not None:
+            writer.close()
+            writer = None
+            os.replace(tmp_path, path)
+    finally:
+        if writer is not None:
+            writer.close()
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+    return rows
+
+
+def _ulp_distance(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    """Distance in units of last place between float64 arrays (finite values)."""
+    ia = a.view(np.int64)
+    ib = b.view(np.int64)
+    ia = np.where(ia < 0, np.int64(-2 ** 63) - ia, ia)
+    ib = np.where(ib < 0, np.int64(-2 ** 63) - ib, ib)
+    return np.abs(ia.astype(np.float64) - ib.astype(np.float64))
+
+
+def compare_frames(local_df: pd.DataFrame, sql_df: pd.DataFrame, columns: list = None) -> dict:
+    """
+    Compare locally computed columns against the SQL table.
+
+    Rows are aligned on interval_time. A value matches when both sides are
+    NULL or both have the identical float64 bit pattern.
+
+    Returns:
+        {column: {rows, identical, null_mismatch, max_abs_diff, max_rel_diff, max_ulp}}
+    """
+    if columns is None:
+        columns = [c for c in local_df.columns
+                   if c.startswith('reg_') and c in sql_df.columns]
+
+    merged = local_df[['interval_time'] + columns].merge(
+        sql_df[['interval_time'] + columns], on='interval_time', suffixes=('_local', '_sql')
+    )
+
+    report = {}
+    for col in columns:
+        a = pd.to_numeric(merged[f"{col}_local"], errors='coerce').to_numpy(dtype=np.float64, na_value=np.nan)
+        b = pd.to_numeric(merged[f"{col}_sql"], errors='coerce').to_numpy(dtype=np.float64, na_value=np.nan)
+        null_a, null_b = np.isnan(a), np.isnan(b)
+        both = ~null_a & ~null_b
+        identical = (null_a & null_b) | (both & (a.view(np.int64) == b.view(np.int64)))
+
+        diff = np.abs(a[both] - b[both])
+        scale = np.maximum(np.abs(b[both]), np.finfo(np.float64).tiny)
+        report[col] = {
+            'rows': int(len(merged)),
+            'identical': int(identical.sum()),
+            'null_mismatch': int((null_a != null_b).sum()),
+            'max_abs_diff': float(diff.max()) if diff.size else 0.0,
+            'max_rel_diff': float((diff / scale).max()) if diff.size else 0.0,
+            'max_ulp': float(_ulp_distance(a[both], b[both]).max()) if diff.size else 0.0
+        }
+    return report
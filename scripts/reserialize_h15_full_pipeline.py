@@ -3,7 +3,7 @@
 Re-Serialize h15 with Full Calibrated Stack Pipeline
 CE Directive: 20251210_0320
 
-Creates h15_ensemble_v2.joblib with:
+Creates h15_ensemble_v2.artifact (see model_artifact.py) with:
 - Base models (LGB, XGB, CB)
 - Calibrators (3x Platt scaling)
 - Meta-learner (LogReg)
@@ -20,12 +20,15 @@ import lightgbm as lgb
 from xgboost import XGBClassifier
 from catboost import CatBoostClassifier
 from sklearn.linear_model import LogisticRegression
-from sklearn.calibration import CalibratedClassifierCV
-import joblib
 import os
+import sys
 import warnings
 warnings.filterwarnings('ignore')
 
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'pipelines', 'training'))
+from fold_engine import walk_forward_bounds, fold_size
+from model_artifact import ARTIFACT_SUFFIX, save_artifact
+
 PROJECT = "bqx-ml"
 FEATURES_DATASET = "bqx_ml_v3_features_v2"
 ANALYTICS_DATASET = "bqx_ml_v3_analytics_v2"
@@ -84,26 +87,8 @@ def load_training_data(pair: str, horizon: int, sample_limit: int = 80000):
 
 
 def create_walk_forward_splits(n_samples: int, n_folds: int = 5, embargo: int = EMBARGO_INTERVALS):
-    """Create walk-forward time series splits with embargo gap."""
-    fold_size = n_samples // (n_folds + 1)
-    splits = []
-
-    for i in range(n_folds):
-        train_end = fold_size * (i + 1)
-        val_start = train_end + embargo
-        val_end = fold_size * (i + 2)
-
-        if val_end > n_samples:
-            val_end = n_samples
-        if val_start >= val_end:
-            continue
-
-        splits.append({
-            'train_idx': list(range(0, train_end)),
-            'val_idx': list(range(val_start, val_end))
-        })
-
-    return splits
+    """Create walk-forward time series splits with embargo gap (slice bounds, see fold_engine)."""
+    return walk_forward_bounds(n_samples, n_folds=n_folds, embargo=embargo)
 
 
 def train_full_pipeline(X, y, feature_names, regime_features, n_folds=5):
@@ -161,14 +146,13 @@ def train_full_pipeline(X, y, feature_names, regime_features, n_folds=5):
         cb_prob = cb_model.predict_proba(X_val)[:, 1]
 
         # Store OOF predictions
-        for i, idx in enumerate(val_idx):
-            oof_lgb[idx] = lgb_prob[i]
-            oof_xgb[idx] = xgb_prob[i]
-            oof_cb[idx] = cb_prob[i]
-            oof_y[idx] = y[idx]
-            oof_mask[idx] = True
-            if regime_features is not None:
-                oof_regime[idx] = regime_features[idx]
+        oof_lgb[val_idx] = lgb_prob
+        oof_xgb[val_idx] = xgb_prob
+        oof_cb[val_idx] = cb_prob
+        oof_y[val_idx] = y[val_idx]
+        oof_mask[val_idx] = True
+        if regime_features is not None:
+            oof_regime[val_idx] = regime_features[val_idx]
 
         # Save models from last fold
         if fold_idx == len(splits) - 1:
@@ -178,7 +162,7 @@ def train_full_pipeline(X, y, feature_names, regime_features, n_folds=5):
                 'catboost': cb_model
             }
 
-        print(f"    Fold {fold_idx+1}: train={len(train_idx)}, val={len(val_idx)}")
+        print(f"    Fold {fold_idx+1}: train={fold_size(train_idx)}, val={fold_size(val_idx)}")
 
     # Filter to OOF samples only
     oof_indices = np.where(oof_mask)[0]
@@ -309,13 +293,6 @@ def main():
         'feature_names': feature_cols,
         'regime_features': regime_cols,
 
-        # EA-003 compatibility placeholders
-        'feature_views': None,
-        'view_config': {
-            'mode': 'shared',
-            'views': None
-        },
-
         # Metadata
         'metadata': {
             'pair': pair,
@@ -333,7 +310,13 @@ def main():
                 'embargo_intervals': EMBARGO_INTERVALS,
                 'calibration_method': 'platt'
             },
-            'gating_results': pipeline['gating_results']
+            'gating_results': pipeline['gating_results'],
+            # EA-003 compatibility placeholders
+            'feature_views': None,
+            'view_config': {
+                'mode': 'shared',
+                'views': None
+            }
         }
     }
 
@@ -341,14 +324,15 @@ def main():
     print("\nStep 4: Saving model artifact...")
     local_dir = f"/home/micha/bqx_ml_v3/models/{pair}"
     os.makedirs(local_dir, exist_ok=True)
-    local_path = f"{local_dir}/h{horizon}_ensemble_v2.joblib"
-    joblib.dump(artifact, local_path)
+    local_path = f"{local_dir}/h{horizon}_ensemble_v2{ARTIFACT_SUFFIX}"
+    save_artifact(local_path, feature_cols, artifact['base_models'], artifact['calibrators'],
+                  artifact['meta_learner'], regime_cols, artifact['metadata'])
     file_size = os.path.getsize(local_path) / (1024 * 1024)
     print(f"  Local: {local_path} ({file_size:.2f} MiB)")
 
     # Upload to GCS
     print("\nStep 5: Uploading to GCS...")
-    gcs_path = f"models/{pair}/h{horizon}_ensemble_v2.joblib"
+    gcs_path = f"models/{pair}/h{horizon}_ensemble_v2{ARTIFACT_SUFFIX}"
     gcs_uri = upload_to_gcs(local_path, gcs_path)
     print(f"  GCS: {gcs_uri}")
 
@@ -356,7 +340,7 @@ def main():
     print("\n" + "=" * 70)
     print("RE-SERIALIZATION COMPLETE")
     print("=" * 70)
-    print(f"  Artifact: h{horizon}_ensemble_v2.joblib")
+    print(f"  Artifact: h{horizon}_ensemble_v2{ARTIFACT_SUFFIX}")
     print(f"  Version: 2.0.0")
     print(f"  Base models: {list(artifact['base_models'].keys())}")
     print(f"  Calibrators: {list(artifact['calibrators'].keys())}")
@@ -0,0 +1,495 @@
+#!/usr/bin/env python3
+"""
+Streaming K-Way Checkpoint Merge
+
+Replaces the ~669 sequential `df.join(feature_df, on="interval_time")` calls in
+merge_with_polars_safe.py, which pushed EURUSD (9.3 GB output) to 60-65 GB RSS
+and caused three OOM incidents (Dec 11-12, 2025).
+
+Every checkpoint file is already sorted by interval_time, so the merge is done
+as ONE forward pass over all files at once:
+
+1. Read only the parquet footers to resolve column ownership
+   (targets first, then feature files in sorted order - first owner wins)
+2. Stream targets.parquet in batches of `batch_rows` rows
+3. For each targets batch, advance every checkpoint cursor up to the batch's
+   last interval_time and align its rows to the batch (LEFT JOIN semantics)
+4. Append the aligned batch to the output file as one parquet row group
+
+Memory is bounded by ~((batch_rows + CURSOR_READ_ROWS) × total columns) plus
+one decoded row group per cursor (checkpoints are written in row groups of at
+most object_store.CHECKPOINT_ROW_GROUP_ROWS rows), independent of the number
+of rows in the pair. The RSS budget (`max_rss_gb`)
+is enforced after every batch: the batch size is halved when the budget is
+exceeded, and the merge aborts with MemoryError if the minimum batch size
+still does not fit.
+
+INCREMENTAL MODE (`since`): after an append-only checkpoint refresh, rows of
+the existing output before `since` are copied through row group by row
+group, and only the tail from `since` on is re-merged. Checkpoint cursors
+start at the first row group holding `since`. Falls back to a full merge
+when there is no previous output or its schema no longer matches.
+
+GCS: `checkpoint_dir` may be a gs:// prefix. Checkpoints are then read in
+place (footers in parallel, one row group's column chunks at a time through
+object_store.iter_batches) instead of being downloaded first, and cursors
+are advanced CURSOR_READ_AHEAD files ahead of the batch assembly, so
+transfers overlap the merge.
+
+Usage:
+    python3 scripts/streaming_merge.py <checkpoint_dir> <output_path> [--batch-rows N] [--max-rss GB]
+        [--since 'YYYY-MM-DD HH:MM:SS']
+"""
+
+import gc
+import os
+import sys
+import argparse
+import numpy as np
+import pyarrow as pa
+import pyarrow.parquet as pq
+from pathlib import Path
+from datetime import datetime
+
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'pipelines', 'training'))
+from checkpoint_watermark import key_values, timestamp_key
+import object_store
+
+# ============================================================================
+# CONFIGURATION
+# ============================================================================
+
+KEY_COLUMN = "interval_time"
+TARGETS_FILE = "targets.parquet"
+
+DEFAULT_BATCH_ROWS = 20_000  # ~1.8 GB per batch at 11k float64 columns
+MIN_BATCH_ROWS = 1_000  # Below this the per-batch overhead dominates
+DEFAULT_MAX_RSS_GB = 8.0  # Fits a 16 GB Cloud Run instance with headroom
+CURSOR_READ_ROWS = 8_192  # Rows decoded per checkpoint file read
+CURSOR_READ_AHEAD = 16  # Checkpoint cursors advanced ahead of batch assembly (footer reads too)
+PROGRESS_INTERVAL = 25  # Log progress every N output batches
+
+_PAGE_SIZE = os.sysconf('SC_PAGE_SIZE')
+
+
+def get_rss_gb() -> float:
+    """Get current process resident set size in GB."""
+    with open('/proc/self/statm', 'r') as f:
+        resident_pages = int(f.read().split()[1])
+    return resident_pages * _PAGE_SIZE / 1024**3
+
+
+def _name(path) -> str:
+    return os.path.basename(str(path))
+
+
+def list_checkpoints(checkpoint_dir) -> tuple:
+    """
+    (targets_path, sorted feature checkpoint paths) of a local directory or gs:// prefix.
+
+    Local paths are returned as Path, remote ones as gs:// strings.
+    """
+    if object_store.is_remote(checkpoint_dir):
+        base = str(checkpoint_dir).rstrip('/')
+        names = [o['name'] for o in object_store.get_store().list(base) if o['name'].endswith('.parquet')]
+        return f"{base}/{TARGETS_FILE}", [f"{base}/{n}" for n in sorted(names) if n != TARGETS_FILE]
+    checkpoint_dir = Path(checkpoint_dir)
+    feature_files = sorted(f for f in checkpoint_dir.glob("*.parquet") if f.name != TARGETS_FILE)
+    return checkpoint_dir / TARGETS_FILE, feature_files
+
+
+def _read_ahead_all(func, items: list) -> list:
+    """func over items, CURSOR_READ_AHEAD at a time, results in order (first error raised)."""
+    results = []
+    for _, result, error in object_store.read_ahead(func, items, CURSOR_READ_AHEAD):
+        if error is not None:
+            raise error
+        results.append(result)
+    return results
+
+
+def _first_row_group(path, min_key: int) -> tuple:
+    """
+    Locate the first row holding interval_time >= min_key (key column only).
+
+    Returns:
+        (row_group_index, row_offset) - index of the row group containing
+        that row, and the global row offset of the row itself
+    """
+    parquet_file = object_store.open_parquet(str(path))
+    keys = key_values(object_store.read_parquet_table(str(path), columns=[KEY_COLUMN]).column(0))
+    first = int(np.searchsorted(keys, min_key, side='left'))
+    ends = np.cumsum([parquet_file.metadata.row_group(i).num_rows for i in range(parquet_file.num_row_groups)])
+    return int(np.searchsorted(ends, first, side='right')), first
+
+
+def resolve_column_ownership(targets_path, feature_files: list) -> tuple:
+    """
+    Decide which file contributes each output column, using footers only.
+
+    Matches the dedup rule used elsewhere in the pipeline: a column already
+    present (in targets or an earlier feature file) is never re-added.
+    Footers are read CURSOR_READ_AHEAD files at a time (one ranged GET each
+    on GCS).
+
+    Returns:
+        (target_columns, owned) where owned is a list of (path, [columns], schema)
+        for feature files that contribute at least one column
+    """
+    target_columns = object_store.read_schema(str(targets_path)).names
+    seen = set(target_columns)
+    owned = []
+
+    schemas = _read_ahead_all(lambda path: object_store.read_schema(str(path)), feature_files)
+    for path, schema in zip(feature_files, schemas):
+        if KEY_COLUMN not in schema.names:
+            print(f"  ⚠️  {_name(path)}: no {KEY_COLUMN} column, skipped")
+            continue
+        columns = [c for c in schema.names if c != KEY_COLUMN and c not in seen]
+        if not columns:
+            continue
+        seen.update(columns)
+        owned.append((path, columns, schema))
+
+    return target_columns, owned
+
+
+class CheckpointCursor:
+    """
+    Forward-only reader over one checkpoint file sorted by interval_time.
+
+    Holds at most one unread record batch, so memory per cursor is
+    ~(read_rows × owned columns) regardless of file size (plus one
+    compressed row group when reading from GCS). With `min_key`, row groups
+    entirely before it are never decoded.
+    """
+
+    def __init__(self, path, columns: list, read_rows: int = CURSOR_READ_ROWS, min_key: int = None,
+                 schema: pa.Schema = None):
+        self.path = path
+        self.columns = columns
+        schema = schema or object_store.read_schema(str(path))
+        self._types = [schema.field(c).type for c in columns]
+        row_groups = None
+        if min_key is not None:
+            first_group = _first_row_group(path, min_key)[0]
+            row_groups = list(range(first_group, object_store.open_parquet(str(path)).num_row_groups))
+        self._reader = object_store.iter_batches(str(path), [KEY_COLUMN] + columns, read_rows, row_groups)
+        self._pending = []  # Record batches not yet consumed
+        self._pending_keys = []  # Matching int64 key arrays
+        self._exhausted = False
+
+    def _fill_until(self, upper: int) -> None:
+        """Read batches until the buffered keys extend past `upper`."""
+        while not self._exhausted:
+            if self._pending_keys and len(self._pending_keys[-1]) and self._pending_keys[-1][-1] > upper:
+                return
+            try:
+                batch = next(self._reader)
+            except StopIteration:
+                self._exhausted = True
+                return
+            if batch.num_rows:
+                keys = key_values(batch.column(0))
+                previous = self._pending_keys[-1] if self._pending_keys else None
+                if np.any(np.diff(keys) < 0) or (previous is not None and len(previous) and keys[0] < previous[-1]):
+                    raise ValueError(f"{_name(self.path)} is not sorted by interval_time")
+                self._pending.append(batch)
+                self._pending_keys.append(keys)
+
+    def _split(self, upper: int) -> tuple:
+        """Consume buffered rows with interval_time <= upper → (table, int64 keys)."""
+        table = pa.Table.from_batches(self._pending, schema=self._pending[0].schema)
+        file_keys = np.concatenate(self._pending_keys)
+        split = int(np.searchsorted(file_keys, upper, side='right'))
+        if split < len(file_keys):
+            self._pending = table.slice(split).to_batches()
+            self._pending_keys = [file_keys[split:]]
+            return table.slice(0, split), file_keys[:split]
+        self._pending = []
+        self._pending_keys = []
+        return table, file_keys
+
+    def last_key(self) -> int:
+        """Largest buffered interval_time, reading one batch if none is buffered (None when done)."""
+        if not self._pending:
+            self._fill_until(np.iinfo(np.int64).min)
+        return int(self._pending_keys[-1][-1]) if self._pending else None
+
+    def take_until(self, upper: int) -> pa.Table:
+        """Consume and return buffered rows with interval_time <= upper (key column first)."""
+        return self._split(upper)[0]
+
+    def take_aligned(self, keys: np.ndarray) -> list:
+        """
+        Return this file's columns aligned to `keys` (LEFT JOIN semantics).
+
+        Rows with interval_time <= keys[-1] are consumed; rows with no
+        matching key become nulls in the output.
+        """
+        upper = int(keys[-1])
+        self._fill_until(upper)
+
+        if not self._pending:
+            return [pa.nulls(len(keys), type=t) for t in self._types]
+
+        # Split buffer: rows up to `upper` are used now, the rest are kept
+        table, file_keys = self._split(upper)
+
+        # Map each target key to its row in this file (first match)
+        pos = np.searchsorted(file_keys, keys, side='left')
+        pos_clipped = np.minimum(pos, max(len(file_keys) - 1, 0))
+        matched = (pos < len(file_keys)) & (file_keys[pos_clipped] == keys) if len(file_keys) else np.zeros(len(keys), bool)
+        indices = pa.array(pos_clipped, mask=~matched, type=pa.int64())
+
+        return [table.column(i + 1).take(indices) for i in range(len(self.columns))]
+
+
+def merge_sorted_runs(run_paths: list, output_path, row_group_rows: int = DEFAULT_BATCH_ROWS,
+                      read_rows: int = CURSOR_READ_ROWS) -> int:
+    """
+    K-way merge of parquet runs (same schema, each sorted by interval_time) into one sorted file.
+
+    Row union, not a join: every input row is written once. Each step emits
+    all buffered rows up to the smallest buffered high-water key across the
+    runs (no run can still produce a smaller key), so memory is bounded by
+    ~(runs × read_rows + row_group_rows) rows regardless of file size.
+
+    Args:
+        run_paths: Sorted parquet runs to merge
+        output_path: Merged parquet file to write
+        row_group_rows: Rows per output row group
+        read_rows: Rows decoded per run read
+
+    Returns:
+        Number of rows written
+    """
+    schema = pq.read_schema(run_paths[0])
+    columns = [c for c in schema.names if c != KEY_COLUMN]
+    cursors = [CheckpointCursor(Path(p), columns, read_rows) for p in run_paths]
+
+    rows = 0
+    buffer, buffered = [], 0
+    with pq.ParquetWriter(output_path, schema) as writer:
+        while True:
+            live = [(cursor, key) for cursor, key in ((c, c.last_key()) for c in cursors) if key is not None]
+            if not live:
+                break
+            bound = min(key for _, key in live)
+            parts = [cursor.take_until(bound) for cursor, _ in live]
+            step = pa.concat_tables(parts).sort_by(KEY_COLUMN).select(schema.names)
+            buffer.append(step)
+            buffered += step.num_rows
+            if buffered >= row_group_rows:
+                writer.write_table(pa.concat_tables(buffer), row_group_size=row_group_rows)
+                rows += buffered
+                buffer, buffered = [], 0
+        if buffer:
+            writer.write_table(pa.concat_tables(buffer), row_group_size=row_group_rows)
+            rows += buffered
+    return rows
+
+
+def _resized(reader, read_rows: int):
+    """Re-chunk an existing batch iterator into batches of at most `read_rows`."""
+    for batch in reader:
+        for offset in range(0, batch.num_rows, read_rows):
+            yield batch.slice(offset, read_rows)
+
+
+def _copy_previous_rows(writer, previous_path: Path, since_key: int) -> tuple:
+    """
+    Copy rows of a previous merged output with interval_time < since_key.
+
+    If the previous output ends before since_key, the cut moves back to just
+    after its last row so no rows are skipped.
+
+    Returns: (rows copied, key the re-merge must start from)
+    """
+    previous = pq.ParquetFile(previous_path)
+    keys = key_values(pq.read_table(previous_path, columns=[KEY_COLUMN]).column(0))
+    if len(keys):
+        since_key = min(since_key, int(keys[-1]) + 1)
+    cut = int(np.searchsorted(keys, since_key, side='left'))
+
+    copied = 0
+    for i in range(previous.num_row_groups):
+        if copied >= cut:
+            break
+        group = previous.read_row_group(i)
+        if copied + group.num_rows > cut:
+            group = group.slice(0, cut - copied)
+        writer.write_table(group)
+        copied += group.num_rows
+    return copied, since_key
+
+
+def streaming_merge(checkpoint_dir: Path, output_path: Path,
+                    batch_rows: int = DEFAULT_BATCH_ROWS,
+                    max_rss_gb: float = DEFAULT_MAX_RSS_GB,
+                    since: str = None) -> dict:
+    """
+    Merge all checkpoint files into one training parquet in a single pass.
+
+    Args:
+        checkpoint_dir: Directory (or gs:// prefix) holding targets.parquet + feature checkpoints
+        output_path: Path of the merged parquet file to write (local)
+        batch_rows: Rows per output row group (initial value, shrinks on RSS backoff)
+        max_rss_gb: Process RSS budget in GB, enforced after every batch
+        since: Re-merge only rows from this interval_time on ('YYYY-MM-DD HH:MM:SS',
+            UTC), keeping earlier rows of the existing output (None → full merge)
+
+    Returns:
+        dict with rows, columns, files, batches, kept_rows, peak_rss_gb, elapsed_seconds
+    """
+    start_time = datetime.now()
+    targets_path, feature_files = list_checkpoints(checkpoint_dir)
+    if not object_store.exists(str(targets_path)):
+        raise FileNotFoundError(f"targets.parquet not found in {checkpoint_dir}")
+
+    print(f"Resolving column ownership from {len(feature_files)} parquet footers...")
+    target_columns, owned = resolve_column_ownership(targets_path, feature_files)
+    feature_column_count = sum(len(cols) for _, cols, _ in owned)
+    print(f"  Targets: {len(target_columns)} columns")
+    print(f"  Features: {feature_column_count:,} columns from {len(owned)} files "
+          f"({len(feature_files) - len(owned)} files contribute no new columns)")
+
+    # Output schema: targets columns, then each file's owned columns in order
+    fields = list(object_store.read_schema(str(targets_path)))
+    for _, cols, schema in owned:
+        fields.extend(schema.field(c) for c in cols)
+    output_schema = pa.schema(fields)
+
+    # Incremental only onto a previous output with exactly this schema
+    since_key = None
+    if since is not None:
+        if not output_path.exists():
+            print(f"  ⚠️  No previous output at {output_path}, running full merge")
+        elif not pq.read_schema(output_path).remove_metadata().equals(output_schema.remove_metadata()):
+            print(f"  ⚠️  Previous output schema differs from checkpoints, running full merge")
+        else:
+            since_key = timestamp_key(since)
+
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = output_path.with_suffix(output_path.suffix + ".tmp")
+
+    total_rows = 0
+    kept_rows = 0
+    batch_count = 0
+    peak_rss = get_rss_gb()
+    last_key = None
+
+    print(f"\nStreaming merge: batch={batch_rows:,} rows, RSS budget={max_rss_gb:.1f} GB")
+
+    try:
+        with pq.ParquetWriter(tmp_path, output_schema, compression='snappy') as writer:
+            targets_file = object_store.open_parquet(str(targets_path))
+            target_groups = list(range(targets_file.num_row_groups))
+            skip_rows = 0
+            if since_key is not None:
+                kept_rows, since_key = _copy_previous_rows(writer, output_path, since_key)
+                total_rows = kept_rows
+                first_group, first_row = _first_row_group(targets_path, since_key)
+                target_groups = target_groups[first_group:]
+                skip_rows = first_row - sum(targets_file.metadata.row_group(i).num_rows for i in range(first_group))
+                print(f"  Incremental: kept {kept_rows:,} previous rows, re-merging from {since}")
+
+            read_rows = min(batch_rows, CURSOR_READ_ROWS)
+            cursors = _read_ahead_all(
+                lambda entry: CheckpointCursor(entry[0], entry[1], read_rows, min_key=since_key, schema=entry[2]),
+                owned)
+            targets_iter = _resized(object_store.iter_batches(str(targets_path), None, batch_rows, target_groups),
+                                    batch_rows)
+
+            while True:
+                # next() on the current iterator so RSS backoff can re-chunk it
+                targets_batch = next(targets_iter, None)
+                if targets_batch is None:
+                    break
+                if skip_rows:
+                    # Rows of the first targets row group before `since`
+                    dropped = min(skip_rows, targets_batch.num_rows)
+                    targets_batch = targets_batch.slice(dropped)
+                    skip_rows -= dropped
+                if targets_batch.num_rows == 0:
+                    continue
+                keys = key_values(targets_batch.column(KEY_COLUMN))
+                if (last_key is not None and keys[0] < last_key) or np.any(np.diff(keys) < 0):
+                    raise ValueError("targets.parquet is not sorted by interval_time")
+                last_key = keys[-1]
+
+                # Cursors are advanced CURSOR_READ_AHEAD ahead (their reads overlap the assembly)
+                arrays = list(targets_batch.columns)
+                for columns in _read_ahead_all(lambda cursor: cursor.take_aligned(keys), cursors):
+                    arrays.extend(columns)
+
+                writer.write_table(pa.Table.from_arrays(arrays, schema=output_schema))
+                total_rows += targets_batch.num_rows
+                batch_count += 1
+                del arrays
+
+                # RSS budget enforcement
+                pa.default_memory_pool().release_unused()
+                rss = get_rss_gb()
+                peak_rss = max(peak_rss, rss)
+                if rss > max_rss_gb:
+                    gc.collect()
+                    pa.default_memory_pool().release_unused()
+                    rss = get_rss_gb()
+                if rss > max_rss_gb:
+                    if batch_rows <= MIN_BATCH_ROWS:
+                        raise MemoryError(
+                            f"RSS {rss:.2f} GB exceeds budget {max_rss_gb:.1f} GB "
+                            f"at minimum batch size ({MIN_BATCH_ROWS:,} rows)"
+                        )
+                    batch_rows = max(batch_rows // 2, MIN_BATCH_ROWS)
+                    targets_iter = _resized(targets_iter, batch_rows)
+                    print(f"  ⚠️  RSS {rss:.2f} GB > {max_rss_gb:.1f} GB budget, batch size → {batch_rows:,} rows")
+
+                if batch_count % PROGRESS_INTERVAL == 0:
+                    elapsed = (datetime.now() - start_time).total_seconds()
+                    print(f"  [{batch_count:5d} batches] {total_rows:,} rows | "
+                          f"RSS: {rss:5.2f} GB | Time: {elapsed/60:5.1f} min", flush=True)
+
+    except BaseException:
+        tmp_path.unlink(missing_ok=True)
+        raise
+
+    tmp_path.replace(output_path)
+    elapsed = (datetime.now() - start_time).total_seconds()
+
+    return {
+        'rows': total_rows,
+        'columns': len(output_schema),
+        'files': len(owned),
+        'batches': batch_count,
+        'kept_rows': kept_rows,
+        'final_batch_rows': batch_rows,
+        'peak_rss_gb': peak_rss,
+        'elapsed_seconds': elapsed
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Streaming k-way merge of sorted checkpoint files")
+    parser.add_argument("checkpoint_dir", help="Directory (or gs:// prefix) with targets.parquet and feature checkpoints")
+    parser.add_argument("output_path", help="Merged training parquet to write")
+    parser.add_argument("--batch-rows", type=int, default=DEFAULT_BATCH_ROWS,
+                        help=f"Rows per output batch (default: {DEFAULT_BATCH_ROWS:,})")
+    parser.add_argument("--max-rss", type=float, default=DEFAULT_MAX_RSS_GB,
+                        help=f"RSS budget in GB (default: {DEFAULT_MAX_RSS_GB})")
+    parser.add_argument("--since", help="Re-merge only rows from this UTC interval_time on, "
+                                        "keeping earlier rows of the existing output")
+    args = parser.parse_args()
+
+    try:
+        checkpoint_dir = args.checkpoint_dir if object_store.is_remote(args.checkpoint_dir) else Path(args.checkpoint_dir)
+        stats = streaming_merge(checkpoint_dir, Path(args.output_path),
+                                batch_rows=args.batch_rows, max_rss_gb=args.max_rss, since=args.since)
+    except (MemoryError, ValueError, FileNotFoundError) as e:
+        print(f"❌ MERGE FAILED: {e}")
+        sys.exit(1)
+
+    print(f"\n✅ Merged {stats['rows']:,} rows × {stats['columns']:,} columns "
+          f"from {stats['files']} files in {stats['elapsed_seconds']/60:.1f} min "
+          f"(peak RSS {stats['peak_rss_gb']:.2f} GB)")
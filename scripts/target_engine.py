@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+"""
+Local Target Engine - All 49 target_bqx{w}_h{h} Columns in One Pass
+
+create_all_targets_tables.py sends one CREATE TABLE job per pair through
+the bq CLI, with 49 `LEAD(bqx_w, h) OVER (ORDER BY interval_time)` window
+expressions each, then the targets table is extracted back to Parquet
+before the merge can run.
+
+This engine reads the pair's base_bqx checkpoint and writes targets.parquet
+straight into the checkpoint directory that merge_with_polars_safe /
+streaming_merge read:
+1. Load interval_time + bqx_{45..2880} once, drop NULL bqx_45 rows, sort
+2. Per horizon, resolve the row h intervals ahead ONCE (one searchsorted
+   over the time axis), then gather all 7 windows through that index
+3. Write interval_time, pair, bqx_*, then the 49 targets (window-major, as
+   the SQL), atomically
+
+GAP HANDLING (gap_policy):
+- 'time' (default): target = bqx_w at exactly interval_time + h minutes,
+  NULL if that interval is missing. A LEAD never crosses a data gap
+  (weekend close, outage) and silently labels a row with a value from
+  hours or days later.
+- 'lead': row-offset LEAD, identical to the BigQuery SQL.
+Both report how many targets a plain LEAD would take across a gap.
+
+Usage:
+    from target_engine import build_targets_local, build_all_targets_local
+    result = build_targets_local('eurusd', checkpoint_root)
+    results = build_all_targets_local(pairs, checkpoint_root, workers=8)
+"""
+
+import os
+import sys
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+from create_all_targets_tables import BQX_WINDOWS, HORIZONS
+
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'pipelines', 'training'))
+from object_store import CHECKPOINT_ROW_GROUP_ROWS
+
+CHECKPOINT_ROOT = "/home/micha/bqx_ml_v3/data/features/checkpoints"
+TARGETS_FILE = "targets.parquet"  # Name streaming_merge / merge_with_polars_safe expect
+
+INTERVAL_NS = 60 * 1_000_000_000  # One interval = one minute
+GAP_POLICIES = ('time', 'lead')
+
+
+def target_column(window: int, horizon: int) -> str:
+    return f"target_bqx{window}_h{horizon}"
+
+
+def load_base_bqx(path: str) -> tuple:
+    """
+    Read a base_bqx checkpoint as the targets SQL's `source` CTE.
+
+    Returns:
+        (times int64 ns sorted, pair Arrow column, values float64 (rows × windows)
+         with NaN for NULL), rows with NULL bqx_45 dropped
+    """
+    columns = ['interval_time', 'pair'] + [f"bqx_{w}" for w in BQX_WINDOWS]
+    table = pq.read_table(path, columns=columns)
+    values = np.empty((table.num_rows, len(BQX_WINDOWS)))
+    for j, w in enumerate(BQX_WINDOWS):
+        values[:, j] = table.column(f"bqx_{w}").cast(pa.float64()).to_numpy(zero_copy_only=False)
+    times = pd.to_datetime(table.column('interval_time').to_pandas(), utc=True) \
+        .to_numpy(dtype='datetime64[ns]').astype(np.int64)
+
+    keep = np.flatnonzero(~np.isnan(values[:, 0]))
+    order = keep[np.argsort(times[keep], kind='stable')]
+    return times[order], table.column('pair').take(pa.array(order)), values[order]
+
+
+def lead_index(times: np.ndarray, horizon: int, gap_policy: str = 'time') -> tuple:
+    """
+    Source row of each row's horizon-`horizon` target.
+
+    Returns:
+        (index int64, valid bool, crossed int) where crossed counts rows whose
+        row-offset LEAD spans more (or less) than `horizon` intervals
+    """
+    n = len(times)
+    offset = np.arange(n) + horizon
+    in_range = offset < n
+    expected = times + horizon * INTERVAL_NS
+    crossed = int(np.count_nonzero(times[offset[in_range]] != expected[in_range]))
+
+    if gap_policy == 'lead':
+        return np.minimum(offset, max(n - 1, 0)), in_range, crossed
+    index = np.searchsorted(times, expected)
+    valid = index < n
+    valid[valid] = times[index[valid]] == expected[valid]
+    return np.minimum(index, max(n - 1, 0)), valid, crossed
+
+
+def compute_targets(times: np.ndarray, values: np.ndarray, gap_policy: str = 'time') -> tuple:
+    """
+    All window × horizon targets.
+
+    Returns:
+        ({target column: float64 array (NaN = NULL)}, {horizon: crossed-gap count})
+    """
+    if gap_policy not in GAP_POLICIES:
+        raise ValueError(f"gap_policy must be one of {GAP_POLICIES}, got {gap_policy!r}")
+    by_horizon, crossed = {}, {}
+    for h in HORIZONS:
+        index, valid, crossed[h] = lead_index(times, h, gap_policy)
+        gathered = values[index]
+        gathered[~valid] = np.nan
+        by_horizon[h] = gathered
+
+    targets = {}
+    for j, w in enumerate(BQX_WINDOWS):
+        for h in HORIZONS:
+            targets[target_column(w, h)] = by_horizon[h][:, j]
+    return targets, crossed
+
+
+def write_targets(path: str, times: np.ndarray, pair_column, values: np.ndarray,
+                  targets: dict) -> None:
+    """Write the targets table (SQL column order) atomically."""
+    arrays = [pa.array(pd.to_datetime(times, utc=True)), pair_column]
+    names = ['interval_time', 'pair']
+    for j, w in enumerate(BQX_WINDOWS):
+        arrays.append(pa.array(values[:, j], from_pandas=True))
+        names.append(f"bqx_{w}")
+    for name, column in targets.items():
+        arrays.append(pa.array(column, from_pandas=True))
+        names.append(name)
+
+    tmp_path = f"{path}.tmp"
+    try:
+        pq.write_table(pa.Table.from_arrays(arrays, names=names), tmp_path,
+                       row_group_size=CHECKPOINT_ROW_GROUP_ROWS, compression='snappy')
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def build_targets_local(pair: str, checkpoint_root: str = CHECKPOINT_ROOT,
+                        gap_policy: str = 'time') -> dict:
+    """
+    Build {checkpoint_root}/{pair}/targets.parquet from base_bqx_{pair}.parquet.
+
+    Returns:
+        Result dict like create_targets_table: pair, status, row_count / error,
+        plus crossed_gaps ({horizon: targets a plain LEAD takes across a gap})
+    """
+    pair_dir = os.path.join(checkpoint_root, pair)
+    source = os.path.join(pair_dir, f"base_bqx_{pair}.parquet")
+    if not os.path.exists(source):
+        return {"pair": pair, "status": "FAILED", "error": f"missing checkpoint {source}"}
+    try:
+        times, pair_column, values = load_base_bqx(source)
+        targets, crossed = compute_targets(times, values, gap_policy)
+        write_targets(os.path.join(pair_dir, TARGETS_FILE), times, pair_column, values, targets)
+    except (OSError, KeyError, ValueError, pa.ArrowException) as e:
+        return {"pair": pair, "status": "FAILED", "error": str(e)[:200]}
+    return {"pair": pair, "status": "SUCCESS", "row_count": len(times), "crossed_gaps": crossed}
+
+
+def build_all_targets_local(pairs: list, checkpoint_root: str = CHECKPOINT_ROOT,
+                            gap_policy: str = 'time', workers: int = None) -> list:
+    """
+    Build targets for many pairs, one process per pair.
+
+    Args:
+        workers: Parallel processes (default: one per core, at most one per pair)
+
+    Returns:
+        List of result dicts in completion order
+    """
+    workers = max(1, min(workers or os.cpu_count() or 1, len(pairs)))
+    if workers == 1:
+        return [build_targets_local(p, checkpoint_root, gap_policy) for p in pairs]
+
+    results = []
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = {executor.submit(build_targets_local, p, checkpoint_root, gap_policy): p for p in pairs}
+        for future in as_completed(futures):
+            results.append(future.result())
+    return results
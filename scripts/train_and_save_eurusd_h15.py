@@ -4,8 +4,9 @@ Train and Save EURUSD h15 Model to GCS
 GATE_3 Requirement: Model artifacts saved to GCS
 
 Trains the calibrated 3-model ensemble and saves to:
-- Local: /models/eurusd/h15_ensemble.joblib
-- GCS: gs://bqx-ml-v3-models/models/eurusd/h15_ensemble.joblib
+- Local: /models/eurusd/h15_ensemble.artifact
+- GCS: gs://bqx-ml-v3-models/models/eurusd/h15_ensemble.artifact
+(native boosters + JSON manifest, see model_artifact.py)
 """
 
 import json
@@ -16,10 +17,8 @@ from google.cloud import bigquery, storage
 import lightgbm as lgb
 from xgboost import XGBClassifier
 from catboost import CatBoostClassifier
-from sklearn.linear_model import LogisticRegression
-from sklearn.calibration import CalibratedClassifierCV
-import joblib
 import os
+from model_artifact import ARTIFACT_SUFFIX, save_artifact
 import warnings
 warnings.filterwarnings('ignore')
 
@@ -167,13 +166,15 @@ def main():
     print("\nStep 3: Saving model artifacts...")
     local_dir = f"/home/micha/bqx_ml_v3/models/{pair}"
     os.makedirs(local_dir, exist_ok=True)
-    local_path = f"{local_dir}/h{horizon}_ensemble.joblib"
-    joblib.dump(artifact, local_path)
+    local_path = f"{local_dir}/h{horizon}_ensemble{ARTIFACT_SUFFIX}"
+    save_artifact(local_path, feature_cols, artifact['models'], metadata={
+        key: artifact[key] for key in ('pair', 'horizon', 'timestamp', 'training_samples', 'version')
+    })
     print(f"  Local: {local_path}")
 
     # Upload to GCS
     print("\nStep 4: Uploading to GCS...")
-    gcs_path = f"models/{pair}/h{horizon}_ensemble.joblib"
+    gcs_path = f"models/{pair}/h{horizon}_ensemble{ARTIFACT_SUFFIX}"
     gcs_uri = upload_to_gcs(local_path, gcs_path)
     print(f"  GCS: {gcs_uri}")
 
@@ -0,0 +1,204 @@
+#!/usr/bin/env python3
+"""
+Local TRI Engine - All Currency Triangles in One Vectorized Pass
+
+generate_tri_tables.py runs one CREATE OR REPLACE TABLE per triangle
+(18 triangles × 2 variants × 2 source variants). Every job re-scans its
+three base_{source_variant}_* tables and rebuilds the interval union, and
+the agg/align variants are the very same query under two table names.
+
+This engine, per source variant:
+1. Loads each base pair series once (from the extracted checkpoints) onto
+   one aligned (time × pair) grid, with a row-presence mask per pair
+2. Computes pair2 (inverted where needed), synthetic_val and tri_error for
+   every triangle as (time × triangle) arrays
+3. Computes the w45/w180 rolling stats for batches of triangles at once
+   over their shared row set (the pair1 ∪ pair3 intervals)
+4. Writes each tri_{variant}_{source_variant}_* table as month-partitioned
+   Parquet (computed once, written for both agg and align)
+
+Semantics follow generate_tri_sql: LEFT JOINs onto the interval union,
+SAFE_DIVIDE(1, v) inversion, ROWS frames over the triangle's own rows,
+NULL-skipping AVG/STDDEV, NULL z-score → arb_opportunity 0 and 'normal'.
+
+Usage:
+    from tri_engine import build_tri_tables_local
+    results = build_tri_tables_local('bqx', checkpoint_root, output_root)
+"""
+
+import os
+import numpy as np
+import pandas as pd
+
+from generate_tri_tables import (
+    TRIANGLES, VARIANTS, DATE_START, DATE_END, get_pair_name, get_standard_pair_direction
+)
+from local_tables import (
+    load_pair_series, align_series, window_mask, write_partitioned, CHECKPOINT_ROOT, LOCAL_OUTPUT_ROOT
+)
+
+# Triangles whose rolling stats are computed together (bounds peak memory:
+# ~8 float64 arrays of rows × TRI_BATCH)
+TRI_BATCH = 6
+
+OUTPUT_COLUMNS = [
+    'interval_time', 'base_curr', 'quote_curr', 'cross_curr',
+    'pair1_val', 'pair2_val', 'pair3_val', 'synthetic_val', 'tri_error',
+    'error_ma_45', 'error_ma_180', 'error_std_180', 'error_zscore',
+    'arb_opportunity', 'error_regime'
+]
+
+
+def triangle_sources(base_curr: str, quote_curr: str, cross_curr: str) -> tuple:
+    """(pair1, pair2_actual, pair2_needs_invert, pair3) as in generate_tri_sql."""
+    pair2_actual, pair2_needs_invert = get_standard_pair_direction(quote_curr, cross_curr)
+    return (get_pair_name(base_curr, quote_curr), pair2_actual, pair2_needs_invert,
+            get_pair_name(base_curr, cross_curr))
+
+
+def triangle_arrays(values: np.ndarray, present: np.ndarray, pairs: list, triangles: list,
+                    grid: np.ndarray) -> dict:
+    """
+    Grid-aligned per-triangle arrays (time × triangle).
+
+    Returns dict with pair1, pair2, pair3, synthetic, error, rows (T×K bool:
+    the triangle's output rows = pair1 ∪ pair3 intervals within the window)
+    """
+    col = {p: j for j, p in enumerate(pairs)}
+    sources = [triangle_sources(*t) for t in triangles]
+    in_window = window_mask(grid, DATE_START, DATE_END)
+
+    p1 = values[:, [col[s[0]] for s in sources]]
+    p2 = values[:, [col[s[1]] for s in sources]]
+    p3 = values[:, [col[s[3]] for s in sources]]
+    invert = np.array([s[2] for s in sources])
+    with np.errstate(divide='ignore'):
+        p2 = np.where(invert, np.where(p2 == 0, np.nan, 1.0 / p2), p2)
+
+    rows = (present[:, [col[s[0]] for s in sources]] | present[:, [col[s[3]] for s in sources]])
+    rows &= in_window[:, None]
+
+    synthetic = p1 * p2
+    return {'pair1': p1, 'pair2': p2, 'pair3': p3, 'synthetic': synthetic,
+            'error': p3 - synthetic, 'rows': rows}
+
+
+def _rolling_stats(errors: np.ndarray) -> dict:
+    """w45/w180 AVG and STDDEV (ROWS frames, NULLs skipped) for each column."""
+    frame = pd.DataFrame(errors)
+    w45 = frame.rolling(45, min_periods=1)
+    w180 = frame.rolling(180, min_periods=1)
+    return {
+        'ma_45': w45.mean().to_numpy(),
+        'std_45': w45.std().to_numpy(),
+        'ma_180': w180.mean().to_numpy(),
+        'std_180': w180.std().to_numpy()
+    }
+
+
+def triangle_frames(arrays: dict, grid: np.ndarray, triangles: list, batch: int = TRI_BATCH):
+    """
+    Yield (triangle, frame) with the full tri_* output columns.
+
+    Triangles sharing the same output row set are processed together in
+    batches, so the rolling windows run as one 2-D pass per batch.
+    """
+    rows = arrays['rows']
+    groups = {}
+    for k in range(len(triangles)):
+        groups.setdefault(np.packbits(rows[:, k]).tobytes(), []).append(k)
+
+    times = pd.to_datetime(grid, utc=True)
+    for members in groups.values():
+        idx = np.flatnonzero(rows[:, members[0]])
+        for start in range(0, len(members), batch):
+            cols = members[start:start + batch]
+            err = arrays['error'][np.ix_(idx, cols)]
+            stats = _rolling_stats(err)
+
+            std_180 = stats['std_180']
+            with np.errstate(divide='ignore', invalid='ignore'):
+                zscore = np.where(std_180 == 0, np.nan, (err - stats['ma_180']) / std_180)
+            arb = (np.abs(zscore) > 2).astype(np.int64)
+            regime = np.where(stats['std_45'] > std_180 * 1.5, 'high_vol',
+                              np.where(stats['std_45'] < std_180 * 0.5, 'low_vol', 'normal'))
+
+            for j, k in enumerate(cols):
+                base_curr, quote_curr, cross_curr = triangles[k]
+                frame = pd.DataFrame({
+                    'interval_time': times[idx],
+                    'base_curr': base_curr,
+                    'quote_curr': quote_curr,
+                    'cross_curr': cross_curr,
+                    'pair1_val': arrays['pair1'][idx, k],
+                    'pair2_val': arrays['pair2'][idx, k],
+                    'pair3_val': arrays['pair3'][idx, k],
+                    'synthetic_val': arrays['synthetic'][idx, k],
+                    'tri_error': err[:, j],
+                    'error_ma_45': stats['ma_45'][:, j],
+                    'error_ma_180': stats['ma_180'][:, j],
+                    'error_std_180': std_180[:, j],
+                    'error_zscore': zscore[:, j],
+                    'arb_opportunity': arb[:, j],
+                    'error_regime': regime[:, j]
+                })
+                yield triangles[k], frame[OUTPUT_COLUMNS]
+
+
+def build_tri_tables_local(source_variant: str, checkpoint_root: str = CHECKPOINT_ROOT,
+                           output_root: str = LOCAL_OUTPUT_ROOT, triangles: list = None,
+                           variants: list = None) -> list:
+    """
+    Build every tri_{variant}_{source_variant}_* table from one load of the base series.
+
+    Args:
+        source_variant: 'bqx' or 'idx'
+        checkpoint_root: Root with one checkpoint directory per pair
+        output_root: Tables are written to output_root/tri/{table_name}/
+        triangles: Subset of TRIANGLES (default: all)
+        variants: Subset of VARIANTS (default: all)
+
+    Returns:
+        List of result dicts (table, status, rows / error) like generate_tri_table
+    """
+    triangles = triangles or TRIANGLES
+    variants = variants or VARIANTS
+    needed = sorted({p for t in triangles for i, p in enumerate(triangle_sources(*t)) if i != 2})
+
+    series, missing = {}, []
+    for pair in needed:
+        loaded = load_pair_series(pair, source_variant, checkpoint_root)
+        if loaded is None:
+            missing.append(pair)
+        else:
+            series[pair] = loaded
+    print(f"  Loaded {len(series)} base_{source_variant}_* series once "
+          f"({sum(len(s[0]) for s in series.values()):,} rows)", flush=True)
+
+    results = []
+    runnable = []
+    for t in triangles:
+        absent = [p for i, p in enumerate(triangle_sources(*t)) if i != 2 and p in missing]
+        if absent:
+            for variant in variants:
+                results.append({'table': f"tri_{variant}_{source_variant}_{'_'.join(t)}",
+                                'status': 'FAILED',
+                                'error': f"missing checkpoint base_{source_variant}_{absent[0]}"})
+        else:
+            runnable.append(t)
+    if not runnable:
+        return results
+
+    grid, values, present, pairs = align_series(series)
+    arrays = triangle_arrays(values, present, pairs, runnable, grid)
+    del values, present
+
+    for triangle, frame in triangle_frames(arrays, grid, runnable):
+        for variant in variants:
+            table_name = f"tri_{variant}_{source_variant}_{'_'.join(triangle)}"
+            try:
+                write_partitioned(frame, os.path.join(output_root, 'tri', table_name))
+                results.append({'table': table_name, 'status': 'SUCCESS', 'rows': len(frame)})
+            except OSError as e:
+                results.append({'table': table_name, 'status': 'FAILED', 'error': str(e)[:200]})
+    return results
@@ -11,7 +11,7 @@ Updated 2025-12-10:
 Usage:
     python validate_gate3.py --pair eurusd --horizon 15
     python validate_gate3.py --pair eurusd --horizon 15 --model-version v3
-    python validate_gate3.py --pair eurusd --horizon 15 --model-path models/eurusd/h15_custom.joblib
+    python validate_gate3.py --pair eurusd --horizon 15 --model-path models/eurusd/h15_custom.artifact
 """
 
 import json
@@ -32,32 +32,38 @@ FEATURE_UNIVERSE_TOTAL = 11337  # Total columns per pair
 FEATURE_UNIVERSE_UNIQUE = 1064  # Unique features per pair
 
 def check_gcs_artifact(pair: str, horizon: int, model_version: str = None, model_path: str = None) -> dict:
-    """Check GCS model artifact exists and has expected size."""
+    """Check GCS model artifact (.artifact, else legacy .joblib) exists and has expected size."""
     if model_path:
         # Custom model path provided
         gcs_path = model_path if model_path.startswith("gs://") else f"gs://bqx-ml-v3-models/{model_path}"
     elif model_version:
         # Versioned model (v2, v3, etc.)
-        gcs_path = f"gs://bqx-ml-v3-models/models/{pair}/h{horizon}_ensemble_{model_version}.joblib"
+        gcs_path = f"gs://bqx-ml-v3-models/models/{pair}/h{horizon}_ensemble_{model_version}.artifact"
     else:
         # Default (legacy)
-        gcs_path = f"gs://bqx-ml-v3-models/models/{pair}/h{horizon}_ensemble.joblib"
+        gcs_path = f"gs://bqx-ml-v3-models/models/{pair}/h{horizon}_ensemble.artifact"
+    # Ensembles saved before the native artifact format are still .joblib
+    candidates = [gcs_path]
+    if gcs_path.endswith(".artifact"):
+        candidates.append(gcs_path[:-len(".artifact")] + ".joblib")
     try:
-        result = subprocess.run(
-            ["gsutil", "ls", "-l", gcs_path],
-            capture_output=True, text=True, timeout=30
-        )
-        if result.returncode == 0:
+        for path in candidates:
+            result = subprocess.run(
+                ["gsutil", "ls", "-l", path],
+                capture_output=True, text=True, timeout=30
+            )
+            if result.returncode != 0:
+                continue
             # Parse size from output
             lines = result.stdout.strip().split('\n')
             for line in lines:
-                if 'joblib' in line:
+                if line.rstrip().endswith(path):
                     parts = line.split()
                     size_bytes = int(parts[0]) if parts[0].isdigit() else 0
                     return {
                         "exists": True,
                         "size_mb": round(size_bytes / 1024 / 1024, 2),
-                        "path": gcs_path,
+                        "path": path,
                         "pass": size_bytes > 1000000  # > 1MB
                     }
         return {"exists": False, "pass": False, "path": gcs_path}
@@ -0,0 +1,143 @@
+#!/usr/bin/env python3
+"""
+corr_engine against a frame-by-frame reading of generate_corr_sql.
+
+Pair and asset checkpoints have gaps, NULL values, a constant stretch
+(CORR NaN on zero variance, beta NULL) and rows past DATE_END. History is
+longer than the largest window plus a few row blocks, so streamed slices
+with a cut halo are compared too. The reference LEFT JOINs with pandas
+and evaluates every ROWS frame directly with two-pass moments.
+"""
+
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+import pyarrow.parquet as pq
+from numpy.lib.stride_tricks import sliding_window_view
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), 'scripts'))
+from generate_corr_tables import DATE_END, WINDOWS, corr_table_name
+from corr_engine import ASSET_DIR, STATS, build_corr_tables_local
+
+VARIANT = 'idx'
+PAIRS = ['eurusd', 'gbpusd', 'usdjpy']  # eurusd and gbpusd share one presence pattern
+ASSETS = ['spy', 'vix']
+ROWS = 3900  # Hourly, from 2025-06-20 (past DATE_END; > max(WINDOWS) + a few ROW_BLOCKs)
+ROW_BLOCK = 200
+CONSTANT = slice(1500, 1620)  # vix holds one value here
+
+
+def _write_series(path, times, values) -> None:
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    pd.DataFrame({'interval_time': times, 'close_idx': values}).to_parquet(path, index=False)
+
+
+def _write_checkpoints(root) -> None:
+    rng = np.random.default_rng(5)
+    times = pd.date_range('2025-06-20', periods=ROWS, freq='h', tz='UTC')
+    shared = rng.random(ROWS) > 0.1
+    for pair in PAIRS:
+        keep = shared if pair in ('eurusd', 'gbpusd') else rng.random(ROWS) > 0.1
+        values = 100.0 + np.cumsum(rng.normal(0, 0.1, ROWS))  # Large level: catches cancellation
+        values[rng.random(ROWS) < 0.05] = np.nan
+        _write_series(root / pair / f"base_{VARIANT}_{pair}.parquet", times[keep], values[keep])
+    for asset in ASSETS:
+        keep = rng.random(ROWS) > 0.3  # Market hours: sparser than pairs
+        values = 50.0 + np.cumsum(rng.normal(0, 0.5, ROWS))
+        values[rng.random(ROWS) < 0.05] = np.nan
+        if asset == 'vix':
+            keep[CONSTANT] = True
+            values[CONSTANT] = 17.25
+        _write_series(root / ASSET_DIR / f"{asset}_{VARIANT}.parquet", times[keep], values[keep])
+
+
+def _frames(values: np.ndarray, window: int) -> np.ndarray:
+    """(rows × window) ROWS frames ending at each row, NaN-padded before the first."""
+    padded = np.concatenate([np.full(window - 1, np.nan), values])
+    return sliding_window_view(padded, window)
+
+
+def _stddev(frames: np.ndarray) -> np.ndarray:
+    n = (~np.isnan(frames)).sum(axis=1)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        mean = np.nansum(frames, axis=1) / n
+        var = np.nansum((frames - mean[:, None]) ** 2, axis=1) / (n - 1)
+    return np.where(n > 1, np.sqrt(var), np.nan)
+
+
+def _constant(frames: np.ndarray) -> np.ndarray:
+    """Frames whose non-NULL values are all equal (zero variance, exactly)."""
+    return np.nanmax(frames, axis=1, initial=-np.inf) == np.nanmin(frames, axis=1, initial=np.inf)
+
+
+def _reference(root, pair: str, asset: str) -> tuple:
+    """Expected table as (DataFrame with NaN for NULL, {column: real-NaN mask})."""
+    p = pd.read_parquet(root / pair / f"base_{VARIANT}_{pair}.parquet").rename(columns={'close_idx': 'pair_value'})
+    a = pd.read_parquet(root / ASSET_DIR / f"{asset}_{VARIANT}.parquet").rename(columns={'close_idx': 'asset_value'})
+    end = pd.Timestamp(DATE_END, tz='UTC')
+    intervals = pd.concat([p['interval_time'], a['interval_time']]).drop_duplicates()
+    df = pd.DataFrame({'interval_time': intervals[intervals <= end].sort_values()})
+    df = df.merge(p, on='interval_time', how='left').merge(a, on='interval_time', how='left')
+
+    x, y = df['pair_value'].to_numpy(), df['asset_value'].to_numpy()
+    real_nan = {}
+    for w in WINDOWS:
+        fx, fy = _frames(x, w), _frames(y, w)
+        both = ~np.isnan(fx) & ~np.isnan(fy)
+        px, py = np.where(both, fx, np.nan), np.where(both, fy, np.nan)
+        n = both.sum(axis=1)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            dx = px - (np.nansum(px, axis=1) / n)[:, None]
+            dy = py - (np.nansum(py, axis=1) / n)[:, None]
+            sxy, sxx, syy = np.nansum(dx * dy, axis=1), np.nansum(dx * dx, axis=1), np.nansum(dy * dy, axis=1)
+            flat = (n > 1) & (_constant(px) | _constant(py))
+            corr = np.where((n > 1) & ~flat, sxy / np.sqrt(sxx * syy), np.nan)
+            cov = np.where(n > 0, sxy / n, np.nan)
+        std_asset = _stddev(fy)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            beta = np.where(np.isnan(std_asset) | _constant(fy), np.nan, cov / std_asset ** 2)
+        df[f"corr_{w}"], df[f"cov_{w}"], df[f"beta_{w}"] = corr, cov, beta
+        df[f"std_pair_{w}"], df[f"std_asset_{w}"] = _stddev(fx), std_asset
+        real_nan[f"corr_{w}"] = flat
+    return df, real_nan
+
+
+def test_tables_match_sql_reference(tmp_path):
+    _write_checkpoints(tmp_path / 'checkpoints')
+    results = build_corr_tables_local(VARIANT, str(tmp_path / 'checkpoints'), str(tmp_path / 'out'),
+                                      PAIRS, ASSETS, workers=2, row_block=ROW_BLOCK)
+    assert len(results) == len(PAIRS) * len(ASSETS)
+    assert all(r['status'] == 'SUCCESS' for r in results)
+
+    flat_frames = 0
+    for pair in PAIRS:
+        for asset in ASSETS:
+            expected, real_nan = _reference(tmp_path / 'checkpoints', pair, asset)
+            table = pq.read_table(tmp_path / 'out' / 'corr' / f"{corr_table_name(VARIANT, pair, asset)}.parquet")
+            result = table.to_pandas()
+
+            assert len(result) == len(expected) > max(WINDOWS) + 2 * ROW_BLOCK
+            assert (result['interval_time'] == expected['interval_time']).all()
+            assert (result['pair'] == pair).all() and (result['asset'] == asset).all()
+            for column in ['pair_value', 'asset_value'] + [f"{s}_{w}" for w in WINDOWS for s in STATS]:
+                null = table.column(column).is_null().to_numpy(zero_copy_only=False)
+                nan = real_nan.get(column, np.zeros(len(expected), dtype=bool))
+                values, exact = result[column].to_numpy(dtype=float), expected[column].to_numpy(dtype=float)
+                assert np.array_equal(null, np.isnan(exact) & ~nan), (pair, asset, column)
+                assert np.array_equal(np.isnan(values) & ~null, nan), (pair, asset, column)
+                np.testing.assert_allclose(values, exact, rtol=1e-7, atol=1e-9, equal_nan=True,
+                                           err_msg=f"{pair}_{asset} {column}")
+            flat_frames += sum(mask.sum() for mask in real_nan.values())
+    assert flat_frames  # The constant stretch produced NaN CORRs
+
+
+def test_missing_asset_fails_only_its_tables(tmp_path):
+    _write_checkpoints(tmp_path / 'checkpoints')
+    os.remove(tmp_path / 'checkpoints' / ASSET_DIR / f"vix_{VARIANT}.parquet")
+    results = build_corr_tables_local(VARIANT, str(tmp_path / 'checkpoints'), str(tmp_path / 'out'),
+                                      PAIRS, ASSETS, workers=1, row_block=ROW_BLOCK)
+    status = {r['table']: r['status'] for r in results}
+    assert status == {corr_table_name(VARIANT, p, a): 'FAILED' if a == 'vix' else 'SUCCESS'
+                      for p in PAIRS for a in ASSETS}
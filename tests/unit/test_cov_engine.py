@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+"""
+cov_engine against a row-by-row reading of generate_cov_sql.
+
+Base checkpoints have gaps, NULL values, zeros (SAFE_DIVIDE ratio → NULL)
+and rows past DATE_END; two pairs share one presence pattern so their
+combinations share a row set. The reference LEFT JOINs with pandas and
+evaluates every ROWS frame directly (NULLs skipped, exact fsum moments).
+"""
+
+import itertools
+import math
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+import pyarrow.parquet as pq
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), 'scripts'))
+from generate_cov_tables import DATE_END, cov_table_name
+from cov_engine import build_cov_tables_local
+
+PAIRS = ['audusd', 'eurgbp', 'eurusd', 'gbpusd']
+COMBINATIONS = list(itertools.combinations(PAIRS, 2))
+ROWS = 600  # Hourly, from 2025-10-28 (crosses a month and DATE_END)
+FLOAT_COLUMNS = ['val1', 'val2', 'spread', 'ratio', 'spread_ma_45', 'spread_ma_180',
+                 'spread_std_45', 'spread_zscore', 'rolling_agreement_45']
+
+
+def _write_checkpoints(root, source_variant: str) -> None:
+    rng = np.random.default_rng(23)
+    times = pd.date_range('2025-10-28', periods=ROWS, freq='h', tz='UTC')
+    column = 'bqx_45' if source_variant == 'bqx' else 'close_idx'
+    shared = rng.random(ROWS) > 0.15
+    for pair in PAIRS:
+        keep = shared if pair in ('eurusd', 'gbpusd') else rng.random(ROWS) > 0.15
+        values = np.round(rng.normal(0, 1, ROWS), 1)  # Both signs, some exact zeros
+        values[rng.random(ROWS) < 0.08] = np.nan
+        os.makedirs(root / pair, exist_ok=True)
+        pd.DataFrame({'interval_time': times[keep], column: values[keep]}).to_parquet(
+            root / pair / f"base_{source_variant}_{pair}.parquet", index=False)
+
+
+def _avg(frame: np.ndarray) -> float:
+    x = frame[~np.isnan(frame)]
+    return math.fsum(x) / len(x) if len(x) else np.nan
+
+
+def _stddev(frame: np.ndarray) -> float:
+    x = frame[~np.isnan(frame)]
+    if len(x) < 2:
+        return np.nan
+    mean = math.fsum(x) / len(x)
+    return math.sqrt(math.fsum((x - mean) ** 2) / (len(x) - 1))
+
+
+def _reference(root, source_variant: str, pair1: str, pair2: str) -> pd.DataFrame:
+    column = 'bqx_45' if source_variant == 'bqx' else 'close_idx'
+
+    def _side(pair, name):
+        df = pd.read_parquet(root / pair / f"base_{source_variant}_{pair}.parquet")
+        return df.rename(columns={column: name})
+
+    p1, p2 = _side(pair1, 'val1'), _side(pair2, 'val2')
+    end = pd.Timestamp(DATE_END, tz='UTC')
+    intervals = pd.concat([p1['interval_time'], p2['interval_time']]).drop_duplicates()
+    df = pd.DataFrame({'interval_time': intervals[intervals <= end].sort_values()})
+    df = df.merge(p1, on='interval_time', how='left').merge(p2, on='interval_time', how='left')
+    val1, val2 = df['val1'].to_numpy(), df['val2'].to_numpy()
+    df['spread'] = val1 - val2
+    with np.errstate(divide='ignore', invalid='ignore'):
+        df['ratio'] = np.where(val2 == 0, np.nan, val1 / val2)
+    df['sign_agreement'] = (np.sign(val1) == np.sign(val2)).astype(np.int64)  # NULL → 0
+
+    spread = df['spread'].to_numpy()
+    agreement = df['sign_agreement'].to_numpy(dtype=float)
+    w45 = [slice(max(0, t - 44), t + 1) for t in range(len(df))]
+    w180 = [slice(max(0, t - 179), t + 1) for t in range(len(df))]
+    df['spread_ma_45'] = [_avg(spread[w]) for w in w45]
+    df['spread_ma_180'] = [_avg(spread[w]) for w in w180]
+    df['spread_std_45'] = [_stddev(spread[w]) for w in w45]
+    std_180 = np.array([_stddev(spread[w]) for w in w180])
+    with np.errstate(divide='ignore', invalid='ignore'):
+        df['spread_zscore'] = np.where(std_180 == 0, np.nan, (spread - df['spread_ma_180']) / std_180)
+    df['rolling_agreement_45'] = [_avg(agreement[w]) for w in w45]
+    df['mean_reversion_signal'] = (np.abs(df['spread_zscore']) > 2).astype(np.int64)  # NULL → 0
+    return df
+
+
+def _read_table(table_dir) -> pd.DataFrame:
+    df = pq.read_table(table_dir).to_pandas()
+    return df.drop(columns='month').sort_values('interval_time').reset_index(drop=True)
+
+
+@pytest.mark.parametrize('source_variant', ['bqx', 'idx'])
+def test_tables_match_sql_reference(tmp_path, source_variant):
+    _write_checkpoints(tmp_path / 'checkpoints', source_variant)
+    results = build_cov_tables_local(source_variant, str(tmp_path / 'checkpoints'), str(tmp_path / 'out'),
+                                     COMBINATIONS)
+    assert len(results) == 2 * len(COMBINATIONS)
+    assert all(r['status'] == 'SUCCESS' for r in results)
+
+    for pair1, pair2 in COMBINATIONS:
+        expected = _reference(tmp_path / 'checkpoints', source_variant, pair1, pair2)
+        agg = _read_table(tmp_path / 'out' / 'cov' / cov_table_name('agg', source_variant, pair1, pair2))
+        align = _read_table(tmp_path / 'out' / 'cov' / cov_table_name('align', source_variant, pair1, pair2))
+        pd.testing.assert_frame_equal(agg, align)
+
+        assert len(agg) == len(expected)
+        assert (agg['interval_time'] == expected['interval_time']).all()
+        assert (agg['pair1'] == pair1).all() and (agg['pair2'] == pair2).all()
+        for column in FLOAT_COLUMNS:
+            result, exact = agg[column].to_numpy(dtype=float), expected[column].to_numpy(dtype=float)
+            assert np.array_equal(np.isnan(result), np.isnan(exact)), (pair1, pair2, column)
+            np.testing.assert_allclose(result, exact, rtol=1e-9, atol=1e-12, equal_nan=True,
+                                       err_msg=f"{pair1}_{pair2} {column}")
+        np.testing.assert_array_equal(agg['sign_agreement'], expected['sign_agreement'])
+        np.testing.assert_array_equal(agg['mean_reversion_signal'], expected['mean_reversion_signal'])
+
+
+def test_missing_checkpoint_fails_only_its_combinations(tmp_path):
+    _write_checkpoints(tmp_path / 'checkpoints', 'bqx')
+    os.remove(tmp_path / 'checkpoints' / 'audusd' / 'base_bqx_audusd.parquet')
+    results = build_cov_tables_local('bqx', str(tmp_path / 'checkpoints'), str(tmp_path / 'out'),
+                                     COMBINATIONS, ['agg'])
+    failed = {r['table'] for r in results if r['status'] == 'FAILED'}
+    assert failed == {cov_table_name('agg', 'bqx', *c) for c in COMBINATIONS if 'audusd' in c}
+    assert len(results) == len(COMBINATIONS)
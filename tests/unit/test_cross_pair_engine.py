@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+"""
+cross_pair_engine against pandas readings of the csi / mkt / var SQL.
+
+Every generator is UNION ALL over pairs + GROUP BY interval_time; the
+reference does exactly that with pandas (groupby skips NaN like SQL skips
+NULL). Pair checkpoints have their own gaps, NULL values, zero signs and
+one file not sorted by interval_time; one reg checkpoint is missing (CSI
+skips the pair unless it is the column sample, mkt_regime fails). Small
+tensor blocks split the history.
+"""
+
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+import pyarrow.parquet as pq
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), 'scripts'))
+from generate_csi_tables import CURRENCY_PAIRS
+from generate_mkt_tables import ALL_PAIRS, WINDOWS as MKT_WINDOWS
+from generate_var_lag import CURRENCY_PAIRS as LAG_FAMILY_PAIRS, LAG_WINDOWS
+from generate_var_usd import USD_PAIRS, WINDOWS_AGG, AGG_FEATURES
+from cross_pair_engine import build_cross_pair_tables_local
+
+ROWS = 240
+BLOCK_ROWS = 64
+MISSING_REG = 'chfjpy'
+UNSORTED = 'eurusd'
+LAG_PAIRS = sorted(set(LAG_FAMILY_PAIRS['CAD']) | set(LAG_FAMILY_PAIRS['CHF']))  # idx var_lag families
+
+
+def _columns(kind: str) -> list:
+    if kind == 'agg':
+        return [f"agg_{feat}_{w}" for w in WINDOWS_AGG for feat in AGG_FEATURES]
+    if kind == 'reg':
+        return ['reg_direction_45', 'reg_direction_90', 'reg_slope_45', 'reg_slope_90', 'reg_r2_45']
+    if kind == 'mom':
+        return [f"mom_{c}_{w}" for w in MKT_WINDOWS for c in ('roc', 'strength')]
+    return ['return_lag_45', 'momentum_45']
+
+
+def _write_checkpoints(root) -> None:
+    rng = np.random.default_rng(13)
+    times = pd.date_range('2025-11-01', periods=ROWS, freq='min', tz='UTC')
+    for kind, pairs in [('agg', ALL_PAIRS), ('reg', ALL_PAIRS), ('mom', ALL_PAIRS), ('lag', LAG_PAIRS)]:
+        for pair in pairs:
+            if kind == 'reg' and pair == MISSING_REG:
+                continue
+            keep = rng.random(ROWS) > 0.2
+            df = pd.DataFrame({'interval_time': times[keep], 'pair': pair})
+            for column in _columns(kind):
+                if 'direction' in column or 'roc' in column:
+                    values = rng.integers(-1, 2, ROWS).astype(float)  # Zero signs included
+                else:
+                    values = rng.normal(0, 1, ROWS)
+                values[rng.random(ROWS) < 0.15] = np.nan
+                df[column] = values[keep]
+            df['source_value'] = 1.0  # Never aggregated
+            if pair == UNSORTED:
+                df = df.sample(frac=1, random_state=0)
+            stem = f"lag_{pair}_45" if kind == 'lag' else f"{kind}_{pair}"
+            os.makedirs(root / pair, exist_ok=True)
+            df.to_parquet(root / pair / f"{stem}.parquet", index=False)
+
+
+def _union(root, stem: str, pairs: list, directions: dict = None) -> pd.DataFrame:
+    """UNION ALL of the pairs' source tables that exist (with the CSI direction)."""
+    parts = []
+    for pair in pairs:
+        path = root / pair / f"{stem.format(pair=pair)}.parquet"
+        if os.path.exists(path):
+            df = pd.read_parquet(path)
+            df['direction'] = (directions or {}).get(pair, 1)
+            parts.append(df)
+    return pd.concat(parts, ignore_index=True)
+
+
+def _csi(root, kind: str, currency: str, directional: tuple) -> pd.DataFrame:
+    config = CURRENCY_PAIRS[currency]
+    directions = {**{p: 1 for p in config['base']}, **{p: -1 for p in config['quote']}}
+    data = _union(root, kind + '_{pair}', config['base'] + config['quote'], directions)
+    out = {'currency': data.groupby('interval_time')['pair'].first().map(lambda _: currency)}
+    for column in _columns(kind):
+        signed = data[column] * data['direction'] if any(d in column for d in directional) else data[column]
+        out[f"csi_{column}"] = signed.groupby(data['interval_time']).mean()
+    return pd.DataFrame(out)
+
+
+def _expected_tables(root) -> dict:
+    expected = {
+        'csi_agg_usd': _csi(root, 'agg', 'USD', ('mean', 'position')),
+        'csi_reg_jpy': _csi(root, 'reg', 'JPY', ('slope', 'quad', 'lin_term', 'quad_term', 'forecast')),
+        'csi_mom_eur': _csi(root, 'mom', 'EUR', ('roc', 'diff', 'dir', 'roc_smooth', 'zscore'))
+    }
+
+    data = _union(root, 'agg_{pair}', ALL_PAIRS)
+    g = data.groupby('interval_time')
+    out = {'scope': g['pair'].first().map(lambda _: 'MARKET'), 'pairs_count': g['pair'].nunique()}
+    for w in MKT_WINDOWS:
+        out[f"mkt_dispersion_mean_{w}"] = g[f"agg_mean_{w}"].max() - g[f"agg_mean_{w}"].min()
+        out[f"mkt_dispersion_position_{w}"] = g[f"agg_position_{w}"].max() - g[f"agg_position_{w}"].min()
+        out[f"mkt_spread_std_{w}"] = g[f"agg_mean_{w}"].std()
+    expected['mkt_dispersion'] = pd.DataFrame(out)
+
+    data = _union(root, 'mom_{pair}', ALL_PAIRS)
+    g = data.groupby('interval_time')
+    out = {'scope': g['pair'].first().map(lambda _: 'MARKET'), 'pairs_count': g['pair'].nunique()}
+    for w in MKT_WINDOWS:
+        out[f"mkt_net_direction_{w}"] = np.sign(data[f"mom_roc_{w}"]).groupby(data['interval_time']).sum(min_count=1)
+        out[f"mkt_avg_momentum_{w}"] = g[f"mom_roc_{w}"].mean()
+        out[f"mkt_avg_strength_{w}"] = g[f"mom_strength_{w}"].mean()
+    expected['mkt_sentiment'] = pd.DataFrame(out)
+
+    data = _union(root, 'agg_{pair}', USD_PAIRS)
+    g = data.groupby('interval_time')
+    out = {'currency_family': g['pair'].first().map(lambda _: 'USD'), 'pairs_in_family': g['pair'].nunique()}
+    for w in WINDOWS_AGG:
+        for feat in AGG_FEATURES:
+            out[f"var_{feat}_{w}"] = g[f"agg_{feat}_{w}"].var(ddof=0)
+            out[f"avg_{feat}_{w}"] = g[f"agg_{feat}_{w}"].mean()
+    expected['var_agg_idx_usd'] = pd.DataFrame(out)
+
+    data = _union(root, 'lag_{pair}_45', LAG_FAMILY_PAIRS['CAD'])
+    g = data.groupby('interval_time')
+    out = {'currency': g['pair'].first().map(lambda _: 'CAD'),
+           'family_avg': g['return_lag_45'].mean(), 'family_std': g['return_lag_45'].std(),
+           'pair_count': g['pair'].nunique()}
+    for lag in LAG_WINDOWS:
+        out[f"family_lag_{lag}"] = g['return_lag_45'].mean() * float(f"{lag / 45.0:.4f}")
+    expected['var_lag_idx_cad'] = pd.DataFrame(out)
+    return expected
+
+
+def test_tables_match_sql_reference(tmp_path):
+    _write_checkpoints(tmp_path / 'checkpoints')
+    results = build_cross_pair_tables_local(str(tmp_path / 'checkpoints'), str(tmp_path / 'out'),
+                                            kinds=['agg', 'reg', 'mom', 'lag45'], variants=['idx'],
+                                            block_rows=BLOCK_ROWS)
+    status = {r['table']: r['status'] for r in results}
+    assert status.pop('mkt_regime') == 'FAILED'  # Needs every pair's reg table
+    assert status.pop('csi_reg_chf') == 'FAILED'  # Columns come from its first pair, chfjpy
+    assert set(status.values()) == {'SUCCESS'}
+    assert len(status) == 3 * len(CURRENCY_PAIRS) - 1 + 2 + 1 + 2  # csi, mkt, var_agg_usd, var_lag
+
+    for table, expected in _expected_tables(tmp_path / 'checkpoints').items():
+        group = table.split('_')[0]
+        result = pq.read_table(tmp_path / 'out' / group / f"{table}.parquet").to_pandas()
+        expected = expected.reset_index()
+
+        assert list(result.columns) == list(expected.columns), table
+        assert result['interval_time'].is_monotonic_increasing
+        assert (result['interval_time'] == expected['interval_time']).all(), table
+        for column in expected.columns[1:]:
+            if not pd.api.types.is_numeric_dtype(expected[column]):
+                assert (result[column] == expected[column]).all(), (table, column)
+                continue
+            values, exact = result[column].to_numpy(dtype=float), expected[column].to_numpy(dtype=float)
+            assert np.array_equal(np.isnan(values), np.isnan(exact)), (table, column)
+            np.testing.assert_allclose(values, exact, rtol=1e-9, atol=1e-12, equal_nan=True,
+                                       err_msg=f"{table} {column}")
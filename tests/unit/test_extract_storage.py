@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+"""
+Storage Read extraction: interleaved streams → sorted checkpoint via k-way merge of sorted runs.
+"""
+
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), 'scripts'))
+import extract_to_parquet
+from extract_to_parquet import LocalReadClient, extract_table_storage
+from streaming_merge import merge_sorted_runs
+
+TABLE = 'mom_45_eurusd'
+
+
+def _feature_table(rows: int) -> pa.Table:
+    times = pd.date_range('2024-01-01', periods=rows, freq='min', tz='UTC').as_unit('us')
+    rng = np.random.default_rng(0)
+    return pa.table({
+        'interval_time': times,
+        'mom_45_close': rng.normal(size=rows),
+        'mom_45_count': np.arange(rows, dtype=np.int64),
+    })
+
+
+@pytest.fixture
+def small_row_groups(monkeypatch):
+    monkeypatch.setattr(extract_to_parquet, 'RUN_BUFFER_ROWS', 700)
+
+
+@pytest.mark.parametrize('shuffle_seed', [None, 7])
+def test_interleaved_streams_produce_sorted_checkpoint(tmp_path, small_row_groups, shuffle_seed):
+    table = _feature_table(5_000)
+    client = LocalReadClient({TABLE: table}, page_rows=250, shuffle_seed=shuffle_seed)
+
+    result = extract_table_storage((TABLE, 'eurusd', tmp_path, None, None), read_client=client)
+
+    assert result['status'] == 'success'
+    assert result['rows'] == table.num_rows
+    assert result['streams'] == extract_to_parquet.MAX_READ_STREAMS
+    if shuffle_seed is None:
+        assert result['runs'] == result['streams']  # In-order streams: one run each
+    else:
+        assert result['runs'] > result['streams']
+    assert pq.read_table(tmp_path / f"{TABLE}.parquet").equals(table)
+    assert result['watermark'] == '2024-01-04 11:19:00'
+    assert sorted(p.name for p in tmp_path.iterdir()) == [f"{TABLE}.parquet"]  # Runs cleaned up
+
+
+def test_single_stream_is_written_without_merge(tmp_path, small_row_groups):
+    table = _feature_table(600)
+    client = LocalReadClient({TABLE: table}, page_rows=1_000)
+
+    result = extract_table_storage((TABLE, 'eurusd', tmp_path, None, None), read_client=client)
+
+    assert (result['streams'], result['runs']) == (1, 1)
+    assert pq.read_table(tmp_path / f"{TABLE}.parquet").equals(table)
+
+
+def test_empty_table(tmp_path):
+    client = LocalReadClient({TABLE: _feature_table(0)})
+
+    result = extract_table_storage((TABLE, 'eurusd', tmp_path, None, None), read_client=client)
+
+    assert result['status'] == 'empty'
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_merge_sorted_runs_keeps_every_row(tmp_path):
+    table = _feature_table(3_000)
+    # Three overlapping sorted runs (every third row) + one run duplicating a key range
+    runs = []
+    for i, part in enumerate([table.take(np.arange(k, 3_000, 3)) for k in range(3)] + [table.slice(100, 50)]):
+        runs.append(tmp_path / f"run{i}.parquet")
+        pq.write_table(part, runs[-1], row_group_size=97)
+
+    rows = merge_sorted_runs(runs, tmp_path / 'merged.parquet', row_group_rows=400, read_rows=64)
+
+    merged = pq.read_table(tmp_path / 'merged.parquet')
+    assert rows == merged.num_rows == 3_050
+    keys = merged.column('interval_time').cast(pa.int64()).to_numpy()
+    assert np.all(np.diff(keys) >= 0)
+    expected = pa.concat_tables([table, table.slice(100, 50)]).sort_by([('mom_45_count', 'ascending')])
+    assert merged.sort_by([('mom_45_count', 'ascending')]).equals(expected)
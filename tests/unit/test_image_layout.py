@@ -0,0 +1,59 @@
+#!/usr/bin/env python3
+"""
+Container images: the flat /workspace/scripts layout must be importable.
+
+The merge and Cloud Run images copy individual files from scripts/ and
+pipelines/training/ into one directory. Each Python file copied there is
+imported from a copy of that layout (repo not on sys.path), so a module
+the Dockerfile forgets to copy fails here instead of at container start.
+"""
+
+import os
+import shutil
+import subprocess
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+IMAGE_DIR = '/workspace/scripts/'
+DOCKERFILES = ['Dockerfile.merge', 'Dockerfile.cloudrun-polars']
+
+
+def _copied_files(dockerfile: str) -> list:
+    """Repo paths the Dockerfile COPYs into /workspace/scripts/."""
+    files = []
+    with open(os.path.join(ROOT, dockerfile)) as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) == 3 and parts[0] == 'COPY' and parts[2] == IMAGE_DIR:
+                files.append(parts[1])
+    return files
+
+
+@pytest.fixture(params=DOCKERFILES)
+def image_scripts(request, tmp_path):
+    scripts = tmp_path / 'workspace' / 'scripts'
+    scripts.mkdir(parents=True)
+    for path in _copied_files(request.param):
+        shutil.copy(os.path.join(ROOT, path), scripts)
+    return scripts
+
+
+def _run(scripts, *args):
+    env = {k: v for k, v in os.environ.items() if k != 'PYTHONPATH'}
+    return subprocess.run([sys.executable, *args], cwd=scripts.parent, env=env,
+                          capture_output=True, text=True, timeout=120)
+
+
+def test_every_copied_module_imports(image_scripts):
+    modules = sorted(p.stem for p in image_scripts.glob('*.py'))
+    assert modules
+    code = f"import sys; sys.path.insert(0, {str(image_scripts)!r}); " + '; '.join(f"import {m}" for m in modules)
+    result = _run(image_scripts, '-c', code)
+    assert result.returncode == 0, result.stderr
+
+
+def test_merge_entry_point_starts(image_scripts):
+    result = _run(image_scripts, 'scripts/merge_with_polars_safe.py', '--help')
+    assert result.returncode == 0, result.stderr
@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+"""
+object_store against the filesystem-backed fake bucket (LocalStore).
+
+Covers projected (column-pruned) reads, atomic publish on write failure,
+prefetch reuse of local copies, and reading checkpoints in place for the
+streaming merge.
+"""
+
+import os
+import shutil
+import sys
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.join(ROOT, 'scripts'))
+sys.path.insert(0, os.path.join(ROOT, 'pipelines', 'training'))
+import object_store
+from object_store import LocalStore
+from streaming_merge import streaming_merge
+
+PREFIX = 'gs://bucket/checkpoints/eurusd'
+
+
+class CountingStore(LocalStore):
+    """LocalStore recording ranged-read bytes and full downloads."""
+
+    def __init__(self, root):
+        super().__init__(root)
+        self.range_bytes = 0
+        self.downloads = []
+
+    def read_range(self, uri, start, length):
+        data = super().read_range(uri, start, length)
+        self.range_bytes += len(data)
+        return data
+
+    def download(self, uri, path):
+        self.downloads.append(uri)
+        super().download(uri, path)
+
+
+@pytest.fixture
+def store(tmp_path):
+    store = CountingStore(str(tmp_path / 'bucket_root'))
+    object_store.set_store(store)
+    yield store
+    object_store.set_store(None)
+
+
+def _frame(rows: int, columns: list, start: str = '2024-01-01', step: int = 1) -> pd.DataFrame:
+    rng = np.random.default_rng(len(columns))
+    times = pd.date_range(start, periods=rows, freq=f'{step}min', tz='UTC').as_unit('us')
+    return pd.DataFrame({'interval_time': times, **{c: rng.normal(size=rows) for c in columns}})
+
+
+def test_projected_read_fetches_only_requested_columns(store, monkeypatch):
+    monkeypatch.setattr(object_store, 'COALESCE_GAP_BYTES', 0)  # Measure pruning, not coalescing
+    uri = f"{PREFIX}/reg_eurusd.parquet"
+    df = _frame(20_000, [f"reg_{i}" for i in range(20)])
+    object_store.write_parquet(df, uri)
+    size = store.size(uri)
+
+    table = object_store.read_parquet_table(uri, columns=['interval_time', 'reg_3'])
+
+    assert table.column_names == ['interval_time', 'reg_3']
+    assert table.to_pandas().equals(df[['interval_time', 'reg_3']])
+    assert store.range_bytes < size / 5
+
+
+def test_failed_write_publishes_nothing(store):
+    uri = f"{PREFIX}/targets.parquet"
+    object_store.write_parquet(_frame(10, ['target_a']), uri)
+    before = store.read_bytes(uri)
+
+    with pytest.raises(RuntimeError):
+        with object_store.open_write(uri) as sink:
+            with pq.ParquetWriter(sink, pa.schema([('x', pa.int64())])) as writer:
+                writer.write_table(pa.table({'x': [1, 2, 3]}))
+                raise RuntimeError("extraction failed mid-write")
+
+    assert store.read_bytes(uri) == before  # Previous object untouched
+    assert [o['name'] for o in store.list(PREFIX)] == ['targets.parquet']
+    assert not any(name.endswith('.tmp') for name in os.listdir(store.path(PREFIX)))
+
+
+def test_failed_local_write_publishes_nothing(tmp_path):
+    path = str(tmp_path / 'out.parquet')
+    with pytest.raises(RuntimeError):
+        with object_store.open_write(path) as sink:
+            sink.write(b'PAR1')
+            raise RuntimeError("boom")
+    assert os.listdir(tmp_path) == []
+
+
+def test_prefetch_reuses_matching_local_copies(store, tmp_path):
+    for name in ['a.parquet', 'b.parquet', 'c.parquet']:
+        object_store.write_parquet(_frame(100, [name[0]]), f"{PREFIX}/{name}")
+    listing = store.list(PREFIX)
+    local_dir = str(tmp_path / 'local')
+
+    first = list(object_store.prefetch(listing, local_dir, max_inflight=2))
+    assert len(store.downloads) == 3
+    assert [os.path.basename(p) for p in first] == ['a.parquet', 'b.parquet', 'c.parquet']
+
+    # Same size + write time → kept; a rewritten object is fetched again
+    object_store.write_parquet(_frame(200, ['b']), f"{PREFIX}/b.parquet")
+    second = list(object_store.prefetch(store.list(PREFIX), local_dir, max_inflight=2))
+    assert second == first
+    assert store.downloads[3:] == [f"{PREFIX}/b.parquet"]
+    assert len(pd.read_parquet(second[1])) == 200
+
+
+def test_iter_batches_streams_one_row_group_at_a_time(store):
+    uri = f"{PREFIX}/vol_eurusd.parquet"
+    df = _frame(5_000, ['vol_a', 'vol_b'])
+    object_store.write_parquet(df, uri, row_group_size=1_000)
+
+    batches = list(object_store.iter_batches(uri, ['interval_time', 'vol_b'], batch_size=300, row_groups=[2, 3, 4]))
+
+    assert max(b.num_rows for b in batches) <= 300
+    assert pa.Table.from_batches(batches).to_pandas().equals(df[['interval_time', 'vol_b']].iloc[2_000:].reset_index(drop=True))
+
+
+def _write_checkpoints(write):
+    write(_frame(3_000, ['target_bqx45_h15']), 'targets.parquet')
+    write(_frame(1_500, ['agg_45_mean', 'agg_45_std'], step=2), 'agg_45_eurusd.parquet')
+    write(_frame(2_900, ['mom_45_close', 'target_bqx45_h15'], start='2024-01-01 01:40'), 'mom_45_eurusd.parquet')
+
+
+def test_streaming_merge_reads_gcs_checkpoints_in_place(store, tmp_path):
+    local_dir = tmp_path / 'checkpoints'
+    local_dir.mkdir()
+    _write_checkpoints(lambda df, name: df.to_parquet(local_dir / name, index=False, row_group_size=700))
+    _write_checkpoints(lambda df, name: object_store.write_parquet(df, f"{PREFIX}/{name}", row_group_size=700))
+
+    local_stats = streaming_merge(local_dir, tmp_path / 'local.parquet', batch_rows=1_000)
+    remote_stats = streaming_merge(PREFIX, tmp_path / 'remote.parquet', batch_rows=1_000)
+
+    assert store.downloads == []
+    assert remote_stats['rows'] == local_stats['rows'] == 3_000
+    assert remote_stats['columns'] == local_stats['columns'] == 5
+    assert pq.read_table(tmp_path / 'remote.parquet').equals(pq.read_table(tmp_path / 'local.parquet'))
+
+
+def test_join_staging_streams_feature_files(store):
+    _write_checkpoints(lambda df, name: object_store.write_parquet(df, f"{PREFIX}/{name}"))
+    import merge_with_polars_safe
+
+    pair = 'teststage'
+    shutil.rmtree(f"/tmp/checkpoints_{pair}", ignore_errors=True)
+    try:
+        targets, features, count = merge_with_polars_safe.download_gcs_checkpoints_to_tmp(PREFIX, pair)
+        assert targets.exists() and count == 2
+        assert len(store.downloads) == 1  # Feature files not fetched until consumed
+        assert [p.name for p in features] == ['agg_45_eurusd.parquet', 'mom_45_eurusd.parquet']
+        assert len(store.downloads) == 3
+    finally:
+        shutil.rmtree(f"/tmp/checkpoints_{pair}", ignore_errors=True)
@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+"""
+rolling_kernels against a brute-force ROWS-frame reference.
+
+Each frame is evaluated directly (rows max(0, t-w+1)..t, NULLs skipped,
+exact fsum moments), covering the partial warm-up frames, NULL runs,
+all-NULL frames and constant frames.
+"""
+
+import math
+import os
+import sys
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), 'scripts'))
+import rolling_kernels as rk
+
+ROWS = 400
+WINDOWS = [1, 2, 7, 45, 500]  # 500 > ROWS: every frame is a warm-up frame
+RTOL = 1e-9
+
+
+def _series(level: float = 1.1) -> np.ndarray:
+    """(ROWS × 3) FX-like series with NULL runs, an all-NULL stretch and a constant run."""
+    rng = np.random.default_rng(42)
+    values = level + np.cumsum(rng.normal(0, 1e-4, (ROWS, 3)), axis=0)
+    values[rng.random(values.shape) < 0.1] = np.nan
+    values[:3, 0] = np.nan           # NULL first rows (FIRST_VALUE, warm-up)
+    values[100:160, 1] = np.nan      # All-NULL frames for w <= 60
+    values[200:260, 2] = level       # Constant frames
+    return values
+
+
+def _frame_stat(frame: np.ndarray, stat: str) -> float:
+    x = frame[~np.isnan(frame)]
+    n = len(x)
+    if stat in ('min', 'max') and n == 0:
+        return np.nan
+    if stat == 'min':
+        return x.min()
+    if stat == 'max':
+        return x.max()
+    if n < 2:  # STDDEV_SAMP
+        return np.nan
+    mean = math.fsum(x) / n
+    return math.sqrt(math.fsum((x - mean) ** 2) / (n - 1))
+
+
+def _brute(values: np.ndarray, window: int, stat: str) -> np.ndarray:
+    out = np.full(values.shape, np.nan)
+    for t in range(len(values)):
+        start = max(0, t - window + 1)
+        for j in range(values.shape[1]):
+            if stat == 'first':
+                out[t, j] = values[start, j]
+            else:
+                out[t, j] = _frame_stat(values[start:t + 1, j], stat)
+    return out
+
+
+def _brute_paired(x: np.ndarray, y: np.ndarray, window: int) -> tuple:
+    """(COVAR_POP, CORR, zero-variance mask) per frame of column-paired x and y."""
+    cov = np.full(x.shape, np.nan)
+    corr = np.full(x.shape, np.nan)
+    flat = np.zeros(x.shape, dtype=bool)
+    for t in range(len(x)):
+        start = max(0, t - window + 1)
+        for j in range(x.shape[1]):
+            a, b = x[start:t + 1, j], y[start:t + 1, j]
+            both = ~np.isnan(a) & ~np.isnan(b)
+            a, b = a[both], b[both]
+            n = len(a)
+            if n == 0:
+                continue
+            da, db = a - math.fsum(a) / n, b - math.fsum(b) / n
+            cov[t, j] = math.fsum(da * db) / n
+            if n < 2:
+                continue
+            ss_a, ss_b = math.fsum(da * da), math.fsum(db * db)
+            if ss_a == 0 or ss_b == 0:
+                flat[t, j] = True
+            else:
+                corr[t, j] = math.fsum(da * db) / math.sqrt(ss_a * ss_b)
+    return cov, corr, flat
+
+
+def _assert_matches(result: np.ndarray, expected: np.ndarray, rtol: float = RTOL, atol: float = 0.0):
+    assert result.shape == expected.shape
+    assert np.array_equal(np.isnan(result), np.isnan(expected))  # NULL exactly where the SQL is NULL
+    np.testing.assert_allclose(result, expected, rtol=rtol, atol=atol, equal_nan=True)
+
+
+@pytest.mark.parametrize('window', WINDOWS)
+@pytest.mark.parametrize('stat', ['min', 'max', 'first'])
+def test_order_statistics(stat, window):
+    values = _series()
+    _assert_matches(rk.rolling_stats(values, [window], (stat,))[(stat, window)], _brute(values, window, stat))
+
+
+def test_constant_frames_have_zero_deviation():
+    values = _series(level=123.456)
+    std = rk.rolling_pearson(values, values[:, :1], 45)['std_x']
+    # Frames lying inside the constant run (rows 200-259) are exactly 0, not float noise
+    assert np.all(std[244:260, 2] == 0.0)
+    assert np.all(std[260:300, 2] > 0.0)
+
+
+def test_single_series_and_helpers_match_rolling_stats():
+    values = _series()
+    stats = rk.rolling_stats(values, [7, 45], ('min', 'max', 'first'))
+    np.testing.assert_array_equal(rk.rolling_min(values[:, 1], 45), stats[('min', 45)][:, 1])
+    np.testing.assert_array_equal(rk.rolling_first(values, 7), stats[('first', 7)])
+    np.testing.assert_array_equal(rk.rolling_max(values, 45), stats[('max', 45)])
+    with pytest.raises(ValueError):
+        rk.rolling_stats(values, [7], ('mean',))
+
+
+@pytest.mark.parametrize('window', [2, 7, 45, 500])
+def test_pearson_every_x_against_every_y(window):
+    x = _series()
+    rng = np.random.default_rng(3)
+    y = np.column_stack([x[:, 0] * 2.0, rng.normal(0, 1.0, ROWS)])
+    y[rng.random(y.shape) < 0.1] = np.nan
+
+    result = rk.rolling_pearson(x, y, window)
+
+    assert result['corr'].shape == (ROWS, 3, 2)
+    for j in range(2):
+        pairs = np.repeat(y[:, j:j + 1], 3, axis=1)
+        cov, corr, flat = _brute_paired(x, pairs, window)
+        _assert_matches(result['cov'][:, :, j], cov, atol=1e-18)  # Unit-scale y column
+        _assert_matches(result['corr'][:, :, j], np.where(flat, np.nan, corr), atol=1e-12)
+        assert np.array_equal(result['corr_nan'][:, :, j], flat)
+    _assert_matches(result['std_x'], _brute(x, window, 'std'), atol=1e-10)
+    _assert_matches(result['std_y'], _brute(y, window, 'std'), atol=1e-10)
@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+"""
+Streaming merge memory: peak RSS follows batch_rows, not checkpoint size.
+
+Checkpoints are written through object_store.write_parquet (the checkpoint
+writer) and merged in a fresh subprocess, so ru_maxrss measures only the
+merge. Two datasets with the same files and columns but 8× the rows per
+file must merge within about the same RSS growth.
+"""
+
+import json
+import os
+import subprocess
+import sys
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.join(ROOT, 'scripts'))
+sys.path.insert(0, os.path.join(ROOT, 'pipelines', 'training'))
+import object_store
+
+FILES = 30
+COLUMNS = 8
+BATCH_ROWS = 5_000
+
+MERGE = f"""
+import json, resource, sys
+sys.path.insert(0, {os.path.join(ROOT, 'scripts')!r})
+sys.path.insert(0, {os.path.join(ROOT, 'pipelines', 'training')!r})
+from pathlib import Path
+from streaming_merge import streaming_merge
+before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+streaming_merge(Path(sys.argv[1]), Path(sys.argv[2]), batch_rows={BATCH_ROWS})
+after = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+print(json.dumps({{'growth_mb': (after - before) / 1024}}))
+"""
+
+
+def _write_checkpoints(directory, rows: int) -> int:
+    """Targets + FILES feature checkpoints of `rows` rows; returns the raw data size in bytes."""
+    directory.mkdir()
+    times = pd.date_range('2020-01-01', periods=rows, freq='min', tz='UTC').as_unit('us')
+    rng = np.random.default_rng(0)
+    object_store.write_parquet(pa.table({'interval_time': times, 'target_a': rng.normal(size=rows)}),
+                               str(directory / 'targets.parquet'))
+    for i in range(FILES):
+        columns = {f'f{i}_{j}': rng.normal(size=rows) for j in range(COLUMNS)}
+        object_store.write_parquet(pa.table({'interval_time': times, **columns}),
+                                   str(directory / f'feat_{i:03d}.parquet'))
+    return FILES * COLUMNS * rows * 8
+
+
+def _merge_growth_mb(checkpoint_dir, output_path) -> float:
+    result = subprocess.run([sys.executable, '-c', MERGE, str(checkpoint_dir), str(output_path)],
+                            capture_output=True, text=True, timeout=600)
+    assert result.returncode == 0, result.stderr
+    return json.loads(result.stdout.strip().splitlines()[-1])['growth_mb']
+
+
+def test_peak_rss_does_not_scale_with_file_size(tmp_path):
+    _write_checkpoints(tmp_path / 'small', 20_000)
+    large_bytes = _write_checkpoints(tmp_path / 'large', 160_000)
+
+    small = _merge_growth_mb(tmp_path / 'small', tmp_path / 'small.parquet')
+    large = _merge_growth_mb(tmp_path / 'large', tmp_path / 'large.parquet')
+
+    # 8× the rows per file: growth stays near the small case and below one copy of the data
+    assert large < small + 64, (small, large)
+    assert large < large_bytes / 2**20, (large, large_bytes / 2**20)
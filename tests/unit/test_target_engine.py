@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""
+target_engine against pandas readings of the targets SQL.
+
+The base_bqx checkpoint is unsorted, misses single intervals and a long
+closed stretch, and has NULL bqx_45 rows (dropped by the source CTE) and
+NULLs in the other windows (kept). 'lead' must equal LEAD(bqx_w, h) over
+the remaining rows; 'time' must take bqx_w at exactly interval_time + h
+and give NULL when that interval is absent.
+"""
+
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+import pyarrow.parquet as pq
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), 'scripts'))
+from create_all_targets_tables import BQX_WINDOWS, HORIZONS
+from target_engine import TARGETS_FILE, build_targets_local, target_column
+
+PAIR = 'eurusd'
+ROWS = 900
+CLOSED = slice(400, 560)  # Market closed: no rows at all
+
+
+def _write_base(root) -> pd.DataFrame:
+    rng = np.random.default_rng(17)
+    times = pd.date_range('2025-11-14 20:00', periods=ROWS, freq='min', tz='UTC')
+    keep = rng.random(ROWS) > 0.05
+    keep[CLOSED] = False
+    df = pd.DataFrame({'interval_time': times, 'pair': PAIR})
+    for w in BQX_WINDOWS:
+        values = rng.normal(0, 1, ROWS)
+        values[rng.random(ROWS) < (0.05 if w == 45 else 0.1)] = np.nan
+        df[f"bqx_{w}"] = values
+    df = df[keep].sample(frac=1, random_state=1)  # Not in interval_time order
+    os.makedirs(root / PAIR, exist_ok=True)
+    df.to_parquet(root / PAIR / f"base_bqx_{PAIR}.parquet", index=False)
+    return df
+
+
+def _reference(base: pd.DataFrame, gap_policy: str) -> tuple:
+    """(expected targets table, {horizon: rows whose LEAD crosses a gap})."""
+    source = base[base['bqx_45'].notna()].sort_values('interval_time').reset_index(drop=True)
+    by_time = source.set_index('interval_time')
+    expected, crossed = source.copy(), {}
+    for w in BQX_WINDOWS:
+        for h in HORIZONS:
+            if gap_policy == 'lead':
+                target = source[f"bqx_{w}"].shift(-h)
+            else:
+                target = by_time[f"bqx_{w}"].reindex(source['interval_time'] + pd.Timedelta(minutes=h))
+            expected[target_column(w, h)] = target.to_numpy()
+    for h in HORIZONS:
+        lead_time = source['interval_time'].shift(-h)
+        crossed[h] = int((lead_time.notna() & (lead_time != source['interval_time'] + pd.Timedelta(minutes=h))).sum())
+    return expected, crossed
+
+
+@pytest.mark.parametrize('gap_policy', ['time', 'lead'])
+def test_targets_match_sql_reference(tmp_path, gap_policy):
+    base = _write_base(tmp_path)
+    result = build_targets_local(PAIR, str(tmp_path), gap_policy)
+    expected, crossed = _reference(base, gap_policy)
+
+    assert result['status'] == 'SUCCESS'
+    assert result['row_count'] == len(expected)
+    assert result['crossed_gaps'] == crossed
+    assert all(crossed.values())  # The closed stretch is crossed at every horizon
+
+    table = pq.read_table(tmp_path / PAIR / TARGETS_FILE).to_pandas()
+    assert list(table.columns) == list(expected.columns)
+    assert (table['interval_time'] == expected['interval_time']).all()
+    assert (table['pair'] == PAIR).all()
+    for column in expected.columns[2:]:
+        values, exact = table[column].to_numpy(dtype=float), expected[column].to_numpy(dtype=float)
+        np.testing.assert_array_equal(values, exact, err_msg=column)  # Gathered, not computed: exact
+
+
+def test_time_policy_never_leads_across_a_gap(tmp_path):
+    base = _write_base(tmp_path)
+    build_targets_local(PAIR, str(tmp_path), 'time')
+    table = pq.read_table(tmp_path / PAIR / TARGETS_FILE).to_pandas()
+
+    times = set(base.loc[base['bqx_45'].notna(), 'interval_time'])
+    for h in HORIZONS:
+        absent = ~(table['interval_time'] + pd.Timedelta(minutes=h)).isin(times)
+        assert absent.any()
+        assert table.loc[absent, [target_column(w, h) for w in BQX_WINDOWS]].isna().all().all()
+
+
+def test_failures_are_reported(tmp_path):
+    assert build_targets_local(PAIR, str(tmp_path))['status'] == 'FAILED'  # No checkpoint
+    _write_base(tmp_path)
+    result = build_targets_local(PAIR, str(tmp_path), 'nearest')
+    assert result['status'] == 'FAILED' and 'gap_policy' in result['error']
+    assert not os.path.exists(tmp_path / PAIR / TARGETS_FILE)
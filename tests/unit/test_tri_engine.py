@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+"""
+tri_engine against a row-by-row reading of generate_tri_sql.
+
+Base checkpoints have gaps (each pair misses its own intervals), NULL
+values, a zero pair2 value (SAFE_DIVIDE inversion → NULL) and rows past
+DATE_END (outside all_intervals). The reference LEFT JOINs with pandas and
+evaluates every ROWS frame directly (NULLs skipped, exact fsum moments).
+"""
+
+import math
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+import pyarrow.parquet as pq
+import pytest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))), 'scripts'))
+from generate_tri_tables import DATE_END
+from tri_engine import build_tri_tables_local, triangle_sources
+
+TRIANGLES = [('eur', 'usd', 'gbp'),   # pair2 = gbpusd inverted
+             ('eur', 'usd', 'jpy')]   # pair2 = usdjpy as is
+ROWS = 600  # Hourly, from 2025-10-28 (crosses a month and DATE_END)
+FLOAT_COLUMNS = ['pair1_val', 'pair2_val', 'pair3_val', 'synthetic_val', 'tri_error',
+                 'error_ma_45', 'error_ma_180', 'error_std_180', 'error_zscore']
+
+
+def _write_checkpoints(root, source_variant: str) -> None:
+    rng = np.random.default_rng(11)
+    times = pd.date_range('2025-10-28', periods=ROWS, freq='h', tz='UTC')
+    column = 'bqx_45' if source_variant == 'bqx' else 'close_idx'
+    pairs = sorted({p for t in TRIANGLES for i, p in enumerate(triangle_sources(*t)) if i != 2})
+    for pair in pairs:
+        keep = rng.random(ROWS) > 0.15  # Each pair has its own gaps
+        values = 1.0 + np.cumsum(rng.normal(0, 1e-3, ROWS))
+        values[rng.random(ROWS) < 0.08] = np.nan
+        if pair == 'gbpusd':
+            values[np.flatnonzero(keep)[5]] = 0.0
+        os.makedirs(root / pair, exist_ok=True)
+        pd.DataFrame({'interval_time': times[keep], column: values[keep]}).to_parquet(
+            root / pair / f"base_{source_variant}_{pair}.parquet", index=False)
+
+
+def _avg(frame: np.ndarray) -> float:
+    x = frame[~np.isnan(frame)]
+    return math.fsum(x) / len(x) if len(x) else np.nan
+
+
+def _stddev(frame: np.ndarray) -> float:
+    x = frame[~np.isnan(frame)]
+    if len(x) < 2:
+        return np.nan
+    mean = math.fsum(x) / len(x)
+    return math.sqrt(math.fsum((x - mean) ** 2) / (len(x) - 1))
+
+
+def _reference(root, source_variant: str, triangle: tuple) -> pd.DataFrame:
+    pair1, pair2, invert, pair3 = triangle_sources(*triangle)
+    column = 'bqx_45' if source_variant == 'bqx' else 'close_idx'
+
+    def _side(pair, name):
+        df = pd.read_parquet(root / pair / f"base_{source_variant}_{pair}.parquet")
+        return df.rename(columns={column: name})
+
+    p1, p2, p3 = _side(pair1, 'pair1_val'), _side(pair2, 'pair2_val'), _side(pair3, 'pair3_val')
+    if invert:
+        p2['pair2_val'] = np.where(p2['pair2_val'] == 0, np.nan, 1.0 / p2['pair2_val'])
+    end = pd.Timestamp(DATE_END, tz='UTC')
+    intervals = pd.concat([p1['interval_time'], p3['interval_time']]).drop_duplicates()
+    df = pd.DataFrame({'interval_time': intervals[intervals <= end].sort_values()})
+    for side in (p1, p2, p3):
+        df = df.merge(side, on='interval_time', how='left')
+    df['synthetic_val'] = df['pair1_val'] * df['pair2_val']
+    df['tri_error'] = df['pair3_val'] - df['synthetic_val']
+
+    err = df['tri_error'].to_numpy()
+    w45 = [err[max(0, t - 44):t + 1] for t in range(len(err))]
+    w180 = [err[max(0, t - 179):t + 1] for t in range(len(err))]
+    df['error_ma_45'] = [_avg(f) for f in w45]
+    df['error_ma_180'] = [_avg(f) for f in w180]
+    df['error_std_180'] = [_stddev(f) for f in w180]
+    std_45 = np.array([_stddev(f) for f in w45])
+    std_180 = df['error_std_180'].to_numpy()
+    with np.errstate(divide='ignore', invalid='ignore'):
+        df['error_zscore'] = np.where(std_180 == 0, np.nan, (err - df['error_ma_180']) / std_180)
+    df['arb_opportunity'] = (np.abs(df['error_zscore']) > 2).astype(np.int64)  # NULL → 0
+    df['error_regime'] = np.where(std_45 > std_180 * 1.5, 'high_vol',
+                                  np.where(std_45 < std_180 * 0.5, 'low_vol', 'normal'))
+    return df
+
+
+def _read_table(table_dir) -> pd.DataFrame:
+    df = pq.read_table(table_dir).to_pandas()
+    return df.drop(columns='month').sort_values('interval_time').reset_index(drop=True)
+
+
+@pytest.mark.parametrize('source_variant', ['bqx', 'idx'])
+def test_tables_match_sql_reference(tmp_path, source_variant):
+    _write_checkpoints(tmp_path / 'checkpoints', source_variant)
+    results = build_tri_tables_local(source_variant, str(tmp_path / 'checkpoints'), str(tmp_path / 'out'),
+                                     TRIANGLES, ['agg', 'align'])
+    assert [r['status'] for r in results] == ['SUCCESS'] * 4
+
+    for triangle in TRIANGLES:
+        expected = _reference(tmp_path / 'checkpoints', source_variant, triangle)
+        name = '_'.join(triangle)
+        agg = _read_table(tmp_path / 'out' / 'tri' / f"tri_agg_{source_variant}_{name}")
+        align = _read_table(tmp_path / 'out' / 'tri' / f"tri_align_{source_variant}_{name}")
+        pd.testing.assert_frame_equal(agg, align)
+
+        assert len(agg) == len(expected)
+        assert (agg['interval_time'] == expected['interval_time']).all()
+        assert (agg[['base_curr', 'quote_curr', 'cross_curr']].to_numpy() == list(triangle)).all()
+        for column in FLOAT_COLUMNS:
+            result, exact = agg[column].to_numpy(dtype=float), expected[column].to_numpy(dtype=float)
+            assert np.array_equal(np.isnan(result), np.isnan(exact)), column  # NULL exactly where SQL is
+            np.testing.assert_allclose(result, exact, rtol=1e-9, atol=1e-12, equal_nan=True, err_msg=column)
+        np.testing.assert_array_equal(agg['arb_opportunity'], expected['arb_opportunity'])
+        np.testing.assert_array_equal(agg['error_regime'], expected['error_regime'])
+
+
+def test_missing_checkpoint_fails_only_its_triangles(tmp_path):
+    _write_checkpoints(tmp_path / 'checkpoints', 'bqx')
+    os.remove(tmp_path / 'checkpoints' / 'eurjpy' / 'base_bqx_eurjpy.parquet')
+    results = build_tri_tables_local('bqx', str(tmp_path / 'checkpoints'), str(tmp_path / 'out'), TRIANGLES, ['agg'])
+    status = {r['table']: r['status'] for r in results}
+    assert status == {'tri_agg_bqx_eur_usd_gbp': 'SUCCESS', 'tri_agg_bqx_eur_usd_jpy': 'FAILED'}